@@ -0,0 +1,9 @@
+"""
+Benchmarks offline de Moltbot.
+
+No forman parte del paquete instalado ni de los tests: se ejecutan a mano
+(o en CI) desde ``moltbot/`` con el paquete instalado::
+
+    python -m benchmarks parsers
+    python -m benchmarks parsers --update-baseline
+"""
@@ -0,0 +1,163 @@
+"""Punto de entrada de los benchmarks (``python -m benchmarks``)."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from benchmarks import load, parsers
+from benchmarks.corpus import SIZES
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="benchmarks", description=__doc__)
+    subparsers = parser.add_subparsers(dest="suite", required=True, metavar="SUITE")
+
+    p = subparsers.add_parser("parsers", help="Velocidad y precisión de los BillParser.")
+    p.add_argument("--provider", action="append", dest="providers", help="Limita a un proveedor.")
+    p.add_argument(
+        "--size", action="append", type=int, dest="sizes",
+        help=f"Tamaño de texto en caracteres (por defecto {', '.join(map(str, SIZES))}).",
+    )
+    p.add_argument("--samples", type=int, default=20, help="Textos realistas por tamaño.")
+    p.add_argument("--repeats", type=int, default=3, help="Repeticiones por texto.")
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument(
+        "--tolerance", type=float, default=2.0,
+        help="Factor de empeoramiento admitido frente a la línea base.",
+    )
+    p.add_argument(
+        "--update-baseline", action="store_true", help="Guarda los resultados como línea base.",
+    )
+
+    defaults = load.LoadConfig()
+    p = subparsers.add_parser(
+        "load", help="Throughput y latencia de extremo a extremo con sustitutos locales.",
+    )
+    p.add_argument(
+        "--mix", action="append", dest="mixes",
+        help=f"Mezcla de tráfico: {', '.join(load.MIXES)} o 'factura=0.8,comando=0.2' "
+             "(repetible; por defecto, todas las predefinidas).",
+    )
+    p.add_argument("--messages", type=int, default=defaults.messages)
+    p.add_argument(
+        "--rate", type=float, default=defaults.rate,
+        help="Mensajes por segundo (0 = lazo cerrado, tan rápido como se pueda).",
+    )
+    p.add_argument(
+        "--command", action="append", dest="commands",
+        help=f"Comando del tráfico (repetible; por defecto {', '.join(load.DEFAULT_COMMANDS)}).",
+    )
+    p.add_argument("--detect-ratio", type=float, default=defaults.detect_ratio)
+    p.add_argument("--dup-ratio", type=float, default=defaults.dup_ratio)
+    p.add_argument("--size", type=int, default=defaults.size, help="Caracteres por factura.")
+    p.add_argument(
+        "--db", choices=["recording", "postgres"], default=defaults.db,
+        help="Capa de datos en memoria o el PostgreSQL de POSTGRES_*.",
+    )
+    p.add_argument("--db-latency-ms", type=float, default=defaults.db_latency_ms)
+    p.add_argument("--webhook-latency-ms", type=float, default=defaults.webhook_latency_ms)
+    p.add_argument("--webhook-jitter-ms", type=float, default=defaults.webhook_jitter_ms)
+    p.add_argument("--webhook-error-ratio", type=float, default=defaults.webhook_error_ratio)
+    p.add_argument(
+        "--trace-memory", action="store_true", help="Mide el pico del heap (tracemalloc).",
+    )
+    p.add_argument("--seed", type=int, default=defaults.seed)
+    p.add_argument(
+        "--tolerance", type=float, default=1.5,
+        help="Factor de empeoramiento admitido frente a la línea base.",
+    )
+    p.add_argument(
+        "--update-baseline", action="store_true", help="Guarda los resultados como línea base.",
+    )
+    return parser.parse_args(argv)
+
+
+def _run_parsers(args: argparse.Namespace) -> int:
+    calibracion = parsers.calibrar()
+    results = parsers.run(
+        providers=args.providers,
+        sizes=tuple(args.sizes) if args.sizes else SIZES,
+        samples_per_size=args.samples,
+        repeats=args.repeats,
+        seed=args.seed,
+    )
+    print(parsers.format_table(results))
+
+    if args.update_baseline:
+        parsers.save_baseline(results, calibracion)
+        print(f"\nLínea base guardada en {parsers.BASELINE_PATH}")
+        return 0
+
+    baseline, calibracion_base = parsers.load_baseline()
+    if not baseline:
+        print("\nSin línea base; ejecuta con --update-baseline para crearla.")
+        return 0
+    sin_base = [r.key for r in results if r.key not in baseline]
+    if sin_base:
+        print(f"\n{len(sin_base)} casos sin línea base (¿desactualizada?): {', '.join(sin_base)}")
+    escala = calibracion / calibracion_base if calibracion_base else 1.0
+    print(f"\nCalibración: {calibracion:.2f} ms (x{escala:.2f} respecto a la línea base).")
+    regresiones = parsers.compare(results, baseline, args.tolerance, escala)
+    if regresiones:
+        print("\nRegresiones:")
+        for regresion in regresiones:
+            print(f"  ✗ {regresion}")
+        return 1
+    print("\nSin regresiones frente a la línea base.")
+    return 0
+
+
+def _run_load(args: argparse.Namespace) -> int:
+    config = load.LoadConfig(
+        messages=args.messages,
+        rate=args.rate,
+        commands=tuple(args.commands) if args.commands else load.DEFAULT_COMMANDS,
+        detect_ratio=args.detect_ratio,
+        dup_ratio=args.dup_ratio,
+        size=args.size,
+        db=args.db,
+        db_latency_ms=args.db_latency_ms,
+        webhook_latency_ms=args.webhook_latency_ms,
+        webhook_jitter_ms=args.webhook_jitter_ms,
+        webhook_error_ratio=args.webhook_error_ratio,
+        trace_memory=args.trace_memory,
+        seed=args.seed,
+    )
+    try:
+        results = load.run(args.mixes or list(load.MIXES), config)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+    print(load.format_table(results))
+
+    if args.update_baseline:
+        load.save_baseline(results, config)
+        print(f"\nLínea base guardada en {load.BASELINE_PATH}")
+        return 0
+
+    baseline = load.load_baseline()
+    if not baseline:
+        print("\nSin línea base; ejecuta con --update-baseline para crearla.")
+        return 0
+    regresiones = load.compare(results, baseline, args.tolerance)
+    if regresiones:
+        print("\nRegresiones:")
+        for regresion in regresiones:
+            print(f"  ✗ {regresion}")
+        return 1
+    print("\nSin regresiones frente a la línea base.")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    if args.suite == "parsers":
+        return _run_parsers(args)
+    if args.suite == "load":
+        return _run_load(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Corpus sintético de facturas para los benchmarks de parsers.
+
+Genera, para cada proveedor con plantilla, textos con un importe conocido
+(para medir la precisión) y textos patológicos que imitan extracciones de PDF
+grandes o adversariales (para medir el peor caso). Todo es determinista a
+partir de una semilla y no requiere red ni ficheros externos.
+"""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# Tamaños aproximados (en caracteres) a los que se rellena cada texto.
+SIZES = (1_000, 16_000, 128_000)
+
+_PALABRAS = (
+    "consumo periodo potencia contratada término energía peaje cargos alquiler "
+    "equipos impuesto eléctrico cliente contrato dirección suministro lectura "
+    "real estimada tarifa descuento bono social cups referencia vencimiento "
+    "domiciliación cuenta titular nif fecha emisión servicio línea móvil fibra"
+).split()
+
+
+@dataclass(frozen=True)
+class Sample:
+    """Texto de prueba con su importe esperado (``None`` si no debe extraerse)."""
+
+    provider: str
+    case: str
+    size: int
+    text: str
+    expected: Optional[float]
+
+
+# ---------------------------------------------------------------------------
+# Utilidades
+# ---------------------------------------------------------------------------
+
+def _importe_es(importe: float, miles: bool = True) -> str:
+    """Formatea *importe* como en las facturas españolas (``1.170,14``)."""
+    texto = f"{importe:,.2f}" if miles else f"{importe:.2f}"
+    return texto.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _importe(rng: random.Random) -> float:
+    """Importe realista, con algunos por encima de 1.000 €."""
+    if rng.random() < 0.2:
+        return round(rng.uniform(1_000, 9_999), 2)
+    return round(rng.uniform(5, 999), 2)
+
+
+def _ruido(rng: random.Random, size: int) -> str:
+    """Líneas de texto de relleno con importes secundarios (IVA, subtotales…)."""
+    lineas, total = [], 0
+    while total < size:
+        if rng.random() < 0.15:
+            linea = f"{rng.choice(_PALABRAS).capitalize()} {_importe_es(rng.uniform(0, 99))} €"
+        else:
+            linea = " ".join(rng.choice(_PALABRAS) for _ in range(rng.randint(4, 12)))
+        lineas.append(linea)
+        total += len(linea) + 1
+    return "\n".join(lineas)
+
+
+def _relleno(rng: random.Random, size: int, cabecera: str, pie: str) -> str:
+    """Coloca *cabecera* y *pie* alrededor de ruido hasta alcanzar *size*."""
+    resto = max(0, size - len(cabecera) - len(pie))
+    return f"{cabecera}\n{_ruido(rng, resto)}\n{pie}"
+
+
+# ---------------------------------------------------------------------------
+# Plantillas por proveedor
+# ---------------------------------------------------------------------------
+
+Template = Callable[[random.Random, float, int], str]
+
+
+def _iberdrola(rng: random.Random, importe: float, size: int) -> str:
+    return _relleno(
+        rng, size,
+        "IBERDROLA CLIENTES, S.A.U.\nFactura de electricidad",
+        f"TOTAL IMPORTE FACTURA {_importe_es(importe)} €\nGracias por confiar en Iberdrola",
+    )
+
+
+def _totalenergies(rng: random.Random, importe: float, size: int) -> str:
+    fecha = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(2020, 2026)}"
+    return _relleno(
+        rng, size,
+        "TotalEnergies Clientes SAU\nFactura de gas y electricidad",
+        f"Importe\n{fecha}\nTotal a pagar\n{_importe_es(importe)} €",
+    )
+
+
+def _o2(rng: random.Random, importe: float, size: int) -> str:
+    return _relleno(
+        rng, size,
+        "O2 Fibra y Móvil\nwww.o2online.es",
+        f"Total factura {_importe_es(importe)} €",
+    )
+
+
+TEMPLATES: dict[str, Template] = {
+    "iberdrola": _iberdrola,
+    "totalenergies": _totalenergies,
+    "o2": _o2,
+}
+
+
+# ---------------------------------------------------------------------------
+# Casos patológicos (comunes a todos los proveedores)
+# ---------------------------------------------------------------------------
+
+def _sin_total(rng: random.Random, size: int) -> str:
+    """Solo ruido: el parser debe recorrer todo el texto y no encontrar nada."""
+    return _ruido(rng, size)
+
+
+def _digitos_sin_euro(rng: random.Random, size: int) -> str:
+    """Rachas largas de dígitos y comas sin ``€`` (tablas de lecturas, CUPS…)."""
+    bloque = "".join(rng.choice("0123456789,") for _ in range(256))
+    return (bloque + "\n") * (size // 257 + 1)
+
+
+def _importe_fechas(rng: random.Random, size: int) -> str:
+    """Muchos ``Importe`` seguidos de series numéricas con puntos y sin cierre."""
+    serie = ".".join(str(rng.randint(0, 9)) for _ in range(200))
+    return (f"Importe\n{serie}\n") * (size // (len(serie) + 9) + 1)
+
+
+def _euros_sueltos(rng: random.Random, size: int) -> str:
+    """Miles de importes con ``€`` (desglose de consumos horarios)."""
+    return " ".join(f"{_importe_es(rng.uniform(0, 1), miles=False)} €" for _ in range(size // 8))
+
+
+PATHOLOGICAL: dict[str, Callable[[random.Random, int], str]] = {
+    "sin_total": _sin_total,
+    "digitos_sin_euro": _digitos_sin_euro,
+    "importe_fechas": _importe_fechas,
+    "euros_sueltos": _euros_sueltos,
+}
+
+
+def generate(
+    providers: list[str],
+    sizes: tuple[int, ...] = SIZES,
+    samples_per_size: int = 20,
+    seed: int = 1234,
+) -> list[Sample]:
+    """Genera el corpus completo para *providers*.
+
+    Los textos realistas llevan un importe conocido; los patológicos se
+    generan una vez por tamaño y se pasan a todos los proveedores (importe
+    esperado ``None``: solo se mide su coste).
+    """
+    rng = random.Random(seed)
+    corpus: list[Sample] = []
+    for size in sizes:
+        patologicos = {case: fn(rng, size) for case, fn in PATHOLOGICAL.items()}
+        for provider in providers:
+            template = TEMPLATES.get(provider)
+            if template is not None:
+                for _ in range(samples_per_size):
+                    importe = _importe(rng)
+                    texto = template(rng, importe, size)
+                    corpus.append(Sample(provider, "realista", size, texto, importe))
+            for case, texto in patologicos.items():
+                corpus.append(Sample(provider, case, size, texto, None))
+    return corpus
@@ -0,0 +1,358 @@
+"""
+Benchmark de carga de extremo a extremo (``python -m benchmarks load``).
+
+Reproduce tráfico sintético contra los callbacks reales de consumo
+(``_on_factura`` y ``_tarea_comando`` de ``moltbot.messaging.rabbit``) sin el
+stack de docker-compose: el broker es un canal falso, la base de datos una
+capa en memoria con latencia configurable (o el PostgreSQL de ``POSTGRES_*``
+con ``--db postgres``) y Discord un servidor HTTP local que puede añadir
+latencia y errores (ver :mod:`benchmarks.standins`).
+
+Cada escenario (mezcla de tráfico) informa de:
+
+* **throughput** (mensajes/s) y latencia p50 / p99 / máxima por tipo de
+  mensaje. Con ``--rate`` la carga es de lazo abierto y la latencia incluye
+  la espera en cola desde la llegada prevista de cada mensaje;
+* **memoria**: RSS al terminar y pico del proceso, y pico del heap de
+  Python con ``--trace-memory`` (más lento);
+* lo que han recibido los sustitutos (inserts, notificaciones, respuestas).
+
+Los resultados se comparan con ``benchmarks/baselines/load.json`` igual que
+el benchmark de parsers. Dependen de la máquina: genera la línea base
+(``--update-baseline``) donde se vaya a comparar, p. ej. antes y después de
+un cambio.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import logging
+import os
+import random
+import resource
+import time
+import tracemalloc
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.corpus import Sample, generate
+from benchmarks.standins import FakeChannel, FakeProperties, RecordingDB, WebhookSink, install
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "load.json"
+
+# Mezclas predefinidas: fracción de mensajes de cada cola.
+MIXES: dict[str, dict[str, float]] = {
+    "facturas": {"factura": 1.0},
+    "comandos": {"comando": 1.0},
+    "mixto": {"factura": 0.9, "comando": 0.1},
+}
+
+DEFAULT_COMMANDS = ("!gastos", "!gastos_proveedores", "!gastos_mes_anterior", "status_cache")
+
+# Por debajo de este margen absoluto las diferencias de latencia son ruido.
+_MIN_DELTA_MS = 1.0
+
+
+@dataclass(frozen=True)
+class LoadConfig:
+    """Parámetros de una ejecución."""
+
+    messages: int = 5000
+    # Mensajes por segundo (0 = tan rápido como se pueda, lazo cerrado).
+    rate: float = 0.0
+    commands: tuple[str, ...] = DEFAULT_COMMANDS
+    # Facturas sin cabecera ``proveedor`` (pasan por la detección) y repetidas.
+    detect_ratio: float = 0.2
+    dup_ratio: float = 0.05
+    size: int = 4_000
+    db: str = "recording"
+    db_latency_ms: float = 1.0
+    webhook_latency_ms: float = 50.0
+    webhook_jitter_ms: float = 20.0
+    webhook_error_ratio: float = 0.0
+    trace_memory: bool = False
+    seed: int = 1234
+
+
+@dataclass(frozen=True)
+class LoadResult:
+    """Resultado de un escenario."""
+
+    mix: str
+    messages: int
+    seconds: float
+    throughput: float
+    factura_p50_ms: Optional[float]
+    factura_p99_ms: Optional[float]
+    factura_max_ms: Optional[float]
+    comando_p50_ms: Optional[float]
+    comando_p99_ms: Optional[float]
+    comando_max_ms: Optional[float]
+    rss_mb: float
+    rss_peak_mb: float
+    heap_peak_mb: Optional[float]
+    db_inserts: int
+    notifications: int
+    replies: int
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Mezcla por nombre (``MIXES``) o como ``factura=0.8,comando=0.2``."""
+    if spec in MIXES:
+        return MIXES[spec]
+    mezcla: dict[str, float] = {}
+    for parte in spec.split(","):
+        tipo, _, peso = parte.partition("=")
+        tipo = tipo.strip().rstrip("s")
+        if tipo not in ("factura", "comando") or not peso:
+            raise ValueError(f"Mezcla inválida: {spec!r} (usa {', '.join(MIXES)} o factura=P,…)")
+        mezcla[tipo] = float(peso)
+    total = sum(mezcla.values())
+    if total <= 0:
+        raise ValueError(f"Mezcla inválida: {spec!r}")
+    return {tipo: peso / total for tipo, peso in mezcla.items()}
+
+
+# ---------------------------------------------------------------------------
+# Tráfico
+# ---------------------------------------------------------------------------
+
+Mensaje = tuple[str, FakeProperties, bytes]
+
+
+def build_traffic(mix: dict[str, float], config: LoadConfig) -> list[Mensaje]:
+    """Genera los mensajes del escenario (antes de medir, de forma determinista)."""
+    rng = random.Random(config.seed)
+    muestras: list[Sample] = [
+        s for s in generate(
+            ["iberdrola", "o2", "totalenergies"], (config.size,),
+            samples_per_size=50, seed=config.seed,
+        )
+        if s.expected is not None
+    ]
+    tipos, pesos = zip(*mix.items())
+    mensajes: list[Mensaje] = []
+    facturas: list[Mensaje] = []
+    for _ in range(config.messages):
+        tipo = rng.choices(tipos, pesos)[0]
+        if tipo == "comando":
+            props = FakeProperties(
+                correlation_id=uuid.UUID(int=rng.getrandbits(128)).hex, reply_to="respuestas_bot",
+            )
+            mensajes.append(("comando", props, rng.choice(config.commands).encode()))
+            continue
+        if facturas and rng.random() < config.dup_ratio:
+            mensajes.append(rng.choice(facturas))
+            continue
+        sample = rng.choice(muestras)
+        # Referencia única al principio (el hash usa el texto truncado): solo
+        # se repiten las facturas elegidas por ``dup_ratio``.
+        texto = f"ref {rng.getrandbits(64):x}\n{sample.text}"
+        headers = None if rng.random() < config.detect_ratio else {"proveedor": sample.provider}
+        mensaje = ("factura", FakeProperties(headers=headers), json.dumps({"text": texto}).encode())
+        facturas.append(mensaje)
+        mensajes.append(mensaje)
+    return mensajes
+
+
+# ---------------------------------------------------------------------------
+# Ejecución
+# ---------------------------------------------------------------------------
+
+def _percentil(valores: list[float], q: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(q * len(ordenados)) - 1))
+    return round(ordenados[indice] * 1000, 3)
+
+
+def _rss_mb() -> float:
+    """RSS actual (Linux, ``/proc``), o el pico si no está disponible."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return _rss_peak_mb()
+
+
+def _rss_peak_mb() -> float:
+    # ``ru_maxrss`` está en KiB en Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_scenario(name: str, mix: dict[str, float], config: LoadConfig) -> LoadResult:
+    """Ejecuta un escenario con sustitutos nuevos y devuelve sus métricas."""
+    from moltbot.config import settings
+    from moltbot.messaging import rabbit
+    from moltbot.utils.notifier import DiscordNotifier
+
+    trafico = build_traffic(mix, config)
+
+    sink = WebhookSink(
+        config.webhook_latency_ms / 1000, config.webhook_jitter_ms / 1000,
+        config.webhook_error_ratio, seed=config.seed,
+    )
+    url = sink.start()
+    notifier = DiscordNotifier(
+        url,
+        queue_size=settings.discord.notifier_queue_size,
+        coalesce_window=settings.discord.coalesce_window_ms / 1000,
+        timeout=settings.discord.request_timeout,
+        max_retries=settings.discord.max_retries,
+    )
+    notifier.start()
+    db = RecordingDB(config.db_latency_ms / 1000) if config.db == "recording" else None
+    channel = FakeChannel()
+    latencias: dict[str, list[float]] = {"factura": [], "comando": []}
+
+    def _on_comando(ch, method, properties, body) -> None:
+        # Lo que hace ``ConcurrentConsumer`` con cada comando, en este hilo.
+        def confirmar(ok: bool) -> None:
+            if ok:
+                ch.basic_ack(method.delivery_tag)
+            else:
+                ch.basic_nack(method.delivery_tag, requeue=True)
+
+        if not rabbit._tarea_comando(properties, body)(ch, confirmar):
+            ch.basic_ack(method.delivery_tag)
+
+    callbacks = {"factura": rabbit._on_factura, "comando": _on_comando}
+    colas = {
+        "factura": settings.rabbitmq.queue_facturas,
+        "comando": settings.rabbitmq.queue_comandos,
+    }
+
+    gc.collect()
+    if config.trace_memory:
+        tracemalloc.start()
+    intervalo = 1 / config.rate if config.rate > 0 else 0.0
+    try:
+        with install(channel, db, notifier):
+            inicio = time.perf_counter()
+            for i, (tipo, props, body) in enumerate(trafico):
+                llegada = inicio + i * intervalo if intervalo else time.perf_counter()
+                espera = llegada - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                # Las facturas van con auto_ack (``_on_factura``); los comandos, con ack manual.
+                entrega = channel.deliver(colas[tipo], auto_ack=tipo == "factura")
+                callbacks[tipo](channel, entrega, props, body)
+                latencias[tipo].append(time.perf_counter() - llegada)
+            segundos = time.perf_counter() - inicio
+        heap_pico = tracemalloc.get_traced_memory()[1] / 2**20 if config.trace_memory else None
+    finally:
+        if config.trace_memory:
+            tracemalloc.stop()
+        notifier.stop()
+        sink.stop()
+
+    return LoadResult(
+        mix=name,
+        messages=len(trafico),
+        seconds=round(segundos, 3),
+        throughput=round(len(trafico) / segundos, 1) if segundos else 0.0,
+        factura_p50_ms=_percentil(latencias["factura"], 0.50),
+        factura_p99_ms=_percentil(latencias["factura"], 0.99),
+        factura_max_ms=_percentil(latencias["factura"], 1.0),
+        comando_p50_ms=_percentil(latencias["comando"], 0.50),
+        comando_p99_ms=_percentil(latencias["comando"], 0.99),
+        comando_max_ms=_percentil(latencias["comando"], 1.0),
+        rss_mb=round(_rss_mb(), 1),
+        rss_peak_mb=round(_rss_peak_mb(), 1),
+        heap_peak_mb=round(heap_pico, 2) if heap_pico is not None else None,
+        db_inserts=db.insertadas if db is not None else -1,
+        notifications=sink.stats.embeds,
+        replies=len(channel.publicadas),
+    )
+
+
+def run(mixes: list[str], config: LoadConfig) -> list[LoadResult]:
+    """Ejecuta cada mezcla de *mixes* con la misma configuración."""
+    # Los logs por mensaje medirían la E/S de la consola, no el bot.
+    logging.getLogger("moltbot").setLevel(logging.ERROR)
+    if config.db == "postgres":
+        from moltbot.db import setup_db
+
+        if not setup_db():
+            raise RuntimeError("No se pudo preparar el esquema 'moltbot' (ver el log).")
+    return [run_scenario(nombre, parse_mix(nombre), config) for nombre in mixes]
+
+
+# ---------------------------------------------------------------------------
+# Línea base e informe
+# ---------------------------------------------------------------------------
+
+def compare(
+    results: list[LoadResult], baseline: dict[str, dict], tolerance: float = 1.5,
+) -> list[str]:
+    """Describe cada regresión respecto a *baseline*.
+
+    Es regresión un throughput más de *tolerance* veces menor o una p99 más
+    de *tolerance* veces mayor (y al menos ``_MIN_DELTA_MS`` ms peor).
+    """
+    regresiones = []
+    for result in results:
+        base = baseline.get(result.mix)
+        if base is None:
+            continue
+        if result.throughput * tolerance < base["throughput"]:
+            regresiones.append(
+                f"{result.mix}: throughput {result.throughput:.0f} msg/s "
+                f"(base {base['throughput']:.0f} msg/s)"
+            )
+        for campo in ("factura_p99_ms", "comando_p99_ms"):
+            actual, previo = getattr(result, campo), base.get(campo)
+            if actual is None or previo is None:
+                continue
+            if actual > previo * tolerance and actual - previo > _MIN_DELTA_MS:
+                regresiones.append(
+                    f"{result.mix}: {campo} {actual:.2f} ms (base {previo:.2f} ms)"
+                )
+    return regresiones
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict[str, dict]:
+    """Lee la línea base (vacía si no existe)."""
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))["results"]
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(
+    results: list[LoadResult], config: LoadConfig, path: Path = BASELINE_PATH,
+) -> None:
+    """Guarda *results* (y la configuración con que se obtuvieron) como línea base."""
+    data = {
+        "version": 1,
+        "config": asdict(config),
+        "results": {r.mix: {k: v for k, v in asdict(r).items() if k != "mix"} for r in results},
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def format_table(results: list[LoadResult]) -> str:
+    """Tabla de texto con los resultados."""
+
+    def ms(valor: Optional[float]) -> str:
+        return f"{valor:.2f}" if valor is not None else "-"
+
+    cabecera = (
+        f"{'mezcla':<18} {'msg':>6} {'msg/s':>9} {'fact p50':>9} {'fact p99':>9} "
+        f"{'cmd p50':>9} {'cmd p99':>9} {'RSS MB':>8} {'pico MB':>8} {'heap MB':>8} "
+        f"{'inserts':>8} {'notif':>6} {'resp':>6}"
+    )
+    filas = [cabecera, "-" * len(cabecera)]
+    for r in results:
+        filas.append(
+            f"{r.mix:<18} {r.messages:>6} {r.throughput:>9.1f} {ms(r.factura_p50_ms):>9} "
+            f"{ms(r.factura_p99_ms):>9} {ms(r.comando_p50_ms):>9} {ms(r.comando_p99_ms):>9} "
+            f"{r.rss_mb:>8.1f} {r.rss_peak_mb:>8.1f} {ms(r.heap_peak_mb):>8} "
+            f"{r.db_inserts:>8} {r.notifications:>6} {r.replies:>6}"
+        )
+    return "\n".join(filas)
@@ -0,0 +1,230 @@
+"""
+Benchmark de los parsers de facturas (``BillParser``).
+
+Para cada proveedor registrado, caso del corpus (realista o patológico) y
+tamaño de texto mide:
+
+* **throughput** (MB/s de texto procesado) y latencia p50 / peor caso de
+  ``extraer_importe``;
+* **precisión** en los textos realistas (importe extraído == importe conocido).
+
+Compara los resultados con una línea base guardada en
+``benchmarks/baselines/parsers.json`` y marca las regresiones. Las latencias
+dependen de la máquina, así que la línea base guarda también lo que tarda
+una carga de referencia fija (:func:`calibrar`, regex y conversión de
+importes sin pasar por los parsers) y, al comparar, sus latencias se escalan
+por la relación entre esa calibración y la de la máquina actual.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import re
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.corpus import SIZES, Sample, generate
+from moltbot.processors.bill_parser import _PARSER_REGISTRY, get_parser
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "parsers.json"
+
+# Por debajo de estos márgenes absolutos las diferencias de latencia son ruido.
+_MIN_DELTA_MS = 1.0
+_MIN_DELTA_P50_MS = 0.1
+
+# Carga de referencia de :func:`calibrar`: no depende del código medido.
+_CALIBRACION_TEXTO = "".join(
+    f"Concepto {i}\nImporte {i % 997},{i % 100:02d} €\nTotal a pagar {i}.{i % 1000:03d},50 €\n"
+    for i in range(2000)
+)
+_CALIBRACION_RE = re.compile(r"(\d{1,3}(?:\.\d{3})*,\d{2})\s*€")
+
+
+@dataclass(frozen=True)
+class CaseResult:
+    """Resultado de un (proveedor, caso, tamaño)."""
+
+    provider: str
+    case: str
+    size: int
+    calls: int
+    throughput_mb_s: float
+    p50_ms: float
+    max_ms: float
+    accuracy: Optional[float]
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}/{self.case}/{self.size}"
+
+
+def _run_group(provider: str, samples: list[Sample], repeats: int) -> CaseResult:
+    """Mide un grupo de textos.
+
+    La latencia de cada texto es la mejor de *repeats* ejecuciones (como
+    ``timeit``), para que el peor caso refleje el texto más costoso y no
+    ruido del sistema; el GC se desactiva durante la medición.
+    """
+    parser = get_parser(provider)
+    latencias: list[float] = []
+    chars = aciertos = esperados = 0
+    gc.disable()
+    try:
+        for sample in samples:
+            mejor = float("inf")
+            for _ in range(max(1, repeats)):
+                inicio = time.perf_counter()
+                importe = parser.extraer_importe(sample.text)
+                mejor = min(mejor, time.perf_counter() - inicio)
+            latencias.append(mejor)
+            chars += len(sample.text)
+            if sample.expected is not None:
+                esperados += 1
+                aciertos += importe is not None and abs(importe - sample.expected) < 0.005
+    finally:
+        gc.enable()
+
+    total = sum(latencias) or 1e-9
+    first = samples[0]
+    return CaseResult(
+        provider=provider,
+        case=first.case,
+        size=first.size,
+        calls=len(latencias) * max(1, repeats),
+        throughput_mb_s=round(chars / total / 1e6, 3),
+        p50_ms=round(statistics.median(latencias) * 1000, 4),
+        max_ms=round(max(latencias) * 1000, 4),
+        accuracy=round(aciertos / esperados, 4) if esperados else None,
+    )
+
+
+def calibrar(repeats: int = 7) -> float:
+    """Milisegundos (el mejor de *repeats*) de la carga de referencia en esta máquina."""
+    mejor = float("inf")
+    gc.disable()
+    try:
+        for _ in range(max(1, repeats)):
+            inicio = time.perf_counter()
+            for importe in _CALIBRACION_RE.findall(_CALIBRACION_TEXTO):
+                float(importe.replace(".", "").replace(",", "."))
+            mejor = min(mejor, time.perf_counter() - inicio)
+    finally:
+        gc.enable()
+    return round(mejor * 1000, 4)
+
+
+def run(
+    providers: Optional[list[str]] = None,
+    sizes: tuple[int, ...] = SIZES,
+    samples_per_size: int = 20,
+    repeats: int = 3,
+    seed: int = 1234,
+) -> list[CaseResult]:
+    """Ejecuta el benchmark sobre el corpus sintético."""
+    providers = providers or sorted(_PARSER_REGISTRY)
+    grupos: dict[tuple[str, str, int], list[Sample]] = defaultdict(list)
+    for sample in generate(providers, sizes, samples_per_size, seed):
+        grupos[(sample.provider, sample.case, sample.size)].append(sample)
+    return [
+        _run_group(provider, samples, repeats)
+        for (provider, _case, _size), samples in sorted(grupos.items())
+    ]
+
+
+def compare(
+    results: list[CaseResult],
+    baseline: dict[str, dict],
+    tolerance: float = 2.0,
+    escala: float = 1.0,
+) -> list[str]:
+    """Devuelve una descripción de cada regresión respecto a *baseline*.
+
+    Es regresión una precisión menor, un peor caso más de *tolerance* veces
+    más lento (y al menos ``_MIN_DELTA_MS`` ms) o un throughput más de
+    *tolerance* veces menor (con una p50 al menos ``_MIN_DELTA_P50_MS`` ms
+    peor, para no marcar ruido en los textos pequeños).
+
+    *escala* es cuántas veces más lenta es esta máquina que la de la línea
+    base (ver :func:`calibrar`); las latencias de la base se multiplican por
+    ella y el throughput se divide.
+    """
+    regresiones = []
+    for result in results:
+        base = baseline.get(result.key)
+        if base is None:
+            continue
+        base = {
+            **base,
+            "max_ms": base["max_ms"] * escala,
+            "p50_ms": base["p50_ms"] * escala,
+            "throughput_mb_s": base["throughput_mb_s"] / escala,
+        }
+        if result.accuracy is not None and result.accuracy < (base.get("accuracy") or 0):
+            regresiones.append(
+                f"{result.key}: precisión {result.accuracy:.2%} (base {base['accuracy']:.2%})"
+            )
+        if (
+            result.max_ms > base["max_ms"] * tolerance
+            and result.max_ms - base["max_ms"] > _MIN_DELTA_MS
+        ):
+            regresiones.append(
+                f"{result.key}: peor caso {result.max_ms:.2f} ms (base {base['max_ms']:.2f} ms)"
+            )
+        if (
+            result.throughput_mb_s * tolerance < base["throughput_mb_s"]
+            and result.p50_ms - base["p50_ms"] > _MIN_DELTA_P50_MS
+        ):
+            regresiones.append(
+                f"{result.key}: throughput {result.throughput_mb_s:.2f} MB/s "
+                f"(base {base['throughput_mb_s']:.2f} MB/s)"
+            )
+    return regresiones
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> tuple[dict[str, dict], Optional[float]]:
+    """Lee la línea base y su calibración (vacía y ``None`` si no existe).
+
+    Las líneas base de la versión 1 no tienen calibración: se comparan tal cual.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}, None
+    return data["results"], data.get("calibracion_ms")
+
+
+def save_baseline(
+    results: list[CaseResult], calibracion_ms: float, path: Path = BASELINE_PATH,
+) -> None:
+    """Guarda *results* como nueva línea base, con la calibración de la máquina."""
+    data = {
+        "version": 2,
+        "calibracion_ms": calibracion_ms,
+        "results": {
+            r.key: {k: v for k, v in asdict(r).items() if k not in ("provider", "case", "size")}
+            for r in results
+        },
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def format_table(results: list[CaseResult]) -> str:
+    """Tabla de texto con los resultados."""
+    cabecera = (
+        f"{'proveedor':<14} {'caso':<17} {'tamaño':>7} {'MB/s':>9} "
+        f"{'p50 ms':>9} {'peor ms':>9} {'precisión':>9}"
+    )
+    filas = [cabecera, "-" * len(cabecera)]
+    for r in results:
+        precision = f"{r.accuracy:.1%}" if r.accuracy is not None else "-"
+        filas.append(
+            f"{r.provider:<14} {r.case:<17} {r.size:>7} {r.throughput_mb_s:>9.2f} "
+            f"{r.p50_ms:>9.3f} {r.max_ms:>9.3f} {precision:>9}"
+        )
+    return "\n".join(filas)
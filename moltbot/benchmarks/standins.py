@@ -0,0 +1,328 @@
+"""
+Sustitutos locales de RabbitMQ, PostgreSQL y Discord para el benchmark de carga.
+
+* :class:`FakeChannel`: canal de pika que solo registra lo publicado, los
+  acks y los rechazos, y comprueba los ``delivery_tag`` como el broker.
+* :class:`RecordingDB`: capa de datos en memoria con la misma deduplicación
+  por hash y los mismos rollups mensuales que PostgreSQL, y una latencia
+  configurable por llamada.
+* :class:`WebhookSink`: servidor HTTP local que hace de webhook de Discord,
+  con latencia, jitter y ratio de errores configurables.
+
+:func:`install` sustituye las dependencias externas de
+``moltbot.messaging.rabbit`` y de los comandos de gastos, y las restaura al
+salir.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+from pika.exceptions import ChannelClosedByBroker
+
+# ---------------------------------------------------------------------------
+# RabbitMQ
+# ---------------------------------------------------------------------------
+
+@dataclass
+class FakeProperties:
+    """Lo que los callbacks leen de ``pika.BasicProperties``."""
+
+    headers: Optional[dict[str, Any]] = None
+    correlation_id: Optional[str] = None
+    reply_to: Optional[str] = None
+
+
+class FakeChannel:
+    """Canal que registra las publicaciones y los acks en lugar de enviarlos.
+
+    Lleva la cuenta de las entregas sin confirmar como el broker: ``multiple``
+    abarca todos los tags pendientes hasta el indicado (en cualquier cola del
+    canal) y confirmar un tag desconocido o ya confirmado cierra el canal con
+    ``PRECONDITION_FAILED`` (:class:`ChannelClosedByBroker`).
+
+    ``connection.call_later`` no programa nada: quien use temporizadores (el
+    linger de ``FacturaBatcher``) tiene que vaciar a mano.
+    """
+
+    def __init__(self) -> None:
+        self.publicadas: list[tuple[str, bytes | str]] = []
+        self.acks = 0
+        self.nacks = 0
+        self.rechazos = 0
+        # Tags devueltos a la cola (nack o reject con requeue), en orden.
+        self.reencoladas: list[int] = []
+        self.is_open = True
+        self.connection = SimpleNamespace(
+            call_later=lambda delay, callback: object(),
+            remove_timeout=lambda timer: None,
+        )
+        self._tag = 0
+        self._sin_confirmar: set[int] = set()
+
+    @property
+    def sin_confirmar(self) -> list[int]:
+        """Tags entregados que aún no se han confirmado ni rechazado."""
+        return sorted(self._sin_confirmar)
+
+    def deliver(self, queue: str, auto_ack: bool = False) -> SimpleNamespace:
+        """``Basic.Deliver`` con un ``delivery_tag`` nuevo."""
+        self._tag += 1
+        if not auto_ack:
+            self._sin_confirmar.add(self._tag)
+        return SimpleNamespace(delivery_tag=self._tag, routing_key=queue, redelivered=False)
+
+    def basic_publish(
+        self, exchange: str, routing_key: str, body: bytes | str, properties: Any = None,
+    ) -> None:
+        self._abierto()
+        self.publicadas.append((routing_key, body))
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        self._liquidar(delivery_tag, multiple)
+        self.acks += 1
+
+    def basic_nack(
+        self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True,
+    ) -> None:
+        tags = self._liquidar(delivery_tag, multiple)
+        if requeue:
+            self.reencoladas.extend(tags)
+        self.nacks += 1
+
+    def basic_reject(self, delivery_tag: int = 0, requeue: bool = True) -> None:
+        tags = self._liquidar(delivery_tag, False)
+        if requeue:
+            self.reencoladas.extend(tags)
+        self.rechazos += 1
+
+    def _abierto(self) -> None:
+        if not self.is_open:
+            raise ChannelClosedByBroker(406, "PRECONDITION_FAILED - canal cerrado")
+
+    def _liquidar(self, delivery_tag: int, multiple: bool) -> list[int]:
+        """Quita de pendientes los tags que cubre la confirmación (como el broker)."""
+        self._abierto()
+        if multiple and delivery_tag == 0:
+            tags = sorted(self._sin_confirmar)
+        elif delivery_tag not in self._sin_confirmar:
+            self.is_open = False
+            raise ChannelClosedByBroker(
+                406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}",
+            )
+        elif multiple:
+            tags = sorted(t for t in self._sin_confirmar if t <= delivery_tag)
+        else:
+            tags = [delivery_tag]
+        self._sin_confirmar.difference_update(tags)
+        return tags
+
+
+# ---------------------------------------------------------------------------
+# PostgreSQL
+# ---------------------------------------------------------------------------
+
+class RecordingDB:
+    """Sustituto en memoria de ``insert_facturas`` y de las consultas de gastos."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self._latency = max(0.0, latency)
+        self._lock = threading.Lock()
+        self._hashes: set[str] = set()
+        self._siguiente_id = 1
+        self._rollup: dict[tuple[date, str], list] = defaultdict(lambda: [0.0, 0])
+        self.llamadas = 0
+        self.insertadas = 0
+        self.duplicadas = 0
+
+    def insert_facturas(
+        self, facturas: Sequence[tuple[str, float, str]],
+    ) -> Optional[list[Optional[int]]]:
+        from moltbot.db.engine import TABLA_FACTURAS, fila_factura, notify_write
+
+        if self._latency:
+            time.sleep(self._latency)
+        mes = date.today().replace(day=1)
+        ids: list[Optional[int]] = []
+        with self._lock:
+            self.llamadas += 1
+            for factura in facturas:
+                proveedor, importe, _texto, hash_contenido = fila_factura(*factura)
+                if hash_contenido in self._hashes:
+                    ids.append(None)
+                    self.duplicadas += 1
+                    continue
+                self._hashes.add(hash_contenido)
+                ids.append(self._siguiente_id)
+                self._siguiente_id += 1
+                self.insertadas += 1
+                fila = self._rollup[(mes, proveedor)]
+                fila[0] += importe
+                fila[1] += 1
+        if any(i is not None for i in ids):
+            notify_write(TABLA_FACTURAS)
+        return ids
+
+    def get_total_gastos_mes(self, mes: Optional[date] = None) -> Optional[float]:
+        mes = (mes or date.today()).replace(day=1)
+        if self._latency:
+            time.sleep(self._latency)
+        with self._lock:
+            return sum(total for (m, _p), (total, _n) in self._rollup.items() if m == mes)
+
+    def get_gastos_por_proveedor(
+        self, mes: Optional[date] = None,
+    ) -> Optional[list[tuple[str, float, int]]]:
+        mes = (mes or date.today()).replace(day=1)
+        if self._latency:
+            time.sleep(self._latency)
+        with self._lock:
+            filas = [(p, total, n) for (m, p), (total, n) in self._rollup.items() if m == mes]
+        return sorted(filas, key=lambda f: (-f[1], f[0]))
+
+
+# ---------------------------------------------------------------------------
+# Discord
+# ---------------------------------------------------------------------------
+
+@dataclass
+class SinkStats:
+    """Peticiones recibidas por :class:`WebhookSink`."""
+
+    peticiones: int = 0
+    embeds: int = 0
+    errores: int = 0
+
+
+class WebhookSink:
+    """Webhook HTTP local que imita a Discord (``204`` tras una latencia)."""
+
+    def __init__(
+        self, latency: float = 0.0, jitter: float = 0.0, error_ratio: float = 0.0, seed: int = 0,
+    ) -> None:
+        self.stats = SinkStats()
+        self._latency = max(0.0, latency)
+        self._jitter = max(0.0, jitter)
+        self._error_ratio = error_ratio
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/webhook"
+
+    def start(self) -> str:
+        """Arranca el servidor en un puerto libre y devuelve su URL."""
+        sink = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            # Keep-alive, como Discord: el notificador reutiliza su sesión.
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                cuerpo = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+                status = sink._responder(cuerpo)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *_args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="webhook-sink", daemon=True,
+        ).start()
+        return self.url
+
+    def _responder(self, cuerpo: bytes) -> int:
+        with self._lock:
+            espera = self._latency + (self._rng.uniform(0, self._jitter) if self._jitter else 0)
+            error = self._rng.random() < self._error_ratio
+        time.sleep(espera)
+        with self._lock:
+            self.stats.peticiones += 1
+            if error:
+                self.stats.errores += 1
+                return 500
+            try:
+                self.stats.embeds += len(json.loads(cuerpo).get("embeds", []))
+            except ValueError:
+                pass
+        return 204
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# ---------------------------------------------------------------------------
+# Instalación
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def install(
+    channel: FakeChannel, db: Optional[RecordingDB], notifier: Any,
+) -> Iterator[None]:
+    """Conecta los callbacks de ``moltbot.messaging.rabbit`` a los sustitutos.
+
+    También empiezan vacías la caché de deduplicación y la de comandos, para
+    que cada escenario parta del mismo estado.
+
+    Args:
+        channel: Recibe también las respuestas que irían al publicador con
+            confirms.
+        db: Capa de datos en memoria, o ``None`` para usar PostgreSQL real
+            (``POSTGRES_*``).
+        notifier: ``DiscordNotifier`` apuntando a :class:`WebhookSink`.
+    """
+    from moltbot.commands import base, invoices
+    from moltbot.config import settings
+    from moltbot.messaging import dedup, rabbit
+
+    def _publicar(
+        respuesta: str,
+        routing_key: str,
+        correlation_id: Optional[str] = None,
+        on_confirm: Optional[Callable[[bool], None]] = None,
+    ) -> bool:
+        channel.basic_publish("", routing_key, respuesta)
+        if on_confirm is not None:
+            on_confirm(True)  # el broker confirma al instante
+        return True
+
+    cambios: list[tuple[Any, str, Any]] = [
+        (rabbit, "notificar_factura", notifier.notificar_factura),
+        (rabbit, "publicar_respuesta", _publicar),
+        (dedup, "_cache", dedup.DedupCache(settings.invoices.dedup_cache_size)),
+    ]
+    if db is not None:
+        cambios += [
+            (rabbit, "insert_facturas", db.insert_facturas),
+            (invoices, "get_total_gastos_mes", db.get_total_gastos_mes),
+            (invoices, "get_gastos_por_proveedor", db.get_gastos_por_proveedor),
+        ]
+    originales = [(modulo, nombre, getattr(modulo, nombre)) for modulo, nombre, _ in cambios]
+    for modulo, nombre, valor in cambios:
+        setattr(modulo, nombre, valor)
+    base._cache.clear()
+    try:
+        yield
+    finally:
+        for modulo, nombre, valor in originales:
+            setattr(modulo, nombre, valor)
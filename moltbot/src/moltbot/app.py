@@ -2,51 +2,374 @@
 Moltbot — punto de entrada principal.
 
 Escucha colas de RabbitMQ para procesar comandos de bot y facturas entrantes.
+
+Los módulos pesados (``pika``, ``psycopg2``, ``requests`` y los handlers de
+comandos) se importan dentro de cada modo de arranque, de modo que el
+supervisor y los subcomandos no pagan lo que no usan.
 """
 
 from __future__ import annotations
 
+import argparse
+import functools
 import logging
 import signal
 import sys
+from pathlib import Path
+from typing import Collection, Optional
 
-from moltbot.config import setup_logging
-from moltbot.db import setup_db
-from moltbot.messaging.rabbit import connect as connect_rabbit
-
-import moltbot.commands as _commands  # noqa: F401 — registra los handlers al importar
+from moltbot.config import settings, setup_logging
+from moltbot.supervisor import Supervisor, parse_worker_plan
+from moltbot.utils import metrics, profiling
 
 logger = logging.getLogger(__name__)
 
+_supervisor = settings.supervisor
+_metrics = settings.metrics
+
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
-def main() -> None:
-    """Inicializa servicios y arranca el consumer loop."""
-    setup_logging()
-    setup_db()
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="moltbot", description=__doc__)
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Usa el runtime asyncio (aio-pika + asyncpg + aiohttp).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=_supervisor.workers,
+        help="Número de procesos worker (por defecto MOLTBOT_WORKERS=%(default)s).",
+    )
+    parser.add_argument(
+        "--worker-queues",
+        default=_supervisor.worker_queues,
+        metavar="COLA=N[,COLA=N…]",
+        help="Reparto de workers por cola, p. ej. 'tareas_facturas=3,comandos_bot=1'.",
+    )
+
+    parser.add_argument(
+        "--check-startup",
+        action="store_true",
+        help="Mide los tiempos de importación e inicialización por fase y termina.",
+    )
+
+    subparsers = parser.add_subparsers(dest="subcommand", metavar="SUBCOMANDO")
+    snapshots = subparsers.add_parser(
+        "snapshots", help="Consulta los snapshots de backups de workflows.",
+    )
+    snapshots.add_argument("action", choices=["list", "show", "diff"])
+    snapshots.add_argument(
+        "refs", nargs="*", metavar="SNAPSHOT",
+        help="Id (o prefijo) del snapshot, 'latest' o 'latest~N'.",
+    )
+    snapshots.add_argument("--workflow", help="Id de workflow para ver su contenido o diff.")
+    snapshots.add_argument(
+        "--folder", default=settings.backup.output_folder, help="Carpeta de backups.",
+    )
+
+    backfill = subparsers.add_parser(
+        "backfill-hashes",
+        help="Calcula el hash de deduplicación de las facturas ya guardadas (una vez).",
+    )
+    backfill.add_argument("--batch-size", type=int, default=1000)
+
+    partitions = subparsers.add_parser(
+        "partitions", help="Particiones mensuales de facturas_gastos.",
+    )
+    partitions.add_argument(
+        "action", choices=["status", "maintain", "migrate"],
+        help="status: lista las particiones; maintain: crea las futuras y aplica la "
+             "retención; migrate: mueve las facturas de la tabla antigua.",
+    )
+    partitions.add_argument("--batch-size", type=int, default=1000)
+
+    importar = subparsers.add_parser(
+        "import", help="Importa facturas históricas desde un directorio o un fichero JSONL.",
+    )
+    importar.add_argument("source", type=Path, help="Directorio de textos o fichero .jsonl.")
+    importar.add_argument(
+        "--workers", type=int, default=0, help="Procesos de parseo (por defecto, uno por CPU).",
+    )
+    importar.add_argument("--batch-size", type=int, default=5000, help="Facturas por COPY.")
+    importar.add_argument("--chunksize", type=int, default=32, help="Textos por tarea del pool.")
+    importar.add_argument("--state", type=Path, help="Fichero de estado para reanudar.")
+    importar.add_argument("--report", type=Path, help="Informe JSONL de textos no procesados.")
+    importar.add_argument(
+        "--date-from", choices=["mtime", "now"], default="mtime",
+        help="Fecha de registro de los ficheros de un directorio (por defecto, su mtime).",
+    )
+    importar.add_argument(
+        "--restart", action="store_true", help="Ignora el estado guardado y empieza de cero.",
+    )
+    return parser.parse_args(argv)
+
+
+def _run_snapshots(args: argparse.Namespace) -> int:
+    """Subcomando ``moltbot snapshots list|show|diff``."""
+    from moltbot.processors.snapshot_store import SnapshotNotFound, SnapshotStore
+
+    store = SnapshotStore(Path(args.folder) / settings.backup.snapshot_dir)
+    try:
+        if args.action == "list":
+            for info in store.list_snapshots():
+                print(f"{info.id}  {info.created_at:%Y-%m-%d %H:%M:%S}")
+        elif args.action == "show":
+            snap = store.load(args.refs[0] if args.refs else "latest")
+            if args.workflow:
+                print(store.get_blob(snap.workflows[args.workflow]["sha256"]).decode("utf-8"))
+            else:
+                for wf_id, entry in sorted(snap.workflows.items(), key=lambda i: i[1]["name"]):
+                    print(f"{wf_id}  {entry['sha256'][:12]}  {entry['name']}")
+        else:
+            ref_a, ref_b = (args.refs + ["latest~1", "latest"][len(args.refs):])[:2]
+            if args.workflow:
+                print(store.diff_workflow(ref_a, ref_b, args.workflow), end="")
+                return 0
+            diff = store.diff(ref_a, ref_b)
+            for label, ids in (
+                ("+", diff.added), ("-", diff.removed), ("~", diff.changed), ("→", diff.renamed),
+            ):
+                for wf_id in ids:
+                    print(f"{label} {wf_id}")
+    except (SnapshotNotFound, KeyError) as exc:
+        print(f"No encontrado: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _run_backfill_hashes(args: argparse.Namespace) -> int:
+    """Subcomando ``moltbot backfill-hashes``."""
+    from moltbot.db import backfill_factura_hashes, close_pool
+
+    result = backfill_factura_hashes(args.batch_size)
+    close_pool()
+    if result is None:
+        return 1
+    actualizadas, duplicadas = result
+    print(f"{actualizadas} facturas con hash, {duplicadas} duplicadas sin hash.")
+    return 0
+
+
+def _run_partitions(args: argparse.Namespace) -> int:
+    """Subcomando ``moltbot partitions status|maintain|migrate``."""
+    from moltbot.db import close_pool, partitions
+
+    try:
+        if args.action == "migrate":
+            movidas = partitions.migrar_legacy(args.batch_size)
+            if movidas is None:
+                return 1
+            print(f"{movidas} facturas movidas a la tabla particionada.")
+        elif args.action == "maintain":
+            creadas = partitions.ensure_partitions()
+            resultado = partitions.aplicar_retencion(batch_size=args.batch_size)
+            if creadas is None or resultado is None:
+                return 1
+            archivados, desconectadas = resultado
+            print(
+                f"{creadas} particiones creadas, {archivados} textos archivados, "
+                f"{desconectadas} particiones desconectadas.",
+            )
+        else:
+            lista = partitions.get_partitions()
+            pendientes = partitions.legacy_pendiente()
+            if lista is None or pendientes is None:
+                return 1
+            for particion in lista:
+                print(f"{particion.nombre}  ~{max(0, particion.filas)} filas")
+            if pendientes:
+                print(f"facturas_gastos_legacy  ~{pendientes} filas pendientes de migrar")
+    finally:
+        close_pool()
+    return 0
+
+
+def _run_import(args: argparse.Namespace) -> int:
+    """Subcomando ``moltbot import``."""
+    from moltbot.db import close_pool
+    from moltbot.importer import Importer, format_report
+
+    if not args.source.exists():
+        print(f"No existe: {args.source}", file=sys.stderr)
+        return 1
+    importer = Importer(
+        args.source,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        chunksize=args.chunksize,
+        state_path=args.state,
+        report_path=args.report,
+        fecha_mtime=args.date_from == "mtime",
+    )
+    try:
+        stats = importer.run(restart=args.restart)
+    except ValueError as exc:
+        print(f"Estado inválido: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        close_pool()
+    if stats is None:
+        print(
+            f"Importación interrumpida; se reanudará desde {importer.state_path}.",
+            file=sys.stderr,
+        )
+        return 1
+    print(format_report(stats, importer.report_path))
+    return 0
+
+
+def _start_metrics(worker_index: int = 0) -> None:
+    """Abre el endpoint ``/metrics`` del proceso (``METRICS_PORT`` + índice de worker)."""
+    if _metrics.enabled:
+        metrics.start_server(_metrics.port + worker_index, _metrics.host)
+
+
+def _start_write_listener(queues: Optional[Collection[str]]) -> None:
+    """Escucha las escrituras de otros procesos si este atiende comandos (caché)."""
+    from moltbot.db import start_write_listener
 
-    connection, channel = connect_rabbit()
+    if queues is None or settings.rabbitmq.queue_comandos in queues:
+        start_write_listener()
+
+
+def _run_blocking(queues: Optional[Collection[str]] = None) -> None:
+    """Arranca el consumer loop bloqueante de pika."""
+    from moltbot.commands import stop_jobs
+    from moltbot.db import close_pool, stop_maintenance, stop_write_listener
+    from moltbot.messaging.publisher import stop_publisher
+    from moltbot.messaging.rabbit import connect as connect_rabbit
+    from moltbot.utils.notifier import stop_notifier
+
+    _start_write_listener(queues)
+    connection, channel, consumers = connect_rabbit(queues)
 
     # Graceful shutdown con SIGINT / SIGTERM
-    def _shutdown(signum: int, _frame) -> None:  # noqa: ANN001
+    def _shutdown(signum: int, _frame) -> None:
         sig_name = signal.Signals(signum).name
         logger.info("Señal %s recibida — cerrando conexión…", sig_name)
         try:
             channel.stop_consuming()
+            # Los mensajes ya en un worker terminan; los que esperaban turno se
+            # cancelan y, sin ack, el broker los reentrega.
+            for consumer in consumers:
+                consumer.shutdown(wait=True)
+            # Los acks de los workers se encolan en la conexión: se envían antes de cerrar.
+            connection.process_data_events(time_limit=0)
             connection.close()
         except Exception:
             pass
+        # Los jobs publican su resultado a través del publicador: antes que él.
+        stop_jobs()
+        stop_publisher()
+        stop_notifier()
+        stop_maintenance()
+        stop_write_listener()
+        close_pool()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, _shutdown)
     signal.signal(signal.SIGTERM, _shutdown)
+    # ``kill -USR1 <pid>`` inicia/detiene el perfilado (ver moltbot.utils.profiling).
+    signal.signal(signal.SIGUSR1, profiling.toggle)
 
     logger.info("Moltbot listo. Escuchando comandos y facturas…")
     channel.start_consuming()
 
 
+def _run_async(queues: Optional[Collection[str]] = None) -> None:
+    """Arranca el runtime asyncio (requiere ``moltbot[async]``)."""
+    import asyncio
+
+    from moltbot.commands import stop_jobs
+    from moltbot.db import close_pool, stop_maintenance, stop_write_listener
+    from moltbot.messaging.publisher import stop_publisher
+
+    try:
+        from moltbot.messaging import aio
+    except ImportError as exc:
+        logger.error("El modo --async requiere 'pip install moltbot[async]': %s", exc)
+        sys.exit(1)
+
+    _start_write_listener(queues)
+    try:
+        asyncio.run(aio.run(queues))
+    finally:
+        # Los jobs publican con el publicador de pika también en este modo.
+        stop_jobs()
+        stop_publisher()
+        stop_maintenance()
+        stop_write_listener()
+        close_pool()
+
+
+def _worker_main(
+    queues: Optional[tuple[str, ...]], index: int = 0, use_async: bool = False,
+) -> None:
+    """Punto de entrada de cada proceso worker lanzado por el supervisor."""
+    setup_logging()
+    _start_metrics(index)
+    if use_async:
+        _run_async(queues)
+    else:
+        _run_blocking(queues)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Inicializa servicios y arranca el consumer loop."""
+    args = _parse_args(argv)
+    setup_logging()
+
+    if args.check_startup:
+        from moltbot.startup import check_startup, format_report
+
+        fases = check_startup()
+        print(format_report(fases))
+        sys.exit(0 if all(f.ok for f in fases) else 1)
+
+    if args.subcommand == "snapshots":
+        sys.exit(_run_snapshots(args))
+
+    from moltbot.db import close_pool, setup_db, start_maintenance
+
+    if not setup_db():
+        logger.error("No se pudo preparar el esquema de la base de datos; se aborta el arranque.")
+        close_pool()
+        sys.exit(1)
+
+    if args.subcommand == "backfill-hashes":
+        sys.exit(_run_backfill_hashes(args))
+    if args.subcommand == "partitions":
+        sys.exit(_run_partitions(args))
+    if args.subcommand == "import":
+        sys.exit(_run_import(args))
+
+    if args.workers > 1 or args.worker_queues:
+        try:
+            plan = parse_worker_plan(args.workers, args.worker_queues)
+        except ValueError as exc:
+            logger.error("%s", exc)
+            sys.exit(2)
+        # Cada worker abre su propio pool: el del supervisor ya no se usa.
+        close_pool()
+        # Particiones futuras y retención: solo en el proceso principal.
+        start_maintenance()
+        Supervisor(functools.partial(_worker_main, use_async=args.use_async), plan).run()
+        return
+
+    start_maintenance()
+    _start_metrics()
+    if args.use_async:
+        _run_async()
+        return
+
+    _run_blocking()
+
+
 if __name__ == "__main__":
     main()
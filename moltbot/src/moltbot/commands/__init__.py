@@ -2,16 +2,32 @@
 Paquete de comandos.
 
 Importa automáticamente todos los módulos de comandos para que se registren
-vía ``@register_command``. Re-exporta ``dispatch`` y ``register_command``
-para uso externo.
+vía ``@register_command``. Re-exporta ``dispatch``, ``register_command`` y
+las utilidades para handlers (parámetros, consultas en paralelo,
+cancelación y jobs en segundo plano) para uso externo.
 
     from moltbot.commands import dispatch, register_command
 """
 
-from moltbot.commands.base import dispatch, register_command
-
 # Auto-registro: importar los módulos que contienen handlers
-import moltbot.commands.invoices as _invoices  # noqa: F401
 import moltbot.commands.infra as _infra  # noqa: F401
+import moltbot.commands.invoices as _invoices  # noqa: F401
+from moltbot.commands.base import dispatch, get_cache_stats, register_command
+from moltbot.commands.jobs import get_job_stats, list_jobs, report_progress, stop_jobs
+from moltbot.commands.params import CommandError, parse_mes
+from moltbot.commands.runtime import CommandCancelled, check_cancelled, fan_out
 
-__all__ = ["dispatch", "register_command"]
+__all__ = [
+    "CommandCancelled",
+    "CommandError",
+    "check_cancelled",
+    "dispatch",
+    "fan_out",
+    "get_cache_stats",
+    "get_job_stats",
+    "list_jobs",
+    "parse_mes",
+    "register_command",
+    "report_progress",
+    "stop_jobs",
+]
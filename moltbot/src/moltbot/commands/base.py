@@ -1,37 +1,312 @@
 """
 Clase/protocolo base para comandos de Moltbot.
 
-Define el registro de comandos y el dispatcher.
+Define el registro de comandos, el dispatcher y la caché de respuestas. Los
+argumentos se convierten a los parámetros tipados del handler
+(:mod:`moltbot.commands.params`), cada handler se ejecuta con su timeout
+(:mod:`moltbot.commands.runtime`) y los comandos largos se lanzan como jobs
+en segundo plano (:mod:`moltbot.commands.jobs`).
 """
 
 from __future__ import annotations
 
+import functools
 import logging
-from typing import Callable
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Collection, Optional
+
+from moltbot.commands import runtime
+from moltbot.commands.jobs import get_job_runner
+from moltbot.commands.params import CommandError, Param, enlazar, parametros, separar, uso
+from moltbot.config import settings
+from moltbot.db import add_write_listener
+from moltbot.utils import metrics
 
 logger = logging.getLogger(__name__)
 
+# ---------------------------------------------------------------------------
+# Caché de respuestas
+# ---------------------------------------------------------------------------
+
+# Las respuestas de error no se cachean: el siguiente intento vuelve a la BD.
+_ERROR_PREFIX = "⚠️"
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Contadores de la caché de comandos."""
+
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    size: int
+    max_size: int
+
+
+class ResultCache:
+    """Caché LRU con TTL por entrada e invalidación por clave.
+
+    Cada entrada guarda la respuesta de un comando, su caducidad y las claves
+    de invalidación (p. ej. ``"facturas"``) de las que depende. Es segura
+    entre hilos (los consumidores concurrentes despachan comandos en paralelo).
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max(0, max_size)
+        self._entries: OrderedDict[str, tuple[float, str, frozenset[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Número de invalidaciones hechas; se pasa a :meth:`put`."""
+        return self._generation
+
+    def get(self, key: str) -> str | None:
+        """Devuelve la respuesta cacheada de *key* si sigue vigente."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(
+        self,
+        key: str,
+        value: str,
+        ttl: float,
+        depends_on: Collection[str] = (),
+        generation: int | None = None,
+    ) -> None:
+        """Guarda *value* durante *ttl* segundos, expulsando la entrada menos usada.
+
+        Si se indica *generation* (leída antes de calcular *value*) y ha habido
+        una invalidación desde entonces, *value* puede estar obsoleto y no se guarda.
+        """
+        if not self._max_size or ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value, frozenset(depends_on))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, depends_on: str) -> None:
+        """Descarta las entradas que dependen de la clave *depends_on*."""
+        with self._lock:
+            self._generation += 1
+            stale = [k for k, (_, _, deps) in self._entries.items() if depends_on in deps]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+
+    def clear(self) -> None:
+        """Vacía la caché."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        """Devuelve una instantánea de los contadores."""
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                invalidations=self._invalidations,
+                size=len(self._entries),
+                max_size=self._max_size,
+            )
+
+
+_cache = ResultCache(settings.commands.cache_size)
+
+# Las escrituras en BD invalidan las respuestas que dependen de la tabla; las
+# de otros procesos llegan por LISTEN/NOTIFY (ver ``moltbot.db.notifications``).
+add_write_listener(_cache.invalidate)
+
+
+def get_cache_stats() -> CacheStats:
+    """Contadores de la caché de comandos del proceso."""
+    return _cache.stats()
+
+
+metrics.register_stats(
+    get_cache_stats,
+    counters={
+        "hits": ("moltbot_command_cache_hits_total", "Respuestas servidas desde la caché."),
+        "misses": ("moltbot_command_cache_misses_total", "Consultas a la caché sin respuesta."),
+        "invalidations": (
+            "moltbot_command_cache_invalidations_total", "Entradas invalidadas por escrituras.",
+        ),
+    },
+    gauges={
+        "size": ("moltbot_command_cache_entries", "Respuestas cacheadas."),
+    },
+)
+
+
 # ---------------------------------------------------------------------------
 # Registro de comandos  (Open/Closed — añade nuevos sin tocar el dispatcher)
 # ---------------------------------------------------------------------------
 
-CommandHandler = Callable[[], str]
-_COMMAND_REGISTRY: dict[str, CommandHandler] = {}
+# Los handlers reciben como argumentos con nombre los parámetros que declaran
+# (ver :mod:`moltbot.commands.params`); los de cero argumentos siguen valiendo.
+CommandHandler = Callable[..., str]
+
+
+@dataclass(frozen=True)
+class _Command:
+    """Handler registrado junto con sus parámetros y su política de caché y de ejecución."""
+
+    handler: CommandHandler
+    params: tuple[Param, ...] = ()
+    ttl: float = 0.0
+    invalidate_on: frozenset[str] = frozenset()
+    timeout: float = 0.0
+    long_running: bool = False
+    max_concurrent: int = 1
+
+
+_COMMAND_REGISTRY: dict[str, _Command] = {}
+
 
+def register_command(
+    name: str,
+    ttl: float = 0.0,
+    invalidate_on: Collection[str] = (),
+    timeout: Optional[float] = None,
+    long_running: bool = False,
+    max_concurrent: int = 1,
+):
+    """Decorador que registra un handler para un comando de texto.
 
-def register_command(name: str):
-    """Decorador que registra un handler para un comando de texto."""
+    Los parámetros del handler, con su tipo anotado, son los argumentos del
+    comando (``!gastos marzo`` → ``mes=date(…, 3, 1)``).
+
+    Args:
+        ttl: segundos durante los que se reutiliza la respuesta (0 = sin caché).
+            Cada combinación de argumentos se cachea por separado.
+        invalidate_on: claves de escritura (p. ej. ``TABLA_FACTURAS``) que
+            invalidan la respuesta cacheada antes de que caduque.
+        timeout: segundos que se espera al handler antes de cancelarlo
+            (por defecto ``COMMAND_TIMEOUT``; 0 = sin límite).
+        long_running: ejecuta el handler como job en segundo plano; el
+            comando responde al momento con el id del job y el resultado se
+            publica al terminar. No admite caché ni timeout.
+        max_concurrent: jobs simultáneos de este comando; el resto espera.
+
+    Raises:
+        TypeError: si el handler declara parámetros de un tipo no admitido.
+    """
 
     def decorator(fn: CommandHandler) -> CommandHandler:
-        _COMMAND_REGISTRY[name.lower()] = fn
+        _COMMAND_REGISTRY[name.lower()] = _Command(
+            fn,
+            parametros(fn),
+            0.0 if long_running else ttl,
+            frozenset(invalidate_on),
+            settings.commands.timeout if timeout is None else timeout,
+            long_running,
+            max(1, max_concurrent),
+        )
         return fn
 
     return decorator
 
 
-def dispatch(comando: str) -> str:
-    """Busca y ejecuta el handler para *comando*; devuelve la respuesta."""
-    handler = _COMMAND_REGISTRY.get(comando)
-    if handler is None:
-        return f"⚠️ Comando desconocido: {comando}"
-    return handler()
+def dispatch(comando: str, destino: Optional[tuple[str, Optional[str]]] = None) -> str:
+    """Busca y ejecuta el handler para *comando*; devuelve la respuesta.
+
+    Args:
+        comando: texto recibido: nombre del comando y, opcionalmente, argumentos.
+        destino: ``(routing_key, correlation_id)`` de la respuesta (ver
+            ``destino_respuesta``). Los jobs publican ahí su progreso y su
+            resultado; por defecto, en ``respuestas_bot``.
+    """
+    nombre, argumentos = separar(comando)
+    command = _COMMAND_REGISTRY.get(nombre)
+    if command is None:
+        metrics.COMMAND_SECONDS.observe(0.0, command="desconocido", cached="false")
+        return f"⚠️ Comando desconocido: {nombre}"
+    try:
+        valores = enlazar(command.params, argumentos)
+    except CommandError as exc:
+        return f"{_ERROR_PREFIX} {exc}. Uso: {uso(nombre, command.params)}"
+
+    clave = f"{nombre} {_argumentos(valores)}".rstrip()
+    handler = functools.partial(command.handler, **valores) if valores else command.handler
+    inicio = time.perf_counter()
+    cached = False
+    try:
+        if command.long_running:
+            return _lanzar_job(nombre, valores, handler, command, destino)
+        if command.ttl <= 0:
+            return _ejecutar(nombre, handler, command.timeout)
+
+        respuesta = _cache.get(clave)
+        if respuesta is not None:
+            cached = True
+            return respuesta
+        generation = _cache.generation
+        respuesta = _ejecutar(nombre, handler, command.timeout)
+        if not respuesta.startswith(_ERROR_PREFIX):
+            _cache.put(clave, respuesta, command.ttl, command.invalidate_on, generation)
+        return respuesta
+    finally:
+        metrics.COMMAND_SECONDS.observe(
+            time.perf_counter() - inicio, command=nombre, cached="true" if cached else "false",
+        )
+
+
+def _argumentos(valores: dict[str, Any]) -> str:
+    """Forma canónica de los argumentos (clave de caché y etiqueta de los jobs)."""
+    return " ".join(f"{k}={v}" for k, v in sorted(valores.items()))
+
+
+def _ejecutar(nombre: str, handler: Callable[[], str], timeout: float) -> str:
+    """Ejecuta *handler* con *timeout* y convierte los fallos en respuestas de error."""
+    try:
+        return runtime.run(handler, timeout)
+    except runtime.CommandTimeout:
+        metrics.ERRORS.inc(stage="command_timeout")
+        logger.warning("El comando %s superó su timeout (%gs); cancelado.", nombre, timeout)
+        return f"{_ERROR_PREFIX} {nombre} no respondió en {timeout:g}s; se ha cancelado."
+    except runtime.CommandCancelled:
+        return f"{_ERROR_PREFIX} {nombre} se ha cancelado."
+    except Exception:
+        logger.exception("Error ejecutando el comando %s.", nombre)
+        return f"{_ERROR_PREFIX} Error ejecutando {nombre}."
+
+
+def _lanzar_job(
+    nombre: str,
+    valores: dict[str, Any],
+    handler: Callable[[], str],
+    command: _Command,
+    destino: Optional[tuple[str, Optional[str]]],
+) -> str:
+    """Lanza *handler* en segundo plano y devuelve la respuesta inmediata."""
+    routing_key, correlation_id = destino or (None, None)
+    job = get_job_runner().submit(
+        nombre, handler, command.max_concurrent, routing_key, correlation_id,
+        _argumentos(valores),
+    )
+    if job is None:
+        return f"{_ERROR_PREFIX} Demasiados jobs en cola; vuelve a intentar {nombre} más tarde."
+    return f"⏳ Aceptado, job `{job.id}`: {job.etiqueta} se ejecuta en segundo plano (!jobs)."
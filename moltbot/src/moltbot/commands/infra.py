@@ -3,26 +3,181 @@
 from __future__ import annotations
 
 import logging
+import os
 
-from moltbot.commands.base import register_command
+from moltbot.commands.base import get_cache_stats, register_command
+from moltbot.commands.jobs import list_jobs, report_progress
 from moltbot.config import settings
-from moltbot.db import get_n8n_execution_count
-from moltbot.processors.backup_manager import backup_n8n_workflows
+from moltbot.db import advisory_lock, get_execution_stats, get_pool_stats
+from moltbot.messaging.dedup import get_dedup_stats
+from moltbot.messaging.publisher import get_publisher_stats
+from moltbot.processors.backup_manager import (
+    backup_n8n_workflows,
+    backup_n8n_workflows_incremental,
+)
+from moltbot.utils import profiling
+from moltbot.utils.notifier import get_notifier_stats
 
 logger = logging.getLogger(__name__)
 
+# Clave del advisory lock del backup de workflows ("mbkup"): ``max_concurrent``
+# solo limita los jobs de un proceso y con ``--workers`` hay varios.
+_BACKUP_LOCK_KEY = 0x6D626B7570
 
-@register_command("status_db")
+# Espera máxima al informe en ``!profile_stop``, muy por debajo de
+# ``COMMAND_TIMEOUT``: si no está listo se responde igualmente.
+_PROFILE_STOP_WAIT = 5.0
+
+
+@register_command("status_db", ttl=30)
 def _cmd_status_db() -> str:
-    count = get_n8n_execution_count()
-    if count is not None:
-        return f"📊 Status DB: {count} ejecuciones"
+    stats = get_execution_stats()
+    if stats is not None:
+        return f"📊 Status DB: {stats.total} ejecuciones" + ("" if stats.exacto else " (estimado)")
     return "⚠️ Hubo un error al consultar la base de datos."
 
 
-@register_command("backup_workflows")
+@register_command("status_ejecuciones", ttl=30)
+def _cmd_status_ejecuciones() -> str:
+    stats = get_execution_stats()
+    if stats is None:
+        return "⚠️ Hubo un error al consultar la base de datos."
+    estados = " · ".join(f"{estado}: {n}" for estado, n in stats.por_estado.items()) or "-"
+    sufijo = "" if stats.exacto else " (estimado)"
+    return f"📊 Ejecuciones n8n{sufijo}: {stats.total} · {estados}"
+
+
+@register_command("status_workflows", ttl=30)
+def _cmd_status_workflows() -> str:
+    stats = get_execution_stats(exacto=True)
+    if stats is None:
+        return "⚠️ Hubo un error al consultar la base de datos."
+    if not stats.por_workflow:
+        return "📊 Aún no hay ejecuciones registradas."
+    lineas = [
+        f"• **{nombre or wf_id or 'sin workflow'}**: {n}"
+        for wf_id, nombre, n in stats.por_workflow
+    ]
+    return "📊 **Ejecuciones por workflow:**\n" + "\n".join(lineas)
+
+
+@register_command("status_pool")
+def _cmd_status_pool() -> str:
+    stats = get_pool_stats()
+    if stats is None:
+        return "📊 Pool DB: aún no inicializado"
+    return (
+        f"📊 Pool DB: {stats.in_use} en uso / {stats.idle} libres "
+        f"(máx. {stats.max_size}) · checkouts: {stats.checkouts} · "
+        f"esperas: {stats.waits} · timeouts: {stats.timeouts} · "
+        f"recicladas: {stats.recycled} · descartadas: {stats.discarded}"
+    )
+
+
+@register_command("status_discord")
+def _cmd_status_discord() -> str:
+    stats = get_notifier_stats()
+    if stats is None:
+        return "🔔 Notificador Discord: aún no inicializado"
+    return (
+        f"🔔 Notificador Discord: {stats.enviadas} enviadas en {stats.mensajes} mensajes · "
+        f"pendientes: {stats.pendientes} · descartadas: {stats.descartadas} · "
+        f"fallidas: {stats.fallidas} · rate limits: {stats.rate_limited}"
+    )
+
+
+@register_command("status_respuestas")
+def _cmd_status_respuestas() -> str:
+    stats = get_publisher_stats()
+    if stats is None:
+        return "📨 Publicador de respuestas: aún no inicializado"
+    return (
+        f"📨 Respuestas: {stats.confirmadas}/{stats.publicadas} confirmadas · "
+        f"pendientes: {stats.pendientes} · sin confirmar: {stats.sin_confirmar} · "
+        f"rechazadas: {stats.rechazadas} · sin destino: {stats.devueltas} · "
+        f"descartadas: {stats.descartadas} · reconexiones: {stats.reconexiones}"
+    )
+
+
+@register_command("status_dedup")
+def _cmd_status_dedup() -> str:
+    stats = get_dedup_stats()
+    return (
+        f"♻️ Deduplicación de facturas: {stats.mensajes_duplicados} mensajes repetidos · "
+        f"{stats.facturas_duplicadas} facturas duplicadas · "
+        f"caché {stats.size}/{stats.max_size}"
+    )
+
+
+@register_command("status_cache")
+def _cmd_status_cache() -> str:
+    stats = get_cache_stats()
+    consultas = stats.hits + stats.misses
+    ratio = stats.hits / consultas if consultas else 0.0
+    return (
+        f"🗃️ Caché de comandos: {stats.size}/{stats.max_size} entradas · "
+        f"aciertos: {stats.hits} · fallos: {stats.misses} ({ratio:.0%} aciertos) · "
+        f"expulsadas: {stats.evictions} · invalidadas: {stats.invalidations}"
+    )
+
+
+@register_command("profile_start")
+def _cmd_profile_start() -> str:
+    cfg = settings.profiling
+    if not profiling.start():
+        return "⚠️ Ya hay un perfilado en curso; usa !profile_stop."
+    return (
+        f"🔬 Perfilado activo en el worker {os.getpid()}: próximos "
+        f"{cfg.max_messages} mensajes o {cfg.max_seconds:.0f}s."
+    )
+
+
+@register_command("profile_stop")
+def _cmd_profile_stop() -> str:
+    activo = profiling.is_active()
+    report = profiling.stop(timeout=_PROFILE_STOP_WAIT)
+    if report is None and activo:
+        return "⏳ El informe aún se está escribiendo; repite !profile_stop en unos segundos."
+    if report is None:
+        return "⚠️ No hay ningún perfil en este worker; usa !profile_start."
+    return report.resumen()
+
+
+@register_command("jobs")
+def _cmd_jobs() -> str:
+    jobs = list_jobs()
+    if not jobs:
+        return f"🧵 No hay jobs en el worker {os.getpid()}."
+    lineas = [f"🧵 Jobs del worker {os.getpid()}:"]
+    for job in jobs:
+        linea = f"• `{job.id}` {job.etiqueta} — {job.estado} ({job.duracion:.1f}s)"
+        if job.activo and job.progreso:
+            linea += f" · {job.progreso}"
+        lineas.append(linea)
+    return "\n".join(lineas)
+
+
+@register_command("backup_workflows", long_running=True, max_concurrent=1)
 def _cmd_backup_workflows() -> str:
-    logger.info("Iniciando backup de flujos n8n…")
+    with advisory_lock(_BACKUP_LOCK_KEY) as libre:
+        if not libre:
+            return "⏳ Ya hay un backup de flujos en curso en otro worker; inténtalo al terminar."
+        return _backup_workflows()
+
+
+def _backup_workflows() -> str:
+    if settings.backup.incremental:
+        report_progress(f"Backup incremental de flujos n8n en {settings.backup.output_folder}…")
+        result = backup_n8n_workflows_incremental()
+        if result is None:
+            return "⚠️ Error al realizar el backup de flujos."
+        return (
+            f"📦 Backup completado en {settings.backup.output_folder}: "
+            f"{result.added} nuevos, {result.changed} modificados, "
+            f"{result.unchanged} sin cambios, {result.deleted} eliminados"
+        )
+
+    report_progress(f"Backup completo de flujos n8n en {settings.backup.output_folder}…")
     cantidad = backup_n8n_workflows()
     if cantidad is not None:
         return f"📦 Backup completado: {cantidad} flujos guardados en {settings.backup.output_folder}"
@@ -3,16 +3,79 @@
 from __future__ import annotations
 
 import logging
+from datetime import date, timedelta
+from typing import Optional
 
 from moltbot.commands.base import register_command
-from moltbot.db import get_total_gastos_mes
+from moltbot.commands.runtime import fan_out
+from moltbot.db import TABLA_FACTURAS, get_gastos_por_proveedor, get_total_gastos_mes
 
 logger = logging.getLogger(__name__)
 
+# Las respuestas se cachean y cada factura nueva las invalida.
+_TTL_GASTOS = 300
 
-@register_command("!gastos")
-def _cmd_gastos() -> str:
-    total = get_total_gastos_mes()
+_ERROR_DB = "⚠️ Hubo un error al consultar la base de datos."
+
+# Proveedores que muestra ``!resumen``.
+_TOP_PROVEEDORES = 5
+
+
+def _mes_anterior(mes: Optional[date] = None) -> date:
+    """Primer día del mes anterior a *mes* (por defecto, al actual)."""
+    return ((mes or date.today()).replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def _nombre_mes(mes: Optional[date]) -> str:
+    return "este mes" if mes is None else f"{mes:%m/%Y}"
+
+
+@register_command("!gastos", ttl=_TTL_GASTOS, invalidate_on=(TABLA_FACTURAS,))
+def _cmd_gastos(mes: Optional[date] = None) -> str:
+    total = get_total_gastos_mes(mes)
     if total is not None:
-        return f"💸 **Resumen de gastos de este mes:** {total:,.2f} €"
-    return "⚠️ Hubo un error al consultar la base de datos."
+        return f"💸 **Resumen de gastos de {_nombre_mes(mes)}:** {total:,.2f} €"
+    return _ERROR_DB
+
+
+@register_command("!gastos_mes_anterior", ttl=_TTL_GASTOS, invalidate_on=(TABLA_FACTURAS,))
+def _cmd_gastos_mes_anterior() -> str:
+    return _cmd_gastos(_mes_anterior())
+
+
+@register_command("!gastos_proveedores", ttl=_TTL_GASTOS, invalidate_on=(TABLA_FACTURAS,))
+def _cmd_gastos_proveedores(mes: Optional[date] = None) -> str:
+    filas = get_gastos_por_proveedor(mes)
+    if filas is None:
+        return _ERROR_DB
+    if not filas:
+        return f"💸 Aún no hay gastos registrados en {_nombre_mes(mes)}."
+    lineas = [
+        f"• **{proveedor}**: {total:,.2f} € ({n} facturas)"
+        for proveedor, total, n in filas
+    ]
+    return f"💸 **Gastos de {_nombre_mes(mes)} por proveedor:**\n" + "\n".join(lineas)
+
+
+@register_command("!resumen", ttl=_TTL_GASTOS, invalidate_on=(TABLA_FACTURAS,))
+def _cmd_resumen(mes: Optional[date] = None) -> str:
+    # Las tres consultas son independientes: van en paralelo.
+    total, total_anterior, filas = fan_out(
+        lambda: get_total_gastos_mes(mes),
+        lambda: get_total_gastos_mes(_mes_anterior(mes)),
+        lambda: get_gastos_por_proveedor(mes),
+    )
+    if total is None or total_anterior is None or filas is None:
+        return _ERROR_DB
+
+    lineas = [f"💸 **Resumen de {_nombre_mes(mes)}:** {total:,.2f} €"]
+    if total_anterior:
+        variacion = (total - total_anterior) / total_anterior
+        lineas.append(f"Mes anterior: {total_anterior:,.2f} € ({variacion:+.0%})")
+    num_facturas = sum(n for _proveedor, _total, n in filas)
+    lineas.append(f"{num_facturas} facturas de {len(filas)} proveedores")
+    lineas += [
+        f"• **{proveedor}**: {importe:,.2f} € ({n} facturas)"
+        for proveedor, importe, n in filas[:_TOP_PROVEEDORES]
+    ]
+    return "\n".join(lineas)
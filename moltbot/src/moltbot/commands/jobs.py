@@ -0,0 +1,417 @@
+"""
+Ejecución en segundo plano de comandos largos (jobs).
+
+Los comandos registrados con ``long_running=True`` no se ejecutan dentro del
+callback de consumo: :func:`dispatch <moltbot.commands.base.dispatch>`
+responde al instante con el id del job y un :class:`JobRunner` lo ejecuta en
+uno de sus hilos. Cada comando tiene un límite de jobs simultáneos; los que
+lo superan esperan en cola (hasta ``COMMAND_JOBS_MAX_QUEUED`` en total).
+
+El progreso (:func:`report_progress`) y el resultado final se publican en la
+cola de respuestas del comando original (``respuestas_bot`` por defecto) a
+través del publicador con confirms: el canal de pika del consumidor no se
+puede usar desde otros hilos.
+
+Los jobs son por proceso: con el supervisor, ``!jobs`` lista los del worker
+que atiende el comando.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Callable, Optional
+
+from moltbot.commands.runtime import CommandCancelled, cancel_scope
+from moltbot.config import settings
+from moltbot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_commands = settings.commands
+
+# Mismo prefijo que las respuestas de error de los comandos.
+_ERROR_PREFIX = "⚠️"
+
+_STOP = object()
+
+JOB_SECONDS = metrics.Histogram(
+    "moltbot_job_duration_seconds",
+    "Duración de los jobs en segundo plano, por comando y estado final.",
+    ("command", "estado"),
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0),
+)
+
+# (respuesta, routing_key, correlation_id) → encolada
+Publicar = Callable[[str, Optional[str], Optional[str]], bool]
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Job:
+    """Estado de un comando lanzado en segundo plano."""
+
+    id: str
+    comando: str
+    # Argumentos ya interpretados (``mes=2025-03-01``), solo para mostrarlos.
+    argumentos: str = ""
+    routing_key: Optional[str] = None
+    correlation_id: Optional[str] = None
+    # en cola → en curso → ok | error; o cancelado al cerrar.
+    estado: str = "en cola"
+    encolado: float = 0.0
+    inicio: Optional[float] = None
+    fin: Optional[float] = None
+    progreso: Optional[str] = None
+    resultado: Optional[str] = None
+
+    @property
+    def etiqueta(self) -> str:
+        return f"{self.comando} {self.argumentos}".rstrip()
+
+    @property
+    def activo(self) -> bool:
+        return self.estado in ("en cola", "en curso")
+
+    @property
+    def duracion(self) -> float:
+        """Segundos en ejecución (o en cola, si aún no ha empezado)."""
+        desde = self.inicio if self.inicio is not None else self.encolado
+        return (self.fin if self.fin is not None else time.time()) - desde
+
+
+@dataclass(frozen=True)
+class JobStats:
+    """Contadores del ejecutor de jobs."""
+
+    lanzados: int
+    completados: int
+    fallidos: int
+    rechazados: int
+    cancelados: int
+    en_curso: int
+    en_cola: int
+
+
+class JobRunner:
+    """Ejecuta jobs en un grupo de hilos con límite de concurrencia por comando.
+
+    Args:
+        publicar: publica un mensaje de progreso o el resultado de un job.
+        workers: hilos de ejecución (compartidos por todos los comandos).
+        history: jobs terminados que se recuerdan para ``!jobs``.
+        max_queued: jobs que pueden esperar turno entre todos los comandos.
+    """
+
+    def __init__(
+        self, publicar: Publicar, workers: int = 2, history: int = 20, max_queued: int = 10,
+    ) -> None:
+        self._publicar = publicar
+        self._workers = max(1, workers)
+        self._max_queued = max(0, max_queued)
+        self._ready: queue.Queue = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._stopping = False
+
+        # Jobs activos por id, en orden de llegada.
+        self._activos: dict[str, Job] = {}
+        self._recientes: deque[Job] = deque(maxlen=max(0, history))
+        # id → señal de cancelación de los jobs en curso (ver ``check_cancelled``).
+        self._cancelaciones: dict[str, threading.Event] = {}
+        # comando → jobs en ejecución o ya pasados a ``_ready``.
+        self._slots: dict[str, int] = {}
+        # comando → jobs esperando a que el comando libere un hueco.
+        self._esperando: dict[str, deque[tuple[Job, Callable[[], str], int]]] = {}
+
+        self._lanzados = 0
+        self._completados = 0
+        self._fallidos = 0
+        self._rechazados = 0
+        self._cancelados = 0
+
+    # -- API pública --------------------------------------------------------
+
+    def start(self) -> None:
+        """Arranca los hilos de ejecución."""
+        if self._threads:
+            return
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f"moltbot-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Cancela los jobs en cola y espera (hasta *timeout*) a los que están en curso.
+
+        Los jobs en curso reciben la señal de cancelación (``check_cancelled``).
+        """
+        with self._lock:
+            self._stopping = True
+            pendientes = [job for espera in self._esperando.values() for job, _h, _m in espera]
+            self._esperando.clear()
+            for cancelacion in self._cancelaciones.values():
+                cancelacion.set()
+        while True:
+            try:
+                item = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            pendientes.append(item[0])
+        for job in pendientes:
+            self._terminar(job, "cancelado", None)
+        for _ in self._threads:
+            self._ready.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        en_curso = [job.id for job in self._activos.values()]
+        if en_curso:
+            logger.warning("Cierre con jobs sin terminar: %s", ", ".join(en_curso))
+        self._threads = []
+
+    def submit(
+        self,
+        comando: str,
+        handler: Callable[[], str],
+        max_concurrent: int = 1,
+        routing_key: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        argumentos: str = "",
+    ) -> Optional[Job]:
+        """Lanza *handler* como job de *comando*.
+
+        El límite *max_concurrent* se aplica por comando, sean cuales sean
+        los argumentos.
+
+        Returns:
+            Una copia del job, o ``None`` si se rechazó (cola llena o cerrando).
+        """
+        max_concurrent = max(1, max_concurrent)
+        with self._lock:
+            en_cola = sum(len(espera) for espera in self._esperando.values())
+            libre = self._slots.get(comando, 0) < max_concurrent
+            if self._stopping or (not libre and en_cola >= self._max_queued):
+                self._rechazados += 1
+                return None
+            job = Job(
+                id=f"{os.getpid()}-{next(self._ids)}",
+                comando=comando,
+                argumentos=argumentos,
+                routing_key=routing_key,
+                correlation_id=correlation_id,
+                encolado=time.time(),
+            )
+            self._activos[job.id] = job
+            self._lanzados += 1
+            if libre:
+                self._slots[comando] = self._slots.get(comando, 0) + 1
+                self._ready.put((job, handler, max_concurrent))
+            else:
+                self._esperando.setdefault(comando, deque()).append(
+                    (job, handler, max_concurrent),
+                )
+            return replace(job)
+
+    def jobs(self) -> list[Job]:
+        """Copia de los jobs activos y de los terminados recientemente (más nuevos primero)."""
+        with self._lock:
+            return [replace(job) for job in (*self._activos.values(), *reversed(self._recientes))]
+
+    def stats(self) -> JobStats:
+        """Devuelve una instantánea de los contadores."""
+        with self._lock:
+            en_curso = sum(1 for job in self._activos.values() if job.estado == "en curso")
+            return JobStats(
+                lanzados=self._lanzados,
+                completados=self._completados,
+                fallidos=self._fallidos,
+                rechazados=self._rechazados,
+                cancelados=self._cancelados,
+                en_curso=en_curso,
+                en_cola=len(self._activos) - en_curso,
+            )
+
+    def report_progress(self, job: Job, texto: str) -> None:
+        """Guarda y publica el progreso de *job*."""
+        with self._lock:
+            job.progreso = texto
+        self._enviar(job, f"🔄 Job `{job.id}` ({job.etiqueta}): {texto}")
+
+    # -- Hilos de ejecución -------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            item = self._ready.get()
+            if item is _STOP:
+                break
+            self._ejecutar(*item)
+
+    def _ejecutar(self, job: Job, handler: Callable[[], str], max_concurrent: int) -> None:
+        cancelacion = threading.Event()
+        with self._lock:
+            job.estado = "en curso"
+            job.inicio = time.time()
+            self._cancelaciones[job.id] = cancelacion
+        logger.info("Job %s (%s) iniciado.", job.id, job.etiqueta)
+        _actual.contexto = (self, job)
+        try:
+            with cancel_scope(cancelacion):
+                resultado = handler()
+            estado = "error" if resultado.startswith(_ERROR_PREFIX) else "ok"
+        except CommandCancelled:
+            resultado, estado = None, "cancelado"
+        except Exception as exc:
+            logger.exception("Error en el job %s (%s).", job.id, job.etiqueta)
+            resultado, estado = f"{_ERROR_PREFIX} Error ejecutando {job.etiqueta}: {exc}", "error"
+        finally:
+            _actual.contexto = None
+            with self._lock:
+                self._cancelaciones.pop(job.id, None)
+            self._liberar(job.comando, max_concurrent)
+        self._terminar(job, estado, resultado)
+
+    def _liberar(self, comando: str, max_concurrent: int) -> None:
+        """Cede el hueco de *comando* al siguiente job que espera, si lo hay."""
+        with self._lock:
+            espera = self._esperando.get(comando)
+            if espera and not self._stopping:
+                self._ready.put(espera.popleft())
+                if not espera:
+                    del self._esperando[comando]
+                return
+            self._slots[comando] -= 1
+            if not self._slots[comando]:
+                del self._slots[comando]
+
+    def _terminar(self, job: Job, estado: str, resultado: Optional[str]) -> None:
+        with self._lock:
+            job.estado = estado
+            job.fin = time.time()
+            job.resultado = resultado
+            self._activos.pop(job.id, None)
+            self._recientes.append(job)
+            if estado == "ok":
+                self._completados += 1
+            elif estado == "error":
+                self._fallidos += 1
+            else:
+                self._cancelados += 1
+        if estado == "cancelado":
+            logger.info("Job %s (%s) cancelado.", job.id, job.etiqueta)
+            self._enviar(job, f"{_ERROR_PREFIX} Job `{job.id}` ({job.etiqueta}) cancelado.")
+            return
+        JOB_SECONDS.observe(job.duracion, command=job.comando, estado=estado)
+        logger.info("Job %s (%s) terminado (%s) en %.1fs.", job.id, job.etiqueta, estado,
+                    job.duracion)
+        icono = "✅" if estado == "ok" else "❌"
+        self._enviar(
+            job, f"{icono} Job `{job.id}` ({job.etiqueta}) en {job.duracion:.1f}s:\n{resultado}",
+        )
+
+    def _enviar(self, job: Job, texto: str) -> None:
+        try:
+            if not self._publicar(texto, job.routing_key, job.correlation_id):
+                logger.warning("No se pudo encolar la respuesta del job %s.", job.id)
+        except Exception:
+            logger.exception("Error publicando la respuesta del job %s.", job.id)
+
+
+# Job que ejecuta el hilo actual, para :func:`report_progress`.
+_actual = threading.local()
+
+
+def report_progress(texto: str) -> None:
+    """Publica el progreso del job en curso; fuera de un job solo lo registra en el log."""
+    contexto = getattr(_actual, "contexto", None)
+    if contexto is None:
+        logger.info("%s", texto)
+        return
+    runner, job = contexto
+    runner.report_progress(job, texto)
+
+
+# ---------------------------------------------------------------------------
+# Instancia global (una por proceso)
+# ---------------------------------------------------------------------------
+
+_runner: Optional[JobRunner] = None
+_runner_pid: Optional[int] = None
+_runner_lock = threading.Lock()
+
+
+def _publicar_respuesta(
+    respuesta: str, routing_key: Optional[str], correlation_id: Optional[str],
+) -> bool:
+    from moltbot.messaging.publisher import publicar_respuesta
+
+    return publicar_respuesta(respuesta, routing_key, correlation_id)
+
+
+def get_job_runner() -> JobRunner:
+    """Devuelve el ejecutor de jobs del proceso, creándolo y arrancándolo bajo demanda."""
+    global _runner, _runner_pid
+    pid = os.getpid()
+    if _runner is not None and _runner_pid == pid:
+        return _runner
+    with _runner_lock:
+        if _runner is None or _runner_pid != pid:
+            runner = JobRunner(
+                _publicar_respuesta,
+                workers=_commands.jobs_workers,
+                history=_commands.jobs_history,
+                max_queued=_commands.jobs_max_queued,
+            )
+            runner.start()
+            _runner, _runner_pid = runner, pid
+    return _runner
+
+
+def list_jobs() -> list[Job]:
+    """Jobs activos y recientes del proceso."""
+    runner = _runner
+    if runner is None or _runner_pid != os.getpid():
+        return []
+    return runner.jobs()
+
+
+def stop_jobs(timeout: float = 10.0) -> None:
+    """Cancela los jobs en cola y espera a los que están en curso (si hay ejecutor)."""
+    global _runner, _runner_pid
+    with _runner_lock:
+        if _runner is not None and _runner_pid == os.getpid():
+            _runner.stop(timeout)
+        _runner, _runner_pid = None, None
+
+
+def get_job_stats() -> Optional[JobStats]:
+    """Contadores del ejecutor de jobs del proceso, o ``None`` si aún no existe."""
+    runner = _runner
+    if runner is None or _runner_pid != os.getpid():
+        return None
+    return runner.stats()
+
+
+metrics.register_stats(
+    get_job_stats,
+    counters={
+        "lanzados": ("moltbot_jobs_started_total", "Jobs aceptados."),
+        "completados": ("moltbot_jobs_completed_total", "Jobs terminados correctamente."),
+        "fallidos": ("moltbot_jobs_failed_total", "Jobs terminados con error."),
+        "rechazados": ("moltbot_jobs_rejected_total", "Jobs rechazados por cola llena."),
+    },
+    gauges={
+        "en_curso": ("moltbot_jobs_running", "Jobs en ejecución."),
+        "en_cola": ("moltbot_jobs_queued", "Jobs esperando turno."),
+    },
+)
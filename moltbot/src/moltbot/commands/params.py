@@ -0,0 +1,217 @@
+"""
+Parámetros tipados de los comandos.
+
+Un comando llega como texto, p. ej. ``!gastos marzo`` o ``!gastos mes=2025-03``.
+El nombre (primera palabra) no distingue mayúsculas; el resto se trocea como
+en una shell (las comillas agrupan palabras) y cada argumento se convierte al
+tipo anotado en el handler::
+
+    @register_command("!gastos")
+    def _cmd_gastos(mes: Optional[date] = None) -> str: ...
+
+Tipos admitidos: ``str``, ``int``, ``float``, ``bool`` y ``date``, que se lee
+como un mes (``marzo``, ``mar-2025``, ``2025-03``, ``03/2025``, ``anterior``…);
+también envueltos en ``Optional``. Si el último parámetro libre es ``str``,
+recoge el resto del texto sin necesidad de comillas. Los handlers sin
+parámetros no admiten argumentos.
+"""
+
+from __future__ import annotations
+
+import inspect
+import re
+import shlex
+import types
+import typing
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Callable, Optional
+
+
+class CommandError(ValueError):
+    """Los argumentos de un comando no encajan con sus parámetros."""
+
+
+@dataclass(frozen=True)
+class Param:
+    """Parámetro de un handler: nombre, tipo y si es obligatorio."""
+
+    nombre: str
+    tipo: type
+    obligatorio: bool
+
+
+# ---------------------------------------------------------------------------
+# Conversores
+# ---------------------------------------------------------------------------
+
+_MESES = (
+    "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+    "agosto", "septiembre", "octubre", "noviembre", "diciembre",
+)
+_ISO_MES = re.compile(r"(\d{4})-(\d{1,2})(?:-\d{1,2})?")
+_MES_ANIO = re.compile(r"(\d{1,2})[/-](\d{4})")
+_NOMBRE_MES = re.compile(r"([a-zñ]+)(?:[/-]?(\d{4}))?")
+
+
+def _numero_mes(nombre: str) -> Optional[int]:
+    """Mes por su nombre o un prefijo de al menos tres letras (``sep``, ``sept``)."""
+    if nombre == "setiembre":
+        return 9
+    if len(nombre) < 3:
+        return None
+    coincidencias = [i for i, mes in enumerate(_MESES, 1) if mes.startswith(nombre)]
+    return coincidencias[0] if len(coincidencias) == 1 else None
+
+
+def parse_mes(texto: str, hoy: Optional[date] = None) -> date:
+    """Primer día del mes que indica *texto*.
+
+    Admite ``2025-03`` (o una fecha completa), ``03/2025``, ``marzo``,
+    ``marzo-2025``, un número de mes, ``actual`` y ``anterior``. Sin año, se
+    toma el mes más reciente con ese nombre (``diciembre`` en enero es el del
+    año pasado).
+
+    Raises:
+        ValueError: si *texto* no es un mes reconocible.
+    """
+    hoy = hoy or date.today()
+    actual = hoy.replace(day=1)
+    t = texto.strip().lower()
+    if t in ("actual", "este"):
+        return actual
+    if t in ("anterior", "pasado"):
+        return (actual - timedelta(days=1)).replace(day=1)
+
+    anio: Optional[int] = None
+    if m := _ISO_MES.fullmatch(t):
+        anio, mes = int(m[1]), int(m[2])
+    elif m := _MES_ANIO.fullmatch(t):
+        mes, anio = int(m[1]), int(m[2])
+    elif t.isdigit():
+        mes = int(t)
+    elif m := _NOMBRE_MES.fullmatch(t):
+        mes = _numero_mes(m[1]) or 0
+        anio = int(m[2]) if m[2] else None
+    else:
+        mes = 0
+    if not 1 <= mes <= 12:
+        raise ValueError(f"mes no válido: {texto}")
+    if anio is None:
+        anio = actual.year if mes <= actual.month else actual.year - 1
+    return date(anio, mes, 1)
+
+
+def _parse_bool(texto: str) -> bool:
+    t = texto.strip().lower()
+    if t in ("1", "si", "sí", "true", "on", "yes"):
+        return True
+    if t in ("0", "no", "false", "off"):
+        return False
+    raise ValueError(f"se esperaba sí/no: {texto}")
+
+
+_CONVERSORES: dict[type, Callable[[str], Any]] = {
+    str: str,
+    int: int,
+    float: lambda t: float(t.replace(",", ".")),
+    bool: _parse_bool,
+    date: parse_mes,
+}
+
+
+# ---------------------------------------------------------------------------
+# Firma de los handlers
+# ---------------------------------------------------------------------------
+
+def parametros(fn: Callable[..., str]) -> tuple[Param, ...]:
+    """Lee los parámetros de *fn* a partir de su firma y sus anotaciones.
+
+    Raises:
+        TypeError: si un parámetro tiene un tipo no admitido o es ``*args``/``**kwargs``.
+    """
+    hints = typing.get_type_hints(fn)
+    params: list[Param] = []
+    for p in inspect.signature(fn).parameters.values():
+        if p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD):
+            raise TypeError(f"{fn.__qualname__}: los comandos no admiten *args ni **kwargs")
+        tipo = hints.get(p.name, str)
+        if typing.get_origin(tipo) in (typing.Union, types.UnionType):
+            tipos = [t for t in typing.get_args(tipo) if t is not type(None)]
+            tipo = tipos[0] if len(tipos) == 1 else None
+        if tipo not in _CONVERSORES:
+            raise TypeError(f"{fn.__qualname__}: tipo no admitido para '{p.name}'")
+        params.append(Param(p.name, tipo, p.default is p.empty))
+    return tuple(params)
+
+
+def uso(nombre: str, params: tuple[Param, ...]) -> str:
+    """Sintaxis del comando, p. ej. ``!gastos [mes]``."""
+    return " ".join(
+        [nombre] + [f"<{p.nombre}>" if p.obligatorio else f"[{p.nombre}]" for p in params],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Análisis de la petición
+# ---------------------------------------------------------------------------
+
+def separar(texto: str) -> tuple[str, str]:
+    """Divide *texto* en el nombre del comando (en minúsculas) y sus argumentos."""
+    partes = texto.strip().split(None, 1)
+    if not partes:
+        return "", ""
+    return partes[0].lower(), partes[1] if len(partes) > 1 else ""
+
+
+def enlazar(params: tuple[Param, ...], argumentos: str) -> dict[str, Any]:
+    """Convierte *argumentos* en los valores de *params* (por posición o ``nombre=valor``).
+
+    Raises:
+        CommandError: si faltan o sobran argumentos o alguno no se puede convertir.
+    """
+    if not argumentos:
+        # Lo habitual: comando sin argumentos.
+        faltan = [p.nombre for p in params if p.obligatorio]
+        if faltan:
+            raise CommandError(f"falta '{faltan[0]}'")
+        return {}
+    try:
+        tokens = shlex.split(argumentos)
+    except ValueError:
+        raise CommandError("comillas sin cerrar") from None
+
+    por_nombre = {p.nombre: p for p in params}
+    textos: dict[str, str] = {}
+    posicionales: list[str] = []
+    for token in tokens:
+        clave, igual, valor = token.partition("=")
+        clave = clave.lower()
+        if igual and clave in por_nombre:
+            if clave in textos:
+                raise CommandError(f"'{clave}' repetido")
+            textos[clave] = valor
+        else:
+            posicionales.append(token)
+
+    libres = [p for p in params if p.nombre not in textos]
+    if len(posicionales) > len(libres):
+        if not libres or libres[-1].tipo is not str:
+            sobrantes = " ".join(posicionales[len(libres):])
+            raise CommandError(f"argumentos de más: {sobrantes}")
+        # El último parámetro de texto recoge el resto.
+        corte = len(libres) - 1
+        posicionales = posicionales[:corte] + [" ".join(posicionales[corte:])]
+    textos.update((p.nombre, valor) for p, valor in zip(libres, posicionales))
+
+    valores: dict[str, Any] = {}
+    for p in params:
+        if p.nombre not in textos:
+            if p.obligatorio:
+                raise CommandError(f"falta '{p.nombre}'")
+            continue
+        try:
+            valores[p.nombre] = _CONVERSORES[p.tipo](textos[p.nombre])
+        except ValueError:
+            raise CommandError(f"valor no válido para '{p.nombre}': {textos[p.nombre]}") from None
+    return valores
@@ -0,0 +1,187 @@
+"""
+Ejecución de los handlers de comandos: concurrencia, timeout y cancelación.
+
+:func:`run` ejecuta el handler en un pool de hilos propio y espera como
+mucho su timeout (``COMMAND_TIMEOUT`` o el indicado en ``register_command``).
+Si vence, el comando se marca como cancelado y el dispatcher responde con un
+error sin esperar más.
+
+Python no puede interrumpir un hilo, así que la cancelación es cooperativa:
+los handlers largos la comprueban con :func:`check_cancelled` y
+:func:`fan_out` deja de esperar a sus llamadas. Las consultas a PostgreSQL
+sí se cortan: el pool aplica ``SET LOCAL statement_timeout`` con el tiempo
+que le queda al comando (:func:`remaining`), así que al vencer se cancelan
+en el servidor y el hilo y la conexión quedan libres.
+
+:func:`fan_out` reparte varias llamadas independientes (p. ej. consultas a
+la BD) entre los hilos de ``COMMAND_FANOUT_WORKERS`` y devuelve sus
+resultados en orden; el handler solo tiene que combinarlos.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from moltbot.config import settings
+from moltbot.db.pool import set_deadline_provider
+
+_commands = settings.commands
+
+_T = TypeVar("_T")
+
+
+class CommandCancelled(Exception):
+    """El comando se ha cancelado (por timeout o al cerrar)."""
+
+
+class CommandTimeout(CommandCancelled):
+    """El comando ha superado su timeout."""
+
+
+# ---------------------------------------------------------------------------
+# Contexto de cancelación (por hilo)
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _Contexto:
+    cancelacion: threading.Event = field(default_factory=threading.Event)
+    # Instante (``time.monotonic``) en el que vence el comando, si tiene timeout.
+    deadline: Optional[float] = None
+
+
+_local = threading.local()
+
+
+@contextmanager
+def _en_contexto(contexto: _Contexto) -> Iterator[None]:
+    anterior = getattr(_local, "contexto", None)
+    _local.contexto = contexto
+    try:
+        yield
+    finally:
+        _local.contexto = anterior
+
+
+@contextmanager
+def cancel_scope(cancelacion: threading.Event) -> Iterator[None]:
+    """Ejecuta el bloque con *cancelacion* como señal de cancelación (sin timeout)."""
+    with _en_contexto(_Contexto(cancelacion)):
+        yield
+
+
+def remaining() -> Optional[float]:
+    """Segundos que le quedan al comando en curso (``None`` si no tiene timeout)."""
+    contexto = getattr(_local, "contexto", None)
+    if contexto is None or contexto.deadline is None:
+        return None
+    return max(0.0, contexto.deadline - time.monotonic())
+
+
+set_deadline_provider(remaining)
+
+
+def cancelled() -> bool:
+    """``True`` si el comando en curso se ha cancelado o ha vencido su timeout."""
+    contexto = getattr(_local, "contexto", None)
+    if contexto is None:
+        return False
+    return contexto.cancelacion.is_set() or remaining() == 0.0
+
+
+def check_cancelled() -> None:
+    """Lanza :class:`CommandCancelled` si el comando en curso ya no debe seguir."""
+    if cancelled():
+        raise CommandCancelled()
+
+
+# ---------------------------------------------------------------------------
+# Pools de hilos (uno por proceso)
+# ---------------------------------------------------------------------------
+
+_executors: dict[str, ThreadPoolExecutor] = {}
+_executors_pid: Optional[int] = None
+_executors_lock = threading.Lock()
+
+
+def _executor(nombre: str, workers: int) -> ThreadPoolExecutor:
+    global _executors, _executors_pid
+    with _executors_lock:
+        if _executors_pid != os.getpid():
+            _executors, _executors_pid = {}, os.getpid()
+        executor = _executors.get(nombre)
+        if executor is None:
+            executor = _executors[nombre] = ThreadPoolExecutor(
+                max_workers=max(1, workers), thread_name_prefix=f"moltbot-{nombre}",
+            )
+        return executor
+
+
+def _ejecutar(contexto: _Contexto, fn: Callable[[], _T], fanout: bool = False) -> _T:
+    anterior = getattr(_local, "fanout", False)
+    with _en_contexto(contexto):
+        _local.fanout = fanout or anterior
+        try:
+            check_cancelled()
+            return fn()
+        finally:
+            _local.fanout = anterior
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+def run(handler: Callable[[], _T], timeout: float) -> _T:
+    """Ejecuta *handler* en el pool de comandos y espera como mucho *timeout* segundos.
+
+    Raises:
+        CommandTimeout: si vence el timeout (el handler queda cancelado).
+    """
+    contexto = _Contexto(deadline=time.monotonic() + timeout if timeout > 0 else None)
+    future = _executor("cmd", _commands.workers).submit(_ejecutar, contexto, handler)
+    try:
+        return future.result(timeout if timeout > 0 else None)
+    except FutureTimeout:
+        contexto.cancelacion.set()
+        future.cancel()
+        raise CommandTimeout(timeout) from None
+
+
+def fan_out(*llamadas: Callable[[], Any]) -> list[Any]:
+    """Ejecuta *llamadas* en paralelo y devuelve sus resultados en el mismo orden.
+
+    Hereda la cancelación y el timeout del comando en curso. Si una llamada
+    falla, propaga su excepción y cancela las que aún no han empezado.
+
+    Raises:
+        CommandTimeout: si vence el timeout del comando antes de tener todos los resultados.
+    """
+    contexto = getattr(_local, "contexto", None) or _Contexto()
+    if getattr(_local, "fanout", False) or len(llamadas) < 2:
+        # Dentro de otro fan_out (o sin nada que repartir): en serie, para no
+        # agotar el pool esperando a tareas que van detrás en la cola.
+        return [_ejecutar(contexto, fn, fanout=True) for fn in llamadas]
+
+    executor = _executor("fanout", _commands.fanout_workers)
+    futures: list[Future] = [
+        executor.submit(_ejecutar, contexto, fn, True) for fn in llamadas
+    ]
+    try:
+        hechos, pendientes = wait(futures, remaining(), return_when=FIRST_EXCEPTION)
+        for future in futures:
+            if future in hechos and future.exception() is not None:
+                raise future.exception()
+        if pendientes:
+            contexto.cancelacion.set()
+            raise CommandTimeout()
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
@@ -10,18 +10,28 @@ from moltbot.config.logging import setup_logging
 from moltbot.config.settings import (
     AppConfig,
     BackupConfig,
+    CommandsConfig,
     DiscordConfig,
+    InvoicesConfig,
+    MetricsConfig,
     PostgresConfig,
+    ProfilingConfig,
     RabbitMQConfig,
+    SupervisorConfig,
     settings,
 )
 
 __all__ = [
     "AppConfig",
     "BackupConfig",
+    "CommandsConfig",
     "DiscordConfig",
+    "InvoicesConfig",
+    "MetricsConfig",
     "PostgresConfig",
+    "ProfilingConfig",
     "RabbitMQConfig",
+    "SupervisorConfig",
     "settings",
     "setup_logging",
 ]
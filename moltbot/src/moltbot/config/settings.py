@@ -31,6 +31,36 @@ class RabbitMQConfig:
     queue_comandos: str = "comandos_bot"
     queue_facturas: str = "tareas_facturas"
     queue_respuestas: str = "respuestas_bot"
+    # Facturas que el modo batch no consigue guardar (aisladas fila a fila):
+    # se aparcan aquí antes de rechazarlas para poder revisarlas y reinyectarlas.
+    queue_facturas_fallidas: str = "tareas_facturas_fallidas"
+    heartbeat: int = int(os.getenv("RABBIT_HEARTBEAT", "60"))
+    # Modo de consumo de las facturas: "simple" (un mensaje cada vez,
+    # auto-ack), "batch" (micro-lotes con ack manual tras el commit) o
+    # "concurrent" (entregas repartidas en un pool de hilos). Los comandos se
+    # consumen siempre en un pool de ``concurrency_comandos`` hilos.
+    consumer_mode: str = os.getenv("RABBIT_CONSUMER_MODE", "simple")
+    prefetch_count: int = int(os.getenv("RABBIT_PREFETCH_COUNT", "100"))
+    factura_batch_size: int = int(os.getenv("FACTURA_BATCH_SIZE", "50"))
+    factura_batch_linger_ms: int = int(os.getenv("FACTURA_BATCH_LINGER_MS", "200"))
+    concurrency_facturas: int = int(os.getenv("RABBIT_CONCURRENCY_FACTURAS", "4"))
+    concurrency_comandos: int = int(os.getenv("RABBIT_CONCURRENCY_COMANDOS", "2"))
+    # Runtime asyncio (``moltbot --async``): mensajes en vuelo por cola.
+    async_prefetch: int = int(os.getenv("RABBIT_ASYNC_PREFETCH", "200"))
+    shutdown_timeout: float = float(os.getenv("RABBIT_SHUTDOWN_TIMEOUT", "30"))
+    # Colas durables y mensajes persistentes. Las colas existentes no cambian
+    # de tipo: hay que borrarlas antes de activarlo (RabbitMQ rechaza
+    # redeclararlas con otra durabilidad).
+    durable: bool = os.getenv("RABBIT_DURABLE", "false").lower() in ("1", "true", "yes")
+    # Respuestas con publisher confirms desde un hilo propio (ver messaging.publisher);
+    # con "false" se publican en línea sin confirmación.
+    publisher_confirms: bool = (
+        os.getenv("RABBIT_PUBLISHER_CONFIRMS", "true").lower() in ("1", "true", "yes")
+    )
+    reply_batch_size: int = int(os.getenv("RABBIT_REPLY_BATCH_SIZE", "100"))
+    reply_batch_linger_ms: int = int(os.getenv("RABBIT_REPLY_BATCH_LINGER_MS", "0"))
+    reply_max_pending: int = int(os.getenv("RABBIT_REPLY_MAX_PENDING", "10000"))
+    reply_max_retries: int = int(os.getenv("RABBIT_REPLY_MAX_RETRIES", "3"))
 
 
 @dataclass(frozen=True)
@@ -41,6 +71,21 @@ class PostgresConfig:
     database: str = os.getenv("POSTGRES_DB", "n8n")
     user: str = os.getenv("POSTGRES_USER", "n8n_user")
     password: str = os.getenv("POSTGRES_PASSWORD", "n8n_password")
+    # Pool de conexiones
+    pool_min_size: int = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+    pool_max_size: int = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "5"))
+    pool_timeout: float = float(os.getenv("POSTGRES_POOL_TIMEOUT", "10"))
+    # Vida máxima de una conexión del pool síncrono, se use o no.
+    pool_max_lifetime: float = float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "1800"))
+    # Runtime asyncio: asyncpg no tiene vida máxima, solo cierra las conexiones
+    # que llevan este tiempo sin usarse (``max_inactive_connection_lifetime``).
+    pool_max_idle: float = float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300"))
+    pool_health_check_idle: float = float(os.getenv("POSTGRES_POOL_HEALTH_CHECK_IDLE", "30"))
+    # Estadísticas de ejecuciones de n8n: "exact" (incremental) o "estimated"
+    # (estadísticas del planner, sin leer la tabla).
+    execution_stats_mode: str = os.getenv("N8N_EXECUTION_STATS_MODE", "exact")
+    # Ejecuciones por bucket del contador exacto (unidad de recuento incremental).
+    execution_stats_bucket: int = int(os.getenv("N8N_EXECUTION_STATS_BUCKET", "10000"))
 
 
 @dataclass(frozen=True)
@@ -49,6 +94,10 @@ class DiscordConfig:
 
     webhook_url_facturas: str = os.getenv("DISCORD_WEBHOOK_URL_FACTURAS", "")
     request_timeout: int = int(os.getenv("DISCORD_REQUEST_TIMEOUT", "10"))
+    # Notificador en segundo plano
+    notifier_queue_size: int = int(os.getenv("DISCORD_NOTIFIER_QUEUE_SIZE", "1000"))
+    coalesce_window_ms: int = int(os.getenv("DISCORD_COALESCE_WINDOW_MS", "2000"))
+    max_retries: int = int(os.getenv("DISCORD_MAX_RETRIES", "3"))
 
 
 @dataclass(frozen=True)
@@ -56,6 +105,100 @@ class BackupConfig:
     """Configuración de backups."""
 
     output_folder: str = os.getenv("BACKUP_OUTPUT_FOLDER", "/n8n-workflows")
+    # Backup incremental: solo reescribe los workflows que han cambiado.
+    incremental: bool = os.getenv("BACKUP_INCREMENTAL", "true").lower() in ("1", "true", "yes")
+    manifest_name: str = ".moltbot-backup-manifest.json"
+    # Filas por viaje del cursor de servidor y hilos de serialización/escritura.
+    itersize: int = int(os.getenv("BACKUP_ITERSIZE", "50"))
+    workers: int = int(os.getenv("BACKUP_WORKERS", "4"))
+    # Formato: "json" (árbol de ficheros sueltos), "snapshot" (almacén
+    # deduplicado y comprimido con historial) o "both".
+    format: str = os.getenv("BACKUP_FORMAT", "json")
+    snapshot_dir: str = os.getenv("BACKUP_SNAPSHOT_DIR", ".snapshots")
+    snapshot_retention_days: int = int(os.getenv("BACKUP_SNAPSHOT_RETENTION_DAYS", "180"))
+
+
+@dataclass(frozen=True)
+class SupervisorConfig:
+    """Configuración del supervisor multi-proceso (``moltbot --workers N``)."""
+
+    workers: int = int(os.getenv("MOLTBOT_WORKERS", "1"))
+    # Reparto de workers por cola, p. ej. "tareas_facturas=3,comandos_bot=1".
+    worker_queues: str = os.getenv("MOLTBOT_WORKER_QUEUES", "")
+    restart_backoff_initial: float = float(os.getenv("MOLTBOT_RESTART_BACKOFF_INITIAL", "1"))
+    restart_backoff_max: float = float(os.getenv("MOLTBOT_RESTART_BACKOFF_MAX", "60"))
+    # Un worker que sobrevive este tiempo se considera estable y resetea el backoff.
+    stable_after: float = float(os.getenv("MOLTBOT_WORKER_STABLE_AFTER", "60"))
+    shutdown_timeout: float = float(os.getenv("MOLTBOT_SHUTDOWN_TIMEOUT", "30"))
+
+
+@dataclass(frozen=True)
+class InvoicesConfig:
+    """Configuración del procesado de facturas."""
+
+    # Confianza mínima para aceptar el proveedor detectado en el texto cuando
+    # el mensaje llega sin cabecera ``proveedor``.
+    detect_min_confidence: float = float(os.getenv("FACTURA_DETECT_MIN_CONFIDENCE", "0.3"))
+    # A partir de este tamaño de cuerpo solo se decodifican ventanas del texto.
+    large_payload_bytes: int = int(os.getenv("FACTURA_LARGE_PAYLOAD_BYTES", "262144"))
+    # Ventanas (bytes) para detectar proveedor y para parsers sin ventana propia.
+    window_head: int = int(os.getenv("FACTURA_WINDOW_HEAD", "16384"))
+    window_tail: int = int(os.getenv("FACTURA_WINDOW_TAIL", "16384"))
+    # Claves recientes (mensajes y facturas) que se recuerdan para descartar duplicados.
+    dedup_cache_size: int = int(os.getenv("FACTURA_DEDUP_CACHE_SIZE", "10000"))
+    # Particiones mensuales (ver moltbot.db.partitions): meses futuros creados
+    # por adelantado y cada cuánto se revisan.
+    partitions_ahead: int = int(os.getenv("FACTURA_PARTITIONS_AHEAD", "3"))
+    partition_maintenance_hours: float = float(
+        os.getenv("FACTURA_PARTITION_MAINTENANCE_HOURS", "24")
+    )
+    # Retención en meses (0 = desactivada): se archiva el texto original y,
+    # más adelante, se desconecta la partición entera.
+    archive_text_months: int = int(os.getenv("FACTURA_ARCHIVE_TEXT_MONTHS", "0"))
+    retention_months: int = int(os.getenv("FACTURA_RETENTION_MONTHS", "0"))
+    # Subcarpeta de BACKUP_OUTPUT_FOLDER para los textos archivados.
+    archive_dir: str = os.getenv("FACTURA_ARCHIVE_DIR", "facturas-archivo")
+
+
+@dataclass(frozen=True)
+class CommandsConfig:
+    """Configuración del registro de comandos."""
+
+    # Caché de respuestas (LRU); 0 la desactiva.
+    cache_size: int = int(os.getenv("COMMAND_CACHE_SIZE", "256"))
+    # Hilos que ejecutan los handlers, timeout por defecto de cada comando
+    # (segundos; 0 = sin límite) e hilos para sus consultas en paralelo.
+    workers: int = int(os.getenv("COMMAND_WORKERS", "8"))
+    timeout: float = float(os.getenv("COMMAND_TIMEOUT", "30"))
+    fanout_workers: int = int(os.getenv("COMMAND_FANOUT_WORKERS", "4"))
+    # Jobs en segundo plano (comandos ``long_running``): hilos, jobs terminados
+    # que lista ``!jobs`` y jobs que pueden esperar turno.
+    jobs_workers: int = int(os.getenv("COMMAND_JOBS_WORKERS", "2"))
+    jobs_history: int = int(os.getenv("COMMAND_JOBS_HISTORY", "20"))
+    jobs_max_queued: int = int(os.getenv("COMMAND_JOBS_MAX_QUEUED", "10"))
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    """Configuración del endpoint de métricas (formato Prometheus)."""
+
+    enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    host: str = os.getenv("METRICS_HOST", "0.0.0.0")
+    # Con el supervisor, el worker N escucha en ``port + N``.
+    port: int = int(os.getenv("METRICS_PORT", "9108"))
+
+
+@dataclass(frozen=True)
+class ProfilingConfig:
+    """Configuración del perfilado bajo demanda (``!profile_start`` / ``SIGUSR1``)."""
+
+    # La sesión termina tras estos mensajes o estos segundos (lo que llegue antes).
+    max_messages: int = int(os.getenv("PROFILE_MAX_MESSAGES", "1000"))
+    max_seconds: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    interval_ms: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    top: int = int(os.getenv("PROFILE_TOP", "15"))
+    # Subcarpeta de BACKUP_OUTPUT_FOLDER donde se guardan los perfiles.
+    output_dir: str = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
 
 
 @dataclass(frozen=True)
@@ -66,6 +209,11 @@ class AppConfig:
     postgres: PostgresConfig = field(default_factory=PostgresConfig)
     discord: DiscordConfig = field(default_factory=DiscordConfig)
     backup: BackupConfig = field(default_factory=BackupConfig)
+    supervisor: SupervisorConfig = field(default_factory=SupervisorConfig)
+    invoices: InvoicesConfig = field(default_factory=InvoicesConfig)
+    commands: CommandsConfig = field(default_factory=CommandsConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
 
 
@@ -4,20 +4,130 @@ Paquete de base de datos.
 Re-exporta las funciones principales:
 
     from moltbot.db import setup_db, insert_factura
+
+Los submódulos (y con ellos ``psycopg2``) se cargan al usar el primer
+símbolo, no al importar el paquete.
 """
 
-from moltbot.db.engine import (
-    get_n8n_execution_count,
-    get_total_gastos_mes,
-    get_workflows,
-    insert_factura,
-    setup_db,
-)
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from moltbot.db.engine import (
+        TABLA_FACTURAS,
+        add_write_listener,
+        advisory_lock,
+        backfill_factura_hashes,
+        copy_facturas,
+        get_gastos_por_proveedor,
+        get_n8n_execution_count,
+        get_total_gastos_mes,
+        get_workflow_ids,
+        get_workflows,
+        hash_factura,
+        hash_factura_texto,
+        insert_factura,
+        insert_facturas,
+        iter_workflows,
+    )
+    from moltbot.db.executions import ExecutionStats, get_execution_stats
+    from moltbot.db.notifications import start_write_listener, stop_write_listener
+    from moltbot.db.partitions import (
+        Particion,
+        aplicar_retencion,
+        ensure_month_partitions,
+        ensure_partitions,
+        get_partitions,
+        migrar_legacy,
+        start_maintenance,
+        stop_maintenance,
+    )
+    from moltbot.db.pool import PoolStats, close_pool, get_pool_stats
+    from moltbot.db.schema import SCHEMA_VERSION, get_schema_version, setup_db
+
+_EXPORTS = {
+    "ExecutionStats": "moltbot.db.executions",
+    "Particion": "moltbot.db.partitions",
+    "PoolStats": "moltbot.db.pool",
+    "SCHEMA_VERSION": "moltbot.db.schema",
+    "TABLA_FACTURAS": "moltbot.db.engine",
+    "add_write_listener": "moltbot.db.engine",
+    "advisory_lock": "moltbot.db.engine",
+    "aplicar_retencion": "moltbot.db.partitions",
+    "backfill_factura_hashes": "moltbot.db.engine",
+    "close_pool": "moltbot.db.pool",
+    "copy_facturas": "moltbot.db.engine",
+    "ensure_month_partitions": "moltbot.db.partitions",
+    "ensure_partitions": "moltbot.db.partitions",
+    "get_execution_stats": "moltbot.db.executions",
+    "get_gastos_por_proveedor": "moltbot.db.engine",
+    "get_n8n_execution_count": "moltbot.db.engine",
+    "get_partitions": "moltbot.db.partitions",
+    "get_pool_stats": "moltbot.db.pool",
+    "get_schema_version": "moltbot.db.schema",
+    "get_total_gastos_mes": "moltbot.db.engine",
+    "get_workflow_ids": "moltbot.db.engine",
+    "get_workflows": "moltbot.db.engine",
+    "hash_factura": "moltbot.db.engine",
+    "hash_factura_texto": "moltbot.db.engine",
+    "insert_factura": "moltbot.db.engine",
+    "insert_facturas": "moltbot.db.engine",
+    "iter_workflows": "moltbot.db.engine",
+    "migrar_legacy": "moltbot.db.partitions",
+    "setup_db": "moltbot.db.schema",
+    "start_maintenance": "moltbot.db.partitions",
+    "start_write_listener": "moltbot.db.notifications",
+    "stop_maintenance": "moltbot.db.partitions",
+    "stop_write_listener": "moltbot.db.notifications",
+}
 
 __all__ = [
+    "SCHEMA_VERSION",
+    "TABLA_FACTURAS",
+    "ExecutionStats",
+    "Particion",
+    "PoolStats",
+    "add_write_listener",
+    "advisory_lock",
+    "aplicar_retencion",
+    "backfill_factura_hashes",
+    "close_pool",
+    "copy_facturas",
+    "ensure_month_partitions",
+    "ensure_partitions",
+    "get_execution_stats",
+    "get_gastos_por_proveedor",
     "get_n8n_execution_count",
+    "get_partitions",
+    "get_pool_stats",
+    "get_schema_version",
     "get_total_gastos_mes",
+    "get_workflow_ids",
     "get_workflows",
+    "hash_factura",
+    "hash_factura_texto",
     "insert_factura",
+    "insert_facturas",
+    "iter_workflows",
+    "migrar_legacy",
     "setup_db",
+    "start_maintenance",
+    "start_write_listener",
+    "stop_maintenance",
+    "stop_write_listener",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,94 @@
+"""
+Acceso asíncrono a PostgreSQL para el runtime asyncio (``moltbot --async``).
+
+Usa un pool de ``asyncpg``. Solo cubre el camino caliente de ingesta de
+facturas; los handlers de comandos siguen usando ``moltbot.db.engine``
+desde un hilo (``asyncio.to_thread``).
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional, Sequence
+
+import asyncpg
+
+from moltbot.config import settings
+from moltbot.db.engine import (
+    INSERT_FACTURAS_SQL,
+    TABLA_FACTURAS,
+    fila_factura,
+    notify_write,
+)
+from moltbot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_pg = settings.postgres
+
+
+async def create_pool() -> asyncpg.Pool:
+    """Crea el pool asíncrono con los mismos límites de tamaño que el pool síncrono.
+
+    La caducidad no es la misma: asyncpg cierra las conexiones inactivas
+    durante ``POSTGRES_POOL_MAX_IDLE`` segundos, no las que superan una vida
+    máxima como ``POSTGRES_POOL_MAX_LIFETIME`` en el pool síncrono.
+    """
+    return await asyncpg.create_pool(
+        host=_pg.host,
+        database=_pg.database,
+        user=_pg.user,
+        password=_pg.password,
+        min_size=_pg.pool_min_size,
+        max_size=_pg.pool_max_size,
+        max_inactive_connection_lifetime=_pg.pool_max_idle,
+        timeout=_pg.pool_timeout,
+    )
+
+
+async def insert_factura(
+    pool: asyncpg.Pool, proveedor: str, importe: float, texto: str = "",
+) -> Optional[int]:
+    """Inserta una nueva factura y devuelve su ID.
+
+    Returns:
+        El ID, o ``None`` en caso de error o si la factura ya existía.
+    """
+    ids = await insert_facturas(pool, [(proveedor, importe, texto)])
+    return ids[0] if ids else None
+
+
+async def insert_facturas(
+    pool: asyncpg.Pool, facturas: Sequence[tuple[str, float, str]],
+) -> Optional[list[Optional[int]]]:
+    """Versión asíncrona de :func:`moltbot.db.engine.insert_facturas`.
+
+    Actualiza el rollup mensual en la misma sentencia e ignora las facturas
+    duplicadas por hash de contenido.
+
+    Returns:
+        Un ID por factura (``None`` para las duplicadas), o ``None`` si falla el lote.
+    """
+    if not facturas:
+        return []
+    try:
+        rows = [fila_factura(*factura) for factura in facturas]
+        values = ", ".join(
+            # El importe necesita tipo explícito: en un VALUES dentro de un CTE
+            # los parámetros sin contexto se deducen como ``text``.
+            f"(${i * 4 + 1}, ${i * 4 + 2}::numeric, ${i * 4 + 3}, ${i * 4 + 4})"
+            for i in range(len(rows))
+        )
+        with metrics.STAGE_SECONDS.time(stage="db"):
+            result = await pool.fetch(
+                INSERT_FACTURAS_SQL % values, *(v for row in rows for v in row),
+            )
+    except (asyncpg.PostgresError, OSError, ValueError) as exc:
+        metrics.ERRORS.inc(stage="db")
+        logger.exception("Error al insertar lote de %d facturas: %s", len(facturas), exc)
+        return None
+
+    if result:
+        notify_write(TABLA_FACTURAS)
+    por_hash = {record["hash_contenido"]: record["id"] for record in result}
+    return [por_hash.pop(row[3], None) for row in rows]
@@ -1,25 +1,32 @@
 """
 Capa de acceso a datos de Moltbot.
 
-Gestiona la conexión a PostgreSQL y expone funciones de consulta/inserción
-para facturas, ejecuciones n8n y workflows.
+Gestiona la conexión a PostgreSQL (vía el pool de ``moltbot.db.pool``) y
+expone funciones de consulta/inserción para facturas, ejecuciones n8n y
+workflows.
 """
 
 from __future__ import annotations
 
+import hashlib
+import io
 import logging
 from contextlib import contextmanager
-from typing import Generator, Optional
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Callable, Generator, Iterable, Iterator, Optional, Sequence
 
 import psycopg2
 from psycopg2.extensions import connection as PgConnection
+from psycopg2.extras import execute_values
 
-from moltbot.config import settings
+from moltbot.db.executions import get_execution_stats
+from moltbot.db.partitions import migrar_legacy
+from moltbot.db.pool import get_pool
+from moltbot.utils import metrics
 
 logger = logging.getLogger(__name__)
 
-_pg = settings.postgres
-
 
 # ---------------------------------------------------------------------------
 # Conexión
@@ -27,88 +34,373 @@ _pg = settings.postgres
 
 @contextmanager
 def _get_connection() -> Generator[PgConnection, None, None]:
-    """Abre (y cierra) una conexión a PostgreSQL de forma segura."""
-    conn = psycopg2.connect(
-        host=_pg.host,
-        database=_pg.database,
-        user=_pg.user,
-        password=_pg.password,
-    )
-    try:
+    """Toma prestada una conexión del pool y la devuelve al terminar."""
+    with get_pool().connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+
+@contextmanager
+def advisory_lock(key: int) -> Iterator[bool]:
+    """``pg_try_advisory_lock`` de sesión durante el bloque, sin esperar.
+
+    Produce ``True`` si se obtuvo el lock (y lo libera al salir) o ``False`` si
+    lo tiene otro proceso. Sirve para que un trabajo largo no corra a la vez en
+    varios workers; la conexión queda ocupada mientras dura el bloque. Los
+    errores de la base de datos se propagan.
+    """
+    with _get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s);", (key,))
+            obtenido = cur.fetchone()[0]
+        conn.commit()
+        try:
+            yield obtenido
+        finally:
+            if obtenido:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s);", (key,))
+                conn.commit()
 
 
 # ---------------------------------------------------------------------------
-# Setup
+# Eventos de escritura
 # ---------------------------------------------------------------------------
 
-def setup_db() -> None:
-    """Inicializa el esquema y todas las tablas del bot."""
-    queries = [
-        "CREATE SCHEMA IF NOT EXISTS moltbot;",
-        """
-        CREATE TABLE IF NOT EXISTS moltbot.facturas_gastos (
-            id SERIAL PRIMARY KEY,
-            proveedor VARCHAR(50) NOT NULL,
-            importe DECIMAL(10, 2) NOT NULL,
-            fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            texto_original TEXT
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS moltbot.logs_infraestructura (
-            id SERIAL PRIMARY KEY,
-            servicio VARCHAR(50) NOT NULL,
-            estado VARCHAR(20) NOT NULL,
-            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """,
-    ]
-    try:
-        with _get_connection() as conn, conn.cursor() as cur:
-            for q in queries:
-                cur.execute(q)
-            conn.commit()
-            logger.info("Infraestructura 'moltbot' (facturas y servicios) lista.")
-    except psycopg2.Error as exc:
-        logger.exception("Error en setup_db: %s", exc)
+WriteListener = Callable[[str], None]
+_write_listeners: list[WriteListener] = []
+
+# Tablas lógicas que notifican escrituras.
+TABLA_FACTURAS = "facturas"
+
+
+def add_write_listener(listener: WriteListener) -> None:
+    """Registra *listener*, que se llama con el nombre de la tabla tras cada commit."""
+    _write_listeners.append(listener)
+
+
+def notify_write(tabla: str) -> None:
+    """Avisa a los listeners de que *tabla* ha cambiado (tras el commit)."""
+    for listener in _write_listeners:
+        try:
+            listener(tabla)
+        except Exception:
+            logger.exception("Error en listener de escritura para '%s'.", tabla)
 
 
 # ---------------------------------------------------------------------------
 # Facturas
 # ---------------------------------------------------------------------------
 
+def hash_factura_texto(
+    proveedor: str, importe: float | Decimal | str, trozos: Iterable[str],
+) -> str:
+    """Hash de contenido de una factura (clave de deduplicación).
+
+    Se calcula sobre el proveedor, el importe a 2 decimales y el texto
+    **completo**, que puede llegar en *trozos* consecutivos (facturas grandes
+    decodificadas por partes): dos facturas con el mismo proveedor e importe
+    solo coinciden si todo su texto coincide, no solo los primeros
+    ``TEXTO_MAX`` caracteres que se guardan.
+    """
+    importe_norm = Decimal(str(importe).replace(",", ".")).quantize(
+        Decimal("0.01"), rounding=ROUND_HALF_UP,
+    )
+    h = hashlib.sha256(f"{proveedor}\x1f{importe_norm}\x1f".encode())
+    for trozo in trozos:
+        # ``surrogatepass``: un JSON puede traer suplentes sueltos (``\ud83d``).
+        h.update(trozo.encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+def hash_factura(proveedor: str, importe: float | Decimal | str, texto: Optional[str]) -> str:
+    """Hash de contenido sobre un texto ya en memoria (ver :func:`hash_factura_texto`).
+
+    El backfill lo aplica al texto guardado (truncado), lo único que queda
+    de las facturas anteriores a la deduplicación.
+    """
+    return hash_factura_texto(proveedor, importe, (texto or "",))
+
+
+# Inserta facturas y actualiza el rollup mensual en la misma sentencia (y por
+# tanto en la misma transacción). ``%s`` recibe una o varias filas VALUES.
+# La deduplicación se hace contra ``facturas_hashes`` (la tabla de facturas
+# está particionada y no admite un índice único solo sobre el hash): solo se
+# insertan, y cuentan en el rollup, las facturas cuyo hash es nuevo.
+INSERT_FACTURAS_SQL = """
+    WITH datos (proveedor, importe, texto_original, hash_contenido) AS (
+        VALUES %s
+    ), hashes AS (
+        INSERT INTO moltbot.facturas_hashes (hash_contenido)
+        SELECT hash_contenido FROM datos
+        ON CONFLICT (hash_contenido) DO NOTHING
+        RETURNING hash_contenido
+    ), nuevas AS (
+        INSERT INTO moltbot.facturas_gastos (proveedor, importe, texto_original, hash_contenido)
+        SELECT DISTINCT ON (d.hash_contenido)
+            d.proveedor, d.importe, d.texto_original, d.hash_contenido
+        FROM datos AS d
+        JOIN hashes AS h ON h.hash_contenido = d.hash_contenido
+        RETURNING id, hash_contenido, proveedor, importe, fecha_registro
+    ), rollup AS (
+        INSERT INTO moltbot.gastos_mensuales AS g (mes, proveedor, total, num_facturas)
+        SELECT date_trunc('month', fecha_registro)::date, proveedor, SUM(importe), COUNT(*)
+        FROM nuevas
+        GROUP BY 1, 2
+        ON CONFLICT (mes, proveedor) DO UPDATE
+            SET total = g.total + EXCLUDED.total,
+                num_facturas = g.num_facturas + EXCLUDED.num_facturas
+    )
+    SELECT id, hash_contenido FROM nuevas;
+"""
+
+
+def fila_factura(
+    proveedor: str, importe: float, texto: str, hash_contenido: Optional[str] = None,
+) -> tuple[str, float, str, str]:
+    """Fila ``(proveedor, importe, texto, hash)`` para ``INSERT_FACTURAS_SQL``.
+
+    *hash_contenido* es el de la factura completa (ver
+    :func:`moltbot.messaging.facturas.extraer_factura`); si no se indica, se
+    calcula sobre *texto*.
+    """
+    importe_clean = float(str(importe).replace(",", "."))
+    if hash_contenido is None:
+        hash_contenido = hash_factura(proveedor, importe_clean, texto)
+    return proveedor, importe_clean, texto, hash_contenido
+
+
 def insert_factura(proveedor: str, importe: float, texto: str = "") -> Optional[int]:
-    """Inserta una nueva factura y devuelve su ID, o ``None`` en caso de error."""
-    query = """
-        INSERT INTO moltbot.facturas_gastos (proveedor, importe, texto_original)
-        VALUES (%s, %s, %s)
-        RETURNING id;
+    """Inserta una nueva factura y devuelve su ID.
+
+    El rollup mensual (``moltbot.gastos_mensuales``) se actualiza en la misma
+    transacción.
+
+    Returns:
+        El ID, o ``None`` en caso de error o si la factura ya existía (mismo
+        hash de contenido). Para distinguir ambos casos, usa :func:`insert_facturas`.
+    """
+    ids = insert_facturas([(proveedor, importe, texto)])
+    return ids[0] if ids else None
+
+
+def insert_facturas(
+    facturas: Sequence[tuple[str, float, str] | tuple[str, float, str, str]],
+) -> Optional[list[Optional[int]]]:
+    """Inserta varias facturas ``(proveedor, importe, texto[, hash])`` en un único commit.
+
+    Usa un ``INSERT`` multi-fila, de modo que el lote entero (incluida la
+    actualización del rollup mensual) cuesta un solo round trip y una sola
+    transacción. Las facturas duplicadas (hash de contenido ya presente en la
+    tabla o repetido en el lote) se ignoran.
+
+    Returns:
+        Un ID por factura, en el mismo orden (``None`` para las duplicadas),
+        o ``None`` si falla el lote completo.
+    """
+    if not facturas:
+        return []
+    query = INSERT_FACTURAS_SQL
+    try:
+        rows = [fila_factura(*factura) for factura in facturas]
+        with metrics.STAGE_SECONDS.time(stage="db"):
+            with _get_connection() as conn, conn.cursor() as cur:
+                result = execute_values(cur, query, rows, page_size=len(rows), fetch=True)
+                conn.commit()
+    except (psycopg2.Error, ValueError) as exc:
+        metrics.ERRORS.inc(stage="db")
+        logger.exception("Error al insertar lote de %d facturas: %s", len(facturas), exc)
+        return None
+
+    if result:
+        notify_write(TABLA_FACTURAS)
+    # Cada hash nuevo corresponde a su primera aparición en el lote.
+    por_hash = {hash_contenido: factura_id for factura_id, hash_contenido in result}
+    ids = []
+    for row in rows:
+        ids.append(por_hash.pop(row[3], None))
+    if len(result) < len(rows):
+        logger.info("%d facturas duplicadas ignoradas.", len(rows) - len(result))
+    return ids
+
+
+# Carga masiva (``moltbot import``): las filas llegan por ``COPY`` a una tabla
+# temporal y se insertan con la misma deduplicación y el mismo rollup que
+# ``INSERT_FACTURAS_SQL``, pero con la fecha de cada factura.
+_COPY_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS facturas_import (
+        proveedor VARCHAR(50),
+        importe DECIMAL(10, 2),
+        fecha_registro TIMESTAMP,
+        texto_original TEXT,
+        hash_contenido CHAR(64)
+    ) ON COMMIT DELETE ROWS;
+"""
+
+_COPY_INSERT_SQL = """
+    WITH hashes AS (
+        INSERT INTO moltbot.facturas_hashes (hash_contenido, fecha_registro)
+        SELECT hash_contenido, COALESCE(fecha_registro, CURRENT_TIMESTAMP)
+        FROM facturas_import
+        ON CONFLICT (hash_contenido) DO NOTHING
+        RETURNING hash_contenido
+    ), nuevas AS (
+        INSERT INTO moltbot.facturas_gastos
+            (proveedor, importe, fecha_registro, texto_original, hash_contenido)
+        SELECT DISTINCT ON (i.hash_contenido)
+            i.proveedor, i.importe, COALESCE(i.fecha_registro, CURRENT_TIMESTAMP),
+            i.texto_original, i.hash_contenido
+        FROM facturas_import AS i
+        JOIN hashes AS h ON h.hash_contenido = i.hash_contenido
+        RETURNING proveedor, importe, fecha_registro
+    ), rollup AS (
+        INSERT INTO moltbot.gastos_mensuales AS g (mes, proveedor, total, num_facturas)
+        SELECT date_trunc('month', fecha_registro)::date, proveedor, SUM(importe), COUNT(*)
+        FROM nuevas
+        GROUP BY 1, 2
+        ON CONFLICT (mes, proveedor) DO UPDATE
+            SET total = g.total + EXCLUDED.total,
+                num_facturas = g.num_facturas + EXCLUDED.num_facturas
+    )
+    SELECT COUNT(*) FROM nuevas;
+"""
+
+
+def _copy_campo(valor: object) -> str:
+    """Valor en el formato de texto de ``COPY`` (``\\N`` para ``NULL``)."""
+    if valor is None:
+        return "\\N"
+    texto = valor.isoformat() if isinstance(valor, datetime) else str(valor)
+    return (
+        texto.replace("\\", "\\\\").replace("\t", "\\t")
+        .replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def copy_facturas(
+    facturas: Sequence[tuple[str, float, str, str, Optional[datetime]]],
+) -> Optional[int]:
+    """Carga un lote grande de facturas ``(proveedor, importe, texto, hash, fecha)`` con ``COPY``.
+
+    Pensada para importar histórico: un único ``COPY`` y un único
+    ``INSERT … SELECT`` por lote, en una transacción. Las duplicadas (por
+    hash de contenido) se ignoran. Con ``fecha=None`` se usa la actual; las
+    particiones de los meses del lote tienen que existir de antemano (ver
+    :func:`moltbot.db.partitions.ensure_month_partitions`).
+
+    Returns:
+        Número de facturas insertadas, o ``None`` si falla el lote completo.
     """
+    if not facturas:
+        return 0
+    buf = io.StringIO()
     try:
-        importe_clean = float(str(importe).replace(",", "."))
+        for proveedor, importe, texto, hash_contenido, fecha in facturas:
+            fila = fila_factura(proveedor, importe, texto, hash_contenido)
+            campos = (fila[0], fila[1], fecha, fila[2], fila[3])
+            buf.write("\t".join(_copy_campo(campo) for campo in campos) + "\n")
+        buf.seek(0)
         with _get_connection() as conn, conn.cursor() as cur:
-            cur.execute(query, (proveedor, importe_clean, texto))
-            factura_id: int = cur.fetchone()[0]
+            cur.execute(_COPY_STAGING_SQL)
+            cur.copy_expert("COPY facturas_import FROM STDIN;", buf)
+            cur.execute(_COPY_INSERT_SQL)
+            insertadas = cur.fetchone()[0]
             conn.commit()
-            return factura_id
     except (psycopg2.Error, ValueError) as exc:
-        logger.exception("Error al insertar factura: %s", exc)
+        logger.exception("Error en la carga masiva de %d facturas: %s", len(facturas), exc)
         return None
 
+    if insertadas:
+        notify_write(TABLA_FACTURAS)
+    return insertadas
 
-def get_total_gastos_mes() -> Optional[float]:
-    """Suma todos los importes del mes actual."""
-    query = """
-        SELECT COALESCE(SUM(importe), 0)
+
+def backfill_factura_hashes(batch_size: int = 1000) -> Optional[tuple[int, int]]:
+    """Calcula el hash de contenido de las facturas anteriores a la deduplicación.
+
+    Recorre por lotes (keyset sobre ``id``) las filas sin hash y les asigna
+    :func:`hash_factura` del texto guardado (el original ya no existe). Si
+    varias filas existentes tienen el mismo contenido, solo la primera recibe
+    el hash; el resto se dejan a ``NULL`` (no se borran datos) y se cuentan
+    como duplicadas.
+
+    Solo recorre la tabla particionada, así que antes mueve a ella las
+    facturas que queden en ``facturas_gastos_legacy``
+    (:func:`moltbot.db.partitions.migrar_legacy`).
+
+    Returns:
+        ``(actualizadas, duplicadas)``, o ``None`` en caso de error.
+    """
+    select = """
+        SELECT id, fecha_registro, proveedor, importe, texto_original
         FROM moltbot.facturas_gastos
-        WHERE date_trunc('month', fecha_registro) = date_trunc('month', CURRENT_DATE);
+        WHERE hash_contenido IS NULL AND id > %s
+        ORDER BY id
+        LIMIT %s;
+    """
+    update = """
+        WITH v (id, fecha_registro, hash) AS (
+            VALUES %s
+        ), nuevos AS (
+            INSERT INTO moltbot.facturas_hashes (hash_contenido, fecha_registro)
+            SELECT hash, fecha_registro FROM v
+            ON CONFLICT (hash_contenido) DO NOTHING
+            RETURNING hash_contenido
+        )
+        UPDATE moltbot.facturas_gastos AS f
+        SET hash_contenido = v.hash
+        FROM v
+        JOIN nuevos AS n ON n.hash_contenido = v.hash
+        WHERE f.id = v.id AND f.fecha_registro = v.fecha_registro
+        RETURNING f.id;
     """
+    if migrar_legacy(batch_size) is None:
+        return None
+    actualizadas = duplicadas = 0
+    ultimo_id = 0
     try:
         with _get_connection() as conn, conn.cursor() as cur:
-            cur.execute(query)
+            while True:
+                cur.execute(select, (ultimo_id, batch_size))
+                filas = cur.fetchall()
+                if not filas:
+                    break
+                ultimo_id = filas[-1][0]
+
+                por_hash: dict[str, tuple[int, datetime]] = {}
+                for factura_id, fecha, proveedor, importe, texto in filas:
+                    clave = hash_factura(proveedor, importe, texto)
+                    por_hash.setdefault(clave, (factura_id, fecha))
+                result = execute_values(
+                    cur, update, [(i, fecha, h) for h, (i, fecha) in por_hash.items()],
+                    page_size=len(por_hash), fetch=True,
+                )
+                conn.commit()
+                actualizadas += len(result)
+                duplicadas += len(filas) - len(result)
+                logger.info(
+                    "Backfill de hashes: %d actualizadas, %d duplicadas (hasta ID %s).",
+                    actualizadas, duplicadas, ultimo_id,
+                )
+    except psycopg2.Error as exc:
+        logger.exception("Error en el backfill de hashes de facturas: %s", exc)
+        return None
+    return actualizadas, duplicadas
+
+
+def get_total_gastos_mes(mes: Optional[date] = None) -> Optional[float]:
+    """Suma todos los importes de *mes* (por defecto, el mes actual).
+
+    Lee del rollup ``moltbot.gastos_mensuales``: una fila por proveedor y
+    mes, sin recorrer la tabla de facturas.
+    """
+    query = """
+        SELECT COALESCE(SUM(total), 0)
+        FROM moltbot.gastos_mensuales
+        WHERE mes = date_trunc('month', COALESCE(%s, CURRENT_DATE))::date;
+    """
+    try:
+        with _get_connection() as conn, conn.cursor() as cur:
+            cur.execute(query, (mes,))
             total = cur.fetchone()[0]
             return float(total)
     except psycopg2.Error as exc:
@@ -116,21 +408,42 @@ def get_total_gastos_mes() -> Optional[float]:
         return None
 
 
-# ---------------------------------------------------------------------------
-# n8n
-# ---------------------------------------------------------------------------
+def get_gastos_por_proveedor(mes: Optional[date] = None) -> Optional[list[tuple[str, float, int]]]:
+    """Desglose por proveedor de *mes* (por defecto, el mes actual).
 
-def get_n8n_execution_count() -> Optional[int]:
-    """Devuelve el número de ejecuciones registradas en n8n."""
+    Returns:
+        Filas ``(proveedor, total, num_facturas)`` de mayor a menor importe,
+        o ``None`` en caso de error.
+    """
+    query = """
+        SELECT proveedor, total, num_facturas
+        FROM moltbot.gastos_mensuales
+        WHERE mes = date_trunc('month', COALESCE(%s, CURRENT_DATE))::date
+        ORDER BY total DESC, proveedor;
+    """
     try:
         with _get_connection() as conn, conn.cursor() as cur:
-            cur.execute("SELECT count(*) FROM execution_entity;")
-            return cur.fetchone()[0]
+            cur.execute(query, (mes,))
+            return [(proveedor, float(total), n) for proveedor, total, n in cur.fetchall()]
     except psycopg2.Error as exc:
-        logger.exception("Error DB: %s", exc)
+        logger.exception("Error consultando gastos por proveedor: %s", exc)
         return None
 
 
+# ---------------------------------------------------------------------------
+# n8n
+# ---------------------------------------------------------------------------
+
+def get_n8n_execution_count() -> Optional[int]:
+    """Devuelve el número de ejecuciones registradas en n8n.
+
+    No hace ``count(*)``: delega en :mod:`moltbot.db.executions` (contador
+    incremental o estimación, según ``N8N_EXECUTION_STATS_MODE``).
+    """
+    stats = get_execution_stats()
+    return stats.total if stats is not None else None
+
+
 def get_workflows() -> Optional[list[tuple]]:
     """Obtiene todos los workflows de n8n (name, nodes, connections)."""
     query = "SELECT name, nodes, connections FROM workflow_entity;"
@@ -141,3 +454,41 @@ def get_workflows() -> Optional[list[tuple]]:
     except psycopg2.Error as exc:
         logger.exception("Error obteniendo workflows: %s", exc)
         return None
+
+
+def iter_workflows(
+    since: Optional[datetime] = None,
+    itersize: int = 50,
+) -> Iterator[tuple]:
+    """Recorre los workflows en streaming con un cursor de servidor.
+
+    A diferencia de :func:`get_workflows`, no carga todo el resultado en
+    memoria: el cursor con nombre trae las filas del servidor de *itersize*
+    en *itersize*. La conexión queda prestada hasta agotar el generador.
+
+    Yields:
+        Filas ``(id, name, nodes, connections, updatedAt)`` ordenadas por
+        ``updatedAt``, modificadas desde *since* (todas si es ``None``).
+
+    Raises:
+        psycopg2.Error: los errores se propagan al consumidor del generador.
+    """
+    query = 'SELECT id, name, nodes, connections, "updatedAt" FROM workflow_entity'
+    if since is not None:
+        query += ' WHERE "updatedAt" >= %s'
+    query += ' ORDER BY "updatedAt";'
+    with _get_connection() as conn, conn.cursor(name="moltbot_iter_workflows") as cur:
+        cur.itersize = itersize
+        cur.execute(query, (since,) if since is not None else None)
+        yield from cur
+
+
+def get_workflow_ids() -> Optional[set[str]]:
+    """IDs de todos los workflows existentes (para detectar borrados)."""
+    try:
+        with _get_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT id FROM workflow_entity;")
+            return {str(row[0]) for row in cur.fetchall()}
+    except psycopg2.Error as exc:
+        logger.exception("Error obteniendo IDs de workflows: %s", exc)
+        return None
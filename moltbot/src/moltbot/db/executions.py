@@ -0,0 +1,372 @@
+"""
+Estadísticas de ejecuciones de n8n sin ``count(*)`` sobre ``execution_entity``.
+
+``execution_entity`` es la tabla que más crece de n8n, así que recorrerla
+entera en cada ``status_db`` no escala. Hay dos modos:
+
+* **Estimado**: total a partir de ``pg_class.reltuples`` y desglose por
+  estado a partir de ``pg_stats`` (valores más comunes de ``status``). No
+  lee la tabla; la precisión es la del último ``ANALYZE``.
+* **Exacto incremental**: contadores persistidos en
+  ``moltbot.ejecuciones_stats`` por ``(bucket, workflow, status)``, donde el
+  bucket es ``id // N8N_EXECUTION_STATS_BUCKET``. Cada refresco:
+
+  1. Recuenta solo los buckets "calientes" (desde un bucket antes de la
+     marca de agua ``id_max`` hasta el id máximo actual): filas nuevas,
+     cambios de estado recientes y commits tardíos de ids bajos.
+  2. Revisa la *frontera*: ejecuciones más antiguas que seguían en un estado
+     no terminal (``new``, ``running``, ``waiting``…), por clave primaria.
+  3. Si n8n ha purgado ejecuciones antiguas (sube ``min(id)``) descarta los
+     buckets por debajo.
+  4. Detecta borrados en los buckets fríos: guarda el id mínimo y máximo de
+     cada bucket (``moltbot.ejecuciones_buckets``) y recuenta los buckets en
+     los que alguno de los dos ha cambiado. Son dos lecturas del índice por
+     bucket. La poda de n8n borra por antigüedad, así que se come los buckets
+     por el principio y se detecta; un borrado suelto en mitad de un bucket
+     frío no mueve sus extremos y queda contado hasta que el bucket cambie
+     (la deriva está acotada por esos borrados manuales).
+
+  El coste de un refresco depende de las filas nuevas, del tamaño de un
+  bucket y del número de buckets (no de filas) del histórico. Un
+  ``pg_advisory_xact_lock`` evita que dos workers refresquen a la vez.
+
+Usa ``id`` (clave primaria, indexada) como marca de agua en lugar de
+``startedAt``, que puede ser nulo en ejecuciones encoladas.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator, Optional
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from moltbot.config import settings
+from moltbot.db.pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+_pg = settings.postgres
+
+# Estados finales de una ejecución de n8n; el resto pueden cambiar todavía.
+ESTADOS_TERMINALES = ("success", "error", "canceled", "crashed")
+
+# Clave del advisory lock del refresco ("molt").
+_LOCK_KEY = 0x6D6F6C74
+
+# Tablas de ``moltbot`` con una fila (o varias) por bucket.
+_TABLAS_BUCKETS = ("ejecuciones_stats", "ejecuciones_frontera", "ejecuciones_buckets")
+
+
+@dataclass(frozen=True)
+class ExecutionStats:
+    """Resumen de ejecuciones de n8n."""
+
+    total: int
+    exacto: bool
+    por_estado: dict[str, int] = field(default_factory=dict)
+    # (workflow_id, nombre, ejecuciones), de más a menos ejecuciones.
+    por_workflow: list[tuple[str, Optional[str], int]] = field(default_factory=list)
+    actualizado: Optional[datetime] = None
+
+
+# ---------------------------------------------------------------------------
+# Modo estimado
+# ---------------------------------------------------------------------------
+
+def estimate_execution_stats() -> Optional[ExecutionStats]:
+    """Estimación a partir de las estadísticas del planner (sin leer la tabla).
+
+    Returns:
+        La estimación, o ``None`` si hay error o la tabla aún no se ha analizado.
+    """
+    query = """
+        SELECT c.reltuples::bigint, s.most_common_vals::text::text[], s.most_common_freqs
+        FROM pg_class c
+        JOIN pg_namespace ns ON ns.oid = c.relnamespace
+        LEFT JOIN pg_stats s
+            ON s.schemaname = ns.nspname AND s.tablename = c.relname AND s.attname = 'status'
+        WHERE c.oid = to_regclass('execution_entity');
+    """
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute(query)
+            row = cur.fetchone()
+    except psycopg2.Error as exc:
+        logger.exception("Error estimando ejecuciones: %s", exc)
+        return None
+
+    # reltuples = -1: la tabla nunca se ha analizado (PostgreSQL 14+).
+    if row is None or row[0] < 0:
+        return None
+    total, valores, frecuencias = row
+    por_estado = {
+        valor: round(freq * total)
+        for valor, freq in zip(valores or [], frecuencias or [])
+    }
+    return ExecutionStats(total=total, exacto=False, por_estado=por_estado)
+
+
+# ---------------------------------------------------------------------------
+# Modo exacto incremental
+# ---------------------------------------------------------------------------
+
+def _recount(cur, bucket_desde: int, bucket_hasta: int, id_max: int) -> None:
+    """Recalcula desde cero los buckets ``[bucket_desde, bucket_hasta]``."""
+    size = _pg.execution_stats_bucket
+    params = {
+        "size": size,
+        "desde": bucket_desde,
+        "hasta": bucket_hasta,
+        "lo": bucket_desde * size,
+        "hi": min(id_max, (bucket_hasta + 1) * size - 1),
+        "terminales": ESTADOS_TERMINALES,
+    }
+    cur.execute(
+        "DELETE FROM moltbot.ejecuciones_stats WHERE bucket BETWEEN %(desde)s AND %(hasta)s;",
+        params,
+    )
+    cur.execute(
+        "DELETE FROM moltbot.ejecuciones_frontera WHERE bucket BETWEEN %(desde)s AND %(hasta)s;",
+        params,
+    )
+    cur.execute(
+        "DELETE FROM moltbot.ejecuciones_buckets WHERE bucket BETWEEN %(desde)s AND %(hasta)s;",
+        params,
+    )
+    cur.execute(
+        """
+        INSERT INTO moltbot.ejecuciones_buckets (bucket, id_min, id_max)
+        SELECT id / %(size)s, min(id), max(id)
+        FROM execution_entity
+        WHERE id BETWEEN %(lo)s AND %(hi)s
+        GROUP BY 1;
+        """,
+        params,
+    )
+    cur.execute(
+        """
+        INSERT INTO moltbot.ejecuciones_stats (bucket, workflow_id, status, n)
+        SELECT id / %(size)s, COALESCE("workflowId", ''), COALESCE(status, 'unknown'), count(*)
+        FROM execution_entity
+        WHERE id BETWEEN %(lo)s AND %(hi)s
+        GROUP BY 1, 2, 3;
+        """,
+        params,
+    )
+    cur.execute(
+        """
+        INSERT INTO moltbot.ejecuciones_frontera (id, bucket, workflow_id, status)
+        SELECT id, id / %(size)s, COALESCE("workflowId", ''), COALESCE(status, 'unknown')
+        FROM execution_entity
+        WHERE id BETWEEN %(lo)s AND %(hi)s
+          AND (status IS NULL OR status NOT IN %(terminales)s);
+        """,
+        params,
+    )
+
+
+def _refresh_frontera(cur, id_limite: int) -> None:
+    """Aplica los cambios de estado de las ejecuciones no terminales antiguas."""
+    cur.execute(
+        """
+        SELECT f.id, f.bucket, f.workflow_id, f.status,
+               COALESCE(e.status, 'unknown'), e.id IS NULL
+        FROM moltbot.ejecuciones_frontera f
+        LEFT JOIN execution_entity e ON e.id = f.id
+        WHERE f.id < %s;
+        """,
+        (id_limite,),
+    )
+    deltas: Counter[tuple[int, str, str]] = Counter()
+    salen: list[int] = []
+    cambian: list[tuple[int, str]] = []
+    for exec_id, bucket, workflow_id, antes, ahora, borrada in cur.fetchall():
+        if not borrada and ahora == antes:
+            continue
+        deltas[(bucket, workflow_id, antes)] -= 1
+        if borrada:
+            salen.append(exec_id)
+            continue
+        deltas[(bucket, workflow_id, ahora)] += 1
+        if ahora in ESTADOS_TERMINALES:
+            salen.append(exec_id)
+        else:
+            cambian.append((exec_id, ahora))
+
+    if deltas:
+        execute_values(
+            cur,
+            """
+            INSERT INTO moltbot.ejecuciones_stats AS s (bucket, workflow_id, status, n)
+            VALUES %s
+            ON CONFLICT (bucket, workflow_id, status) DO UPDATE SET n = s.n + EXCLUDED.n;
+            """,
+            [(b, wf, st, n) for (b, wf, st), n in deltas.items() if n],
+        )
+    if salen:
+        cur.execute("DELETE FROM moltbot.ejecuciones_frontera WHERE id = ANY(%s);", (salen,))
+    if cambian:
+        execute_values(
+            cur,
+            """
+            UPDATE moltbot.ejecuciones_frontera AS f SET status = v.status
+            FROM (VALUES %s) AS v (id, status)
+            WHERE f.id = v.id;
+            """,
+            cambian,
+        )
+
+
+def _buckets_con_borrados(cur, desde: int, hasta: int) -> list[int]:
+    """Buckets de ``[desde, hasta]`` cuyos ids mínimo o máximo han cambiado.
+
+    Un bucket sin fila en ``ejecuciones_buckets`` (anterior a la migración 7)
+    también sale, salvo que esté vacío.
+    """
+    size = _pg.execution_stats_bucket
+    cur.execute(
+        """
+        SELECT b.bucket
+        FROM generate_series(%(desde)s::bigint, %(hasta)s::bigint) AS b (bucket)
+        LEFT JOIN moltbot.ejecuciones_buckets r ON r.bucket = b.bucket
+        CROSS JOIN LATERAL (
+            SELECT min(e.id) AS id_min, max(e.id) AS id_max
+            FROM execution_entity e
+            WHERE e.id >= b.bucket * %(size)s AND e.id < (b.bucket + 1) * %(size)s
+        ) AS a
+        WHERE a.id_min IS DISTINCT FROM r.id_min OR a.id_max IS DISTINCT FROM r.id_max
+        ORDER BY 1;
+        """,
+        {"desde": desde, "hasta": hasta, "size": size},
+    )
+    return [bucket for (bucket,) in cur.fetchall()]
+
+
+def _rangos(buckets: list[int]) -> Iterator[tuple[int, int]]:
+    """Agrupa buckets ordenados en rangos consecutivos ``(desde, hasta)``."""
+    if not buckets:
+        return
+    desde = hasta = buckets[0]
+    for bucket in buckets[1:]:
+        if bucket != hasta + 1:
+            yield desde, hasta
+            desde = bucket
+        hasta = bucket
+    yield desde, hasta
+
+
+def _refresh(cur) -> None:
+    """Pone al día los contadores exactos (dentro de la transacción de *cur*)."""
+    size = _pg.execution_stats_bucket
+    cur.execute("SELECT id_min, id_max FROM moltbot.ejecuciones_estado;")
+    estado = cur.fetchone()
+    # min/max sobre la clave primaria: dos lecturas del índice.
+    cur.execute("SELECT min(id), max(id) FROM execution_entity;")
+    nuevo_min, nuevo_max = cur.fetchone()
+
+    if nuevo_max is None:
+        for tabla in _TABLAS_BUCKETS:
+            cur.execute(f"DELETE FROM moltbot.{tabla};")
+        nuevo_min = nuevo_max = 0
+    elif estado is None or nuevo_max < estado[0]:
+        # Primera vez (o tabla recreada): recuento completo, una sola vez.
+        logger.info("Inicializando estadísticas exactas de ejecuciones…")
+        for tabla in _TABLAS_BUCKETS:
+            cur.execute(f"DELETE FROM moltbot.{tabla};")
+        _recount(cur, nuevo_min // size, nuevo_max // size, nuevo_max)
+    else:
+        id_min, id_max = estado
+        caliente = max(0, id_max - size) // size
+        primero = nuevo_min // size
+        if nuevo_min > id_min:
+            # Purga de n8n: fuera los buckets enteros por debajo del nuevo mínimo.
+            for tabla in _TABLAS_BUCKETS:
+                cur.execute(f"DELETE FROM moltbot.{tabla} WHERE bucket < %s;", (primero,))
+        # El bucket del nuevo mínimo, si es frío, sale aquí (su mínimo ha subido).
+        for desde, hasta in _rangos(_buckets_con_borrados(cur, primero, caliente - 1)):
+            _recount(cur, desde, hasta, nuevo_max)
+        _refresh_frontera(cur, caliente * size)
+        _recount(cur, caliente, max(caliente, nuevo_max // size, id_max // size), nuevo_max)
+
+    cur.execute(
+        """
+        INSERT INTO moltbot.ejecuciones_estado (singleton, id_min, id_max, actualizado)
+        VALUES (TRUE, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (singleton) DO UPDATE
+            SET id_min = EXCLUDED.id_min,
+                id_max = EXCLUDED.id_max,
+                actualizado = EXCLUDED.actualizado;
+        """,
+        (nuevo_min, nuevo_max),
+    )
+
+
+def refresh_execution_stats(top_workflows: int = 10) -> Optional[ExecutionStats]:
+    """Refresca los contadores exactos y devuelve el resumen.
+
+    Si otro proceso está refrescando en ese momento, devuelve los contadores
+    ya persistidos sin esperar.
+    """
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s);", (_LOCK_KEY,))
+            if cur.fetchone()[0]:
+                _refresh(cur)
+            conn.commit()
+
+            cur.execute(
+                """
+                SELECT status, sum(n)
+                FROM moltbot.ejecuciones_stats
+                GROUP BY status
+                HAVING sum(n) > 0
+                ORDER BY 2 DESC;
+                """
+            )
+            por_estado = {status: int(n) for status, n in cur.fetchall()}
+            cur.execute(
+                """
+                SELECT s.workflow_id, w.name, sum(s.n) AS total
+                FROM moltbot.ejecuciones_stats s
+                LEFT JOIN workflow_entity w ON w.id::text = s.workflow_id
+                GROUP BY s.workflow_id, w.name
+                HAVING sum(s.n) > 0
+                ORDER BY total DESC
+                LIMIT %s;
+                """,
+                (top_workflows,),
+            )
+            por_workflow = [(wf_id, name, int(n)) for wf_id, name, n in cur.fetchall()]
+            cur.execute("SELECT actualizado FROM moltbot.ejecuciones_estado;")
+            row = cur.fetchone()
+            return ExecutionStats(
+                total=sum(por_estado.values()),
+                exacto=True,
+                por_estado=por_estado,
+                por_workflow=por_workflow,
+                actualizado=row[0] if row else None,
+            )
+    except psycopg2.Error as exc:
+        logger.exception("Error refrescando estadísticas de ejecuciones: %s", exc)
+        return None
+
+
+def get_execution_stats(exacto: Optional[bool] = None) -> Optional[ExecutionStats]:
+    """Estadísticas de ejecuciones según ``N8N_EXECUTION_STATS_MODE``.
+
+    Args:
+        exacto: fuerza un modo; por defecto el configurado. El modo estimado
+            recurre al exacto si la tabla aún no tiene estadísticas.
+    """
+    if exacto is None:
+        exacto = _pg.execution_stats_mode != "estimated"
+    if not exacto:
+        stats = estimate_execution_stats()
+        if stats is not None:
+            return stats
+    return refresh_execution_stats()
@@ -0,0 +1,112 @@
+"""
+Avisos de escritura entre procesos (``LISTEN``/``NOTIFY``).
+
+Los listeners de :func:`moltbot.db.engine.add_write_listener` (la caché de
+respuestas de los comandos) solo se enteraban de las escrituras de su propio
+proceso: con varios workers, ``!gastos`` podía responder con datos de hasta
+un TTL de antigüedad si la factura la había guardado otro worker.
+
+La migración 6 añade un trigger sobre ``moltbot.gastos_mensuales`` que hace
+``pg_notify`` en el canal ``moltbot_escrituras`` con la tabla lógica
+(``facturas``) cuando cambia el rollup. PostgreSQL entrega el aviso al hacer
+commit (y agrupa los repetidos de una misma transacción), así que cubre
+también las escrituras del importador o de otros procesos.
+
+Cada proceso que atiende comandos mantiene un hilo con una conexión propia
+(fuera del pool, porque queda en ``LISTEN``) que reenvía los avisos a los
+listeners locales mediante :func:`moltbot.db.engine.notify_write`. Si la
+conexión se pierde, al reconectar se invalida todo, porque pudo perderse
+algún aviso.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import select
+import threading
+from typing import Optional
+
+import psycopg2
+
+from moltbot.db.engine import TABLA_FACTURAS, notify_write
+from moltbot.db.pool import connect_kwargs
+
+logger = logging.getLogger(__name__)
+
+CANAL = "moltbot_escrituras"
+
+# Tablas lógicas que se invalidan enteras al (re)conectar.
+_TABLAS = (TABLA_FACTURAS,)
+
+# Espera entre reintentos de conexión y cadencia con la que el hilo revisa si
+# debe parar.
+_REINTENTO = 5.0
+_POLL = 1.0
+
+
+def _escuchar(stop: threading.Event) -> None:
+    """Bucle del hilo: ``LISTEN`` y reenvío de avisos hasta que se pida parar."""
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(**connect_kwargs())
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CANAL};")
+            logger.info("Escuchando avisos de escritura en '%s'.", CANAL)
+            # Lo escrito mientras no escuchábamos no llegó a avisarse.
+            for tabla in _TABLAS:
+                notify_write(tabla)
+            while not stop.is_set():
+                if not select.select([conn], [], [], _POLL)[0]:
+                    continue
+                conn.poll()
+                tablas = {aviso.payload for aviso in conn.notifies}
+                conn.notifies.clear()
+                for tabla in tablas:
+                    notify_write(tabla)
+        except (psycopg2.Error, OSError) as exc:
+            logger.warning(
+                "Sin avisos de escritura entre procesos (%s); se reintenta en %.0fs.",
+                exc, _REINTENTO,
+            )
+            stop.wait(_REINTENTO)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Instancia global (una por proceso)
+# ---------------------------------------------------------------------------
+
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def start_write_listener() -> None:
+    """Arranca el hilo que reenvía los avisos de otros procesos (si no está ya)."""
+    global _thread, _stop, _pid
+    with _lock:
+        if _thread is not None and _pid == os.getpid() and _thread.is_alive():
+            return
+        _stop = threading.Event()
+        _thread = threading.Thread(
+            target=_escuchar, args=(_stop,), name="moltbot-db-listen", daemon=True,
+        )
+        _thread.start()
+        _pid = os.getpid()
+
+
+def stop_write_listener(timeout: float = 5.0) -> None:
+    """Detiene el hilo de avisos del proceso (si existe)."""
+    global _thread, _pid
+    with _lock:
+        thread, same_pid = _thread, _pid == os.getpid()
+        _thread, _pid = None, None
+        _stop.set()
+    if thread is not None and same_pid:
+        thread.join(timeout)
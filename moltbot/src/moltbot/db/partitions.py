@@ -0,0 +1,697 @@
+"""
+Particionado mensual de ``moltbot.facturas_gastos``.
+
+La tabla de facturas está particionada por rango sobre ``fecha_registro``,
+una partición por mes (``moltbot.facturas_gastos_AAAA_MM``) más una
+partición ``DEFAULT`` de seguridad que debería estar siempre vacía. Así:
+
+* Las consultas acotadas a un mes (``fecha_registro >= X AND < Y``) solo
+  leen su partición, y el autovacuum trabaja partición a partición.
+* Los inserts van a la partición del mes actual, cuyo tamaño no crece con
+  el histórico.
+* La retención es barata: una partición antigua se desconecta de golpe
+  (``DETACH PARTITION``) en lugar de borrar filas. No puede ser
+  ``CONCURRENTLY`` porque PostgreSQL no lo admite con partición DEFAULT, así
+  que el ``DETACH`` espera el lock como mucho ``_DETACH_LOCK_TIMEOUT`` (los
+  inserts esperan detrás mientras tanto) y, si no lo obtiene, lo reintenta
+  el siguiente mantenimiento.
+
+Un índice único sobre una tabla particionada tiene que incluir la clave de
+partición, así que la deduplicación por hash de contenido vive en una tabla
+aparte, ``moltbot.facturas_hashes`` (ver ``INSERT_FACTURAS_SQL``).
+
+Migración de una base de datos existente (migración 5 del esquema):
+
+1. ``setup_db`` renombra la tabla antigua a ``facturas_gastos_legacy``, crea
+   la tabla particionada y copia los hashes a ``facturas_hashes``. Desde ese
+   momento las facturas nuevas ya se insertan en la tabla particionada.
+2. :func:`migrar_legacy` mueve las filas antiguas por lotes (una
+   transacción corta por lote, conservando los IDs) y borra la tabla antigua
+   al terminar. La lanza el propio mantenimiento con el bot en marcha; para
+   hacerlo de inmediato, ``moltbot partitions migrate``. Hasta entonces esas
+   filas no aparecen en ``facturas_gastos`` (ni las ve el backfill de
+   hashes), así que cada arranque lo avisa en el log.
+
+Mantenimiento (:func:`mantener_particiones`, al arrancar y cada
+``FACTURA_PARTITION_MAINTENANCE_HOURS``):
+
+* Mueve a las particiones las filas que queden en la tabla antigua.
+* Crea las particiones de los próximos ``FACTURA_PARTITIONS_AHEAD`` meses.
+* Archiva el ``texto_original`` de las particiones con más de
+  ``FACTURA_ARCHIVE_TEXT_MONTHS`` meses en
+  ``<BACKUP_OUTPUT_FOLDER>/<FACTURA_ARCHIVE_DIR>/facturas_AAAA_MM.jsonl.gz``
+  y lo deja a ``NULL`` en la base de datos (proveedor, importe y fecha se
+  conservan). ``moltbot.facturas_archivadas`` guarda hasta qué ID se ha
+  archivado cada partición, así que las ya archivadas no se vuelven a
+  recorrer.
+* Desconecta las particiones con más de ``FACTURA_RETENTION_MONTHS`` meses:
+  la tabla sigue existiendo (para consultarla, exportarla o borrarla a
+  mano), pero deja de formar parte de ``facturas_gastos``. Los totales de
+  ``gastos_mensuales`` no cambian.
+
+Ambos umbrales valen 0 por defecto (desactivados).
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import sql
+
+from moltbot.config import settings
+from moltbot.db.pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+_cfg = settings.invoices
+
+# Clave del advisory lock del mantenimiento de particiones ("mpart").
+_LOCK_KEY = 0x6D70617274
+
+_NOMBRE_RE = re.compile(r"^facturas_gastos_(\d{4})_(\d{2})$")
+
+# Espera máxima por el lock de un ``DETACH PARTITION``: mientras espera, los
+# inserts en ``facturas_gastos`` se encolan detrás de él.
+_DETACH_LOCK_TIMEOUT = "1s"
+
+
+@dataclass(frozen=True)
+class Particion:
+    """Partición conectada a ``facturas_gastos``."""
+
+    nombre: str
+    # Primer día del mes, o ``None`` para la partición DEFAULT.
+    mes: Optional[date]
+    # Estimación de ``pg_class.reltuples`` (-1 si nunca se ha analizado).
+    filas: int
+
+
+# ---------------------------------------------------------------------------
+# Meses
+# ---------------------------------------------------------------------------
+
+def inicio_mes(dia: date) -> date:
+    """Primer día del mes de *dia*."""
+    return date(dia.year, dia.month, 1)
+
+
+def sumar_meses(mes: date, n: int) -> date:
+    """Primer día del mes que está *n* meses después (o antes) de *mes*."""
+    indice = mes.year * 12 + mes.month - 1 + n
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def rango_mes(mes: date) -> tuple[date, date]:
+    """``(desde, hasta)`` semiabierto del mes de *mes*, tal como lo usa su partición.
+
+    Las consultas con ``fecha_registro >= desde AND fecha_registro < hasta``
+    solo leen una partición.
+    """
+    desde = inicio_mes(mes)
+    return desde, sumar_meses(desde, 1)
+
+
+def nombre_particion(mes: date) -> str:
+    """Nombre de la partición del mes (``facturas_gastos_AAAA_MM``)."""
+    return f"facturas_gastos_{mes.year:04d}_{mes.month:02d}"
+
+
+# ---------------------------------------------------------------------------
+# DDL
+# ---------------------------------------------------------------------------
+
+def _particiones(cur) -> list[Particion]:
+    cur.execute(
+        """
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'moltbot.facturas_gastos'::regclass
+        ORDER BY c.relname;
+        """
+    )
+    particiones = []
+    for nombre, filas in cur.fetchall():
+        match = _NOMBRE_RE.match(nombre)
+        mes = date(int(match[1]), int(match[2]), 1) if match else None
+        particiones.append(Particion(nombre, mes, filas))
+    return particiones
+
+
+def crear_particion(cur, mes: date) -> bool:
+    """Crea la partición de *mes* si no existe.
+
+    Si la partición DEFAULT tiene filas de ese mes (PostgreSQL no deja crear
+    la partición en ese caso), se crean aparte, se mueven a ella en la misma
+    transacción y después se conecta.
+
+    Returns:
+        ``True`` si se ha creado. Si ya existe una tabla con ese nombre (p.
+        ej. una partición desconectada por la retención) no se toca.
+    """
+    nombre = nombre_particion(mes)
+    cur.execute("SELECT to_regclass(%s) IS NULL;", (f"moltbot.{nombre}",))
+    if not cur.fetchone()[0]:
+        return False
+    desde, hasta = rango_mes(mes)
+    valores = {
+        "tabla": sql.Identifier("moltbot", nombre),
+        "desde": sql.Literal(desde.isoformat()),
+        "hasta": sql.Literal(hasta.isoformat()),
+    }
+    cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM moltbot.facturas_gastos_default "
+        "WHERE fecha_registro >= %s AND fecha_registro < %s);",
+        (desde, hasta),
+    )
+    if not cur.fetchone()[0]:
+        cur.execute(
+            sql.SQL(
+                "CREATE TABLE {tabla} PARTITION OF moltbot.facturas_gastos "
+                "FOR VALUES FROM ({desde}) TO ({hasta});"
+            ).format(**valores),
+        )
+        logger.info("Partición %s creada.", nombre)
+        return True
+
+    cur.execute(
+        sql.SQL(
+            "CREATE TABLE {tabla} "
+            "(LIKE moltbot.facturas_gastos INCLUDING DEFAULTS INCLUDING CONSTRAINTS);"
+        ).format(**valores),
+    )
+    cur.execute(
+        sql.SQL(
+            """
+            WITH movidas AS (
+                DELETE FROM moltbot.facturas_gastos_default
+                WHERE fecha_registro >= {desde} AND fecha_registro < {hasta}
+                RETURNING id, proveedor, importe, fecha_registro, texto_original, hash_contenido
+            )
+            INSERT INTO {tabla}
+                (id, proveedor, importe, fecha_registro, texto_original, hash_contenido)
+            SELECT * FROM movidas;
+            """
+        ).format(**valores),
+    )
+    movidas = cur.rowcount
+    cur.execute(
+        sql.SQL(
+            "ALTER TABLE moltbot.facturas_gastos ATTACH PARTITION {tabla} "
+            "FOR VALUES FROM ({desde}) TO ({hasta});"
+        ).format(**valores),
+    )
+    logger.warning(
+        "Partición %s creada con %d facturas que estaban en la partición DEFAULT.",
+        nombre, movidas,
+    )
+    return True
+
+
+def _crear_futuras(cur, meses_adelante: int, hoy: Optional[date] = None) -> int:
+    actual = inicio_mes(hoy or date.today())
+    return sum(
+        crear_particion(cur, sumar_meses(actual, n)) for n in range(max(0, meses_adelante) + 1)
+    )
+
+
+def particionar_facturas(cur) -> None:
+    """Migración 5: convierte ``facturas_gastos`` en una tabla particionada por mes.
+
+    Solo hace DDL y copia los hashes de contenido; las filas existentes se
+    quedan en ``facturas_gastos_legacy`` hasta que :func:`migrar_legacy` las
+    mueve. Los IDs siguen saliendo de la misma secuencia.
+    """
+    cur.execute(
+        "SELECT relkind FROM pg_class WHERE oid = 'moltbot.facturas_gastos'::regclass;",
+    )
+    if cur.fetchone()[0] == "p":
+        return
+
+    for paso in (
+        "ALTER TABLE moltbot.facturas_gastos RENAME TO facturas_gastos_legacy;",
+        "ALTER INDEX moltbot.facturas_gastos_pkey RENAME TO facturas_gastos_legacy_pkey;",
+        """
+        ALTER INDEX IF EXISTS moltbot.facturas_gastos_fecha_registro_idx
+            RENAME TO facturas_gastos_legacy_fecha_registro_idx;
+        """,
+        """
+        ALTER INDEX IF EXISTS moltbot.facturas_gastos_hash_contenido_idx
+            RENAME TO facturas_gastos_legacy_hash_contenido_idx;
+        """,
+        """
+        CREATE TABLE moltbot.facturas_gastos (
+            id INTEGER NOT NULL DEFAULT nextval('moltbot.facturas_gastos_id_seq'),
+            proveedor VARCHAR(50) NOT NULL,
+            importe DECIMAL(10, 2) NOT NULL,
+            fecha_registro TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            texto_original TEXT,
+            hash_contenido CHAR(64),
+            PRIMARY KEY (id, fecha_registro)
+        ) PARTITION BY RANGE (fecha_registro);
+        """,
+        # La secuencia pasa a la tabla nueva para que sobreviva al borrar la antigua.
+        "ALTER SEQUENCE moltbot.facturas_gastos_id_seq OWNED BY moltbot.facturas_gastos.id;",
+        """
+        CREATE INDEX facturas_gastos_fecha_registro_idx
+            ON moltbot.facturas_gastos (fecha_registro);
+        """,
+        """
+        CREATE TABLE moltbot.facturas_gastos_default
+            PARTITION OF moltbot.facturas_gastos DEFAULT;
+        """,
+        """
+        CREATE TABLE moltbot.facturas_hashes (
+            hash_contenido CHAR(64) PRIMARY KEY,
+            fecha_registro TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        # Único paso que recorre la tabla antigua: los hashes tienen que estar
+        # antes del primer insert para que la deduplicación no tenga huecos.
+        """
+        INSERT INTO moltbot.facturas_hashes (hash_contenido, fecha_registro)
+        SELECT hash_contenido, COALESCE(fecha_registro, CURRENT_TIMESTAMP)
+        FROM moltbot.facturas_gastos_legacy
+        WHERE hash_contenido IS NOT NULL;
+        """,
+    ):
+        cur.execute(paso)
+    logger.info("Hashes de %d facturas copiados a facturas_hashes.", cur.rowcount)
+    _crear_futuras(cur, _cfg.partitions_ahead)
+
+    cur.execute("SELECT EXISTS (SELECT 1 FROM moltbot.facturas_gastos_legacy);")
+    if cur.fetchone()[0]:
+        logger.warning(
+            "Facturas existentes en moltbot.facturas_gastos_legacy: "
+            "ejecuta 'moltbot partitions migrate' para moverlas a las particiones.",
+        )
+    else:
+        cur.execute("DROP TABLE moltbot.facturas_gastos_legacy;")
+
+
+# ---------------------------------------------------------------------------
+# Migración de las filas antiguas
+# ---------------------------------------------------------------------------
+
+_MOVER_SQL = """
+    WITH movidas AS (
+        DELETE FROM moltbot.facturas_gastos_legacy
+        WHERE id = ANY(%s)
+        RETURNING id, proveedor, importe, fecha_registro, texto_original, hash_contenido
+    )
+    INSERT INTO moltbot.facturas_gastos
+        (id, proveedor, importe, fecha_registro, texto_original, hash_contenido)
+    SELECT id, proveedor, importe, COALESCE(fecha_registro, 'epoch'), texto_original,
+           hash_contenido
+    FROM movidas;
+"""
+
+
+def migrar_legacy(batch_size: int = 1000) -> Optional[int]:
+    """Mueve las facturas de ``facturas_gastos_legacy`` a la tabla particionada.
+
+    Recorre la tabla antigua por lotes (keyset sobre ``id``). Cada lote crea
+    las particiones de sus meses y mueve las filas en una transacción corta,
+    así que el bot puede seguir insertando mientras tanto. Al vaciarse, la
+    tabla antigua se borra. Se puede interrumpir y volver a lanzar.
+
+    Returns:
+        Número de facturas movidas, o ``None`` en caso de error.
+    """
+    movidas = 0
+    ultimo_id = 0
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            while True:
+                cur.execute("SELECT to_regclass('moltbot.facturas_gastos_legacy') IS NULL;")
+                if cur.fetchone()[0]:
+                    conn.rollback()
+                    break
+                cur.execute("SELECT pg_advisory_xact_lock(%s);", (_LOCK_KEY,))
+                cur.execute(
+                    """
+                    SELECT id, date_trunc('month', COALESCE(fecha_registro, 'epoch'))::date
+                    FROM moltbot.facturas_gastos_legacy
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s;
+                    """,
+                    (ultimo_id, batch_size),
+                )
+                filas = cur.fetchall()
+                if not filas:
+                    cur.execute("DROP TABLE moltbot.facturas_gastos_legacy;")
+                    conn.commit()
+                    logger.info("Migración a particiones completada: tabla antigua borrada.")
+                    break
+
+                for mes in sorted({mes for _, mes in filas}):
+                    crear_particion(cur, mes)
+                ids = [factura_id for factura_id, _ in filas]
+                cur.execute(_MOVER_SQL, (ids,))
+                # Sus IDs son anteriores a lo ya archivado en esos meses.
+                cur.execute(
+                    "DELETE FROM moltbot.facturas_archivadas WHERE particion = ANY(%s);",
+                    ([nombre_particion(mes) for _, mes in filas],),
+                )
+                conn.commit()
+                ultimo_id = ids[-1]
+                movidas += len(ids)
+                logger.info(
+                    "Migración a particiones: %d facturas movidas (hasta ID %s).",
+                    movidas, ultimo_id,
+                )
+    except psycopg2.Error as exc:
+        logger.exception("Error migrando facturas a particiones: %s", exc)
+        return None
+    return movidas
+
+
+# ---------------------------------------------------------------------------
+# Retención
+# ---------------------------------------------------------------------------
+
+def _archivar_textos(
+    conn, particion: Particion, carpeta: Path, batch_size: int,
+) -> int:
+    """Pasa a gzip el ``texto_original`` de *particion* y lo deja a ``NULL``.
+
+    Cada lote se escribe (en modo append: un miembro gzip más) antes del
+    commit que borra los textos, de modo que un fallo a medias como mucho
+    duplica líneas en el archivo, nunca pierde textos.
+
+    Solo recorre las facturas con ID posterior al último archivado de la
+    partición (``moltbot.facturas_archivadas``), que se actualiza al
+    terminar: en las ya archivadas cuesta una búsqueda en el índice.
+    """
+    tabla = sql.Identifier("moltbot", particion.nombre)
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT ultimo_id FROM moltbot.facturas_archivadas WHERE particion = %s;",
+            (particion.nombre,),
+        )
+        fila = cur.fetchone()
+        desde = fila[0] if fila else 0
+        cur.execute(sql.SQL("SELECT max(id) FROM {tabla};").format(tabla=tabla))
+        hasta = cur.fetchone()[0]
+    conn.rollback()
+    if hasta is None or hasta <= desde:
+        return 0
+
+    update = sql.SQL(
+        """
+        UPDATE {tabla} AS f
+        SET texto_original = NULL
+        FROM (
+            SELECT id, texto_original FROM {tabla}
+            WHERE id > %s AND id <= %s AND texto_original IS NOT NULL
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE
+        ) AS antes
+        WHERE f.id = antes.id
+        RETURNING f.id, f.fecha_registro, f.proveedor, f.importe, f.hash_contenido,
+                  antes.texto_original;
+        """
+    ).format(tabla=tabla)
+
+    carpeta.mkdir(parents=True, exist_ok=True)
+    path = carpeta / f"{particion.nombre.replace('facturas_gastos_', 'facturas_')}.jsonl.gz"
+    archivadas = 0
+    with conn.cursor() as cur:
+        while True:
+            cur.execute(update, (desde, hasta, batch_size))
+            filas = cur.fetchall()
+            if not filas:
+                break
+            with gzip.open(path, "at", encoding="utf-8") as fh:
+                for factura_id, fecha, proveedor, importe, hash_contenido, texto in filas:
+                    fh.write(json.dumps({
+                        "id": factura_id,
+                        "fecha_registro": fecha.isoformat(),
+                        "proveedor": proveedor,
+                        "importe": str(importe),
+                        "hash_contenido": hash_contenido,
+                        "texto_original": texto,
+                    }, ensure_ascii=False) + "\n")
+            conn.commit()
+            archivadas += len(filas)
+            desde = max(fila[0] for fila in filas)
+        cur.execute(
+            """
+            INSERT INTO moltbot.facturas_archivadas (particion, ultimo_id) VALUES (%s, %s)
+            ON CONFLICT (particion) DO UPDATE
+                SET ultimo_id = EXCLUDED.ultimo_id, actualizado = CURRENT_TIMESTAMP;
+            """,
+            (particion.nombre, hasta),
+        )
+        conn.commit()
+    if archivadas:
+        logger.info("%d textos de %s archivados en %s.", archivadas, particion.nombre, path)
+    return archivadas
+
+
+@contextmanager
+def _autocommit(conn) -> Iterator[None]:
+    """Pone *conn* en autocommit durante el bloque (sin transacción abierta)."""
+    conn.autocommit = True
+    try:
+        yield
+    finally:
+        conn.autocommit = False
+
+
+def _desconectar(cur, particion: Particion) -> bool:
+    """Desconecta *particion* de ``facturas_gastos`` (la conexión debe estar en autocommit).
+
+    El ``DETACH`` necesita un lock exclusivo sobre ``facturas_gastos``
+    (``CONCURRENTLY`` no se admite con partición DEFAULT). Lo espera como
+    mucho ``_DETACH_LOCK_TIMEOUT`` para no dejar los inserts encolados
+    detrás de una transacción larga.
+
+    Returns:
+        ``True`` si se ha desconectado; ``False`` si no se obtuvo el lock (se
+        reintenta en la siguiente pasada del mantenimiento).
+    """
+    detach = sql.SQL("ALTER TABLE moltbot.facturas_gastos DETACH PARTITION {}").format(
+        sql.Identifier("moltbot", particion.nombre),
+    )
+    cur.execute("SET lock_timeout = %s;", (_DETACH_LOCK_TIMEOUT,))
+    try:
+        cur.execute(detach + sql.SQL(";"))
+    except psycopg2.errors.LockNotAvailable:
+        logger.warning(
+            "Partición %s ocupada: se desconectará en el siguiente mantenimiento.",
+            particion.nombre,
+        )
+        return False
+    finally:
+        cur.execute("RESET lock_timeout;")
+    return True
+
+
+def aplicar_retencion(
+    hoy: Optional[date] = None,
+    retention_months: int = _cfg.retention_months,
+    archive_text_months: int = _cfg.archive_text_months,
+    batch_size: int = 1000,
+) -> Optional[tuple[int, int]]:
+    """Archiva textos y desconecta particiones antiguas según la configuración.
+
+    Un mes cuenta como antiguo cuando empezó hace más de *N* meses: con
+    ``retention_months=12``, en octubre de 2026 se desconecta septiembre
+    de 2025 y anteriores. La partición del mes actual nunca se toca.
+
+    Returns:
+        ``(textos_archivados, particiones_desconectadas)``, o ``None`` en
+        caso de error.
+    """
+    actual = inicio_mes(hoy or date.today())
+    carpeta = Path(settings.backup.output_folder) / _cfg.archive_dir
+    archivados = desconectadas = 0
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                todas = _particiones(cur)
+            conn.rollback()
+            particiones = [p for p in todas if p.mes is not None]
+
+            if archive_text_months > 0:
+                limite = sumar_meses(actual, -archive_text_months)
+                for particion in particiones:
+                    if particion.mes < limite:
+                        archivados += _archivar_textos(conn, particion, carpeta, batch_size)
+
+            if retention_months > 0:
+                limite = sumar_meses(actual, -retention_months)
+                with _autocommit(conn), conn.cursor() as cur:
+                    for particion in particiones:
+                        if particion.mes >= limite:
+                            continue
+                        if _desconectar(cur, particion):
+                            desconectadas += 1
+                            logger.info(
+                                "Partición %s desconectada (retención de %d meses).",
+                                particion.nombre, retention_months,
+                            )
+    except (psycopg2.Error, OSError) as exc:
+        logger.exception("Error aplicando la retención de facturas: %s", exc)
+        return None
+    return archivados, desconectadas
+
+
+# ---------------------------------------------------------------------------
+# Mantenimiento
+# ---------------------------------------------------------------------------
+
+def ensure_partitions(
+    meses_adelante: int = _cfg.partitions_ahead, hoy: Optional[date] = None,
+) -> Optional[int]:
+    """Crea las particiones del mes actual y de los *meses_adelante* siguientes.
+
+    Returns:
+        Número de particiones creadas, o ``None`` en caso de error.
+    """
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (_LOCK_KEY,))
+            creadas = _crear_futuras(cur, meses_adelante, hoy)
+            conn.commit()
+            return creadas
+    except psycopg2.Error as exc:
+        logger.exception("Error creando particiones de facturas: %s", exc)
+        return None
+
+
+def ensure_month_partitions(meses: Iterable[date]) -> Optional[int]:
+    """Crea las particiones que falten para *meses* (p. ej. al importar histórico).
+
+    Sin una partición propia, las facturas de un mes pasado caerían en la
+    partición DEFAULT y habría que moverlas al crear después la del mes.
+
+    Returns:
+        Número de particiones creadas, o ``None`` en caso de error.
+    """
+    pendientes = sorted({inicio_mes(mes) for mes in meses})
+    if not pendientes:
+        return 0
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (_LOCK_KEY,))
+            creadas = sum(crear_particion(cur, mes) for mes in pendientes)
+            conn.commit()
+            return creadas
+    except psycopg2.Error as exc:
+        logger.exception("Error creando particiones de facturas: %s", exc)
+        return None
+
+
+def get_partitions() -> Optional[list[Particion]]:
+    """Particiones conectadas a ``facturas_gastos``, o ``None`` en caso de error."""
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            particiones = _particiones(cur)
+            conn.rollback()
+            return particiones
+    except psycopg2.Error as exc:
+        logger.exception("Error listando particiones de facturas: %s", exc)
+        return None
+
+
+def legacy_pendiente() -> Optional[int]:
+    """Facturas que quedan en la tabla antigua (estimación), o ``None`` en caso de error."""
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = to_regclass('moltbot.facturas_gastos_legacy');",
+            )
+            row = cur.fetchone()
+            conn.rollback()
+            return max(0, row[0]) if row else 0
+    except psycopg2.Error as exc:
+        logger.exception("Error consultando la tabla antigua de facturas: %s", exc)
+        return None
+
+
+def legacy_con_filas() -> Optional[bool]:
+    """``True`` si quedan facturas en la tabla antigua, o ``None`` en caso de error."""
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('moltbot.facturas_gastos_legacy') IS NOT NULL;")
+            quedan = cur.fetchone()[0]
+            if quedan:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM moltbot.facturas_gastos_legacy);")
+                quedan = cur.fetchone()[0]
+            conn.rollback()
+            return quedan
+    except psycopg2.Error as exc:
+        logger.exception("Error consultando la tabla antigua de facturas: %s", exc)
+        return None
+
+
+def mantener_particiones() -> None:
+    """Migra las filas antiguas, crea las particiones futuras y aplica la retención."""
+    movidas = migrar_legacy()
+    creadas = ensure_partitions()
+    resultado = aplicar_retencion()
+    if movidas or creadas or (resultado and any(resultado)):
+        archivados, desconectadas = resultado or (0, 0)
+        logger.info(
+            "Mantenimiento de particiones: %d facturas migradas, %d creadas, "
+            "%d textos archivados, %d desconectadas.",
+            movidas or 0, creadas or 0, archivados, desconectadas,
+        )
+
+
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+def _maintenance_loop(interval: float) -> None:
+    while True:
+        try:
+            mantener_particiones()
+        except Exception:
+            logger.exception("Error en el mantenimiento de particiones.")
+        if _stop.wait(interval):
+            return
+
+
+def start_maintenance(interval_hours: float = _cfg.partition_maintenance_hours) -> None:
+    """Lanza el mantenimiento periódico en un hilo daemon (ahora y cada *interval_hours*)."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    if legacy_con_filas():
+        logger.warning(
+            "Quedan facturas en moltbot.facturas_gastos_legacy: no aparecen en las consultas "
+            "ni en el backfill de hashes hasta moverlas. El mantenimiento las mueve en segundo "
+            "plano; 'moltbot partitions migrate' lo hace de inmediato.",
+        )
+    _stop.clear()
+    _thread = threading.Thread(
+        target=_maintenance_loop, args=(max(60.0, interval_hours * 3600),),
+        name="moltbot-partitions", daemon=True,
+    )
+    _thread.start()
+
+
+def stop_maintenance(timeout: float = 5.0) -> None:
+    """Detiene el hilo de mantenimiento (si está en marcha)."""
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+        _thread = None
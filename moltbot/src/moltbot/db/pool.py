@@ -0,0 +1,413 @@
+"""
+Pool de conexiones a PostgreSQL.
+
+Reutiliza conexiones entre consultas para no pagar en cada mensaje el
+handshake TCP, la autenticación y el fork del backend de PostgreSQL.
+
+Características:
+
+* Tamaño mínimo/máximo configurables (``PostgresConfig.pool_*``).
+* Health check al sacar una conexión del pool (``SELECT 1`` si lleva
+  demasiado tiempo ociosa, y descarte si está cerrada o rota).
+* Reciclado de conexiones que superan su tiempo de vida máximo.
+* Estadísticas (checkouts, esperas, en uso, errores…) para monitorización,
+  expuestas también en ``/metrics``.
+* ``statement_timeout`` acotado al tiempo que le queda al comando en curso
+  (ver :func:`set_deadline_provider`): un handler que vence su timeout no
+  deja una consulta ocupando la conexión y el hilo indefinidamente.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Generator, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extensions import connection as PgConnection
+
+from moltbot.config import settings
+from moltbot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_pg = settings.postgres
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No se pudo obtener una conexión del pool dentro del tiempo límite."""
+
+
+# Segundos que le quedan al código que pide la conexión (``None`` = sin límite).
+DeadlineProvider = Callable[[], Optional[float]]
+_deadline_provider: Optional[DeadlineProvider] = None
+
+
+def set_deadline_provider(provider: Optional[DeadlineProvider]) -> None:
+    """Registra la función que da el tiempo restante del trabajo en curso.
+
+    Si devuelve un valor, cada conexión prestada empieza su transacción con
+    ``SET LOCAL statement_timeout`` a ese tiempo. ``moltbot.commands.runtime``
+    registra su ``remaining()``; en el resto de hilos devuelve ``None`` y no
+    cuesta nada.
+    """
+    global _deadline_provider
+    _deadline_provider = provider
+
+
+def _limitar_consultas(conn: PgConnection) -> None:
+    restante = _deadline_provider() if _deadline_provider is not None else None
+    if restante is None or conn.autocommit:
+        return
+    # 0 desactivaría el límite: un comando ya vencido recibe el mínimo.
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL statement_timeout = %s;", (max(1, int(restante * 1000)),))
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    """Instantánea de las estadísticas del pool."""
+
+    min_size: int
+    max_size: int
+    size: int
+    idle: int
+    in_use: int
+    checkouts: int
+    waits: int
+    timeouts: int
+    created: int
+    recycled: int
+    discarded: int
+    # Bloques ``with pool.connection()`` que terminaron con una excepción.
+    errors: int
+    connect_errors: int
+
+
+@dataclass
+class _PooledConnection:
+    """Conexión física junto con sus marcas de tiempo."""
+
+    conn: PgConnection
+    created_at: float
+    last_used: float
+
+
+class ConnectionPool:
+    """Pool de conexiones thread-safe con health checks y reciclado por edad."""
+
+    def __init__(
+        self,
+        connect_kwargs: dict[str, Any],
+        min_size: int = 1,
+        max_size: int = 5,
+        timeout: float = 10.0,
+        max_lifetime: float = 1800.0,
+        health_check_idle: float = 30.0,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size debe ser >= 1")
+        self._connect_kwargs = connect_kwargs
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_idle = health_check_idle
+
+        self._cond = threading.Condition()
+        self._idle: list[_PooledConnection] = []
+        self._in_use: dict[int, _PooledConnection] = {}
+        self._size = 0  # conexiones abiertas + huecos reservados en apertura
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._errors = 0
+        self._connect_errors = 0
+
+    # -- Ciclo de vida ------------------------------------------------------
+
+    def open(self) -> None:
+        """Pre-abre ``min_size`` conexiones (los fallos se registran, no abortan)."""
+        for _ in range(self.min_size):
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._new_connection()
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                logger.exception("No se pudo pre-abrir una conexión del pool.")
+                return
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def close(self) -> None:
+        """Cierra todas las conexiones ociosas y rechaza nuevos checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled.conn)
+
+    # -- API pública --------------------------------------------------------
+
+    @contextmanager
+    def connection(self) -> Generator[PgConnection, None, None]:
+        """Presta una conexión del pool y la devuelve al salir del bloque."""
+        pooled = self._checkout()
+        failed = False
+        try:
+            _limitar_consultas(pooled.conn)
+            yield pooled.conn
+        except BaseException:
+            failed = True
+            with self._cond:
+                self._errors += 1
+            raise
+        finally:
+            self._checkin(pooled, failed)
+
+    def stats(self) -> PoolStats:
+        """Devuelve una instantánea de las estadísticas del pool."""
+        with self._cond:
+            return PoolStats(
+                min_size=self.min_size,
+                max_size=self.max_size,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                checkouts=self._checkouts,
+                waits=self._waits,
+                timeouts=self._timeouts,
+                created=self._created,
+                recycled=self._recycled,
+                discarded=self._discarded,
+                errors=self._errors,
+                connect_errors=self._connect_errors,
+            )
+
+    # -- Internals ----------------------------------------------------------
+
+    def _new_connection(self) -> _PooledConnection:
+        try:
+            conn = psycopg2.connect(**self._connect_kwargs)
+        except psycopg2.Error:
+            with self._cond:
+                self._connect_errors += 1
+            raise
+        now = time.monotonic()
+        with self._cond:
+            self._created += 1
+        return _PooledConnection(conn=conn, created_at=now, last_used=now)
+
+    def _checkout(self) -> _PooledConnection:
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("El pool de conexiones está cerrado.")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        pooled = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timeout ({self.timeout}s) esperando conexión del pool."
+                        )
+                    if not waited:
+                        self._waits += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+            if pooled is None:
+                try:
+                    pooled = self._new_connection()
+                except BaseException:
+                    self._release_slot()
+                    raise
+            elif self._expired(pooled, time.monotonic()):
+                with self._cond:
+                    self._recycled += 1
+                self._discard(pooled, count=False)
+                continue
+            elif not self._is_healthy(pooled):
+                self._discard(pooled)
+                continue
+
+            with self._cond:
+                self._checkouts += 1
+                self._in_use[id(pooled.conn)] = pooled
+            return pooled
+
+    def _checkin(self, pooled: _PooledConnection, failed: bool) -> None:
+        with self._cond:
+            self._in_use.pop(id(pooled.conn), None)
+
+        conn = pooled.conn
+        if conn.closed:
+            self._discard(pooled)
+            return
+
+        try:
+            if failed or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(pooled)
+            return
+
+        now = time.monotonic()
+        if self._expired(pooled, now):
+            with self._cond:
+                self._recycled += 1
+            self._discard(pooled, count=False)
+            return
+
+        pooled.last_used = now
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._cond.notify()
+                closed = True
+            else:
+                self._idle.append(pooled)
+                self._cond.notify()
+                closed = False
+        if closed:
+            self._close_quietly(conn)
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        conn = pooled.conn
+        if conn.closed:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            logger.warning("Conexión del pool no responde; se descarta.")
+            return False
+
+    def _expired(self, pooled: _PooledConnection, now: float) -> bool:
+        return self.max_lifetime > 0 and now - pooled.created_at >= self.max_lifetime
+
+    def _discard(self, pooled: _PooledConnection, count: bool = True) -> None:
+        self._close_quietly(pooled.conn)
+        with self._cond:
+            if count:
+                self._discarded += 1
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn: PgConnection) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Instancia global (una por proceso)
+# ---------------------------------------------------------------------------
+
+def connect_kwargs() -> dict[str, Any]:
+    """Parámetros de ``psycopg2.connect`` según ``POSTGRES_*``."""
+    return {
+        "host": _pg.host,
+        "database": _pg.database,
+        "user": _pg.user,
+        "password": _pg.password,
+    }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Devuelve el pool del proceso actual, creándolo bajo demanda.
+
+    Tras un ``fork`` las conexiones heredadas no se pueden compartir, así que
+    cada proceso hijo crea su propio pool.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            pool = ConnectionPool(
+                connect_kwargs=connect_kwargs(),
+                min_size=_pg.pool_min_size,
+                max_size=_pg.pool_max_size,
+                timeout=_pg.pool_timeout,
+                max_lifetime=_pg.pool_max_lifetime,
+                health_check_idle=_pg.pool_health_check_idle,
+            )
+            pool.open()
+            _pool, _pool_pid = pool, pid
+    return _pool
+
+
+def close_pool() -> None:
+    """Cierra el pool del proceso actual (si existe)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool, _pool_pid = None, None
+
+
+def get_pool_stats() -> Optional[PoolStats]:
+    """Estadísticas del pool del proceso actual, o ``None`` si aún no existe."""
+    pool = _pool
+    if pool is None or _pool_pid != os.getpid():
+        return None
+    return pool.stats()
+
+
+metrics.register_stats(
+    get_pool_stats,
+    counters={
+        "checkouts": ("moltbot_db_checkouts_total", "Conexiones prestadas por el pool."),
+        "waits": ("moltbot_db_pool_waits_total", "Checkouts que tuvieron que esperar."),
+        "timeouts": ("moltbot_db_pool_timeouts_total", "Checkouts que agotaron la espera."),
+        "created": ("moltbot_db_connections_created_total", "Conexiones abiertas."),
+        "errors": ("moltbot_db_errors_total", "Operaciones de DB terminadas en error."),
+        "connect_errors": ("moltbot_db_connect_errors_total", "Fallos al abrir conexión."),
+    },
+    gauges={
+        "in_use": ("moltbot_db_connections_in_use", "Conexiones prestadas ahora mismo."),
+        "idle": ("moltbot_db_connections_idle", "Conexiones libres en el pool."),
+    },
+)
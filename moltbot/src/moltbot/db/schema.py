@@ -0,0 +1,253 @@
+"""
+Esquema versionado de Moltbot.
+
+El DDL se organiza en migraciones numeradas (``MIGRATIONS``). La tabla
+``moltbot.schema_version`` registra las aplicadas, de modo que un arranque
+con el esquema al día cuesta dos consultas de catálogo en lugar de todo el
+DDL. Las pendientes se aplican en una sola transacción bajo un advisory
+lock, así que varios procesos arrancando a la vez no se pisan.
+
+Para cambiar el esquema se añade una migración al final de la lista (nunca
+se edita una ya publicada). Cada paso es una sentencia SQL o una función
+que recibe el cursor.
+
+Las migraciones 1–4 recogen el DDL que antes ejecutaba ``setup_db`` en cada
+arranque; usan ``IF NOT EXISTS`` para que las bases de datos existentes se
+adopten sin cambios.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Callable, Union
+
+import psycopg2
+
+from moltbot.db.partitions import particionar_facturas
+from moltbot.db.pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock de las migraciones ("mschm").
+_LOCK_KEY = 0x6D7363686D
+
+Paso = Union[str, Callable[..., None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Cambio de esquema con número de versión."""
+
+    version: int
+    descripcion: str
+    pasos: tuple[Paso, ...]
+
+
+def _setup_rollups(cur) -> None:
+    """Crea la tabla de rollups mensuales y la rellena si es nueva."""
+    cur.execute("SELECT to_regclass('moltbot.gastos_mensuales') IS NULL;")
+    es_nueva = cur.fetchone()[0]
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.gastos_mensuales (
+            mes DATE NOT NULL,
+            proveedor VARCHAR(50) NOT NULL,
+            total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            num_facturas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (mes, proveedor)
+        );
+        """
+    )
+    if es_nueva:
+        cur.execute(
+            """
+            INSERT INTO moltbot.gastos_mensuales (mes, proveedor, total, num_facturas)
+            SELECT date_trunc('month', fecha_registro)::date, proveedor, SUM(importe), COUNT(*)
+            FROM moltbot.facturas_gastos
+            WHERE fecha_registro IS NOT NULL
+            GROUP BY 1, 2;
+            """
+        )
+        logger.info("Rollups mensuales inicializados (%d filas).", cur.rowcount)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "Facturas y logs de infraestructura", (
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.facturas_gastos (
+            id SERIAL PRIMARY KEY,
+            proveedor VARCHAR(50) NOT NULL,
+            importe DECIMAL(10, 2) NOT NULL,
+            fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            texto_original TEXT
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS facturas_gastos_fecha_registro_idx
+            ON moltbot.facturas_gastos (fecha_registro);
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.logs_infraestructura (
+            id SERIAL PRIMARY KEY,
+            servicio VARCHAR(50) NOT NULL,
+            estado VARCHAR(20) NOT NULL,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    )),
+    # Deduplicación por contenido (ver ``hash_factura``); las filas
+    # anteriores se rellenan con ``moltbot backfill-hashes``.
+    Migration(2, "Hash de contenido de facturas", (
+        "ALTER TABLE moltbot.facturas_gastos ADD COLUMN IF NOT EXISTS hash_contenido CHAR(64);",
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS facturas_gastos_hash_contenido_idx
+            ON moltbot.facturas_gastos (hash_contenido);
+        """,
+    )),
+    # Estadísticas de ejecuciones de n8n (ver ``moltbot.db.executions``).
+    Migration(3, "Estadísticas incrementales de ejecuciones", (
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.ejecuciones_stats (
+            bucket BIGINT NOT NULL,
+            workflow_id VARCHAR(36) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            n BIGINT NOT NULL,
+            PRIMARY KEY (bucket, workflow_id, status)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.ejecuciones_frontera (
+            id BIGINT PRIMARY KEY,
+            bucket BIGINT NOT NULL,
+            workflow_id VARCHAR(36) NOT NULL,
+            status VARCHAR(20) NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.ejecuciones_estado (
+            singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+            id_min BIGINT NOT NULL,
+            id_max BIGINT NOT NULL,
+            actualizado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    )),
+    Migration(4, "Rollups mensuales de gastos", (_setup_rollups,)),
+    # Particiones mensuales y deduplicación en ``facturas_hashes`` (ver
+    # ``moltbot.db.partitions``); las filas antiguas se mueven con
+    # ``moltbot partitions migrate``.
+    Migration(5, "Facturas particionadas por mes", (particionar_facturas,)),
+    # Invalidación de cachés entre procesos (ver ``moltbot.db.notifications``).
+    Migration(6, "Avisos de escritura con NOTIFY", (
+        """
+        CREATE OR REPLACE FUNCTION moltbot.notificar_escritura() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify('moltbot_escrituras', TG_ARGV[0]);
+            RETURN NULL;
+        END;
+        $$;
+        """,
+        """
+        CREATE TRIGGER gastos_mensuales_notificar
+            AFTER INSERT OR UPDATE OR DELETE ON moltbot.gastos_mensuales
+            FOR EACH ROW EXECUTE FUNCTION moltbot.notificar_escritura('facturas');
+        """,
+    )),
+    # Borrados en buckets fríos de ejecuciones (ver ``moltbot.db.executions``).
+    # Empieza vacía: el primer refresco recuenta una vez los buckets sin fila.
+    Migration(7, "Extremos de los buckets de ejecuciones", (
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.ejecuciones_buckets (
+            bucket BIGINT PRIMARY KEY,
+            id_min BIGINT NOT NULL,
+            id_max BIGINT NOT NULL
+        );
+        """,
+    )),
+    # Hasta qué ID se ha archivado el texto de cada partición (ver
+    # ``moltbot.db.partitions``), para no volver a recorrerlas.
+    Migration(8, "Particiones con textos archivados", (
+        """
+        CREATE TABLE IF NOT EXISTS moltbot.facturas_archivadas (
+            particion TEXT PRIMARY KEY,
+            ultimo_id INTEGER NOT NULL,
+            actualizado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    )),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def _version_actual(cur) -> int:
+    cur.execute("SELECT to_regclass('moltbot.schema_version') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM moltbot.schema_version;")
+    return cur.fetchone()[0]
+
+
+def get_schema_version() -> int | None:
+    """Versión del esquema aplicada en la base de datos, o ``None`` si falla la consulta."""
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            version = _version_actual(cur)
+            conn.rollback()
+            return version
+    except psycopg2.Error as exc:
+        logger.exception("Error consultando la versión del esquema: %s", exc)
+        return None
+
+
+def setup_db() -> bool:
+    """
+    Lleva el esquema ``moltbot`` a la última versión (no hace nada si ya lo está).
+
+    Devuelve ``False`` si la migración falla (el error queda en el log): quien
+    arranca el servicio debe abortar en vez de atender mensajes con un esquema
+    a medias.
+    """
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            if _version_actual(cur) >= SCHEMA_VERSION:
+                conn.rollback()
+                logger.info("Esquema 'moltbot' al día (versión %d).", SCHEMA_VERSION)
+                return True
+
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (_LOCK_KEY,))
+            cur.execute("CREATE SCHEMA IF NOT EXISTS moltbot;")
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS moltbot.schema_version (
+                    version INTEGER PRIMARY KEY,
+                    descripcion TEXT NOT NULL,
+                    aplicada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+                """
+            )
+            # Otro proceso puede haber migrado mientras esperábamos el lock.
+            actual = _version_actual(cur)
+            for migration in MIGRATIONS:
+                if migration.version <= actual:
+                    continue
+                for paso in migration.pasos:
+                    if callable(paso):
+                        paso(cur)
+                    else:
+                        cur.execute(paso)
+                cur.execute(
+                    "INSERT INTO moltbot.schema_version (version, descripcion) VALUES (%s, %s);",
+                    (migration.version, migration.descripcion),
+                )
+                logger.info(
+                    "Migración %d aplicada: %s", migration.version, migration.descripcion,
+                )
+            conn.commit()
+            logger.info("Infraestructura 'moltbot' lista (esquema versión %d).", SCHEMA_VERSION)
+        return True
+    except psycopg2.Error as exc:
+        logger.exception("Error en setup_db: %s", exc)
+        return False
@@ -0,0 +1,396 @@
+"""
+Importación masiva de facturas históricas (``moltbot import``).
+
+Alternativa a publicar los textos uno a uno en ``tareas_facturas``: recorre
+un directorio o un fichero JSONL, extrae los importes en un pool de
+procesos y carga los resultados con ``COPY`` en lotes grandes.
+
+Fuentes admitidas:
+
+* **Directorio**: cada fichero ``.txt`` (texto plano) o ``.json`` (``{"text":
+  …}``, como los mensajes de la cola) es una factura. El proveedor sale de
+  los metadatos del fichero: el nombre de una carpeta de la ruta o el
+  prefijo del nombre (``iberdrola/2023-01.txt``, ``o2_2023-01.txt``); si no
+  hay, se detecta en el texto. La fecha de registro es la de modificación
+  del fichero (``--date-from now`` para usar la actual).
+* **JSONL**: una factura por línea con ``text`` y, opcionalmente,
+  ``proveedor`` y ``fecha`` (ISO 8601).
+
+El progreso se guarda tras cada lote en un fichero de estado, así que una
+ejecución interrumpida continúa donde se quedó. Como además las facturas se
+deduplican por hash de contenido, repetir un lote no duplica datos. Los
+textos que no se pueden procesar se anotan en un informe JSONL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+from moltbot.config import settings
+from moltbot.utils.files import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Extensiones que se importan de un directorio.
+_EXTENSIONES = (".txt", ".json")
+
+
+@dataclass(frozen=True)
+class ImportItem:
+    """Factura pendiente de procesar (se envía a los procesos del pool)."""
+
+    indice: int
+    # Ruta relativa (directorio) o ``linea:N`` (JSONL); identifica la factura en el informe.
+    clave: str
+    ruta: Optional[str] = None
+    texto: Optional[str] = None
+    proveedor: Optional[str] = None
+    fecha: Optional[datetime] = None
+    # Error detectado al leer la fuente (p. ej. una línea JSONL inválida).
+    error: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ImportResult:
+    """Resultado de procesar un :class:`ImportItem`."""
+
+    indice: int
+    clave: str
+    # ``(proveedor, importe, texto, hash, fecha)`` o ``None`` si hay error.
+    factura: Optional[tuple[str, float, str, str, Optional[datetime]]] = None
+    # Motivo del error (agrupable en el resumen) y detalle para el informe.
+    error: Optional[str] = None
+    detalle: str = ""
+
+
+@dataclass
+class ImportStats:
+    """Contadores de una importación (también se guardan en el estado)."""
+
+    procesadas: int = 0
+    importadas: int = 0
+    duplicadas: int = 0
+    errores: int = 0
+    segundos: float = 0.0
+    por_error: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def por_segundo(self) -> float:
+        return self.procesadas / self.segundos if self.segundos else 0.0
+
+
+# ---------------------------------------------------------------------------
+# Fuentes
+# ---------------------------------------------------------------------------
+
+def _proveedor_de_ruta(relativa: Path, proveedores: frozenset[str]) -> Optional[str]:
+    """Proveedor según la ruta: una carpeta o el prefijo del nombre del fichero."""
+    for parte in relativa.parts[:-1]:
+        if parte.lower() in proveedores:
+            return parte.lower()
+    prefijo = re.split(r"[_\-. ]", relativa.stem, maxsplit=1)[0].lower()
+    return prefijo if prefijo in proveedores else None
+
+
+def _fecha(valor: object) -> Optional[datetime]:
+    if not valor:
+        return None
+    fecha = datetime.fromisoformat(str(valor))
+    # ``fecha_registro`` es hora local sin zona (como el mtime de los ficheros):
+    # las fechas con zona se pasan a la hora local, no se les quita sin más.
+    return fecha.astimezone().replace(tzinfo=None) if fecha.tzinfo else fecha
+
+
+def iter_directorio(
+    raiz: Path, proveedores: frozenset[str], fecha_mtime: bool = True, desde: int = 0,
+) -> Iterator[ImportItem]:
+    """Facturas de *raiz* en orden estable (ruta relativa), saltando las *desde* primeras."""
+    rutas = sorted(
+        p for p in raiz.rglob("*") if p.is_file() and p.suffix.lower() in _EXTENSIONES
+    )
+    for indice, ruta in enumerate(rutas[desde:], start=desde):
+        relativa = ruta.relative_to(raiz)
+        yield ImportItem(
+            indice=indice,
+            clave=str(relativa),
+            ruta=str(ruta),
+            proveedor=_proveedor_de_ruta(relativa, proveedores),
+            fecha=datetime.fromtimestamp(ruta.stat().st_mtime) if fecha_mtime else None,
+        )
+
+
+def iter_jsonl(path: Path, desde: int = 0) -> Iterator[ImportItem]:
+    """Facturas de un fichero JSONL, saltando las *desde* primeras líneas."""
+    with path.open("r", encoding="utf-8") as fh:
+        for indice, linea in enumerate(fh):
+            if indice < desde:
+                continue
+            clave = f"linea:{indice + 1}"
+            try:
+                datos = json.loads(linea) if linea.strip() else {}
+                fecha = _fecha(datos.get("fecha"))
+            except (ValueError, AttributeError) as exc:
+                # Se informa desde el pool, como el resto de errores.
+                yield ImportItem(indice, clave, error=str(exc))
+                continue
+            yield ImportItem(
+                indice=indice,
+                clave=clave,
+                texto=datos.get("text", ""),
+                proveedor=datos.get("proveedor") or None,
+                fecha=fecha,
+            )
+
+
+# ---------------------------------------------------------------------------
+# Procesado (en los procesos del pool)
+# ---------------------------------------------------------------------------
+
+def _leer(ruta: str) -> str:
+    with open(ruta, "r", encoding="utf-8", errors="replace") as fh:
+        contenido = fh.read()
+    if ruta.lower().endswith(".json"):
+        return json.loads(contenido).get("text", "")
+    return contenido
+
+
+def procesar(item: ImportItem) -> ImportResult:
+    """Extrae ``(proveedor, importe, texto, hash, fecha)`` de una factura."""
+    from moltbot.db import hash_factura_texto
+    from moltbot.messaging.facturas import TEXTO_MAX
+    from moltbot.processors.bill_parser import detect_provider, get_parser
+
+    def fallo(error: str, detalle: object = "") -> ImportResult:
+        return ImportResult(item.indice, item.clave, error=error, detalle=str(detalle))
+
+    if item.error is not None:
+        return fallo("JSON inválido", item.error)
+    try:
+        texto = item.texto if item.ruta is None else _leer(item.ruta)
+    except (OSError, ValueError, AttributeError) as exc:
+        return fallo("no se pudo leer", exc)
+    if not texto:
+        return fallo("texto vacío")
+
+    proveedor = item.proveedor
+    if not proveedor:
+        match = detect_provider(texto)
+        if match is None or match.confidence < settings.invoices.detect_min_confidence:
+            return fallo("proveedor desconocido", match or "")
+        proveedor = match.provider
+
+    parser = get_parser(proveedor)
+    if parser is None:
+        return fallo("proveedor sin parser", proveedor)
+    importe = parser.extraer_importe(texto)
+    if importe is None:
+        return fallo("importe no encontrado", proveedor)
+    # El hash es el de la factura completa, como en la cola (ver ``extraer_factura``).
+    hash_contenido = hash_factura_texto(proveedor, importe, (texto,))
+    return ImportResult(
+        item.indice, item.clave,
+        factura=(proveedor, importe, texto[:TEXTO_MAX], hash_contenido, item.fecha),
+    )
+
+
+def _init_worker() -> None:
+    # Los logs de cada texto (proveedor detectado, parser…) saturarían la salida.
+    logging.getLogger("moltbot").setLevel(logging.ERROR)
+
+
+# ---------------------------------------------------------------------------
+# Importación
+# ---------------------------------------------------------------------------
+
+def default_state_path(fuente: Path) -> Path:
+    """Fichero de estado por defecto: ``<BACKUP_OUTPUT_FOLDER>/imports/<fuente>-<hash>.json``."""
+    resuelta = str(fuente.resolve())
+    sufijo = hashlib.sha1(resuelta.encode("utf-8")).hexdigest()[:10]
+    return Path(settings.backup.output_folder) / "imports" / f"{fuente.name}-{sufijo}.json"
+
+
+def _cargar_estado(path: Path, fuente: Path) -> tuple[int, Optional[int], ImportStats]:
+    """``(siguiente, bytes_del_informe, stats)`` del último lote confirmado."""
+    try:
+        estado = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return 0, None, ImportStats()
+    if estado.get("fuente") != str(fuente.resolve()):
+        raise ValueError(f"{path} corresponde a otra fuente ({estado.get('fuente')})")
+    stats = ImportStats(**estado.get("stats", {}))
+    return int(estado.get("siguiente", 0)), estado.get("informe"), stats
+
+
+def _guardar_estado(
+    path: Path, fuente: Path, siguiente: int, informe: int, stats: ImportStats,
+) -> None:
+    estado = {
+        "fuente": str(fuente.resolve()),
+        "siguiente": siguiente,
+        # Tamaño del informe de errores al confirmar: al reanudar se recorta a
+        # él, porque las facturas posteriores se vuelven a procesar.
+        "informe": informe,
+        "actualizado": datetime.now().isoformat(timespec="seconds"),
+        "stats": stats.__dict__,
+    }
+    atomic_write(path, json.dumps(estado, ensure_ascii=False, indent=2).encode("utf-8"))
+
+
+class Importer:
+    """Importa una fuente (directorio o JSONL) con un pool de procesos y ``COPY``."""
+
+    def __init__(
+        self,
+        fuente: Path,
+        workers: int = 0,
+        batch_size: int = 5000,
+        chunksize: int = 32,
+        state_path: Optional[Path] = None,
+        report_path: Optional[Path] = None,
+        fecha_mtime: bool = True,
+        progress: Optional[IO[str]] = None,
+    ) -> None:
+        self._fuente = fuente
+        self._workers = workers or os.cpu_count() or 1
+        self._batch_size = max(1, batch_size)
+        self._chunksize = max(1, chunksize)
+        self._state_path = state_path or default_state_path(fuente)
+        self._report_path = report_path or self._state_path.with_suffix(".errores.jsonl")
+        self._fecha_mtime = fecha_mtime
+        self._progress = progress if progress is not None else sys.stderr
+        self._meses: set[date] = set()
+
+    @property
+    def state_path(self) -> Path:
+        return self._state_path
+
+    @property
+    def report_path(self) -> Path:
+        return self._report_path
+
+    def _items(self, desde: int) -> Iterator[ImportItem]:
+        if self._fuente.is_dir():
+            from moltbot.processors.bill_parser import registered_providers
+
+            return iter_directorio(
+                self._fuente, frozenset(registered_providers()), self._fecha_mtime, desde,
+            )
+        return iter_jsonl(self._fuente, desde)
+
+    def run(self, restart: bool = False) -> Optional[ImportStats]:
+        """Importa la fuente, continuando desde el último lote guardado salvo con *restart*.
+
+        Returns:
+            Los contadores acumulados, o ``None`` si falla la carga de un lote
+            (el estado queda en el último lote confirmado).
+        """
+        if restart:
+            self._state_path.unlink(missing_ok=True)
+        siguiente, tam_informe, stats = _cargar_estado(self._state_path, self._fuente)
+        if siguiente:
+            logger.info("Reanudando %s desde la factura %d.", self._fuente, siguiente)
+
+        self._report_path.parent.mkdir(parents=True, exist_ok=True)
+        if siguiente and tam_informe is not None and self._report_path.exists():
+            # Fuera las líneas de facturas que no llegaron a un lote confirmado.
+            os.truncate(self._report_path, min(tam_informe, self._report_path.stat().st_size))
+        lote: list[tuple[str, float, str, str, Optional[datetime]]] = []
+        inicio = time.monotonic() - stats.segundos
+        ultimo_aviso = 0.0
+        ctx = multiprocessing.get_context("spawn")
+        with (
+            ctx.Pool(self._workers, initializer=_init_worker) as pool,
+            self._report_path.open("a" if siguiente else "w", encoding="utf-8") as informe,
+        ):
+            for result in pool.imap(procesar, self._items(siguiente), self._chunksize):
+                stats.procesadas += 1
+                siguiente = result.indice + 1
+                if result.factura is not None:
+                    lote.append(result.factura)
+                else:
+                    stats.errores += 1
+                    stats.por_error[result.error] = stats.por_error.get(result.error, 0) + 1
+                    informe.write(json.dumps(
+                        {"clave": result.clave, "error": result.error, "detalle": result.detalle},
+                        ensure_ascii=False,
+                    ) + "\n")
+
+                if len(lote) >= self._batch_size:
+                    informe.flush()
+                    if not self._cargar(lote, stats):
+                        return None
+                    stats.segundos = time.monotonic() - inicio
+                    _guardar_estado(
+                        self._state_path, self._fuente, siguiente, informe.tell(), stats,
+                    )
+                    lote.clear()
+
+                ahora = time.monotonic()
+                if ahora - ultimo_aviso >= 2.0:
+                    ultimo_aviso = ahora
+                    stats.segundos = ahora - inicio
+                    self._avisar(stats)
+
+            informe.flush()
+            if not self._cargar(lote, stats):
+                return None
+            tam_informe = informe.tell()
+        stats.segundos = time.monotonic() - inicio
+        _guardar_estado(self._state_path, self._fuente, siguiente, tam_informe, stats)
+        self._avisar(stats, final=True)
+        return stats
+
+    def _cargar(
+        self, lote: list[tuple[str, float, str, str, Optional[datetime]]], stats: ImportStats,
+    ) -> bool:
+        from moltbot.db import copy_facturas, ensure_month_partitions
+
+        if not lote:
+            return True
+        meses = {date(f.year, f.month, 1) for *_, f in lote if f is not None} - self._meses
+        if meses:
+            if ensure_month_partitions(meses) is None:
+                return False
+            self._meses |= meses
+        insertadas = copy_facturas(lote)
+        if insertadas is None:
+            return False
+        stats.importadas += insertadas
+        stats.duplicadas += len(lote) - insertadas
+        return True
+
+    def _avisar(self, stats: ImportStats, final: bool = False) -> None:
+        fin = "\n" if final else "\r"
+        self._progress.write(
+            f"{stats.procesadas} procesadas · {stats.importadas} importadas · "
+            f"{stats.duplicadas} duplicadas · {stats.errores} errores · "
+            f"{stats.por_segundo:.0f}/s{fin}"
+        )
+        self._progress.flush()
+
+
+def format_report(stats: ImportStats, report_path: Path) -> str:
+    """Resumen final de la importación."""
+    lineas = [
+        f"Importadas {stats.importadas} de {stats.procesadas} facturas en "
+        f"{stats.segundos:.1f}s ({stats.por_segundo:.0f}/s); "
+        f"{stats.duplicadas} duplicadas, {stats.errores} con error.",
+    ]
+    if stats.errores:
+        lineas.append(f"Textos no procesados ({report_path}):")
+        lineas += [
+            f"  {n:8d}  {motivo}"
+            for motivo, n in sorted(stats.por_error.items(), key=lambda i: -i[1])
+        ]
+    return "\n".join(lineas)
@@ -4,8 +4,24 @@ Paquete de mensajería.
 Re-exporta la función de conexión principal:
 
     from moltbot.messaging import connect
+
+``pika`` se carga al usar ``connect``, no al importar el paquete (p. ej.
+desde ``moltbot.messaging.dedup``).
 """
 
-from moltbot.messaging.rabbit import connect
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from moltbot.messaging.rabbit import connect
 
 __all__ = ["connect"]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "connect":
+        from moltbot.messaging.rabbit import connect
+
+        return connect
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,204 @@
+"""
+Runtime asyncio de Moltbot (``moltbot --async``).
+
+Alternativa al bucle bloqueante de ``pika``: usa ``aio-pika`` para AMQP,
+``asyncpg`` para PostgreSQL y ``aiohttp`` para Discord, de modo que las
+esperas de I/O de cientos de mensajes se solapan en un único proceso.
+
+Los registros existentes se reutilizan sin cambios: los parsers
+(``get_parser``) se ejecutan en el event loop y los handlers de comandos
+(``dispatch``, síncronos) en un hilo vía ``asyncio.to_thread``.
+
+Requiere las dependencias opcionales ``pip install moltbot[async]``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+from typing import Collection, Optional
+
+import aio_pika
+import aiohttp
+import asyncpg
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage, AbstractRobustConnection
+
+from moltbot.commands import dispatch
+from moltbot.config import settings
+from moltbot.db import aio as db_aio
+from moltbot.messaging import dedup
+from moltbot.messaging.facturas import extraer_factura
+from moltbot.messaging.publisher import destino_respuesta
+from moltbot.utils import discord_aio, metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+_rabbit = settings.rabbitmq
+
+
+class AsyncRuntime:
+    """Consumidor asyncio de las colas de comandos y facturas."""
+
+    def __init__(self, queues: Optional[Collection[str]] = None) -> None:
+        self._queues = queues
+        self._stopping = asyncio.Event()
+        self._inflight: set[asyncio.Task] = set()
+        self._connection: AbstractRobustConnection | None = None
+        self._channel: AbstractChannel | None = None
+        self._pool: asyncpg.Pool | None = None
+        self._http: aiohttp.ClientSession | None = None
+
+    # -- Callbacks ----------------------------------------------------------
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _on_factura(self, message: AbstractIncomingMessage) -> None:
+        self._spawn(self._procesar_factura(message))
+
+    async def _on_comando(self, message: AbstractIncomingMessage) -> None:
+        self._spawn(self._procesar_comando(message))
+
+    async def _procesar_factura(self, message: AbstractIncomingMessage) -> None:
+        """Procesa un mensaje de la cola de facturas."""
+        try:
+            with metrics.track_message(_rabbit.queue_facturas):
+                await self._guardar_factura(message)
+        except Exception:
+            logger.exception("Error procesando factura.")
+        finally:
+            profiling.tick()
+            await message.ack()
+
+    async def _guardar_factura(self, message: AbstractIncomingMessage) -> None:
+        """Parsea, guarda y notifica una factura (salvo que sea un duplicado)."""
+        clave = dedup.clave_mensaje(message.headers, message.body)
+        if dedup.mensaje_visto(clave):
+            logger.info("Mensaje de factura repetido; se descarta.")
+            return
+
+        factura = extraer_factura(message.headers, message.body)
+        if factura is None:
+            return
+        clave_factura = dedup.clave_factura(factura)
+        if dedup.factura_vista(clave_factura):
+            dedup.marcar_procesada(clave)
+            logger.info("Factura ya registrada; se descarta.")
+            return
+
+        ids = await db_aio.insert_facturas(self._pool, [factura])
+        if ids is None:
+            return
+        dedup.marcar_procesada(clave, clave_factura)
+
+        proveedor, importe = factura.proveedor, factura.importe
+        if ids[0] is None:
+            dedup.contar_duplicada()
+            logger.info("Factura duplicada de %s (%.2f€); no se notifica.", proveedor, importe)
+            return
+        await discord_aio.enviar_notificacion_factura(self._http, proveedor, importe)
+        logger.info("Factura guardada: %.2f€ (ID: %s)", importe, ids[0])
+
+    async def _procesar_comando(self, message: AbstractIncomingMessage) -> None:
+        """Procesa un comando entrante y publica la respuesta."""
+        try:
+            with metrics.track_message(_rabbit.queue_comandos):
+                comando = message.body.decode().strip()
+                logger.info("Comando recibido: %s", comando)
+                routing_key, correlation_id = destino_respuesta(
+                    message.correlation_id, message.reply_to, message.headers,
+                )
+                respuesta = await asyncio.to_thread(
+                    dispatch, comando, (routing_key, correlation_id),
+                )
+
+            # Con confirms, ``publish`` espera el ack del broker solo en esta tarea.
+            with metrics.STAGE_SECONDS.time(stage="publish"):
+                await self._channel.default_exchange.publish(
+                    aio_pika.Message(
+                        body=respuesta.encode(),
+                        correlation_id=correlation_id,
+                        headers={"correlation_id": correlation_id} if correlation_id else None,
+                        delivery_mode=(
+                            aio_pika.DeliveryMode.PERSISTENT if _rabbit.durable else None
+                        ),
+                    ),
+                    routing_key=routing_key,
+                )
+            logger.info("Respuesta enviada a %s: %s", routing_key, respuesta)
+        except Exception:
+            logger.exception("Error procesando comando.")
+        finally:
+            profiling.tick()
+            await message.ack()
+
+    # -- Ciclo de vida ------------------------------------------------------
+
+    def stop(self, signum: int) -> None:
+        """Pide una parada ordenada (llamado desde el manejador de señales)."""
+        logger.info("Señal %s recibida — cerrando conexión…", signal.Signals(signum).name)
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """Conecta, consume hasta recibir SIGINT/SIGTERM y drena lo pendiente."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop, sig)
+        loop.add_signal_handler(signal.SIGUSR1, profiling.toggle)
+
+        # Si falla algún paso del arranque, el finally cierra los anteriores.
+        try:
+            self._pool = await db_aio.create_pool()
+            self._http = discord_aio.create_session()
+            self._connection = await aio_pika.connect_robust(
+                host=_rabbit.host,
+                login=_rabbit.user,
+                password=_rabbit.password,
+                heartbeat=_rabbit.heartbeat,
+            )
+            self._channel = await self._connection.channel(
+                publisher_confirms=_rabbit.publisher_confirms,
+            )
+            await self._channel.set_qos(prefetch_count=_rabbit.async_prefetch)
+
+            durable = _rabbit.durable
+            cola_comandos = await self._channel.declare_queue(
+                _rabbit.queue_comandos, durable=durable,
+            )
+            cola_facturas = await self._channel.declare_queue(
+                _rabbit.queue_facturas, durable=durable,
+            )
+            await self._channel.declare_queue(_rabbit.queue_respuestas, durable=durable)
+
+            consumidores = [
+                (cola, await cola.consume(callback))
+                for cola, callback in (
+                    (cola_comandos, self._on_comando),
+                    (cola_facturas, self._on_factura),
+                )
+                if self._queues is None or cola.name in self._queues
+            ]
+
+            logger.info("Moltbot (asyncio) listo. Escuchando comandos y facturas…")
+            await self._stopping.wait()
+
+            for cola, tag in consumidores:
+                await cola.cancel(tag)
+            if self._inflight:
+                logger.info("Esperando %d mensajes en curso…", len(self._inflight))
+                await asyncio.wait(set(self._inflight), timeout=_rabbit.shutdown_timeout)
+        finally:
+            if self._connection is not None:
+                await self._connection.close()
+            if self._http is not None:
+                await self._http.close()
+            if self._pool is not None:
+                await self._pool.close()
+
+
+async def run(queues: Optional[Collection[str]] = None) -> None:
+    """Punto de entrada del runtime asyncio."""
+    await AsyncRuntime(queues).run()
@@ -0,0 +1,202 @@
+"""
+Ingesta de facturas por micro-lotes.
+
+Acumula facturas ya parseadas hasta ``batch_size`` mensajes o ``linger_ms``
+milisegundos, las escribe con un único ``INSERT`` multi-fila y solo entonces
+confirma (ack) los mensajes del lote. Si el proceso cae antes del commit,
+RabbitMQ vuelve a entregar los mensajes pendientes.
+
+Los acks y nacks van tag a tag, nunca con ``multiple``: el canal es el mismo
+que el de los comandos, y un ``multiple`` confirmaría (o reencolaría) también
+los comandos que siguen ejecutándose en el pool, cuyo ack posterior haría que
+el broker cerrase el canal por ``delivery_tag`` desconocido.
+
+Los duplicados (ver :mod:`moltbot.messaging.dedup`) se confirman sin entrar
+en el lote; los que solo detecta el índice único se confirman con el lote
+pero no se notifican.
+
+Las facturas que fallan al reintentar fila a fila se publican tal cual en la
+cola de fallidas (``tareas_facturas_fallidas``) antes de rechazarlas, para no
+perderlas: ``tareas_facturas`` no tiene dead-letter exchange y cambiar sus
+argumentos obligaría a borrar la cola existente.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Callable, NamedTuple, Optional
+
+from pika.adapters.blocking_connection import BlockingChannel
+from pika.exceptions import AMQPError
+from pika.spec import Basic, BasicProperties
+
+from moltbot.config import settings
+from moltbot.db import insert_facturas
+from moltbot.messaging import dedup
+from moltbot.messaging.facturas import Factura
+from moltbot.utils import metrics, profiling
+from moltbot.utils.notifier import notificar_factura
+
+logger = logging.getLogger(__name__)
+
+ExtractorFactura = Callable[[BasicProperties, bytes], Optional[Factura]]
+
+
+class _Pendiente(NamedTuple):
+    """Mensaje del lote en curso (el cuerpo se guarda por si hay que aparcarlo)."""
+
+    tag: int
+    factura: Factura
+    claves: tuple[str, str]
+    properties: BasicProperties
+    body: bytes
+
+
+class FacturaBatcher:
+    """Callback de consumo que agrupa facturas y hace ack tras el commit."""
+
+    def __init__(
+        self,
+        channel: BlockingChannel,
+        extraer: ExtractorFactura,
+        batch_size: int = 50,
+        linger_ms: int = 200,
+        cola_fallidas: str = settings.rabbitmq.queue_facturas_fallidas,
+    ) -> None:
+        self._channel = channel
+        self._extraer = extraer
+        self._batch_size = max(1, batch_size)
+        self._linger = max(0, linger_ms) / 1000
+        self._cola_fallidas = cola_fallidas
+        self._pending: list[_Pendiente] = []
+        self._timer = None
+
+    # -- Callback de pika ---------------------------------------------------
+
+    @profiling.hook
+    @metrics.track_message(settings.rabbitmq.queue_facturas)
+    def on_message(
+        self,
+        ch: BlockingChannel,
+        method: Basic.Deliver,
+        properties: BasicProperties,
+        body: bytes,
+    ) -> None:
+        """Parsea el mensaje y lo añade al lote en curso."""
+        clave = dedup.clave_mensaje(properties.headers, body)
+        if dedup.mensaje_visto(clave):
+            logger.info("Mensaje de factura repetido; se descarta.")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        try:
+            factura = self._extraer(properties, body)
+        except Exception:
+            logger.exception("Error procesando factura.")
+            factura = None
+
+        if factura is None:
+            # Mensaje descartado: se confirma ya, igual que hacía auto_ack.
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        clave_factura = dedup.clave_factura(factura)
+        if dedup.factura_vista(clave_factura):
+            dedup.marcar_procesada(clave)
+            logger.info("Factura ya registrada; se descarta.")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        self._pending.append(
+            _Pendiente(method.delivery_tag, factura, (clave, clave_factura), properties, body),
+        )
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = ch.connection.call_later(self._linger, self._on_linger)
+
+    # -- Flush --------------------------------------------------------------
+
+    def _on_linger(self) -> None:
+        self._timer = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Escribe el lote pendiente en la DB y confirma sus mensajes."""
+        if self._timer is not None:
+            self._channel.connection.remove_timeout(self._timer)
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        facturas = [p.factura for p in batch]
+
+        ids = insert_facturas(facturas)
+        if ids is not None:
+            for pendiente in batch:
+                self._channel.basic_ack(delivery_tag=pendiente.tag)
+            guardadas = [i for i in ids if i is not None]
+            logger.info(
+                "Lote de %d facturas guardado (%d nuevas, %d duplicadas).",
+                len(ids), len(guardadas), len(ids) - len(guardadas),
+            )
+            for pendiente, id_db in zip(batch, ids):
+                self._confirmada(pendiente.factura, pendiente.claves, id_db)
+            return
+
+        self._flush_uno_a_uno(batch)
+
+    @staticmethod
+    def _confirmada(factura: Factura, claves: tuple[str, str], id_db: Optional[int]) -> None:
+        """Memoriza la factura y la notifica si era nueva."""
+        dedup.marcar_procesada(*claves)
+        if id_db is None:
+            dedup.contar_duplicada()
+            return
+        proveedor, importe = factura.proveedor, factura.importe
+        notificar_factura(proveedor, importe)
+
+    def _flush_uno_a_uno(self, batch: list[_Pendiente]) -> None:
+        """Reintenta un lote fallido fila a fila para aislar facturas inválidas.
+
+        Si no entra ninguna se asume un fallo de la DB y se devuelve todo el
+        lote a la cola; si solo fallan algunas, esas se aparcan en la cola de
+        fallidas y se rechazan sin reencolar.
+        """
+        resultados = [(p, insert_facturas([p.factura])) for p in batch]
+        if all(ids is None for _, ids in resultados):
+            logger.error("Lote de %d facturas no guardado; se reencola.", len(batch))
+            for pendiente in batch:
+                self._channel.basic_nack(delivery_tag=pendiente.tag, requeue=True)
+            return
+
+        for pendiente, ids in resultados:
+            if ids is None:
+                self._aparcar(pendiente)
+                continue
+            self._channel.basic_ack(delivery_tag=pendiente.tag)
+            self._confirmada(pendiente.factura, pendiente.claves, ids[0])
+            logger.info("Factura guardada: %.2f€ (ID: %s)", pendiente.factura.importe, ids[0])
+
+    def _aparcar(self, pendiente: _Pendiente) -> None:
+        """Copia el mensaje a la cola de fallidas y lo rechaza (o lo reencola si no se pudo)."""
+        proveedor = pendiente.factura.proveedor
+        try:
+            self._channel.basic_publish(
+                exchange="",
+                routing_key=self._cola_fallidas,
+                body=pendiente.body,
+                properties=pendiente.properties,
+            )
+        except AMQPError:
+            logger.exception(
+                "No se pudo aparcar la factura fallida (%s); se reencola.", proveedor,
+            )
+            self._channel.basic_nack(delivery_tag=pendiente.tag, requeue=True)
+            return
+        logger.error(
+            "Factura no guardada tras fallo de inserción (%s); movida a '%s'.",
+            proveedor, self._cola_fallidas,
+        )
+        self._channel.basic_reject(delivery_tag=pendiente.tag, requeue=False)
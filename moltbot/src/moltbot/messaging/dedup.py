@@ -0,0 +1,155 @@
+"""
+Deduplicación de facturas entrantes.
+
+n8n reintenta workflows y el trigger de Gmail puede dispararse dos veces, así
+que la misma factura puede llegar varias veces a ``tareas_facturas``. Hay
+dos niveles de protección:
+
+1. **Caché LRU en memoria** (por proceso), con dos tipos de clave:
+   el hash del mensaje crudo (cabecera ``proveedor`` + cuerpo), que permite
+   saltarse incluso el parseo, y el hash de contenido de la factura ya
+   parseada (:func:`moltbot.db.hash_factura_texto`, sobre el texto completo).
+2. **Clave primaria** de ``facturas_hashes`` (un hash por factura): el ``INSERT``
+   ignora los duplicados (también entre workers), que no se insertan, no
+   cuentan en el rollup mensual y no se notifican.
+
+Solo se memorizan claves de facturas guardadas o confirmadas como
+duplicadas, nunca las de inserciones fallidas, para que un reintento tras
+un error vuelva a procesarse.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+
+from moltbot.config import settings
+from moltbot.messaging.facturas import Factura
+from moltbot.utils import metrics
+
+
+@dataclass(frozen=True)
+class DedupStats:
+    """Contadores de la caché de deduplicación."""
+
+    mensajes_duplicados: int
+    facturas_duplicadas: int
+    size: int
+    max_size: int
+
+
+class DedupCache:
+    """Conjunto LRU acotado de claves ya procesadas (seguro entre hilos)."""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max(0, max_size)
+        self._keys: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._mensajes_duplicados = 0
+        self._facturas_duplicadas = 0
+
+    def mensaje_visto(self, key: str) -> bool:
+        """``True`` (y lo cuenta) si el mensaje con clave *key* ya se procesó."""
+        with self._lock:
+            if self._touch(key):
+                self._mensajes_duplicados += 1
+                return True
+            return False
+
+    def factura_vista(self, key: str) -> bool:
+        """``True`` (y lo cuenta) si la factura con clave *key* ya se guardó."""
+        with self._lock:
+            if self._touch(key):
+                self._facturas_duplicadas += 1
+                return True
+            return False
+
+    def contar_duplicada(self) -> None:
+        """Cuenta una factura rechazada como duplicada por el índice único."""
+        with self._lock:
+            self._facturas_duplicadas += 1
+
+    def _touch(self, key: str) -> bool:
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def add(self, *keys: str) -> None:
+        """Memoriza *keys*, expulsando las menos recientes si no caben."""
+        if not self._max_size:
+            return
+        with self._lock:
+            for key in keys:
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self._max_size:
+                self._keys.popitem(last=False)
+
+    def stats(self) -> DedupStats:
+        """Devuelve una instantánea de los contadores."""
+        with self._lock:
+            return DedupStats(
+                mensajes_duplicados=self._mensajes_duplicados,
+                facturas_duplicadas=self._facturas_duplicadas,
+                size=len(self._keys),
+                max_size=self._max_size,
+            )
+
+
+_cache = DedupCache(settings.invoices.dedup_cache_size)
+
+
+def clave_mensaje(headers: Optional[Mapping[str, Any]], body: bytes) -> str:
+    """Clave del mensaje crudo: mismo proveedor declarado y mismo cuerpo."""
+    proveedor = str(headers.get("proveedor") or "") if headers else ""
+    digest = hashlib.sha256(proveedor.encode("utf-8"))
+    digest.update(b"\x1f")
+    digest.update(body)
+    return "m:" + digest.hexdigest()
+
+
+def clave_factura(factura: Factura) -> str:
+    """Clave de contenido de una factura parseada (la del índice único)."""
+    return "f:" + factura.hash_contenido
+
+
+def mensaje_visto(clave: str) -> bool:
+    """``True`` si el mensaje ya se procesó (se puede descartar sin parsearlo)."""
+    return _cache.mensaje_visto(clave)
+
+
+def factura_vista(clave: str) -> bool:
+    """``True`` si la factura ya se guardó (se puede descartar sin insertarla)."""
+    return _cache.factura_vista(clave)
+
+
+def marcar_procesada(*claves: str) -> None:
+    """Memoriza las claves de una factura guardada o confirmada como duplicada."""
+    _cache.add(*claves)
+
+
+def contar_duplicada() -> None:
+    """Cuenta una factura rechazada como duplicada por el índice único."""
+    _cache.contar_duplicada()
+
+
+def get_dedup_stats() -> DedupStats:
+    """Contadores de deduplicación del proceso."""
+    return _cache.stats()
+
+
+metrics.register_stats(
+    get_dedup_stats,
+    counters={
+        "mensajes_duplicados": (
+            "moltbot_dedup_messages_total", "Mensajes repetidos descartados antes de parsear.",
+        ),
+        "facturas_duplicadas": (
+            "moltbot_dedup_invoices_total", "Facturas duplicadas (caché o índice único).",
+        ),
+    },
+)
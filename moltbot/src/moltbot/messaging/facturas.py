@@ -0,0 +1,142 @@
+"""
+Decodificación y parseo de mensajes de factura.
+
+Lógica común a todos los runtimes (pika bloqueante, modo batch, asyncio):
+no depende del cliente AMQP, solo de las cabeceras y el cuerpo del mensaje.
+
+Los cuerpos de más de ``FACTURA_LARGE_PAYLOAD_BYTES`` no pasan por
+``json.loads``: el texto se localiza en el buffer crudo y solo se decodifican
+las ventanas donde cada parser declara que está el total
+(``BillParser.search_window``), de modo que la memoria y la CPU por mensaje
+no crecen con el número de páginas de la factura.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Mapping, NamedTuple, Optional
+
+from moltbot.config import settings
+from moltbot.db import hash_factura_texto
+from moltbot.processors.bill_parser import SearchWindow, detect_provider, get_parser
+from moltbot.processors.payload import Span, find_string_value, iter_fragments, read_windows
+from moltbot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Longitud máxima del texto original que se guarda junto a la factura.
+TEXTO_MAX = 500
+
+
+class Factura(NamedTuple):
+    """Factura parseada, lista para insertar (``insert_facturas`` la acepta tal cual)."""
+
+    proveedor: str
+    importe: float
+    # Texto original truncado a ``TEXTO_MAX`` (lo que se guarda).
+    texto: str
+    # Hash de contenido calculado sobre el texto completo (clave de deduplicación).
+    hash_contenido: str
+
+
+_invoices = settings.invoices
+
+# Bytes de JSON que bastan para TEXTO_MAX caracteres (peor caso: ``\uXXXX``).
+_HEAD_MIN = TEXTO_MAX * 6
+
+
+def extraer_factura(headers: Optional[Mapping[str, Any]], body: bytes) -> Optional[Factura]:
+    """Decodifica y parsea un mensaje de factura.
+
+    Si el mensaje no trae cabecera ``proveedor``, se detecta a partir del
+    texto (``detect_provider``) y se acepta si la confianza alcanza
+    ``FACTURA_DETECT_MIN_CONFIDENCE``.
+
+    Returns:
+        La :class:`Factura` lista para insertar, o ``None`` si el mensaje no
+        se puede procesar (proveedor desconocido, importe ilegible…).
+    """
+    if len(body) > _invoices.large_payload_bytes:
+        buf = memoryview(body)
+        with metrics.STAGE_SECONDS.time(stage="decode"):
+            span = find_string_value(buf, "text")
+        if span is not None:
+            return _extraer_factura_grande(headers, buf, span)
+        logger.warning("Mensaje grande sin campo 'text' localizable; se decodifica entero.")
+
+    with metrics.STAGE_SECONDS.time(stage="decode"):
+        datos: dict = json.loads(body)
+    texto: str = datos.get("text", "")
+    proveedor = headers.get("proveedor") if headers else None
+    if not proveedor:
+        proveedor = _detectar_proveedor(texto)
+
+    parser = get_parser(proveedor)
+    if parser is None:
+        metrics.DISCARDED.inc(reason="unknown_provider")
+        return None
+
+    with metrics.STAGE_SECONDS.time(stage="parse", provider=proveedor):
+        importe: Optional[float] = parser.extraer_importe(texto)
+
+    if importe is None:
+        metrics.DISCARDED.inc(reason="no_amount")
+        logger.warning("No se pudo extraer el importe del texto recibido.")
+        return None
+
+    return Factura(
+        proveedor, importe, texto[:TEXTO_MAX], hash_factura_texto(proveedor, importe, (texto,)),
+    )
+
+
+def _extraer_factura_grande(
+    headers: Optional[Mapping[str, Any]], buf: memoryview, span: Span,
+) -> Optional[Factura]:
+    """Variante de :func:`extraer_factura` que solo decodifica ventanas del texto."""
+    proveedor = headers.get("proveedor") if headers else None
+    if not proveedor:
+        with metrics.STAGE_SECONDS.time(stage="decode"):
+            cabeza, cola = read_windows(buf, span, _invoices.window_head, _invoices.window_tail)
+        proveedor = _detectar_proveedor(f"{cabeza}\n{cola}")
+
+    parser = get_parser(proveedor)
+    if parser is None:
+        metrics.DISCARDED.inc(reason="unknown_provider")
+        return None
+
+    ventana = parser.search_window or SearchWindow(_invoices.window_head, _invoices.window_tail)
+    with metrics.STAGE_SECONDS.time(stage="decode"):
+        cabeza, cola = read_windows(buf, span, max(ventana.head, _HEAD_MIN), ventana.tail)
+    logger.info(
+        "Factura grande (%d bytes de texto): se analizan %d + %d caracteres.",
+        len(span), len(cabeza), len(cola),
+    )
+
+    with metrics.STAGE_SECONDS.time(stage="parse", provider=proveedor):
+        importe = parser.extraer_importe(f"{cabeza}\n{cola}" if cola else cabeza)
+    if importe is None:
+        metrics.DISCARDED.inc(reason="no_amount")
+        logger.warning("No se pudo extraer el importe del texto recibido.")
+        return None
+
+    # El hash recorre el texto entero por trozos, sin tenerlo completo en memoria.
+    with metrics.STAGE_SECONDS.time(stage="decode"):
+        hash_contenido = hash_factura_texto(proveedor, importe, iter_fragments(buf, span))
+    return Factura(proveedor, importe, cabeza[:TEXTO_MAX], hash_contenido)
+
+
+def _detectar_proveedor(texto: str) -> str:
+    """Proveedor detectado en *texto*, o ``"desconocido"`` si no hay confianza suficiente."""
+    with metrics.STAGE_SECONDS.time(stage="detect"):
+        match = detect_provider(texto)
+    if match is None:
+        return "desconocido"
+    if match.confidence < settings.invoices.detect_min_confidence:
+        logger.warning(
+            "Proveedor dudoso (%s, confianza %.2f); se descarta la factura.",
+            match.provider, match.confidence,
+        )
+        return "desconocido"
+    logger.info("Proveedor detectado: %s (confianza %.2f)", match.provider, match.confidence)
+    return match.provider
@@ -0,0 +1,482 @@
+"""
+Publicación fiable de respuestas con *publisher confirms*.
+
+El consumidor bloqueante publicaba cada respuesta con un ``basic_publish``
+sin confirmar: si RabbitMQ caía justo entonces, la respuesta se perdía sin
+aviso. ``ReplyPublisher`` mantiene su propia conexión (``SelectConnection``)
+en un hilo dedicado y:
+
+* activa *publisher confirms* y sigue los acks/nacks de forma asíncrona
+  (``publicar`` encola y vuelve al instante, sin esperar la confirmación);
+* agrupa las respuestas que se acumulan bajo carga en una misma vuelta del
+  ioloop (hasta ``RABBIT_REPLY_BATCH_SIZE``, con espera opcional
+  ``RABBIT_REPLY_BATCH_LINGER_MS``);
+* reintenta las rechazadas (``nack``) y, tras una reconexión, vuelve a
+  publicar las que quedaron sin confirmar (entrega *at-least-once*: el
+  consumidor debe tolerar respuestas repetidas con el mismo
+  ``correlation_id``);
+* avisa a quien publica (``on_confirm``) cuando el broker confirma la
+  respuesta o la descarta definitivamente, para que el comando solo se
+  confirme (``basic_ack``) con la respuesta ya a salvo;
+* publica con ``mandatory`` y cuenta las respuestas que no llegan a ninguna
+  cola (``reply_to`` inexistente).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Mapping, Optional
+
+import pika
+from pika.spec import Basic, BasicProperties
+
+from moltbot.config import settings
+from moltbot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_rabbit = settings.rabbitmq
+
+# Aviso del resultado de una respuesta: ``True`` si el broker la confirmó,
+# ``False`` si se descartó tras agotar los reintentos. Se llama desde el hilo
+# del publicador.
+OnConfirm = Callable[[bool], None]
+
+
+@dataclass(frozen=True)
+class PublisherStats:
+    """Contadores del publicador de respuestas."""
+
+    publicadas: int
+    confirmadas: int
+    rechazadas: int
+    devueltas: int
+    descartadas: int
+    reconexiones: int
+    pendientes: int
+    sin_confirmar: int
+
+
+@dataclass
+class _Respuesta:
+    routing_key: str
+    body: bytes
+    properties: BasicProperties
+    encolada: float = field(default_factory=time.monotonic)
+    intentos: int = 0
+    on_confirm: Optional[OnConfirm] = None
+
+    def avisar(self, confirmada: bool) -> None:
+        """Llama a ``on_confirm`` (si lo hay) sin dejar escapar sus errores al ioloop."""
+        if self.on_confirm is None:
+            return
+        try:
+            self.on_confirm(confirmada)
+        except Exception:
+            logger.exception("Error en el aviso de confirmación de una respuesta.")
+
+
+class ReplyPublisher:
+    """Publicador con confirms que corre en su propio hilo e ioloop."""
+
+    def __init__(
+        self,
+        parameters: pika.ConnectionParameters,
+        queue: str,
+        durable: bool = False,
+        batch_size: int = 100,
+        linger_ms: int = 0,
+        max_pending: int = 10_000,
+        max_retries: int = 3,
+        reconnect_delay: float = 5.0,
+    ) -> None:
+        self._parameters = parameters
+        self._queue = queue
+        self._durable = durable
+        self._batch_size = max(1, batch_size)
+        self._linger = max(0, linger_ms) / 1000
+        self._max_pending = max(1, max_pending)
+        self._max_retries = max(0, max_retries)
+        self._reconnect_delay = reconnect_delay
+
+        self._lock = threading.Lock()
+        self._pending: deque[_Respuesta] = deque()
+        self._flush_scheduled = False
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Solo se tocan desde el hilo del ioloop.
+        self._connection: Optional[pika.SelectConnection] = None
+        self._channel = None
+        self._ready = False
+        self._next_tag = 0
+        self._outstanding: OrderedDict[int, _Respuesta] = OrderedDict()
+
+        self._publicadas = 0
+        self._confirmadas = 0
+        self._rechazadas = 0
+        self._devueltas = 0
+        self._descartadas = 0
+        self._reconexiones = 0
+
+    # -- API pública --------------------------------------------------------
+
+    def start(self) -> None:
+        """Arranca el hilo del publicador (conecta y reconecta por su cuenta)."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="moltbot-publisher", daemon=True,
+            )
+            self._thread.start()
+
+    def publicar(
+        self,
+        body: bytes,
+        routing_key: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        headers: Optional[Mapping[str, Any]] = None,
+        on_confirm: Optional[OnConfirm] = None,
+    ) -> bool:
+        """Encola una respuesta para publicarla con confirmación (no bloquea).
+
+        *on_confirm* se llama (desde el hilo del publicador) cuando el broker
+        confirma la respuesta o cuando se descarta tras ``max_retries`` nacks.
+
+        Returns:
+            ``False`` si se descartó porque la cola interna está llena (en ese
+            caso no se llama a *on_confirm*).
+        """
+        properties = BasicProperties(
+            correlation_id=correlation_id,
+            headers=dict(headers) if headers else None,
+            delivery_mode=2 if self._durable else None,  # 2 = persistente
+            content_type="text/plain",
+        )
+        respuesta = _Respuesta(routing_key or self._queue, body, properties, on_confirm=on_confirm)
+        with self._lock:
+            if len(self._pending) >= self._max_pending:
+                self._descartadas += 1
+                logger.warning("Cola de respuestas llena; se descarta una respuesta.")
+                return False
+            self._pending.append(respuesta)
+        self._wake()
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Espera (hasta *timeout*) a que se confirme lo pendiente y cierra la conexión."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and (self._pending or self._outstanding):
+            time.sleep(0.05)
+        if self._pending or self._outstanding:
+            logger.warning(
+                "Se cierran %d respuestas sin confirmar.",
+                len(self._pending) + len(self._outstanding),
+            )
+        self._stopping.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._close)
+            except Exception:
+                pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> PublisherStats:
+        """Devuelve una instantánea de los contadores."""
+        with self._lock:
+            return PublisherStats(
+                publicadas=self._publicadas,
+                confirmadas=self._confirmadas,
+                rechazadas=self._rechazadas,
+                devueltas=self._devueltas,
+                descartadas=self._descartadas,
+                reconexiones=self._reconexiones,
+                pendientes=len(self._pending),
+                sin_confirmar=len(self._outstanding),
+            )
+
+    # -- Hilo del publicador ------------------------------------------------
+
+    def _run(self) -> None:
+        primera = True
+        while not self._stopping.is_set():
+            if not primera:
+                with self._lock:
+                    self._reconexiones += 1
+            primera = False
+            self._connection = pika.SelectConnection(
+                self._parameters,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._connection.ioloop.start()
+            self._connection = None
+            if not self._stopping.is_set():
+                self._stopping.wait(self._reconnect_delay)
+
+    def _wake(self) -> None:
+        """Programa un flush en el ioloop (como mucho uno pendiente a la vez)."""
+        with self._lock:
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        connection = self._connection
+        if connection is None:
+            with self._lock:
+                self._flush_scheduled = False
+            return  # se publicará al (re)conectar
+        try:
+            connection.ioloop.add_callback_threadsafe(self._schedule_flush)
+        except Exception:
+            with self._lock:
+                self._flush_scheduled = False
+
+    def _schedule_flush(self) -> None:
+        if self._linger and self._connection is not None:
+            self._connection.ioloop.call_later(self._linger, self._flush)
+        else:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Publica hasta ``batch_size`` respuestas pendientes (hilo del ioloop)."""
+        with self._lock:
+            self._flush_scheduled = False
+        if not self._ready:
+            return
+        with self._lock:
+            n = min(self._batch_size, len(self._pending))
+            lote = [self._pending.popleft() for _ in range(n)]
+            quedan = bool(self._pending)
+        for respuesta in lote:
+            self._next_tag += 1
+            self._outstanding[self._next_tag] = respuesta
+            respuesta.intentos += 1
+            self._channel.basic_publish(
+                exchange="",
+                routing_key=respuesta.routing_key,
+                body=respuesta.body,
+                properties=respuesta.properties,
+                mandatory=True,
+            )
+        if lote:
+            with self._lock:
+                self._publicadas += len(lote)
+        if quedan:
+            # Devuelve el control al ioloop (acks, heartbeats) antes del siguiente lote.
+            self._wake()
+
+    # -- Callbacks de pika (hilo del ioloop) --------------------------------
+
+    def _on_connection_open(self, connection: pika.SelectConnection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, _connection, error: Exception) -> None:
+        logger.error("El publicador de respuestas no pudo conectar: %s", error)
+        self._connection.ioloop.stop()
+
+    def _on_connection_closed(self, _connection, reason: Exception) -> None:
+        self._ready = False
+        self._channel = None
+        # Lo no confirmado se vuelve a publicar tras reconectar (at-least-once).
+        if self._outstanding:
+            with self._lock:
+                self._pending.extendleft(reversed(self._outstanding.values()))
+            self._outstanding.clear()
+        if not self._stopping.is_set():
+            logger.warning("Conexión del publicador cerrada (%s); se reconectará.", reason)
+        self._connection.ioloop.stop()
+
+    def _on_channel_open(self, channel) -> None:
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.add_on_return_callback(self._on_return)
+        channel.queue_declare(
+            queue=self._queue, durable=self._durable, callback=self._on_queue_declared,
+        )
+
+    def _on_queue_declared(self, _frame) -> None:
+        self._channel.confirm_delivery(
+            ack_nack_callback=self._on_confirm, callback=self._on_confirm_ok,
+        )
+
+    def _on_confirm_ok(self, _frame) -> None:
+        self._next_tag = 0
+        self._ready = True
+        logger.info("Publicador de respuestas listo (confirms activos).")
+        self._flush()
+
+    def _on_channel_closed(self, _channel, reason: Exception) -> None:
+        logger.warning("Canal del publicador cerrado: %s", reason)
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_return(self, _channel, method: Basic.Return, properties, _body) -> None:
+        with self._lock:
+            self._devueltas += 1
+        logger.warning(
+            "Respuesta sin cola de destino '%s' (%s, correlation_id=%s).",
+            method.routing_key, method.reply_text, properties.correlation_id,
+        )
+
+    def _on_confirm(self, frame) -> None:
+        method = frame.method
+        if method.multiple:
+            confirmadas = []
+            while self._outstanding and next(iter(self._outstanding)) <= method.delivery_tag:
+                confirmadas.append(self._outstanding.popitem(last=False)[1])
+        else:
+            respuesta = self._outstanding.pop(method.delivery_tag, None)
+            confirmadas = [respuesta] if respuesta is not None else []
+
+        if isinstance(method, Basic.Ack):
+            ahora = time.monotonic()
+            for respuesta in confirmadas:
+                metrics.STAGE_SECONDS.observe(ahora - respuesta.encolada, stage="publish")
+            with self._lock:
+                self._confirmadas += len(confirmadas)
+            for respuesta in confirmadas:
+                respuesta.avisar(True)
+            return
+
+        # Nack: el broker no pudo aceptarlas; se reintentan al principio de la
+        # cola salvo las que ya agotaron sus intentos.
+        reintentos = [r for r in confirmadas if r.intentos <= self._max_retries]
+        descartadas = [r for r in confirmadas if r.intentos > self._max_retries]
+        with self._lock:
+            self._rechazadas += len(confirmadas)
+            self._descartadas += len(descartadas)
+            self._pending.extendleft(reversed(reintentos))
+        metrics.ERRORS.inc(len(confirmadas), stage="publish")
+        if reintentos:
+            logger.warning(
+                "%d respuestas rechazadas por RabbitMQ; se reintentan.", len(reintentos),
+            )
+            self._wake()
+        if descartadas:
+            logger.error(
+                "%d respuestas rechazadas por RabbitMQ %d veces; se descartan.",
+                len(descartadas), self._max_retries + 1,
+            )
+            for respuesta in descartadas:
+                respuesta.avisar(False)
+
+    def _close(self) -> None:
+        if self._connection is not None and not (
+            self._connection.is_closing or self._connection.is_closed
+        ):
+            self._connection.close()
+
+
+def destino_respuesta(
+    correlation_id: Optional[str],
+    reply_to: Optional[str],
+    headers: Optional[Mapping[str, Any]],
+) -> tuple[str, Optional[str]]:
+    """Cola de destino y ``correlation_id`` de la respuesta a un comando.
+
+    Se toman de las propiedades AMQP del comando o, si no vienen (el nodo
+    RabbitMQ de n8n solo permite fijar cabeceras), de las cabeceras
+    ``reply_to`` y ``correlation_id``. Sin ``reply_to`` se responde en
+    ``respuestas_bot``.
+    """
+    headers = headers or {}
+    reply_to = reply_to or headers.get("reply_to")
+    correlation_id = correlation_id or headers.get("correlation_id")
+    return (
+        str(reply_to) if reply_to else _rabbit.queue_respuestas,
+        str(correlation_id) if correlation_id else None,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Instancia global (una por proceso)
+# ---------------------------------------------------------------------------
+
+_publisher: Optional[ReplyPublisher] = None
+_publisher_pid: Optional[int] = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher() -> ReplyPublisher:
+    """Devuelve el publicador del proceso, creándolo y arrancándolo bajo demanda."""
+    global _publisher, _publisher_pid
+    pid = os.getpid()
+    if _publisher is not None and _publisher_pid == pid:
+        return _publisher
+    with _publisher_lock:
+        if _publisher is None or _publisher_pid != pid:
+            publisher = ReplyPublisher(
+                pika.ConnectionParameters(
+                    host=_rabbit.host,
+                    credentials=pika.PlainCredentials(_rabbit.user, _rabbit.password),
+                    heartbeat=_rabbit.heartbeat,
+                ),
+                queue=_rabbit.queue_respuestas,
+                durable=_rabbit.durable,
+                batch_size=_rabbit.reply_batch_size,
+                linger_ms=_rabbit.reply_batch_linger_ms,
+                max_pending=_rabbit.reply_max_pending,
+                max_retries=_rabbit.reply_max_retries,
+            )
+            publisher.start()
+            _publisher, _publisher_pid = publisher, pid
+    return _publisher
+
+
+def publicar_respuesta(
+    respuesta: str,
+    routing_key: Optional[str] = None,
+    correlation_id: Optional[str] = None,
+    on_confirm: Optional[OnConfirm] = None,
+) -> bool:
+    """Encola *respuesta* en el publicador del proceso; no bloquea al consumidor.
+
+    Ver :meth:`ReplyPublisher.publicar` para *on_confirm* y el valor devuelto.
+    """
+    headers = {"correlation_id": correlation_id} if correlation_id else None
+    return get_publisher().publicar(
+        respuesta.encode(), routing_key, correlation_id, headers, on_confirm,
+    )
+
+
+def stop_publisher(timeout: float = 10.0) -> None:
+    """Espera las confirmaciones pendientes y detiene el publicador (si existe)."""
+    global _publisher, _publisher_pid
+    with _publisher_lock:
+        if _publisher is not None and _publisher_pid == os.getpid():
+            _publisher.stop(timeout)
+        _publisher, _publisher_pid = None, None
+
+
+def get_publisher_stats() -> Optional[PublisherStats]:
+    """Contadores del publicador del proceso, o ``None`` si aún no existe."""
+    publisher = _publisher
+    if publisher is None or _publisher_pid != os.getpid():
+        return None
+    return publisher.stats()
+
+
+metrics.register_stats(
+    get_publisher_stats,
+    counters={
+        "publicadas": ("moltbot_replies_published_total", "Respuestas publicadas."),
+        "confirmadas": ("moltbot_replies_confirmed_total", "Respuestas confirmadas por RabbitMQ."),
+        "rechazadas": ("moltbot_replies_nacked_total", "Respuestas rechazadas (nack)."),
+        "devueltas": ("moltbot_replies_returned_total", "Respuestas sin cola de destino."),
+        "descartadas": ("moltbot_replies_dropped_total", "Respuestas descartadas."),
+        "reconexiones": ("moltbot_replies_reconnects_total", "Reconexiones del publicador."),
+    },
+    gauges={
+        "pendientes": ("moltbot_replies_pending", "Respuestas esperando a publicarse."),
+        "sin_confirmar": ("moltbot_replies_unconfirmed", "Publicadas sin confirmar aún."),
+    },
+)
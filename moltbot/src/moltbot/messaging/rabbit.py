@@ -6,9 +6,9 @@ Gestiona la conexión, declaración de colas y callbacks de consumo.
 
 from __future__ import annotations
 
-import json
+import functools
 import logging
-from typing import Optional
+from typing import Collection, Optional
 
 import pika
 from pika.adapters.blocking_connection import BlockingChannel
@@ -16,9 +16,14 @@ from pika.spec import Basic, BasicProperties
 
 from moltbot.commands import dispatch
 from moltbot.config import settings
-from moltbot.db import insert_factura
-from moltbot.processors.bill_parser import get_parser
-from moltbot.utils.discord_bot import enviar_notificacion_factura
+from moltbot.db import insert_facturas
+from moltbot.messaging import dedup
+from moltbot.messaging.batch import FacturaBatcher
+from moltbot.messaging.facturas import Factura, extraer_factura
+from moltbot.messaging.publisher import destino_respuesta, publicar_respuesta
+from moltbot.messaging.workers import AccionCanal, ConcurrentConsumer, Confirmar
+from moltbot.utils import metrics, profiling
+from moltbot.utils.notifier import notificar_factura
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +34,43 @@ _rabbit = settings.rabbitmq
 # Callbacks de las colas
 # ---------------------------------------------------------------------------
 
+def _extraer_factura(properties: BasicProperties, body: bytes) -> Optional[Factura]:
+    """Adapta :func:`extraer_factura` a las propiedades de pika."""
+    return extraer_factura(properties.headers, body)
+
+
+@profiling.hook
+@metrics.track_message(_rabbit.queue_facturas)
+def _guardar_factura(properties: BasicProperties, body: bytes) -> None:
+    """Parsea, guarda y notifica una factura (salvo que sea un duplicado)."""
+    clave = dedup.clave_mensaje(properties.headers, body)
+    if dedup.mensaje_visto(clave):
+        logger.info("Mensaje de factura repetido; se descarta.")
+        return
+
+    factura = _extraer_factura(properties, body)
+    if factura is None:
+        return
+    clave_factura = dedup.clave_factura(factura)
+    if dedup.factura_vista(clave_factura):
+        dedup.marcar_procesada(clave)
+        logger.info("Factura ya registrada; se descarta.")
+        return
+
+    ids = insert_facturas([factura])
+    if ids is None:
+        return
+    dedup.marcar_procesada(clave, clave_factura)
+
+    proveedor, importe = factura.proveedor, factura.importe
+    if ids[0] is None:
+        dedup.contar_duplicada()
+        logger.info("Factura duplicada de %s (%.2f€); no se notifica.", proveedor, importe)
+        return
+    notificar_factura(proveedor, importe)
+    logger.info("Factura guardada: %.2f€ (ID: %s)", importe, ids[0])
+
+
 def _on_factura(
     ch: BlockingChannel,
     method: Basic.Deliver,
@@ -37,73 +79,179 @@ def _on_factura(
 ) -> None:
     """Procesa un mensaje de la cola de facturas."""
     try:
-        datos: dict = json.loads(body)
-        proveedor = (
-            properties.headers.get("proveedor", "desconocido")
-            if properties.headers
-            else "desconocido"
-        )
-        texto: str = datos.get("text", "")
+        _guardar_factura(properties, body)
+    except Exception:
+        logger.exception("Error procesando factura.")
 
-        parser = get_parser(proveedor)
-        if parser is None:
-            return
 
-        importe: Optional[float] = parser.extraer_importe(texto)
+@profiling.hook
+@metrics.track_message(_rabbit.queue_comandos)
+def _responder_comando(body: bytes, properties: Optional[BasicProperties] = None) -> str:
+    """Ejecuta el comando recibido y devuelve la respuesta."""
+    # Solo el nombre del comando ignora mayúsculas; los argumentos se respetan.
+    comando = body.decode().strip()
+    logger.info("Comando recibido: %s", comando)
+    return dispatch(comando, _destino(properties))
 
-        if importe is None:
-            logger.warning("No se pudo extraer el importe del texto recibido.")
-            return
 
-        id_db = insert_factura(proveedor=proveedor, importe=importe, texto=texto[:500])
-        enviar_notificacion_factura(proveedor, importe)
-        logger.info("Factura guardada: %.2f€ (ID: %s)", importe, id_db)
+def _destino(properties: Optional[BasicProperties]) -> tuple[str, Optional[str]]:
+    """``(routing_key, correlation_id)`` de la respuesta al comando."""
+    return destino_respuesta(
+        properties.correlation_id if properties else None,
+        properties.reply_to if properties else None,
+        properties.headers if properties else None,
+    )
 
-    except Exception:
-        logger.exception("Error procesando factura.")
+
+def _respuesta_perdida(routing_key: str, correlation_id: Optional[str]) -> None:
+    metrics.REPLIES_LOST.inc()
+    logger.error(
+        "Respuesta a %s descartada (correlation_id=%s); el comando se confirma sin ella.",
+        routing_key, correlation_id,
+    )
 
 
-def _on_comando(
+def _publicar_respuesta(
     ch: BlockingChannel,
-    method: Basic.Deliver,
-    properties: BasicProperties,
-    body: bytes,
-) -> None:
-    """Procesa un comando entrante y publica la respuesta."""
-    comando = body.decode().lower().strip()
-    logger.info("Comando recibido: %s", comando)
+    confirmar: Confirmar,
+    respuesta: str,
+    properties: Optional[BasicProperties] = None,
+) -> bool:
+    """Publica *respuesta* al comando con *properties* (``reply_to``/``correlation_id``).
 
-    respuesta = dispatch(comando)
+    Con publisher confirms, el comando se confirma cuando el broker acepta la
+    respuesta o cuando esta se da por perdida (cola interna llena o rechazada
+    tras los reintentos): reencolarlo volvería a ejecutar el handler, que
+    puede tener efectos (``backup_workflows``, ``profile_start``…), en bucle
+    mientras dure el problema. Las respuestas perdidas se cuentan en
+    ``moltbot_replies_lost_total``.
 
-    ch.basic_publish(
-        exchange="",
-        routing_key=_rabbit.queue_respuestas,
-        body=respuesta,
-    )
-    logger.info("Respuesta enviada: %s", respuesta)
+    Returns:
+        ``True`` si la confirmación del comando queda pendiente de *confirmar*.
+    """
+    routing_key, correlation_id = _destino(properties)
+    if _rabbit.publisher_confirms:
+
+        def confirmada(ok: bool) -> None:
+            if not ok:
+                _respuesta_perdida(routing_key, correlation_id)
+            confirmar(True)
+
+        # Encola en el publicador con confirms; no bloquea el hilo de la conexión.
+        if not publicar_respuesta(respuesta, routing_key, correlation_id, on_confirm=confirmada):
+            _respuesta_perdida(routing_key, correlation_id)
+            return False
+        logger.info("Respuesta encolada para %s: %s", routing_key, respuesta)
+        return True
+
+    with metrics.STAGE_SECONDS.time(stage="publish"):
+        ch.basic_publish(
+            exchange="",
+            routing_key=routing_key,
+            body=respuesta,
+            properties=pika.BasicProperties(
+                correlation_id=correlation_id,
+                headers={"correlation_id": correlation_id} if correlation_id else None,
+                delivery_mode=2 if _rabbit.durable else None,
+            ),
+        )
+    logger.info("Respuesta enviada a %s: %s", routing_key, respuesta)
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Tareas para los consumidores concurrentes (se ejecutan en hilos worker)
+# ---------------------------------------------------------------------------
+
+def _tarea_comando(properties: BasicProperties, body: bytes) -> AccionCanal:
+    respuesta = _responder_comando(body, properties)
+    # La publicación se hace en el hilo de la conexión.
+    return functools.partial(_publicar_respuesta, respuesta=respuesta, properties=properties)
 
 
 # ---------------------------------------------------------------------------
 # Conexión a RabbitMQ
 # ---------------------------------------------------------------------------
 
-def connect() -> tuple[pika.BlockingConnection, BlockingChannel]:
-    """Crea la conexión y el canal a RabbitMQ, declarando las colas necesarias."""
+def connect(
+    queues: Optional[Collection[str]] = None,
+) -> tuple[pika.BlockingConnection, BlockingChannel, list[ConcurrentConsumer]]:
+    """Crea la conexión y el canal a RabbitMQ, declarando las colas necesarias.
+
+    Args:
+        queues: Colas a consumir (por defecto, comandos y facturas). El
+            supervisor lo usa para dedicar workers a una cola concreta.
+
+    Returns:
+        ``(conexión, canal, consumidores)``: al cerrar hay que llamar a
+        ``shutdown()`` de cada consumidor antes de cerrar la conexión, para
+        que los mensajes en curso terminen y se confirmen.
+    """
     credentials = pika.PlainCredentials(_rabbit.user, _rabbit.password)
     connection = pika.BlockingConnection(
-        pika.ConnectionParameters(host=_rabbit.host, credentials=credentials),
+        pika.ConnectionParameters(
+            host=_rabbit.host, credentials=credentials, heartbeat=_rabbit.heartbeat,
+        ),
     )
     channel = connection.channel()
 
-    channel.queue_declare(queue=_rabbit.queue_comandos)
-    channel.queue_declare(queue=_rabbit.queue_facturas)
-    channel.queue_declare(queue=_rabbit.queue_respuestas)
+    consumir_comandos = queues is None or _rabbit.queue_comandos in queues
+    consumir_facturas = queues is None or _rabbit.queue_facturas in queues
 
-    channel.basic_consume(
-        queue=_rabbit.queue_comandos, on_message_callback=_on_comando, auto_ack=True,
-    )
-    channel.basic_consume(
-        queue=_rabbit.queue_facturas, on_message_callback=_on_factura, auto_ack=True,
-    )
+    # Solo se declaran las colas que usa este worker (la de respuestas la
+    # declara el publicador con confirms si está activo).
+    declarar = [
+        cola for cola, usada in (
+            (_rabbit.queue_comandos, consumir_comandos),
+            (_rabbit.queue_facturas, consumir_facturas),
+            (_rabbit.queue_respuestas, consumir_comandos and not _rabbit.publisher_confirms),
+        )
+        if usada
+    ]
+    for queue in declarar:
+        channel.queue_declare(queue=queue, durable=_rabbit.durable)
+
+    consumers: list[ConcurrentConsumer] = []
+    if consumir_comandos:
+        # Los comandos se atienden siempre en paralelo, sea cual sea el modo:
+        # un handler lento no retiene al resto ni al hilo de la conexión.
+        consumers.append(ConcurrentConsumer(
+            connection, channel, _rabbit.queue_comandos, _tarea_comando,
+            max_workers=_rabbit.concurrency_comandos,
+        ))
+    if consumir_facturas and _rabbit.consumer_mode == "concurrent":
+        consumers.append(ConcurrentConsumer(
+            connection, channel, _rabbit.queue_facturas, _guardar_factura,
+            max_workers=_rabbit.concurrency_facturas,
+        ))
+    for consumer in consumers:
+        consumer.start()
+    if not consumir_facturas or _rabbit.consumer_mode == "concurrent":
+        return connection, channel, consumers
+
+    if _rabbit.consumer_mode == "batch":
+        # Ack manual: el prefetch limita los mensajes en vuelo sin confirmar.
+        channel.basic_qos(prefetch_count=_rabbit.prefetch_count)
+        # Aquí acaban las facturas que no entran en la DB ni fila a fila.
+        channel.queue_declare(queue=_rabbit.queue_facturas_fallidas, durable=_rabbit.durable)
+        batcher = FacturaBatcher(
+            channel,
+            extraer=_extraer_factura,
+            batch_size=_rabbit.factura_batch_size,
+            linger_ms=_rabbit.factura_batch_linger_ms,
+        )
+        channel.basic_consume(
+            queue=_rabbit.queue_facturas, on_message_callback=batcher.on_message,
+        )
+        logger.info(
+            "Facturas en modo batch (lote=%d, linger=%dms, prefetch=%d).",
+            _rabbit.factura_batch_size,
+            _rabbit.factura_batch_linger_ms,
+            _rabbit.prefetch_count,
+        )
+    else:
+        channel.basic_consume(
+            queue=_rabbit.queue_facturas, on_message_callback=_on_factura, auto_ack=True,
+        )
 
-    return connection, channel
+    return connection, channel, consumers
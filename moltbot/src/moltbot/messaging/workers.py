@@ -0,0 +1,127 @@
+"""
+Consumo concurrente de colas con un pool de hilos acotado.
+
+El hilo de la ``BlockingConnection`` solo recibe entregas y las reparte a un
+``ThreadPoolExecutor`` por cola. Los acks y publicaciones vuelven al hilo de
+la conexión mediante ``add_callback_threadsafe`` (pika no es thread-safe), de
+modo que ese hilo nunca se bloquea y sigue atendiendo los heartbeats.
+
+La contrapresión la pone el prefetch: cada consumidor recibe como mucho
+tantos mensajes sin confirmar como hilos tiene su pool.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import pika
+from pika.adapters.blocking_connection import BlockingChannel
+from pika.spec import Basic, BasicProperties
+
+logger = logging.getLogger(__name__)
+
+# Confirma la entrega en curso desde cualquier hilo: ``True`` hace ``basic_ack``
+# y ``False`` ``basic_nack`` con reencolado.
+Confirmar = Callable[[bool], None]
+
+# Acción que el worker devuelve para ejecutar en el hilo de la conexión
+# (p. ej. publicar una respuesta) antes de confirmar la entrega. Si devuelve
+# ``True``, la confirmación queda a su cargo (llamando a ``Confirmar``, p. ej.
+# cuando el broker acepte la respuesta); si no, el mensaje se confirma al
+# terminar.
+AccionCanal = Callable[[BlockingChannel, Confirmar], bool]
+Tarea = Callable[[BasicProperties, bytes], Optional[AccionCanal]]
+
+
+class ConcurrentConsumer:
+    """Consumidor de una cola que procesa las entregas en paralelo."""
+
+    def __init__(
+        self,
+        connection: pika.BlockingConnection,
+        channel: BlockingChannel,
+        queue: str,
+        tarea: Tarea,
+        max_workers: int,
+    ) -> None:
+        self._connection = connection
+        self._channel = channel
+        self._queue = queue
+        self._tarea = tarea
+        self._max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix=f"moltbot-{queue}",
+        )
+
+    def start(self) -> None:
+        """Fija el prefetch del consumidor y empieza a consumir la cola."""
+        # basic_qos sin global=True aplica a los consumidores creados después.
+        self._channel.basic_qos(prefetch_count=self._max_workers)
+        self._channel.basic_consume(queue=self._queue, on_message_callback=self._on_message)
+        logger.info("Cola %s en modo concurrente (%d workers).", self._queue, self._max_workers)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Deja de aceptar trabajo y, opcionalmente, espera a los workers."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    # -- Hilo de la conexión ------------------------------------------------
+
+    def _on_message(
+        self,
+        ch: BlockingChannel,
+        method: Basic.Deliver,
+        properties: BasicProperties,
+        body: bytes,
+    ) -> None:
+        self._executor.submit(self._run, method.delivery_tag, properties, body)
+
+    def _finish(self, delivery_tag: int, accion: Optional[AccionCanal]) -> None:
+        diferida = False
+        try:
+            if accion is not None:
+                confirmar = functools.partial(self._confirmar, delivery_tag)
+                diferida = bool(accion(self._channel, confirmar))
+        except Exception:
+            logger.exception("Error publicando desde la cola %s.", self._queue)
+        finally:
+            if not diferida:
+                self._channel.basic_ack(delivery_tag=delivery_tag)
+
+    def _confirmar(self, delivery_tag: int, ok: bool) -> None:
+        """Ack (o nack con reencolado) de *delivery_tag*; se puede llamar desde cualquier hilo."""
+
+        def confirmar() -> None:
+            # Tras una reconexión el canal es otro y el tag ya no vale: el
+            # broker reentregará el mensaje.
+            if not self._channel.is_open:
+                return
+            if ok:
+                self._channel.basic_ack(delivery_tag=delivery_tag)
+            else:
+                self._channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+
+        try:
+            self._connection.add_callback_threadsafe(confirmar)
+        except Exception:
+            logger.warning("Conexión cerrada; no se pudo confirmar el mensaje %s.", delivery_tag)
+
+    # -- Hilo worker --------------------------------------------------------
+
+    def _run(self, delivery_tag: int, properties: BasicProperties, body: bytes) -> None:
+        accion: Optional[AccionCanal] = None
+        try:
+            accion = self._tarea(properties, body)
+        except Exception:
+            # Igual que con auto_ack: el fallo se registra y el mensaje se descarta.
+            logger.exception("Error procesando mensaje de la cola %s.", self._queue)
+
+        try:
+            self._connection.add_callback_threadsafe(
+                functools.partial(self._finish, delivery_tag, accion),
+            )
+        except Exception:
+            # Conexión cerrada: el broker reentregará el mensaje sin confirmar.
+            logger.warning("Conexión cerrada; no se pudo confirmar el mensaje %s.", delivery_tag)
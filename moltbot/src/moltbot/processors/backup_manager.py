@@ -2,19 +2,31 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
 import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Optional, TypeVar
 
 from moltbot.config import settings
-from moltbot.db import get_workflows
+from moltbot.db import get_workflow_ids, iter_workflows
+from moltbot.processors.snapshot_store import SnapshotStore
+from moltbot.utils.files import atomic_write
 
 logger = logging.getLogger(__name__)
 
 _SAFE_FILENAME_RE = re.compile(r"[^\w\s_-]", re.UNICODE)
 
+_MANIFEST_VERSION = 1
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
 
 def _sanitize_filename(name: str) -> str:
     """Convierte un nombre arbitrario en un nombre de fichero seguro."""
@@ -22,38 +34,321 @@ def _sanitize_filename(name: str) -> str:
     return sanitized.strip().replace(" ", "_") or "unnamed_workflow"
 
 
+def _assign_filename(name: str, wf_id: str, used: dict[str, str], previous: Optional[str]) -> str:
+    """Elige el fichero de un workflow sin pisar el de otro con el mismo nombre saneado.
+
+    Si el nombre saneado ya pertenece a otro workflow se añade el id como
+    sufijo. Un workflow conserva su fichero anterior mientras siga
+    correspondiendo a su nombre, para no renombrar ficheros sin necesidad.
+
+    Args:
+        used: fichero → id de workflow; se actualiza con la asignación.
+    """
+    base = _sanitize_filename(name)
+    candidates = (f"{base}.json", f"{base}_{wf_id}.json")
+    if previous in candidates and used.get(previous, wf_id) == wf_id:
+        filename = previous
+    elif used.get(candidates[0], wf_id) == wf_id:
+        filename = candidates[0]
+    else:
+        filename = candidates[1]
+    if previous is not None and previous != filename and used.get(previous) == wf_id:
+        del used[previous]
+    used[filename] = wf_id
+    return filename
+
+
+def _serialize_workflow(name: str, nodes: Any, connections: Any) -> bytes:
+    """Serializa un workflow tal y como se guarda en disco."""
+    workflow_data = {
+        "name": name,
+        "nodes": nodes,
+        "connections": connections,
+    }
+    return json.dumps(workflow_data, indent=4, ensure_ascii=False).encode("utf-8")
+
+
+def _snapshot_store(folder: Path) -> Optional[SnapshotStore]:
+    """Almacén de snapshots si el formato configurado lo usa."""
+    if settings.backup.format in ("snapshot", "both"):
+        return SnapshotStore(folder / settings.backup.snapshot_dir)
+    return None
+
+
+def _escribiendo(store: Optional[SnapshotStore]) -> ContextManager[None]:
+    """Bloqueo de escritura del almacén (nada si no hay almacén)."""
+    return store.writing() if store is not None else nullcontext()
+
+
+def _pipeline(items: Iterable[_T], fn: Callable[[_T], _R], workers: int) -> Iterator[_R]:
+    """Aplica *fn* a *items* en un pool de hilos, en streaming.
+
+    Como mucho hay ``2 * workers`` elementos en vuelo, así que la memoria
+    no depende de cuántos elementos produzca *items*. Los resultados se
+    devuelven en orden de finalización.
+    """
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="moltbot-backup") as pool:
+        pending: set[Future] = set()
+        for item in items:
+            pending.add(pool.submit(fn, item))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
 def backup_n8n_workflows(output_folder: str | None = None) -> Optional[int]:
     """
     Lee los flujos de la tabla de n8n y los guarda como archivos ``.json``.
 
+    Igual que el incremental, según ``BACKUP_FORMAT`` escribe el árbol de
+    ficheros, un snapshot en el almacén deduplicado o ambos.
+
     Returns:
         Número de workflows exportados, o ``None`` en caso de error.
     """
     folder = Path(output_folder or settings.backup.output_folder)
     folder.mkdir(parents=True, exist_ok=True)
+    write_json = settings.backup.format in ("json", "both")
+    store = _snapshot_store(folder)
+    used: dict[str, str] = {}
+
+    def _jobs() -> Iterator[tuple]:
+        for wf_id, name, nodes, connections, _updated_at in iter_workflows(
+            itersize=settings.backup.itersize,
+        ):
+            wf_id = str(wf_id)
+            yield wf_id, _assign_filename(name, wf_id, used, None), name, nodes, connections
+
+    def _export(job: tuple) -> tuple[str, dict]:
+        wf_id, filename, name, nodes, connections = job
+        data = _serialize_workflow(name, nodes, connections)
+        if write_json:
+            atomic_write(folder / filename, data)
+        entry = {"name": name}
+        if store is not None:
+            entry["sha256"] = store.put_blob(data)
+        return wf_id, entry
 
     try:
-        workflows = get_workflows()
-        if not workflows:
-            logger.warning("No se encontraron workflows para exportar.")
-            return 0
-
-        for name, nodes, connections in workflows:
-            filepath = folder / f"{_sanitize_filename(name)}.json"
-            workflow_data = {
-                "name": name,
-                "nodes": nodes,
-                "connections": connections,
-            }
-            filepath.write_text(
-                json.dumps(workflow_data, indent=4, ensure_ascii=False),
-                encoding="utf-8",
-            )
-
-        total = len(workflows)
-        logger.info("Backup completado: %d workflows exportados a %s", total, folder)
-        return total
+        with _escribiendo(store):
+            entries = dict(_pipeline(_jobs(), _export, settings.backup.workers))
+            if not entries:
+                logger.warning("No se encontraron workflows para exportar.")
+                return 0
+            snapshot_id = store.write_snapshot(entries) if store is not None else None
+
+        if store is not None:
+            store.prune(settings.backup.snapshot_retention_days)
+
+        logger.info(
+            "Backup completado: %d workflows exportados a %s (snapshot: %s)",
+            len(entries), folder, snapshot_id or "-",
+        )
+        return len(entries)
 
     except Exception:
         logger.exception("Error en backup de workflows.")
         return None
+
+
+# ---------------------------------------------------------------------------
+# Backup incremental
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class BackupResult:
+    """Resumen de un backup incremental."""
+
+    added: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    snapshot_id: Optional[str] = None
+
+    @property
+    def total(self) -> int:
+        """Workflows presentes en el backup tras la ejecución."""
+        return self.added + self.changed + self.unchanged
+
+
+def _load_manifest(path: Path) -> dict:
+    """Lee el manifiesto del backup anterior (vacío si no existe o es inválido)."""
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if manifest.get("version") == _MANIFEST_VERSION:
+            return manifest
+        logger.warning("Manifiesto de backup con versión desconocida; se ignora.")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError):
+        logger.warning("Manifiesto de backup ilegible; se hará un backup completo.")
+    return {"version": _MANIFEST_VERSION, "watermark": None, "workflows": {}}
+
+
+@dataclass(frozen=True)
+class _SyncJob:
+    """Trabajo de sincronización de un workflow (se ejecuta en un hilo del pool)."""
+
+    wf_id: str
+    name: str
+    nodes: Any
+    connections: Any
+    filename: str
+    previous: Optional[dict]
+
+
+def _sync_workflow(
+    folder: Path,
+    job: _SyncJob,
+    write_json: bool,
+    store: Optional[SnapshotStore],
+) -> tuple[str, dict, str]:
+    """Serializa un workflow y lo escribe solo si su contenido ha cambiado.
+
+    Returns:
+        ``(wf_id, entrada_del_manifiesto, estado)`` con estado ``"added"``,
+        ``"changed"`` o ``"unchanged"``.
+    """
+    data = _serialize_workflow(job.name, job.nodes, job.connections)
+    digest = hashlib.sha256(data).hexdigest()
+    filepath = folder / job.filename
+    entry = {"name": job.name, "file": job.filename, "sha256": digest}
+    previous = job.previous
+
+    if store is not None:
+        store.put_blob(data, digest)
+
+    if previous is None:
+        estado = "added"
+    elif previous["sha256"] != digest or previous["file"] != job.filename:
+        estado = "changed"
+    elif write_json and not filepath.exists():
+        estado = "changed"
+    else:
+        return job.wf_id, entry, "unchanged"
+
+    # Sin entrada previa puede existir ya el fichero de un backup completo anterior.
+    if write_json and not (filepath.exists() and filepath.read_bytes() == data):
+        atomic_write(filepath, data)
+    return job.wf_id, entry, estado
+
+
+def backup_n8n_workflows_incremental(output_folder: str | None = None) -> Optional[BackupResult]:
+    """
+    Backup incremental de los workflows de n8n.
+
+    Mantiene un manifiesto con el hash de cada workflow y la marca de agua
+    ``updatedAt`` de la última ejecución, de modo que solo se leen las filas
+    modificadas desde entonces y solo se reescriben los ficheros cuyo
+    contenido serializado ha cambiado. Los workflows borrados en n8n se
+    eliminan también del backup.
+
+    Las filas llegan en streaming desde un cursor de servidor y se
+    serializan/escriben en paralelo, de modo que el pico de memoria no
+    depende del número total de workflows.
+
+    Según ``BACKUP_FORMAT`` escribe el árbol de ficheros ``.json``, un
+    snapshot en el almacén deduplicado (:mod:`snapshot_store`) o ambos.
+
+    Returns:
+        Un :class:`BackupResult` con los contadores, o ``None`` en caso de error.
+    """
+    folder = Path(output_folder or settings.backup.output_folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    manifest_path = folder / settings.backup.manifest_name
+    write_json = settings.backup.format in ("json", "both")
+    store = _snapshot_store(folder)
+
+    try:
+        manifest = _load_manifest(manifest_path)
+        entries: dict[str, dict] = manifest["workflows"]
+        watermark = manifest.get("watermark")
+        since = datetime.fromisoformat(watermark) if watermark else None
+
+        ids = get_workflow_ids()
+        if ids is None:
+            return None
+
+        added = changed = deleted = 0
+        obsolete: set[str] = set()
+
+        # Borrados: presentes en el manifiesto pero ya no en n8n.
+        for wf_id in [wf_id for wf_id in entries if wf_id not in ids]:
+            obsolete.add(entries.pop(wf_id)["file"])
+            deleted += 1
+
+        # El snapshot necesita el blob de cada workflow: si falta alguno
+        # (p. ej. al activar el formato snapshot) se hace una pasada completa.
+        if store is not None and any(not store.has_blob(e["sha256"]) for e in entries.values()):
+            since = None
+
+        used = {entry["file"]: wf_id for wf_id, entry in entries.items()}
+
+        def _jobs() -> Iterator[_SyncJob]:
+            nonlocal since
+            for wf_id, name, nodes, connections, updated_at in iter_workflows(
+                since, itersize=settings.backup.itersize,
+            ):
+                if updated_at is not None and (since is None or updated_at > since):
+                    since = updated_at
+                wf_id = str(wf_id)
+                previous = entries.get(wf_id)
+                filename = _assign_filename(
+                    name, wf_id, used, previous["file"] if previous else None,
+                )
+                if previous is not None and previous["file"] != filename:
+                    obsolete.add(previous["file"])
+                yield _SyncJob(wf_id, name, nodes, connections, filename, previous)
+
+        def _sync(job: _SyncJob) -> tuple[str, dict, str]:
+            return _sync_workflow(folder, job, write_json, store)
+
+        # Los blobs nuevos no tienen índice hasta write_snapshot: mientras
+        # tanto, la poda de otro backup no debe tocarlos.
+        with _escribiendo(store):
+            for wf_id, entry, estado in _pipeline(_jobs(), _sync, settings.backup.workers):
+                entries[wf_id] = entry
+                if estado == "added":
+                    added += 1
+                elif estado == "changed":
+                    changed += 1
+            snapshot_id = store.write_snapshot(entries) if store is not None else None
+
+        # Los ficheros viejos se borran al final, cuando ya no hay escrituras en vuelo.
+        live_files = {entry["file"] for entry in entries.values()}
+        for filename in obsolete - live_files:
+            (folder / filename).unlink(missing_ok=True)
+
+        if store is not None:
+            store.prune(settings.backup.snapshot_retention_days)
+
+        manifest["watermark"] = since.isoformat() if since else None
+        atomic_write(
+            manifest_path,
+            json.dumps(manifest, indent=2, ensure_ascii=False, sort_keys=True).encode("utf-8"),
+        )
+
+        result = BackupResult(
+            added=added,
+            changed=changed,
+            unchanged=len(entries) - added - changed,
+            deleted=deleted,
+            snapshot_id=snapshot_id,
+        )
+        logger.info(
+            "Backup incremental en %s: %d nuevos, %d modificados, %d sin cambios, "
+            "%d eliminados (snapshot: %s).",
+            folder, result.added, result.changed, result.unchanged, result.deleted,
+            snapshot_id or "-",
+        )
+        return result
+
+    except Exception:
+        logger.exception("Error en backup incremental de workflows.")
+        return None
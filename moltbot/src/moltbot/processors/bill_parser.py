@@ -4,14 +4,22 @@ Parsers de facturas por proveedor.
 Cada proveedor implementa ``BillParser`` y se registra con ``@register_parser``.
 Para añadir un nuevo proveedor basta con crear una nueva clase decorada;
 no es necesario modificar el código existente (Open/Closed).
+
+Las firmas (``signatures``) que declara cada parser alimentan un autómata
+Aho-Corasick combinado que detecta el proveedor de un texto en una sola
+pasada (``detect_provider``), para facturas que llegan sin cabecera
+``proveedor``.
 """
 
 from __future__ import annotations
 
 import logging
 import re
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional
+from collections import deque
+from dataclasses import dataclass
+from typing import ClassVar, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +28,28 @@ logger = logging.getLogger(__name__)
 # Base
 # ---------------------------------------------------------------------------
 
+@dataclass(frozen=True)
+class SearchWindow:
+    """Zona de la factura donde está el total: primeros/últimos bytes del texto.
+
+    En mensajes grandes solo se decodifican y analizan estas ventanas
+    (ver ``moltbot.processors.payload``).
+    """
+
+    head: int = 0
+    tail: int = 0
+
+
 class BillParser(ABC):
     """Interfaz común que todo parser de factura debe implementar."""
 
+    # Dónde buscar el total en mensajes grandes (``None`` = ventana por defecto).
+    search_window: ClassVar[Optional[SearchWindow]] = None
+
+    # Frases características del proveedor (sin distinguir mayúsculas), usadas
+    # por ``detect_provider``. Se comparan como palabras completas.
+    signatures: ClassVar[tuple[str, ...]] = ()
+
     @abstractmethod
     def extraer_importe(self, texto: str) -> Optional[float]:
         """Extrae el importe total de la factura a partir de su texto."""
@@ -40,6 +67,7 @@ def register_parser(provider: str):
 
     def decorator(cls: type[BillParser]) -> type[BillParser]:
         _PARSER_REGISTRY[provider.lower()] = cls
+        _invalidate_classifier()
         return cls
 
     return decorator
@@ -54,6 +82,140 @@ def get_parser(provider: str) -> Optional[BillParser]:
     return cls()
 
 
+def registered_providers() -> list[str]:
+    """Proveedores con parser registrado, en orden alfabético."""
+    return sorted(_PARSER_REGISTRY)
+
+
+# ---------------------------------------------------------------------------
+# Detección de proveedor  (Aho-Corasick sobre las firmas de todos los parsers)
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ProviderMatch:
+    """Proveedor detectado en un texto."""
+
+    provider: str
+    # 0–1: cobertura de sus firmas × ventaja sobre el resto de candidatos.
+    confidence: float
+    matched: tuple[str, ...] = ()
+
+
+class _SignatureAutomaton:
+    """Autómata Aho-Corasick: busca todas las firmas en una sola pasada.
+
+    El coste de ``scan`` es lineal en la longitud del texto (más las
+    coincidencias) y no depende del número de firmas registradas.
+    """
+
+    def __init__(self, signatures: dict[str, list[str]]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[str, str]]] = [[]]  # (proveedor, firma)
+        self.totals: dict[str, int] = {}
+
+        for provider, firmas in signatures.items():
+            unicas = {f.lower().strip() for f in firmas if f.strip()}
+            self.totals[provider] = len(unicas)
+            for firma in unicas:
+                self._add(provider, firma)
+        self._link()
+
+    def _add(self, provider: str, firma: str) -> None:
+        state = 0
+        for char in firma:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((provider, firma))
+
+    def _link(self) -> None:
+        """Calcula los enlaces de fallo (BFS) y hereda las salidas."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    fail = self._fail[state]
+                    while fail and char not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, texto: str) -> dict[str, set[str]]:
+        """Devuelve proveedor → firmas encontradas como palabras completas."""
+        texto = texto.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        found: dict[str, set[str]] = {}
+        state = 0
+        for i, char in enumerate(texto):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for provider, firma in out[state]:
+                start, end = i - len(firma) + 1, i + 1
+                if (start == 0 or not texto[start - 1].isalnum()) and (
+                    end == len(texto) or not texto[end].isalnum()
+                ):
+                    found.setdefault(provider, set()).add(firma)
+        return found
+
+
+_classifier: Optional[_SignatureAutomaton] = None
+_classifier_lock = threading.Lock()
+
+
+def _invalidate_classifier() -> None:
+    global _classifier
+    _classifier = None
+
+
+def _get_classifier() -> _SignatureAutomaton:
+    """Construye (una vez por versión del registry) el autómata combinado."""
+    global _classifier
+    classifier = _classifier
+    if classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = _SignatureAutomaton({
+                    provider: list(cls.signatures)
+                    for provider, cls in _PARSER_REGISTRY.items()
+                    if cls.signatures
+                })
+            classifier = _classifier
+    return classifier
+
+
+def detect_provider(texto: str) -> Optional[ProviderMatch]:
+    """Detecta el proveedor de una factura a partir de su texto.
+
+    Recorre el texto una sola vez con el autómata de firmas. La confianza
+    combina qué fracción de sus firmas aparece (cobertura) y cuánto se
+    separa del resto de candidatos.
+
+    Returns:
+        El proveedor más probable, o ``None`` si no aparece ninguna firma.
+    """
+    classifier = _get_classifier()
+    found = classifier.scan(texto)
+    if not found:
+        return None
+
+    scores = {
+        provider: len(firmas) / classifier.totals[provider]
+        for provider, firmas in found.items()
+    }
+    best = max(scores, key=lambda p: (scores[p], len(found[p])))
+    confidence = scores[best] * scores[best] / sum(scores.values())
+    return ProviderMatch(best, round(confidence, 3), tuple(sorted(found[best])))
+
+
 # ---------------------------------------------------------------------------
 # Utilidades compartidas (DRY)
 # ---------------------------------------------------------------------------
@@ -79,6 +241,10 @@ def _parse_importe_es(raw: str) -> Optional[float]:
 class IberdrolaBillParser(BillParser):
     """Parser para facturas de Iberdrola."""
 
+    signatures = ("iberdrola", "iberdrola clientes", "total importe factura")
+    # Resumen en la primera página.
+    search_window = SearchWindow(head=8_192, tail=2_048)
+
     _PATTERN = re.compile(
         r"TOTAL IMPORTE FACTURA\s+([\d.,]+)\s?€", re.IGNORECASE
     )
@@ -94,6 +260,10 @@ class IberdrolaBillParser(BillParser):
 class TotalEnergiesBillParser(BillParser):
     """Parser para facturas de TotalEnergies."""
 
+    signatures = ("totalenergies", "totalenergies clientes", "total energies")
+    # El desglose con el importe final cierra la factura.
+    search_window = SearchWindow(head=2_048, tail=8_192)
+
     _PATTERN_DETAILED = re.compile(
         r"Importe\s*\n\s*[\d.]+\.\d+\.\d+\s*\n\s*[^\n]+\n\s*([\d,]+)\s*€",
         re.IGNORECASE | re.DOTALL,
@@ -117,6 +287,9 @@ class TotalEnergiesBillParser(BillParser):
 class O2BillParser(BillParser):
     """Parser para facturas de O2."""
 
+    signatures = ("o2", "o2 fibra", "o2online", "total factura")
+    search_window = SearchWindow(head=8_192, tail=4_096)
+
     _PATTERN = re.compile(
         r"Total factura\s+([\d.]+,\d{2})\s*€", re.IGNORECASE
     )
@@ -0,0 +1,155 @@
+"""
+Lectura acotada de cadenas JSON directamente sobre el buffer del mensaje.
+
+Para cuerpos grandes (extracciones de PDF de muchas páginas) evita
+``json.loads`` del cuerpo entero y la cadena decodificada completa: localiza
+el valor de una clave con expresiones regulares de bytes que recorren el
+buffer vía ``memoryview`` (sin copias) y decodifica solo ventanas acotadas
+del principio y del final del valor.
+
+Las expresiones regulares de los parsers no pueden ejecutarse sobre el JSON
+en bruto (``\\n``, ``\\u20ac``… están escapados), así que se aplican a las
+ventanas ya decodificadas, cuyo tamaño no depende del de la factura.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, Optional
+
+_QUOTE_RE = re.compile(rb'"')
+
+# Escape de la mitad alta de un par suplente (``\ud83d`` de ``\ud83d\ude00``).
+_HIGH_SURROGATE_RE = re.compile(rb'\\u[dD][89abAB][0-9a-fA-F]{2}')
+
+# Escape incompleto al final de un fragmento (``\`` o ``\uXX``).
+_TRAILING_ESCAPE_RE = re.compile(rb'(?<!\\)(?:\\\\)*(\\(?:u[0-9a-fA-F]{0,3})?)$')
+
+
+@lru_cache(maxsize=16)
+def _key_re(key: str) -> re.Pattern[bytes]:
+    # La comilla de la clave no puede ir escapada (estaría dentro de otro valor).
+    return re.compile(rb'(?<!\\)"' + re.escape(key.encode()) + rb'"\s*:\s*"')
+
+
+@dataclass(frozen=True)
+class Span:
+    """Posición ``[start, end)`` del contenido de una cadena JSON en el buffer."""
+
+    start: int
+    end: int
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+
+def find_string_value(buf: memoryview | bytes, key: str) -> Optional[Span]:
+    """Localiza el valor (cadena) de *key* en el JSON crudo *buf*.
+
+    Returns:
+        El tramo del contenido (sin comillas), o ``None`` si la clave no
+        existe, no es una cadena o el JSON está truncado.
+    """
+    match = _key_re(key).search(buf)
+    if match is None:
+        return None
+    view = memoryview(buf)
+    pos = match.end()
+    # Comilla de cierre: la primera precedida por un número par de barras.
+    while (quote := _QUOTE_RE.search(view, pos)) is not None:
+        end = quote.start()
+        barras = 0
+        while view[end - barras - 1] == 0x5C:
+            barras += 1
+        if not barras % 2:
+            return Span(match.end(), end)
+        pos = end + 1
+    return None
+
+
+def _barras_antes(view: memoryview, pos: int) -> int:
+    """Número de barras invertidas seguidas justo antes de *pos*."""
+    barras = 0
+    while pos - barras - 1 >= 0 and view[pos - barras - 1] == 0x5C:
+        barras += 1
+    return barras
+
+
+def _skip_partial_escape(view: memoryview, start: int) -> int:
+    """Si *start* cae dentro de un escape (``\\n``, ``\\u20ac``…), salta al final de este."""
+    for back in range(1, 6):
+        pos = start - back
+        if pos < 0:
+            break
+        if view[pos] != 0x5C:
+            continue
+        # La barra solo abre un escape si la preceden un número par de barras.
+        if _barras_antes(view, pos) % 2:
+            continue
+        largo = 6 if pos + 1 < len(view) and view[pos + 1] == 0x75 else 2  # "u"
+        return max(start, pos + largo)
+    return start
+
+
+def decode_fragment(buf: memoryview | bytes, start: int, end: int) -> str:
+    """Decodifica un trozo arbitrario del contenido de una cadena JSON.
+
+    Los bordes pueden caer en mitad de un escape o de un carácter UTF-8: se
+    recortan hasta el límite válido más cercano (se pierde como mucho un
+    carácter por borde).
+    """
+    view = memoryview(buf)
+    start = min(end, _skip_partial_escape(view, start))
+    # Borde inicial: no empezar en un byte de continuación UTF-8.
+    while start < end and 0x80 <= view[start] <= 0xBF:
+        start += 1
+    raw = bytes(view[start:end])
+    trailing = _TRAILING_ESCAPE_RE.search(raw)
+    if trailing is not None and trailing.group(1):
+        raw = raw[: trailing.start(1)]
+    texto = json.loads(f'"{raw.decode("utf-8", "ignore")}"', strict=False)
+    # Pares suplentes (``\ud83d\ude00``) partidos por el corte.
+    if texto and "\udc00" <= texto[0] <= "\udfff":
+        texto = texto[1:]
+    if texto and "\ud800" <= texto[-1] <= "\udbff":
+        texto = texto[:-1]
+    return texto
+
+
+def read_windows(buf: memoryview | bytes, span: Span, head: int, tail: int) -> tuple[str, str]:
+    """Decodifica los primeros *head* y los últimos *tail* bytes de *span*.
+
+    Si las ventanas se solapan (cadena corta) se devuelve la cadena entera
+    como cabeza y la cola vacía.
+    """
+    if head + tail >= len(span):
+        return decode_fragment(buf, span.start, span.end), ""
+    cabeza = decode_fragment(buf, span.start, span.start + head) if head else ""
+    cola = decode_fragment(buf, span.end - tail, span.end) if tail else ""
+    return cabeza, cola
+
+
+def iter_fragments(buf: memoryview | bytes, span: Span, chunk: int = 1 << 16) -> Iterator[str]:
+    """Decodifica *span* entero en trozos consecutivos de unos *chunk* bytes.
+
+    A diferencia de :func:`decode_fragment` no se pierde nada: los cortes se
+    desplazan para no partir escapes, caracteres UTF-8 ni pares suplentes, y
+    la concatenación de los trozos es la cadena completa.
+    """
+    view = memoryview(buf)
+    pos = span.start
+    while pos < span.end:
+        corte = _skip_partial_escape(view, min(span.end, pos + max(chunk, 16)))
+        while corte < span.end and 0x80 <= view[corte] <= 0xBF:
+            corte += 1
+        if (
+            corte < span.end
+            and _HIGH_SURROGATE_RE.fullmatch(view[corte - 6:corte])
+            and not _barras_antes(view, corte - 6) % 2
+        ):
+            corte = min(span.end, corte + 6)
+        yield json.loads(f'"{bytes(view[pos:corte]).decode("utf-8")}"', strict=False)
+        pos = corte
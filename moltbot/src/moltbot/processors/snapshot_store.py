@@ -0,0 +1,299 @@
+"""
+Almacén de snapshots de workflows, direccionado por contenido.
+
+Estructura en disco (bajo ``<carpeta de backup>/.snapshots``)::
+
+    objects/ab/abcdef….json.gz   # blob = JSON del workflow comprimido con gzip
+    snapshots/20261018T101500Z.json  # índice: id de workflow → (nombre, hash)
+    snapshots/20261018T101500Z-1.json  # otro snapshot en el mismo segundo
+
+Cada blob se guarda una sola vez aunque aparezca en cientos de snapshots,
+así que un snapshot diario apenas ocupa lo que su índice. ``list``, ``show`` y
+``diff`` trabajan solo con los índices; los blobs solo se descomprimen para
+ver el contenido o el diff de un workflow concreto.
+
+Un backup escribe sus blobs antes que el índice que los referencia, así que
+mientras tanto parecen huérfanos. Los backups toman un ``flock`` compartido
+sobre ``.lock`` (:meth:`SnapshotStore.writing`) y :meth:`SnapshotStore.prune`
+uno exclusivo; si hay un backup en curso, la poda se deja para el siguiente.
+"""
+
+from __future__ import annotations
+
+import difflib
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from moltbot.utils.files import atomic_write
+
+logger = logging.getLogger(__name__)
+
+_INDEX_VERSION = 1
+_ID_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def _orden(snapshot_id: str) -> tuple[str, int]:
+    """Clave de orden cronológico: ``X`` < ``X-1`` < ``X-2`` < … < ``Y``."""
+    base, _, n = snapshot_id.partition("-")
+    return base, int(n) if n.isdigit() else 0
+
+
+class SnapshotNotFound(KeyError):
+    """El snapshot solicitado no existe."""
+
+
+@dataclass(frozen=True)
+class SnapshotInfo:
+    """Resumen de un snapshot (sin cargar su índice)."""
+
+    id: str
+    created_at: datetime
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Índice completo de un snapshot: id de workflow → ``{name, sha256}``."""
+
+    id: str
+    created_at: datetime
+    workflows: dict[str, dict]
+
+
+@dataclass(frozen=True)
+class SnapshotDiff:
+    """Diferencias entre dos snapshots, por id de workflow."""
+
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    renamed: list[str] = field(default_factory=list)
+
+
+class SnapshotStore:
+    """Almacén de blobs deduplicados + índices de snapshot."""
+
+    def __init__(self, root: Path | str, compress_level: int = 6) -> None:
+        self.root = Path(root)
+        self._objects = self.root / "objects"
+        self._snapshots = self.root / "snapshots"
+        self._level = compress_level
+
+    # -- Bloqueo ------------------------------------------------------------
+
+    @contextmanager
+    def _flock(self, modo: int) -> Iterator[bool]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "ab") as fh:
+            try:
+                fcntl.flock(fh, modo)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """Bloqueo compartido para escribir blobs y el índice que los usa.
+
+        Varios backups pueden escribir a la vez; :meth:`prune` espera a que
+        no quede ninguno.
+        """
+        with self._flock(fcntl.LOCK_SH):
+            yield
+
+    # -- Blobs --------------------------------------------------------------
+
+    def _blob_path(self, digest: str) -> Path:
+        return self._objects / digest[:2] / f"{digest}.json.gz"
+
+    def has_blob(self, digest: str) -> bool:
+        """``True`` si el blob con ese hash ya está almacenado."""
+        return self._blob_path(digest).exists()
+
+    def put_blob(self, data: bytes, digest: Optional[str] = None) -> str:
+        """Guarda *data* (si no existía ya) y devuelve su hash SHA-256."""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists():
+            atomic_write(path, gzip.compress(data, compresslevel=self._level, mtime=0))
+        return digest
+
+    def get_blob(self, digest: str) -> bytes:
+        """Devuelve el contenido descomprimido de un blob."""
+        return gzip.decompress(self._blob_path(digest).read_bytes())
+
+    # -- Snapshots ----------------------------------------------------------
+
+    def write_snapshot(
+        self, workflows: dict[str, dict], now: Optional[datetime] = None,
+    ) -> str:
+        """Guarda un índice de snapshot y devuelve su id.
+
+        Args:
+            workflows: id de workflow → ``{"name": …, "sha256": …}``; los blobs
+                referenciados deben existir ya en el almacén.
+        """
+        now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        base = now.strftime(_ID_FORMAT)
+        entradas = {
+            wf_id: {"name": entry["name"], "sha256": entry["sha256"]}
+            for wf_id, entry in workflows.items()
+        }
+        self._snapshots.mkdir(parents=True, exist_ok=True)
+        n = 0
+        while True:
+            snapshot_id = f"{base}-{n}" if n else base
+            index = {
+                "version": _INDEX_VERSION,
+                "id": snapshot_id,
+                "created_at": now.isoformat(),
+                "workflows": entradas,
+            }
+            datos = json.dumps(index, ensure_ascii=False, sort_keys=True).encode("utf-8")
+            if self._crear_indice(self._snapshots / f"{snapshot_id}.json", datos):
+                return snapshot_id
+            n += 1
+
+    @staticmethod
+    def _crear_indice(path: Path, data: bytes) -> bool:
+        """Crea *path* con *data* solo si no existe (``False`` si ya existía).
+
+        Se escribe en un temporal y se enlaza con ``link``, que falla si el
+        destino existe: dos backups en el mismo segundo no se pisan el id y
+        nadie ve un índice a medio escribir.
+        """
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.link(tmp, path)
+        except FileExistsError:
+            return False
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+        return True
+
+    def list_snapshots(self) -> list[SnapshotInfo]:
+        """Snapshots disponibles, del más antiguo al más reciente."""
+        if not self._snapshots.is_dir():
+            return []
+        infos = []
+        for path in sorted(self._snapshots.glob("*.json"), key=lambda p: _orden(p.stem)):
+            try:
+                created = datetime.strptime(path.stem[:16], _ID_FORMAT).replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            infos.append(SnapshotInfo(id=path.stem, created_at=created))
+        return infos
+
+    def resolve(self, ref: str) -> str:
+        """Traduce ``latest``, ``latest~N`` o un prefijo de id a un id completo."""
+        ids = [info.id for info in self.list_snapshots()]
+        if ref == "latest" or ref.startswith("latest~"):
+            try:
+                back = int(ref.partition("~")[2] or 0)
+            except ValueError:
+                raise SnapshotNotFound(ref) from None
+            if 0 <= back < len(ids):
+                return ids[-1 - back]
+            raise SnapshotNotFound(ref)
+        if ref in ids:
+            return ref
+        matches = [i for i in ids if i.startswith(ref)]
+        if len(matches) != 1:
+            raise SnapshotNotFound(ref)
+        return matches[0]
+
+    def load(self, ref: str) -> Snapshot:
+        """Carga el índice de un snapshot."""
+        snapshot_id = self.resolve(ref)
+        index = json.loads((self._snapshots / f"{snapshot_id}.json").read_text(encoding="utf-8"))
+        return Snapshot(
+            id=snapshot_id,
+            created_at=datetime.fromisoformat(index["created_at"]),
+            workflows=index["workflows"],
+        )
+
+    def diff(self, ref_a: str, ref_b: str) -> SnapshotDiff:
+        """Compara dos snapshots usando solo sus índices."""
+        a, b = self.load(ref_a).workflows, self.load(ref_b).workflows
+        result = SnapshotDiff()
+        for wf_id in sorted(a.keys() | b.keys()):
+            if wf_id not in a:
+                result.added.append(wf_id)
+            elif wf_id not in b:
+                result.removed.append(wf_id)
+            else:
+                if a[wf_id]["sha256"] != b[wf_id]["sha256"]:
+                    result.changed.append(wf_id)
+                if a[wf_id]["name"] != b[wf_id]["name"]:
+                    result.renamed.append(wf_id)
+        return result
+
+    def diff_workflow(self, ref_a: str, ref_b: str, wf_id: str) -> str:
+        """Diff unificado del JSON de un workflow entre dos snapshots."""
+        snaps = [self.load(ref_a), self.load(ref_b)]
+        texts = []
+        for snap in snaps:
+            entry = snap.workflows.get(wf_id)
+            texts.append(
+                self.get_blob(entry["sha256"]).decode("utf-8").splitlines(keepends=True)
+                if entry else []
+            )
+        return "".join(difflib.unified_diff(
+            texts[0], texts[1], fromfile=f"{snaps[0].id}/{wf_id}", tofile=f"{snaps[1].id}/{wf_id}",
+        ))
+
+    # -- Retención ----------------------------------------------------------
+
+    def prune(self, keep_days: int, now: Optional[datetime] = None) -> tuple[int, int]:
+        """Borra snapshots más antiguos que *keep_days* y los blobs huérfanos.
+
+        Siempre conserva el snapshot más reciente. No hace nada si hay un
+        backup escribiendo (ver :meth:`writing`): sus blobs aún no tienen índice.
+
+        Returns:
+            ``(snapshots_borrados, blobs_borrados)``.
+        """
+        if keep_days <= 0:
+            return 0, 0
+        with self._flock(fcntl.LOCK_EX | fcntl.LOCK_NB) as libre:
+            if not libre:
+                logger.info("Hay un backup escribiendo snapshots; la poda queda para el siguiente.")
+                return 0, 0
+            return self._prune(keep_days, now)
+
+    def _prune(self, keep_days: int, now: Optional[datetime]) -> tuple[int, int]:
+        limit = (now or datetime.now(timezone.utc)) - timedelta(days=keep_days)
+        infos = self.list_snapshots()
+        borrados = 0
+        for info in infos[:-1]:
+            if info.created_at < limit:
+                (self._snapshots / f"{info.id}.json").unlink(missing_ok=True)
+                borrados += 1
+        if not borrados:
+            return 0, 0
+
+        vivos = {
+            entry["sha256"]
+            for info in self.list_snapshots()
+            for entry in self.load(info.id).workflows.values()
+        }
+        blobs = 0
+        for path in self._objects.glob("*/*.json.gz"):
+            if path.name.removesuffix(".json.gz") not in vivos:
+                path.unlink(missing_ok=True)
+                blobs += 1
+        return borrados, blobs
@@ -0,0 +1,119 @@
+"""
+Diagnóstico del arranque en frío (``moltbot --check-startup``).
+
+Mide por fases lo que cuesta levantar un worker: la importación de las
+dependencias pesadas y de los módulos del bot, y la inicialización de
+PostgreSQL (pool y versión del esquema) y RabbitMQ. No modifica nada: el
+esquema solo se consulta y no se declaran colas.
+
+Cada fase de importación mide lo que añade sobre las anteriores (un
+módulo ya cargado cuesta 0).
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+# Dependencias pesadas primero, luego los módulos del bot que las usan.
+_IMPORTS = (
+    "psycopg2",
+    "pika",
+    "requests",
+    "moltbot.db.engine",
+    "moltbot.commands",
+    "moltbot.messaging.rabbit",
+)
+
+
+@dataclass(frozen=True)
+class Fase:
+    """Resultado de una fase del arranque."""
+
+    nombre: str
+    segundos: float
+    ok: bool
+    detalle: str = ""
+
+
+def _medir(nombre: str, fn: Callable[[], str]) -> Fase:
+    inicio = time.perf_counter()
+    try:
+        detalle = fn()
+        ok = True
+    except Exception as exc:  # se informa, no se propaga
+        detalle = f"{type(exc).__name__}: {exc}"
+        ok = False
+    return Fase(nombre, time.perf_counter() - inicio, ok, detalle)
+
+
+def _importar(modulo: str) -> str:
+    if modulo in sys.modules:
+        return "ya cargado"
+    importlib.import_module(modulo)
+    return ""
+
+
+def _postgres() -> str:
+    from moltbot.db.pool import get_pool
+
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1;")
+        conn.rollback()
+    return ""
+
+
+def _esquema() -> str:
+    from moltbot.db import SCHEMA_VERSION, get_schema_version
+
+    version = get_schema_version()
+    if version is None:
+        raise RuntimeError("no se pudo consultar la versión")
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(f"versión {version}, pendiente migrar a {SCHEMA_VERSION}")
+    return f"versión {version}"
+
+
+def _rabbitmq() -> str:
+    import pika
+
+    from moltbot.config import settings
+
+    rabbit = settings.rabbitmq
+    connection = pika.BlockingConnection(
+        pika.ConnectionParameters(
+            host=rabbit.host,
+            credentials=pika.PlainCredentials(rabbit.user, rabbit.password),
+            heartbeat=rabbit.heartbeat,
+        ),
+    )
+    connection.close()
+    return rabbit.host
+
+
+def check_startup() -> list[Fase]:
+    """Ejecuta todas las fases y devuelve sus tiempos."""
+    fases = [_medir(f"import {modulo}", lambda m=modulo: _importar(m)) for modulo in _IMPORTS]
+    fases.append(_medir("pool PostgreSQL", _postgres))
+    fases.append(_medir("esquema", _esquema))
+    fases.append(_medir("conexión RabbitMQ", _rabbitmq))
+
+    if "moltbot.db.pool" in sys.modules:
+        sys.modules["moltbot.db.pool"].close_pool()
+    return fases
+
+
+def format_report(fases: list[Fase]) -> str:
+    """Tabla de texto con el tiempo de cada fase y el total."""
+    ancho = max(len(f.nombre) for f in fases)
+    lineas = [
+        f"{'✓' if f.ok else '✗'} {f.nombre:<{ancho}}  {f.segundos * 1000:9.1f} ms  {f.detalle}"
+        .rstrip()
+        for f in fases
+    ]
+    total = sum(f.segundos for f in fases)
+    lineas.append(f"  {'total':<{ancho}}  {total * 1000:9.1f} ms")
+    return "\n".join(lineas)
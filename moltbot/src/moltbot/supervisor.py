@@ -0,0 +1,191 @@
+"""
+Supervisor multi-proceso de Moltbot (``moltbot --workers N``).
+
+Lanza N procesos worker, cada uno con su propia conexión a RabbitMQ y su
+propio pool de PostgreSQL, y los mantiene vivos:
+
+* Reinicia los workers caídos con backoff exponencial.
+* Reenvía SIGTERM/SIGINT a los workers para un drenaje coordinado y, pasado
+  ``shutdown_timeout``, mata a los que no hayan terminado.
+* Permite fijar workers a colas concretas (``tareas_facturas=3,comandos_bot=1``).
+* Reenvía SIGUSR1 a todos los workers (inicia/detiene su perfilado).
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from typing import Callable, Optional
+
+from moltbot.config import settings
+
+logger = logging.getLogger(__name__)
+
+_cfg = settings.supervisor
+
+# Colas que consume un worker (``None`` = todas).
+Colas = Optional[tuple[str, ...]]
+# El worker recibe sus colas y su índice (estable entre reinicios).
+WorkerTarget = Callable[[Colas, int], None]
+
+
+def parse_worker_plan(workers: int, spec: str = "") -> list[Colas]:
+    """Traduce ``--workers``/``--worker-queues`` a la lista de colas por worker.
+
+    Con *spec* vacío se lanzan *workers* procesos que consumen todas las colas;
+    con ``"tareas_facturas=3,comandos_bot=1"`` se lanzan 3 + 1 workers
+    dedicados (y *workers* se ignora).
+
+    Raises:
+        ValueError: si *spec* está mal formado o nombra una cola que los
+            workers no consumen (un worker así arrancaría sin hacer nada).
+    """
+    if not spec.strip():
+        return [None] * max(1, workers)
+
+    validas = (settings.rabbitmq.queue_comandos, settings.rabbitmq.queue_facturas)
+    plan: list[Colas] = []
+    for item in spec.split(","):
+        cola, sep, cantidad = item.strip().partition("=")
+        if not cola or not sep or not cantidad.isdigit():
+            raise ValueError(f"Reparto de workers inválido: '{item.strip()}' (esperado cola=N)")
+        if cola not in validas:
+            raise ValueError(
+                f"Cola desconocida en el reparto de workers: '{cola}' "
+                f"(usa {' o '.join(validas)})",
+            )
+        plan.extend([(cola,)] * int(cantidad))
+    if not plan:
+        raise ValueError("El reparto de workers no define ningún worker.")
+    return plan
+
+
+@dataclass
+class _WorkerSlot:
+    """Estado de un hueco de worker dentro del supervisor."""
+
+    index: int
+    colas: Colas
+    process: Optional[BaseProcess] = None
+    started_at: float = 0.0
+    fallos: int = 0
+    restart_at: float = field(default=0.0)
+
+
+class Supervisor:
+    """Arranca, vigila y detiene un conjunto de procesos worker."""
+
+    def __init__(
+        self,
+        target: WorkerTarget,
+        plan: list[Colas],
+        backoff_initial: float = _cfg.restart_backoff_initial,
+        backoff_max: float = _cfg.restart_backoff_max,
+        stable_after: float = _cfg.stable_after,
+        shutdown_timeout: float = _cfg.shutdown_timeout,
+    ) -> None:
+        # "spawn": cada worker arranca un intérprete limpio, sin conexiones heredadas.
+        self._ctx = multiprocessing.get_context("spawn")
+        self._target = target
+        self._slots = [_WorkerSlot(index=i, colas=colas) for i, colas in enumerate(plan)]
+        self._backoff_initial = backoff_initial
+        self._backoff_max = backoff_max
+        self._stable_after = stable_after
+        self._shutdown_timeout = shutdown_timeout
+        self._stopping = False
+
+    # -- API pública --------------------------------------------------------
+
+    def run(self) -> None:
+        """Bucle principal: lanza los workers y los reinicia hasta recibir una señal."""
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGUSR1, self._forward_signal)
+
+        for slot in self._slots:
+            self._start(slot)
+        logger.info("Supervisor activo con %d workers.", len(self._slots))
+
+        while not self._stopping:
+            self._reap_and_restart()
+
+        self._drain()
+
+    # -- Internals ----------------------------------------------------------
+
+    def _on_signal(self, signum: int, _frame) -> None:
+        logger.info("Señal %s recibida — deteniendo workers…", signal.Signals(signum).name)
+        self._stopping = True
+
+    def _forward_signal(self, signum: int, _frame) -> None:
+        """Reenvía *signum* a todos los workers vivos (p. ej. SIGUSR1 → perfilado)."""
+        for slot in self._slots:
+            if slot.process is not None and slot.process.is_alive():
+                os.kill(slot.process.pid, signum)
+
+    def _start(self, slot: _WorkerSlot) -> None:
+        nombre = f"moltbot-worker-{slot.index}"
+        slot.process = self._ctx.Process(
+            target=self._target, args=(slot.colas, slot.index), name=nombre,
+        )
+        slot.process.start()
+        slot.started_at = time.monotonic()
+        logger.info(
+            "Worker %d arrancado (pid %s, colas: %s).",
+            slot.index, slot.process.pid, ", ".join(slot.colas) if slot.colas else "todas",
+        )
+
+    def _reap_and_restart(self) -> None:
+        vivos = [s.process.sentinel for s in self._slots if s.process is not None]
+        timeout = 1.0
+        pendientes = [s.restart_at for s in self._slots if s.process is None]
+        if pendientes:
+            timeout = max(0.0, min(timeout, min(pendientes) - time.monotonic()))
+        if vivos:
+            wait(vivos, timeout=timeout)
+        else:
+            time.sleep(timeout)
+
+        if self._stopping:
+            return
+
+        now = time.monotonic()
+        for slot in self._slots:
+            proc = slot.process
+            if proc is not None and not proc.is_alive():
+                proc.join()
+                vida = now - slot.started_at
+                slot.fallos = 0 if vida >= self._stable_after else slot.fallos + 1
+                delay = min(
+                    self._backoff_max, self._backoff_initial * (2 ** max(0, slot.fallos - 1)),
+                ) if slot.fallos else 0.0
+                logger.warning(
+                    "Worker %d (pid %s) terminó con código %s tras %.1fs; reinicio en %.1fs.",
+                    slot.index, proc.pid, proc.exitcode, vida, delay,
+                )
+                slot.process = None
+                slot.restart_at = now + delay
+            if slot.process is None and now >= slot.restart_at:
+                self._start(slot)
+
+    def _drain(self) -> None:
+        """Reenvía SIGTERM a los workers y espera a que terminen su drenaje."""
+        procesos = [s.process for s in self._slots if s.process is not None]
+        for proc in procesos:
+            if proc.is_alive():
+                proc.terminate()  # SIGTERM → parada ordenada del worker
+
+        deadline = time.monotonic() + self._shutdown_timeout
+        for proc in procesos:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                logger.warning("Worker %s no terminó a tiempo; se mata.", proc.pid)
+                proc.kill()
+                proc.join()
+        logger.info("Todos los workers detenidos.")
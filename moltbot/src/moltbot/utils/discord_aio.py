@@ -0,0 +1,48 @@
+"""Integración asíncrona con Discord vía Webhooks (runtime ``--async``)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import aiohttp
+
+from moltbot.config import settings
+from moltbot.utils import metrics
+from moltbot.utils.discord_bot import payload_factura
+
+logger = logging.getLogger(__name__)
+
+_discord = settings.discord
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Crea la sesión HTTP compartida (keep-alive) para los webhooks."""
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=_discord.request_timeout),
+    )
+
+
+async def enviar_notificacion_factura(
+    session: aiohttp.ClientSession, proveedor: str, importe: float,
+) -> bool:
+    """Versión asíncrona de :func:`moltbot.utils.discord_bot.enviar_notificacion_factura`.
+
+    Returns:
+        ``True`` si el envío fue exitoso, ``False`` en caso contrario.
+    """
+    if not _discord.webhook_url_facturas:
+        logger.warning("DISCORD_WEBHOOK_URL_FACTURAS no configurada; omitiendo envío.")
+        return False
+
+    try:
+        with metrics.STAGE_SECONDS.time(stage="notify"):
+            async with session.post(
+                _discord.webhook_url_facturas, json=payload_factura(proveedor, importe),
+            ) as response:
+                response.raise_for_status()
+                return True
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        metrics.ERRORS.inc(stage="notify")
+        logger.exception("Error enviando notificación a Discord.")
+        return False
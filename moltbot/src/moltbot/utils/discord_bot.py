@@ -12,6 +12,37 @@ logger = logging.getLogger(__name__)
 
 _discord = settings.discord
 
+CONTENT_FACTURA = "🔔 **Nueva Factura Detectada**"
+
+
+def embed_factura(proveedor: str, importe: float) -> dict:
+    """Construye el embed de Discord que describe una factura."""
+    return {
+        "title": f"Detalle: {proveedor}",
+        "color": 5814783,
+        "fields": [
+            {
+                "name": "Importe total",
+                "value": f"**{importe} €**",
+                "inline": True,
+            },
+            {
+                "name": "Estado",
+                "value": "📥 Guardada en DB",
+                "inline": True,
+            },
+        ],
+        "footer": {"text": "Moltbot Infrastructure"},
+    }
+
+
+def payload_factura(proveedor: str, importe: float) -> dict:
+    """Construye el mensaje (con embed) que anuncia una nueva factura."""
+    return {
+        "content": CONTENT_FACTURA,
+        "embeds": [embed_factura(proveedor, importe)],
+    }
+
 
 def enviar_notificacion_factura(proveedor: str, importe: float) -> bool:
     """Envía un embed a Discord notificando una nueva factura.
@@ -23,28 +54,7 @@ def enviar_notificacion_factura(proveedor: str, importe: float) -> bool:
         logger.warning("DISCORD_WEBHOOK_URL_FACTURAS no configurada; omitiendo envío.")
         return False
 
-    payload = {
-        "content": "🔔 **Nueva Factura Detectada**",
-        "embeds": [
-            {
-                "title": f"Detalle: {proveedor}",
-                "color": 5814783,
-                "fields": [
-                    {
-                        "name": "Importe total",
-                        "value": f"**{importe} €**",
-                        "inline": True,
-                    },
-                    {
-                        "name": "Estado",
-                        "value": "📥 Guardada en DB",
-                        "inline": True,
-                    },
-                ],
-                "footer": {"text": "Moltbot Infrastructure"},
-            }
-        ],
-    }
+    payload = payload_factura(proveedor, importe)
 
     try:
         response = requests.post(
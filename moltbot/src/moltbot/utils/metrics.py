@@ -0,0 +1,333 @@
+"""
+Métricas de Moltbot en formato de exposición de Prometheus.
+
+Registro mínimo sin dependencias externas (contadores, histogramas y
+gauges calculados al vuelo) y un servidor HTTP embebido que sirve
+``GET /metrics`` desde un hilo en segundo plano::
+
+    curl -s localhost:9108/metrics
+
+Cada observación cuesta un ``bisect`` y un lock, así que la
+instrumentación puede quedarse activa en producción.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Generator, Iterable, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Buckets de latencia (segundos): de 1 ms a 30 s.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pares = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    """Base común: nombre, ayuda, etiquetas y registro global."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        """Líneas de la métrica en formato de exposición (cabecera incluida)."""
+
+
+class Counter(_Metric):
+    """Contador monótono por combinación de etiquetas."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in values
+        ]
+
+
+class Histogram(_Metric):
+    """Histograma de latencias con buckets fijos."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self._buckets = tuple(sorted(buckets))
+        # etiquetas → (cuentas por bucket, [suma])
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self._buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Generator[None, None, None]:
+        """Mide la duración del bloque ``with`` (también si lanza una excepción)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = [
+                (key, list(counts), suma[0]) for key, (counts, suma) in self._values.items()
+            ]
+        lines = self._header()
+        for key, counts, suma in values:
+            acumulado = 0
+            for limite, count in zip(self._buckets + (float("inf"),), counts):
+                acumulado += count
+                etiquetas = _format_labels(self.labelnames, key, f'le="{_format_value(limite)}"')
+                lines.append(f"{self.name}_bucket{etiquetas} {acumulado}")
+            etiquetas = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{etiquetas} {_format_value(suma)}")
+            lines.append(f"{self.name}_count{etiquetas} {acumulado}")
+        return lines
+
+
+class GaugeFunc(_Metric):
+    """Gauge cuyo valor se calcula al servir ``/metrics``.
+
+    *fn* devuelve un número, un ``dict`` de valores de etiqueta → número, o
+    ``None`` si no hay dato (el componente aún no existe en este proceso).
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Optional[float | dict[LabelValues, float]]],
+        labelnames: Iterable[str] = (),
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self._fn = fn
+
+    def render(self) -> list[str]:
+        try:
+            value = self._fn()
+        except Exception:
+            logger.exception("Error calculando la métrica %s.", self.name)
+            return []
+        if value is None:
+            return []
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in values
+        ]
+
+
+class CounterFunc(GaugeFunc):
+    """Como :class:`GaugeFunc`, para contadores que ya lleva otro componente."""
+
+    kind = "counter"
+
+
+_REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    """Todas las métricas registradas, en formato de texto de Prometheus."""
+    lines: list[str] = []
+    for metric in list(_REGISTRY):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def register_stats(
+    getter: Callable[[], Any],
+    counters: Optional[Mapping[str, tuple[str, str]]] = None,
+    gauges: Optional[Mapping[str, tuple[str, str]]] = None,
+) -> None:
+    """Expone campos de una instantánea de estadísticas (``get_*_stats()``).
+
+    Args:
+        getter: devuelve la dataclass de estadísticas, o ``None``.
+        counters / gauges: campo → ``(nombre de la métrica, ayuda)``.
+    """
+
+    def campo(nombre: str) -> Callable[[], Optional[float]]:
+        def leer() -> Optional[float]:
+            stats = getter()
+            return None if stats is None else getattr(stats, nombre)
+        return leer
+
+    for nombre, (metrica, ayuda) in (counters or {}).items():
+        CounterFunc(metrica, ayuda, campo(nombre))
+    for nombre, (metrica, ayuda) in (gauges or {}).items():
+        GaugeFunc(metrica, ayuda, campo(nombre))
+
+
+# ---------------------------------------------------------------------------
+# Métricas comunes
+# ---------------------------------------------------------------------------
+
+MESSAGES = Counter(
+    "moltbot_messages_total",
+    "Mensajes consumidos por cola y resultado (ok, error).",
+    ("queue", "result"),
+)
+MESSAGE_SECONDS = Histogram(
+    "moltbot_message_duration_seconds",
+    "Tiempo total de procesado de un mensaje, por cola.",
+    ("queue",),
+)
+STAGE_SECONDS = Histogram(
+    "moltbot_stage_duration_seconds",
+    "Latencia por etapa (decode, detect, parse, db, notify, publish) y proveedor.",
+    ("stage", "provider"),
+)
+COMMAND_SECONDS = Histogram(
+    "moltbot_command_duration_seconds",
+    "Latencia de dispatch por comando.",
+    ("command", "cached"),
+)
+ERRORS = Counter(
+    "moltbot_errors_total",
+    "Errores por etapa.",
+    ("stage",),
+)
+REPLIES_LOST = Counter(
+    "moltbot_replies_lost_total",
+    "Respuestas a comandos descartadas sin llegar al broker (el comando se confirma igual).",
+)
+DISCARDED = Counter(
+    "moltbot_invoices_discarded_total",
+    "Facturas descartadas sin guardar, por motivo.",
+    ("reason",),
+)
+
+
+@contextmanager
+def track_message(queue: str) -> Generator[None, None, None]:
+    """Mide un mensaje de *queue* y lo cuenta como ``ok`` o ``error``.
+
+    Sirve como ``with`` o como decorador de la función que procesa el mensaje.
+    """
+    inicio = time.perf_counter()
+    result = "error"
+    try:
+        yield
+        result = "ok"
+    finally:
+        MESSAGE_SECONDS.observe(time.perf_counter() - inicio, queue=queue)
+        MESSAGES.inc(queue=queue, result=result)
+
+
+# ---------------------------------------------------------------------------
+# Servidor HTTP
+# ---------------------------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("metrics: " + format, *args)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Arranca el endpoint ``/metrics`` en un hilo daemon (una vez por proceso).
+
+    Returns:
+        El servidor, o ``None`` si no se pudo abrir el puerto.
+    """
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as exc:
+        logger.warning("No se pudo abrir el endpoint de métricas en %s:%d: %s", host, port, exc)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="moltbot-metrics", daemon=True).start()
+    _server = server
+    logger.info("Métricas disponibles en http://%s:%d/metrics", host, port)
+    return server
+
+
+def stop_server() -> None:
+    """Detiene el endpoint de métricas (si está arrancado)."""
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,304 @@
+"""
+Notificador de Discord en segundo plano.
+
+Los callbacks de consumo solo encolan la notificación (``notificar_factura``)
+y vuelven al instante; un hilo dedicado las envía con una ``requests.Session``
+persistente (keep-alive) y:
+
+* respeta los límites de Discord (``429`` con ``retry_after`` y las cabeceras
+  ``X-RateLimit-Remaining`` / ``X-RateLimit-Reset-After``);
+* agrupa las facturas que llegan dentro de una ventana corta en un único
+  mensaje con varios embeds (máx. 10, el límite de Discord);
+* cuenta las notificaciones descartadas (cola llena) y las fallidas.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+from moltbot.config import settings
+from moltbot.utils import metrics
+from moltbot.utils.discord_bot import CONTENT_FACTURA, embed_factura
+
+logger = logging.getLogger(__name__)
+
+_discord = settings.discord
+
+# Discord admite como máximo 10 embeds por mensaje.
+MAX_EMBEDS = 10
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class NotifierStats:
+    """Contadores del notificador."""
+
+    encoladas: int
+    enviadas: int
+    mensajes: int
+    descartadas: int
+    fallidas: int
+    rate_limited: int
+    pendientes: int
+
+
+class DiscordNotifier:
+    """Envía notificaciones de facturas desde un hilo propio."""
+
+    def __init__(
+        self,
+        webhook_url: str,
+        queue_size: int = 1000,
+        coalesce_window: float = 2.0,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+    ) -> None:
+        self._url = webhook_url
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._window = max(0.0, coalesce_window)
+        self._timeout = timeout
+        self._max_retries = max(0, max_retries)
+        self._session = requests.Session()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self._encoladas = 0
+        self._enviadas = 0
+        self._mensajes = 0
+        self._descartadas = 0
+        self._fallidas = 0
+        self._rate_limited = 0
+
+    # -- API pública --------------------------------------------------------
+
+    def start(self) -> None:
+        """Arranca el hilo emisor."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="moltbot-discord", daemon=True,
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Vacía la cola pendiente (hasta *timeout* segundos) y detiene el hilo."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Cola de notificaciones llena al cerrar; se abandonan las pendientes.")
+        self._thread.join(timeout)
+        self._thread = None
+        self._session.close()
+
+    def notificar_factura(self, proveedor: str, importe: float) -> bool:
+        """Encola la notificación de una factura sin bloquear.
+
+        Returns:
+            ``True`` si se encoló, ``False`` si se descartó (cola llena).
+        """
+        try:
+            self._queue.put_nowait(embed_factura(proveedor, importe))
+        except queue.Full:
+            with self._lock:
+                self._descartadas += 1
+            logger.warning("Cola de notificaciones llena; se descarta la de %s.", proveedor)
+            return False
+        with self._lock:
+            self._encoladas += 1
+        return True
+
+    def stats(self) -> NotifierStats:
+        """Devuelve una instantánea de los contadores."""
+        with self._lock:
+            return NotifierStats(
+                encoladas=self._encoladas,
+                enviadas=self._enviadas,
+                mensajes=self._mensajes,
+                descartadas=self._descartadas,
+                fallidas=self._fallidas,
+                rate_limited=self._rate_limited,
+                pendientes=self._queue.qsize(),
+            )
+
+    # -- Hilo emisor --------------------------------------------------------
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            embeds = [item]
+
+            # Agrupa lo que llegue dentro de la ventana (o ya esté en cola).
+            deadline = time.monotonic() + self._window
+            while len(embeds) < MAX_EMBEDS:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = (
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0 and not stopping
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    continue
+                embeds.append(item)
+
+            self._enviar(embeds)
+
+        # Vacía lo que quede tras la señal de parada.
+        pendientes = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pendientes.append(item)
+        for i in range(0, len(pendientes), MAX_EMBEDS):
+            self._enviar(pendientes[i:i + MAX_EMBEDS])
+
+    def _enviar(self, embeds: list[dict]) -> None:
+        content = (
+            CONTENT_FACTURA if len(embeds) == 1
+            else f"🔔 **{len(embeds)} Nuevas Facturas Detectadas**"
+        )
+        payload = {"content": content, "embeds": embeds}
+
+        for intento in range(self._max_retries + 1):
+            try:
+                with metrics.STAGE_SECONDS.time(stage="notify"):
+                    response = self._session.post(self._url, json=payload, timeout=self._timeout)
+            except requests.RequestException:
+                logger.exception("Error enviando notificación a Discord.")
+                break
+
+            if response.status_code == 429:
+                with self._lock:
+                    self._rate_limited += 1
+                espera = self._retry_after(response)
+                logger.warning("Discord rate limit; reintento %d en %.2fs.", intento + 1, espera)
+                time.sleep(espera)
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.RequestException:
+                logger.exception("Error enviando notificación a Discord.")
+                break
+
+            with self._lock:
+                self._enviadas += len(embeds)
+                self._mensajes += 1
+            self._respetar_bucket(response)
+            return
+
+        metrics.ERRORS.inc(stage="notify")
+        with self._lock:
+            self._fallidas += len(embeds)
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        """Segundos a esperar tras un 429 (cuerpo JSON o cabecera ``Retry-After``)."""
+        try:
+            return float(response.json()["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            pass
+        try:
+            return float(response.headers.get("Retry-After", "1"))
+        except ValueError:
+            return 1.0
+
+    @staticmethod
+    def _respetar_bucket(response: requests.Response) -> None:
+        """Si el bucket de rate limit se ha agotado, espera a que se reinicie."""
+        if response.headers.get("X-RateLimit-Remaining") != "0":
+            return
+        try:
+            time.sleep(float(response.headers.get("X-RateLimit-Reset-After", "0")))
+        except ValueError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Instancia global (una por proceso)
+# ---------------------------------------------------------------------------
+
+_notifier: Optional[DiscordNotifier] = None
+_notifier_pid: Optional[int] = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier() -> Optional[DiscordNotifier]:
+    """Devuelve el notificador del proceso, o ``None`` si no hay webhook configurado."""
+    global _notifier, _notifier_pid
+    if not _discord.webhook_url_facturas:
+        return None
+    pid = os.getpid()
+    if _notifier is not None and _notifier_pid == pid:
+        return _notifier
+    with _notifier_lock:
+        if _notifier is None or _notifier_pid != pid:
+            notifier = DiscordNotifier(
+                _discord.webhook_url_facturas,
+                queue_size=_discord.notifier_queue_size,
+                coalesce_window=_discord.coalesce_window_ms / 1000,
+                timeout=_discord.request_timeout,
+                max_retries=_discord.max_retries,
+            )
+            notifier.start()
+            _notifier, _notifier_pid = notifier, pid
+    return _notifier
+
+
+def notificar_factura(proveedor: str, importe: float) -> bool:
+    """Encola la notificación de una factura; no bloquea al consumidor."""
+    notifier = get_notifier()
+    if notifier is None:
+        logger.warning("DISCORD_WEBHOOK_URL_FACTURAS no configurada; omitiendo envío.")
+        return False
+    return notifier.notificar_factura(proveedor, importe)
+
+
+def stop_notifier(timeout: float = 10.0) -> None:
+    """Envía lo pendiente y detiene el notificador del proceso (si existe)."""
+    global _notifier, _notifier_pid
+    with _notifier_lock:
+        if _notifier is not None and _notifier_pid == os.getpid():
+            _notifier.stop(timeout)
+        _notifier, _notifier_pid = None, None
+
+
+def get_notifier_stats() -> Optional[NotifierStats]:
+    """Contadores del notificador del proceso, o ``None`` si aún no existe."""
+    notifier = _notifier
+    if notifier is None or _notifier_pid != os.getpid():
+        return None
+    return notifier.stats()
+
+
+metrics.register_stats(
+    get_notifier_stats,
+    counters={
+        "enviadas": ("moltbot_notifications_sent_total", "Notificaciones enviadas a Discord."),
+        "descartadas": ("moltbot_notifications_dropped_total", "Descartadas por cola llena."),
+        "fallidas": ("moltbot_notifications_failed_total", "Notificaciones no entregadas."),
+        "rate_limited": ("moltbot_notifications_rate_limited_total", "Respuestas 429 de Discord."),
+    },
+    gauges={
+        "pendientes": ("moltbot_notifications_pending", "Notificaciones en cola."),
+    },
+)
@@ -0,0 +1,380 @@
+"""
+Perfilado bajo demanda del bucle de consumo.
+
+Una sesión de perfilado (``!profile_start``, o ``SIGUSR1`` al proceso)
+activa durante los próximos *N* mensajes o *S* segundos, lo que ocurra antes:
+
+* **CPU por muestreo**: un hilo toma cada pocos milisegundos la pila de
+  los hilos que han consumido CPU desde la muestra anterior (reloj de CPU
+  por hilo, ``time.pthread_getcpuclockid``). Los hilos parados en I/O o en
+  una cola no cuentan: con los del pool de workers casi siempre esperando,
+  inflaban ``wait``/``select`` y tapaban el trabajo real. Donde no hay reloj
+  por hilo se descartan las pilas que terminan en esperas conocidas.
+* **Asignaciones de memoria** con ``tracemalloc`` (diferencia entre el
+  inicio y el final de la sesión, por línea de código).
+
+Al terminar se escriben en ``<BACKUP_OUTPUT_FOLDER>/profiles/`` un informe
+de texto y las pilas en formato *folded* (``flamegraph.pl``, speedscope), y
+``!profile_stop`` responde con un resumen.
+
+Sin sesión activa, el coste en el camino de cada mensaje es comprobar una
+variable global (:func:`tick`).
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+from moltbot.config import settings
+from moltbot.utils.files import atomic_write
+
+logger = logging.getLogger(__name__)
+
+_cfg = settings.profiling
+
+F = TypeVar("F", bound=Callable)
+
+
+@dataclass(frozen=True)
+class ProfileReport:
+    """Resultado de una sesión de perfilado."""
+
+    path: Path
+    duracion: float
+    mensajes: int
+    muestras: int
+    # (función, muestras en las que estaba en lo alto de la pila)
+    top_funciones: list[tuple[str, int]]
+    # (línea de código, bytes netos asignados, bloques)
+    top_asignaciones: list[tuple[str, int, int]]
+
+    def resumen(self, top: int = 5) -> str:
+        """Resumen corto para responder por Discord."""
+        lineas = [
+            f"🔬 Perfil: {self.mensajes} mensajes en {self.duracion:.1f}s "
+            f"({self.muestras} muestras) → `{self.path}`",
+        ]
+        if self.top_funciones:
+            lineas.append("**CPU (muestras propias):**")
+            lineas += [
+                f"• {funcion}: {n * 100 / max(1, self.muestras):.1f}%"
+                for funcion, n in self.top_funciones[:top]
+            ]
+        if self.top_asignaciones:
+            lineas.append("**Memoria (asignaciones netas):**")
+            lineas += [
+                f"• {sitio}: {size / 1024:+.1f} KiB en {bloques} bloques"
+                for sitio, size, bloques in self.top_asignaciones[:top]
+            ]
+        return "\n".join(lineas)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Fracción del intervalo de muestreo que un hilo tiene que haber pasado en CPU
+# para contar como ocupado.
+_BUSY_FRACTION = 0.1
+
+# Funciones (archivo, nombre) en las que un hilo está esperando, no
+# trabajando. Solo se usan si no hay reloj de CPU por hilo.
+_ESPERAS = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "readinto"),
+    ("ssl.py", "read"),
+    ("ssl.py", "recv_into"),
+    ("thread.py", "_worker"),
+})
+
+
+def _cpu_clock(ident: int) -> Optional[int]:
+    """Reloj de CPU del hilo *ident*, o ``None`` si la plataforma no lo ofrece."""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+
+def _esperando(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _ESPERAS
+
+
+class ProfileSession:
+    """Sesión de perfilado acotada por mensajes y por tiempo."""
+
+    def __init__(
+        self,
+        output_dir: Path,
+        max_messages: int,
+        max_seconds: float,
+        interval: float,
+        top: int = 15,
+    ) -> None:
+        self._output_dir = output_dir
+        self._max_messages = max(0, max_messages)
+        self._max_seconds = max(0.0, max_seconds)
+        self._interval = max(0.001, interval)
+        self._top = top
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._mensajes = 0
+        self._muestras = 0
+        self._stacks: Counter[tuple[str, ...]] = Counter()
+        # Tiempo de CPU de cada hilo en la muestra anterior.
+        self._cpu: dict[int, float] = {}
+        self._inicio = 0.0
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._own_tracemalloc = False
+        self.report: Optional[ProfileReport] = None
+
+    def start(self) -> None:
+        """Arranca tracemalloc y el hilo de muestreo."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        self._baseline = tracemalloc.take_snapshot()
+        self._inicio = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="moltbot-profiler", daemon=True)
+        self._thread.start()
+
+    def tick(self) -> None:
+        """Cuenta un mensaje procesado; cierra la sesión al llegar al límite."""
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._mensajes += 1
+            if self._max_messages and self._mensajes >= self._max_messages:
+                self._done.set()
+
+    def stop(self, timeout: float = 30.0) -> Optional[ProfileReport]:
+        """Termina la sesión (si sigue activa) y devuelve el informe.
+
+        Con ``timeout=0`` solo pide la parada: el informe lo escribe el hilo de
+        muestreo en segundo plano y este método devuelve ``None``.
+        """
+        self._done.set()
+        if (
+            timeout > 0
+            and self._thread is not None
+            and self._thread is not threading.current_thread()
+        ):
+            self._thread.join(timeout)
+        return self.report
+
+    # -- Hilo de muestreo ---------------------------------------------------
+
+    def _run(self) -> None:
+        deadline = self._inicio + self._max_seconds if self._max_seconds else None
+        propio = threading.get_ident()
+        try:
+            while not self._done.wait(self._interval):
+                self._sample(propio)
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        finally:
+            self._done.set()
+            try:
+                self.report = self._finish()
+            except Exception:
+                logger.exception("Error escribiendo el perfil.")
+            _session_finished(self)
+
+    def _ocupado(self, ident: int, frame, cpu: dict[int, float]) -> bool:
+        reloj = _cpu_clock(ident)
+        if reloj is None:
+            return not _esperando(frame)
+        try:
+            cpu[ident] = time.clock_gettime(reloj)
+        except OSError:
+            return False
+        anterior = self._cpu.get(ident)
+        # La primera vez que se ve un hilo no hay con qué comparar.
+        return anterior is not None and cpu[ident] - anterior >= self._interval * _BUSY_FRACTION
+
+    def _sample(self, propio: int) -> None:
+        nombres = {t.ident: t.name for t in threading.enumerate()}
+        cpu: dict[int, float] = {}
+        for ident, frame in sys._current_frames().items():
+            if ident == propio or not self._ocupado(ident, frame, cpu):
+                continue
+            pila = []
+            while frame is not None:
+                pila.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            pila.append(nombres.get(ident, str(ident)))
+            self._stacks[tuple(reversed(pila))] += 1
+        # Los hilos que ya no existen salen del diccionario.
+        self._cpu = cpu
+        self._muestras += 1
+
+    def _finish(self) -> ProfileReport:
+        duracion = time.monotonic() - self._inicio
+        snapshot = tracemalloc.take_snapshot()
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+        filtros = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        diferencias = snapshot.filter_traces(filtros).compare_to(
+            self._baseline.filter_traces(filtros), "lineno",
+        )
+        asignaciones = [
+            (str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+            for stat in sorted(diferencias, key=lambda s: s.size_diff, reverse=True)[: self._top]
+            if stat.size_diff > 0
+        ]
+
+        propias: Counter[str] = Counter()
+        for pila, n in self._stacks.items():
+            propias[pila[-1]] += n
+        funciones = propias.most_common(self._top)
+
+        nombre = f"profile-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        path = self._output_dir / f"{nombre}.txt"
+        report = ProfileReport(
+            path=path,
+            duracion=duracion,
+            mensajes=self._mensajes,
+            muestras=self._muestras,
+            top_funciones=funciones,
+            top_asignaciones=asignaciones,
+        )
+        folded = "".join(f"{';'.join(pila)} {n}\n" for pila, n in self._stacks.items())
+        atomic_write(self._output_dir / f"{nombre}.folded", folded.encode("utf-8"))
+        atomic_write(path, self._format(report).encode("utf-8"))
+        logger.info("%s", report.resumen())
+        return report
+
+    def _format(self, report: ProfileReport) -> str:
+        lineas = [
+            f"Perfil de moltbot (pid {os.getpid()})",
+            f"Duración: {report.duracion:.2f}s · mensajes: {report.mensajes} · "
+            f"muestras: {report.muestras} (cada {self._interval * 1000:.0f} ms)",
+            "",
+            "CPU — muestras en lo alto de la pila (hilos ocupados):",
+        ]
+        lineas += [
+            f"  {n:8d}  {n * 100 / max(1, report.muestras):6.1f}%  {funcion}"
+            for funcion, n in report.top_funciones
+        ]
+        lineas += ["", "Memoria — asignaciones netas durante la sesión:"]
+        lineas += [
+            f"  {size / 1024:+12.1f} KiB  {bloques:+8d} bloques  {sitio}"
+            for sitio, size, bloques in report.top_asignaciones
+        ]
+        return "\n".join(lineas) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Sesión global (una por proceso)
+# ---------------------------------------------------------------------------
+
+_session: Optional[ProfileSession] = None
+_last_report: Optional[ProfileReport] = None
+_session_lock = threading.Lock()
+
+
+def _session_finished(session: ProfileSession) -> None:
+    global _session, _last_report
+    with _session_lock:
+        if _session is session:
+            _session = None
+        if session.report is not None:
+            _last_report = session.report
+
+
+def start(
+    max_messages: int = _cfg.max_messages,
+    max_seconds: float = _cfg.max_seconds,
+) -> bool:
+    """Inicia una sesión de perfilado.
+
+    Returns:
+        ``False`` si ya había una sesión activa.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            return False
+        session = ProfileSession(
+            Path(settings.backup.output_folder) / _cfg.output_dir,
+            max_messages=max_messages,
+            max_seconds=max_seconds,
+            interval=_cfg.interval_ms / 1000,
+            top=_cfg.top,
+        )
+        session.start()
+        _session = session
+    logger.info(
+        "Perfilado activo: próximos %d mensajes o %.0fs.", max_messages, max_seconds,
+    )
+    return True
+
+
+def stop(wait: bool = True, timeout: float = 30.0) -> Optional[ProfileReport]:
+    """Detiene la sesión activa y devuelve su informe (o el de la última sesión).
+
+    Espera como mucho *timeout* segundos a que se escriba el informe; si no
+    está a tiempo devuelve ``None`` (el hilo de muestreo lo deja en el log al
+    terminar). Con ``wait=False`` no espera y devuelve el de la sesión anterior.
+    """
+    session = _session
+    if session is None:
+        return _last_report
+    if not wait:
+        session.stop(timeout=0)
+        return _last_report
+    return session.stop(timeout=timeout)
+
+
+def is_active() -> bool:
+    """``True`` si hay una sesión de perfilado en curso."""
+    return _session is not None
+
+
+def tick() -> None:
+    """Hook del camino de mensajes: cuenta un mensaje si hay sesión activa."""
+    session = _session
+    if session is not None:
+        session.tick()
+
+
+def hook(fn: F) -> F:
+    """Decorador que llama a :func:`tick` tras procesar cada mensaje."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            tick()
+
+    return wrapper  # type: ignore[return-value]
+
+
+def toggle(*_args) -> None:
+    """Inicia o detiene el perfilado (manejador de ``SIGUSR1``).
+
+    No espera a que se escriba el informe: corre en el hilo principal (o en el
+    bucle de asyncio), que no debe bloquearse.
+    """
+    if is_active():
+        stop(wait=False)
+        logger.info("Perfilado detenido; el informe se escribe en segundo plano.")
+    else:
+        start()
@@ -1 +1,52 @@
-"""Fixtures compartidas para los tests de Moltbot."""
+"""Fixtures compartidas para los tests de Moltbot.
+
+Los tests marcados con la fixture ``pg`` usan un PostgreSQL real y solo se
+ejecutan con ``MOLTBOT_TEST_POSTGRES=1``: las variables ``POSTGRES_*`` tienen
+que apuntar a una base de datos desechable, porque se borra el esquema
+``moltbot`` al empezar y las tablas de facturas antes de cada test.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Iterator
+
+import pytest
+
+_PG_OPT_IN = "MOLTBOT_TEST_POSTGRES"
+
+# Tablas que se vacían antes de cada test con ``pg``.
+_TABLAS = (
+    "moltbot.facturas_gastos",
+    "moltbot.facturas_hashes",
+    "moltbot.gastos_mensuales",
+    "moltbot.facturas_archivadas",
+)
+
+
+@pytest.fixture(scope="session")
+def pg_schema() -> Iterator[None]:
+    """Esquema ``moltbot`` recién creado (una vez por sesión)."""
+    if os.getenv(_PG_OPT_IN) != "1":
+        pytest.skip(f"tests de PostgreSQL desactivados (exporta {_PG_OPT_IN}=1)")
+    from moltbot.db import close_pool, setup_db
+    from moltbot.db.pool import get_pool
+
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS moltbot CASCADE;")
+        conn.commit()
+    if not setup_db():
+        pytest.fail("setup_db no pudo aplicar las migraciones (ver el log)")
+    yield
+    close_pool()
+
+
+@pytest.fixture()
+def pg(pg_schema: None) -> Iterator[None]:
+    """PostgreSQL con las tablas de facturas vacías."""
+    from moltbot.db.pool import get_pool
+
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(f"TRUNCATE {', '.join(_TABLAS)};")
+        conn.commit()
+    yield
@@ -0,0 +1,18 @@
+"""Tests del arranque de ``moltbot.app``."""
+
+from __future__ import annotations
+
+import pytest
+
+import moltbot.db
+from moltbot import app
+
+
+def test_main_aborta_si_falla_la_migracion(monkeypatch):
+    monkeypatch.setattr(moltbot.db, "setup_db", lambda: False)
+    monkeypatch.setattr(app, "_run_blocking", lambda *a, **k: pytest.fail("no debe arrancar"))
+
+    with pytest.raises(SystemExit) as exc:
+        app.main([])
+
+    assert exc.value.code == 1
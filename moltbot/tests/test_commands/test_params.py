@@ -0,0 +1,151 @@
+"""Tests de los parámetros tipados de los comandos."""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Optional
+
+import pytest
+
+from moltbot.commands.params import (
+    CommandError,
+    Param,
+    enlazar,
+    parametros,
+    parse_mes,
+    separar,
+    uso,
+)
+
+HOY = date(2026, 3, 18)
+
+
+# ---------------------------------------------------------------------------
+# Meses
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    ("texto", "esperado"),
+    [
+        ("actual", date(2026, 3, 1)),
+        ("Este", date(2026, 3, 1)),
+        ("anterior", date(2026, 2, 1)),
+        ("2025-03", date(2025, 3, 1)),
+        ("2025-3-17", date(2025, 3, 1)),
+        ("03/2025", date(2025, 3, 1)),
+        ("3-2025", date(2025, 3, 1)),
+        ("marzo", date(2026, 3, 1)),
+        ("  MARZO ", date(2026, 3, 1)),
+        ("mar-2024", date(2024, 3, 1)),
+        ("marzo2024", date(2024, 3, 1)),
+        ("sept", date(2025, 9, 1)),
+        ("setiembre", date(2025, 9, 1)),
+        ("2", date(2026, 2, 1)),
+        # Sin año: el más reciente con ese nombre.
+        ("diciembre", date(2025, 12, 1)),
+        ("abril", date(2025, 4, 1)),
+    ],
+)
+def test_parse_mes(texto, esperado):
+    assert parse_mes(texto, HOY) == esperado
+
+
+def test_parse_mes_anterior_en_enero_cambia_de_anio():
+    assert parse_mes("anterior", date(2026, 1, 5)) == date(2025, 12, 1)
+
+
+@pytest.mark.parametrize("texto", ["", "13", "0", "2025-13", "ma", "ju", "foo", "marzo-25"])
+def test_parse_mes_invalido(texto):
+    with pytest.raises(ValueError):
+        parse_mes(texto, HOY)
+
+
+# ---------------------------------------------------------------------------
+# Firma y uso
+# ---------------------------------------------------------------------------
+
+def _gastos(mes: Optional[date] = None, detalle: bool = False) -> str:
+    return ""
+
+
+def _nota(importe: float, texto: str) -> str:
+    return ""
+
+
+def test_parametros_desde_la_firma():
+    assert parametros(_gastos) == (
+        Param("mes", date, False),
+        Param("detalle", bool, False),
+    )
+    assert parametros(_nota) == (Param("importe", float, True), Param("texto", str, True))
+
+
+def test_parametros_no_admitidos():
+    def _varargs(*args: str) -> str:
+        return ""
+
+    def _lista(ids: list) -> str:
+        return ""
+
+    with pytest.raises(TypeError):
+        parametros(_varargs)
+    with pytest.raises(TypeError):
+        parametros(_lista)
+
+
+def test_uso():
+    assert uso("!gastos", parametros(_gastos)) == "!gastos [mes] [detalle]"
+    assert uso("!nota", parametros(_nota)) == "!nota <importe> <texto>"
+
+
+# ---------------------------------------------------------------------------
+# Petición
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    ("texto", "esperado"),
+    [
+        ("!Gastos marzo", ("!gastos", "marzo")),
+        ("  !status_db  ", ("!status_db", "")),
+        ("!nota 3 dos  palabras", ("!nota", "3 dos  palabras")),
+        ("   ", ("", "")),
+    ],
+)
+def test_separar(texto, esperado):
+    assert separar(texto) == esperado
+
+
+def test_enlazar_por_posicion_y_por_nombre():
+    params = parametros(_gastos)
+    assert enlazar(params, "") == {}
+    assert enlazar(params, "2025-03 si") == {"mes": date(2025, 3, 1), "detalle": True}
+    assert enlazar(params, "DETALLE=no mes=03/2025") == {"mes": date(2025, 3, 1), "detalle": False}
+
+
+def test_enlazar_el_ultimo_texto_recoge_el_resto():
+    params = parametros(_nota)
+    assert enlazar(params, "12,5 cena con 'el equipo'") == {
+        "importe": 12.5, "texto": "cena con el equipo",
+    }
+
+
+@pytest.mark.parametrize(
+    ("argumentos", "mensaje"),
+    [
+        ("marzo si extra", "argumentos de más: extra"),
+        ("mes=marzo mes=abril", "'mes' repetido"),
+        ("'marzo", "comillas sin cerrar"),
+        ("quizas", "valor no válido para 'mes'"),
+        ("marzo quizas", "valor no válido para 'detalle'"),
+    ],
+)
+def test_enlazar_errores(argumentos, mensaje):
+    with pytest.raises(CommandError, match=mensaje):
+        enlazar(parametros(_gastos), argumentos)
+
+
+def test_enlazar_falta_obligatorio():
+    with pytest.raises(CommandError, match="falta 'importe'"):
+        enlazar(parametros(_nota), "")
+    with pytest.raises(CommandError, match="falta 'texto'"):
+        enlazar(parametros(_nota), "12")
@@ -0,0 +1,41 @@
+"""Tests del timeout de los handlers de comandos."""
+
+from __future__ import annotations
+
+import threading
+
+import psycopg2
+
+from moltbot.commands import runtime
+from moltbot.db.pool import get_pool
+
+
+def test_consulta_de_un_comando_vencido_se_cancela_en_el_servidor(pg_schema):
+    terminado, errores = threading.Event(), []
+
+    def _handler() -> None:
+        try:
+            with get_pool().connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT pg_sleep(30);")
+        except psycopg2.Error as exc:
+            errores.append(exc)
+        finally:
+            terminado.set()
+
+    # La consulta se corta a la vez que vence el comando: según quién llegue
+    # antes, run() devuelve o lanza CommandTimeout.
+    try:
+        runtime.run(_handler, timeout=0.3)
+    except runtime.CommandTimeout:
+        pass
+
+    # El hilo y la conexión quedan libres en cuanto vence el statement_timeout.
+    assert terminado.wait(5)
+    assert isinstance(errores[0], psycopg2.extensions.QueryCanceledError)
+
+
+def test_sin_comando_no_hay_limite(pg_schema):
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute("SHOW statement_timeout;")
+        assert cur.fetchone()[0] == "0"
+        conn.rollback()
@@ -0,0 +1,24 @@
+"""Tests del advisory lock de trabajos largos (ver ``conftest.py``)."""
+
+from __future__ import annotations
+
+from moltbot.commands import infra
+from moltbot.db import advisory_lock
+
+_KEY = 0x7465737431
+
+
+def test_segundo_intento_no_espera_y_se_libera_al_salir(pg_schema):
+    with advisory_lock(_KEY) as primero:
+        with advisory_lock(_KEY) as segundo:
+            assert (primero, segundo) == (True, False)
+    with advisory_lock(_KEY) as otra_vez:
+        assert otra_vez
+
+
+def test_backup_ocupado_en_otro_worker(pg_schema, monkeypatch):
+    monkeypatch.setattr(infra, "_backup_workflows", lambda: "hecho")
+
+    with advisory_lock(infra._BACKUP_LOCK_KEY):
+        assert infra._cmd_backup_workflows().startswith("⏳")
+    assert infra._cmd_backup_workflows() == "hecho"
@@ -0,0 +1,69 @@
+"""Tests del contador exacto de ejecuciones de n8n (ver ``conftest.py``)."""
+
+from __future__ import annotations
+
+import dataclasses
+from typing import Iterator
+
+import pytest
+
+from moltbot.db import executions
+from moltbot.db.executions import _rangos
+from moltbot.db.pool import get_pool
+
+
+def test_rangos_consecutivos():
+    assert list(_rangos([])) == []
+    assert list(_rangos([1, 2, 3, 5, 7, 8])) == [(1, 3), (5, 5), (7, 8)]
+
+
+def _ejecutar(consulta: str, params: tuple = ()) -> None:
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(consulta, params)
+        conn.commit()
+
+
+@pytest.fixture()
+def n8n(pg: None, monkeypatch) -> Iterator[None]:
+    """Tablas mínimas de n8n con 100 ejecuciones terminadas, en buckets de 10."""
+    monkeypatch.setattr(
+        executions, "_pg", dataclasses.replace(executions._pg, execution_stats_bucket=10),
+    )
+    _ejecutar(
+        """
+        CREATE TABLE execution_entity (
+            id INTEGER PRIMARY KEY, "workflowId" VARCHAR(36), status VARCHAR(20)
+        );
+        CREATE TABLE workflow_entity (id VARCHAR(36) PRIMARY KEY, name TEXT);
+        INSERT INTO execution_entity SELECT i, 'w1', 'success' FROM generate_series(1, 100) i;
+        TRUNCATE moltbot.ejecuciones_stats, moltbot.ejecuciones_frontera,
+                 moltbot.ejecuciones_buckets, moltbot.ejecuciones_estado;
+        """,
+    )
+    yield
+    _ejecutar("DROP TABLE execution_entity, workflow_entity;")
+
+
+def _total() -> int:
+    stats = executions.refresh_execution_stats()
+    assert stats is not None
+    return stats.total
+
+
+def test_borrados_en_buckets_frios_se_descuentan(n8n):
+    assert _total() == 100
+
+    # Poda por antigüedad que no llega a vaciar el bucket 2, y un borrado en
+    # el extremo de un bucket intermedio.
+    _ejecutar("DELETE FROM execution_entity WHERE id < 25 OR id = 59;")
+
+    assert _total() == 100 - 24 - 1
+
+
+def test_buckets_sin_extremos_se_recuentan_una_vez(n8n):
+    assert _total() == 100
+    # Como tras la migración 7: contadores sin fila de extremos y desfasados.
+    _ejecutar("TRUNCATE moltbot.ejecuciones_buckets;")
+    _ejecutar("DELETE FROM execution_entity WHERE id BETWEEN 40 AND 45;")
+
+    assert _total() == 94
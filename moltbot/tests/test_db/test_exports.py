@@ -0,0 +1,9 @@
+"""Tests de los re-exports perezosos de ``moltbot.db``."""
+
+from __future__ import annotations
+
+import moltbot.db as db
+
+
+def test_all_coincide_con_los_exports():
+    assert sorted(db.__all__) == sorted(db._EXPORTS)
@@ -0,0 +1,53 @@
+"""Tests de inserción de facturas contra PostgreSQL (ver ``conftest.py``)."""
+
+from __future__ import annotations
+
+from moltbot.db import get_total_gastos_mes, hash_factura, insert_facturas
+from moltbot.db.pool import get_pool
+
+
+def _guardadas(ids: list) -> list[tuple[str, float, str]]:
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, proveedor, importe, texto_original FROM moltbot.facturas_gastos"
+            " WHERE id = ANY(%s);",
+            ([i for i in ids if i is not None],),
+        )
+        por_id = {fila[0]: (fila[1], float(fila[2]), fila[3]) for fila in cur.fetchall()}
+        conn.rollback()
+    return [por_id[i] for i in ids]
+
+
+def test_ids_en_el_orden_de_las_facturas(pg):
+    facturas = [("o2", 10.0, "c"), ("iberdrola", 20.5, "a"), ("o2", 30.0, "b")]
+
+    ids = insert_facturas(facturas)
+
+    assert ids is not None and None not in ids
+    assert _guardadas(ids) == facturas
+    assert insert_facturas([facturas[1]]) == [None]
+
+
+def test_duplicadas_en_el_mismo_lote(pg):
+    ids = insert_facturas([
+        ("o2", 10.0, "a"),
+        ("o2", 10.0, "a"),
+        ("o2", 15.0, "b"),
+        ("o2", 10.0, "a"),
+    ])
+
+    assert ids is not None
+    assert ids[1] is None and ids[3] is None
+    assert _guardadas([ids[0], ids[2]]) == [("o2", 10.0, "a"), ("o2", 15.0, "b")]
+    # El rollup solo cuenta las nuevas.
+    assert get_total_gastos_mes() == 25.0
+
+
+def test_hash_de_contenido_explicito(pg):
+    # Mismo texto guardado (truncado) pero distinta factura completa.
+    ids = insert_facturas([("o2", 42.0, "cuota", "1" * 64), ("o2", 42.0, "cuota", "2" * 64)])
+
+    assert ids is not None and None not in ids
+    # Sin hash explícito se calcula sobre el texto.
+    assert insert_facturas([("o2", 42.0, "cuota")]) != [None]
+    assert insert_facturas([("o2", 42.0, "cuota", hash_factura("o2", 42.0, "cuota"))]) == [None]
@@ -0,0 +1,30 @@
+"""Tests de los avisos de escritura entre procesos (LISTEN/NOTIFY)."""
+
+from __future__ import annotations
+
+import queue
+
+from moltbot.db import add_write_listener, engine, start_write_listener, stop_write_listener
+from moltbot.db.pool import get_pool
+
+
+def test_escritura_de_otra_conexion_invalida_la_tabla(pg):
+    recibidas: queue.Queue[str] = queue.Queue()
+    add_write_listener(recibidas.put)
+    start_write_listener()
+    try:
+        # Al conectar invalida todo (pudo perderse algún aviso).
+        assert recibidas.get(timeout=5) == engine.TABLA_FACTURAS
+
+        # Escritura directa, sin pasar por notify_write de este proceso.
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO moltbot.gastos_mensuales (mes, proveedor, total, num_facturas) "
+                "VALUES (date_trunc('month', now())::date, 'o2', 10, 1);",
+            )
+            conn.commit()
+
+        assert recibidas.get(timeout=5) == engine.TABLA_FACTURAS
+    finally:
+        stop_write_listener()
+        engine._write_listeners.remove(recibidas.put)
@@ -0,0 +1,187 @@
+"""Tests del particionado mensual de ``facturas_gastos``."""
+
+from __future__ import annotations
+
+import gzip
+import json
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+
+from moltbot.db import partitions
+from moltbot.db.partitions import inicio_mes, nombre_particion, rango_mes, sumar_meses
+from moltbot.db.pool import get_pool
+
+HOY = date(2026, 10, 18)
+
+
+# ---------------------------------------------------------------------------
+# Meses
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    ("mes", "n", "esperado"),
+    [
+        (date(2026, 10, 1), 0, date(2026, 10, 1)),
+        (date(2026, 10, 1), 3, date(2027, 1, 1)),
+        (date(2026, 1, 1), -1, date(2025, 12, 1)),
+        (date(2026, 12, 1), 1, date(2027, 1, 1)),
+        (date(2026, 10, 1), -22, date(2024, 12, 1)),
+        (date(2026, 10, 1), 24, date(2028, 10, 1)),
+    ],
+)
+def test_sumar_meses(mes, n, esperado):
+    assert sumar_meses(mes, n) == esperado
+
+
+def test_rango_mes_es_semiabierto_y_empieza_el_dia_1():
+    assert rango_mes(date(2026, 2, 17)) == (date(2026, 2, 1), date(2026, 3, 1))
+    assert rango_mes(date(2026, 12, 31)) == (date(2026, 12, 1), date(2027, 1, 1))
+    assert inicio_mes(date(2024, 2, 29)) == date(2024, 2, 1)
+
+
+def test_nombre_particion():
+    assert nombre_particion(date(2026, 3, 1)) == "facturas_gastos_2026_03"
+
+
+# ---------------------------------------------------------------------------
+# PostgreSQL
+# ---------------------------------------------------------------------------
+
+def _ejecutar(consulta: str, params: tuple = ()) -> list[tuple]:
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(consulta, params)
+        filas = cur.fetchall() if cur.description else []
+        conn.commit()
+    return filas
+
+
+def _conectadas() -> set[str]:
+    return {p.nombre for p in partitions.get_partitions() or []}
+
+
+@pytest.fixture()
+def meses_pasados(pg: None) -> Iterator[None]:
+    """Borra al terminar las particiones (conectadas o no) anteriores a ``HOY``."""
+    yield
+    for (nombre,) in _ejecutar(
+        "SELECT relname FROM pg_class WHERE relnamespace = 'moltbot'::regnamespace "
+        "AND relkind IN ('r', 'p') AND relname ~ '^facturas_gastos_[0-9]{4}_[0-9]{2}$' "
+        "AND relname < %s;",
+        (nombre_particion(inicio_mes(HOY)),),
+    ):
+        _ejecutar(f"DROP TABLE moltbot.{nombre};")
+    _ejecutar("DROP TABLE IF EXISTS moltbot.facturas_gastos_legacy;")
+
+
+def test_retencion_desconecta_los_meses_anteriores_al_limite(meses_pasados):
+    meses = [sumar_meses(inicio_mes(HOY), -n) for n in (11, 12, 13, 14)]
+    assert partitions.ensure_month_partitions(meses) == 4
+
+    resultado = partitions.aplicar_retencion(hoy=HOY, retention_months=12, archive_text_months=0)
+
+    # Límite: octubre de 2025. Septiembre y agosto salen; noviembre y octubre se quedan.
+    assert resultado == (0, 2)
+    conectadas = _conectadas()
+    assert {"facturas_gastos_2025_11", "facturas_gastos_2025_10"} <= conectadas
+    assert not {"facturas_gastos_2025_09", "facturas_gastos_2025_08"} & conectadas
+    # Desconectada no es borrada.
+    assert _ejecutar("SELECT to_regclass('moltbot.facturas_gastos_2025_09') IS NOT NULL;")[0][0]
+
+
+def test_retencion_desactivada_no_toca_nada(meses_pasados):
+    partitions.ensure_month_partitions([date(2020, 1, 1)])
+
+    resultado = partitions.aplicar_retencion(hoy=HOY, retention_months=0, archive_text_months=0)
+
+    assert resultado == (0, 0)
+    assert "facturas_gastos_2020_01" in _conectadas()
+
+
+def test_archivo_de_textos_no_vuelve_a_recorrer_lo_archivado(
+    meses_pasados, tmp_path, monkeypatch,
+):
+    monkeypatch.setattr(partitions, "settings", SimpleNamespace(
+        backup=SimpleNamespace(output_folder=str(tmp_path)),
+    ))
+    partitions.ensure_month_partitions([date(2025, 1, 1)])
+    _ejecutar(
+        "INSERT INTO moltbot.facturas_gastos "
+        "(proveedor, importe, fecha_registro, texto_original) "
+        "VALUES ('o2', 1, '2025-01-05', 'a'), ('o2', 2, '2025-01-06', 'b');",
+    )
+
+    def archivar() -> tuple:
+        return partitions.aplicar_retencion(
+            hoy=HOY, retention_months=0, archive_text_months=6, batch_size=1,
+        )
+
+    assert archivar() == (2, 0)
+    ultimo = _ejecutar(
+        "SELECT ultimo_id FROM moltbot.facturas_archivadas "
+        "WHERE particion = 'facturas_gastos_2025_01';",
+    )[0][0]
+    assert ultimo == _ejecutar("SELECT max(id) FROM moltbot.facturas_gastos_2025_01;")[0][0]
+
+    # Un texto restaurado por debajo de la marca no se vuelve a buscar…
+    _ejecutar("UPDATE moltbot.facturas_gastos_2025_01 SET texto_original = 'x';")
+    assert archivar() == (0, 0)
+    # …pero sí las facturas nuevas del mes (p. ej. de una importación).
+    _ejecutar(
+        "INSERT INTO moltbot.facturas_gastos "
+        "(proveedor, importe, fecha_registro, texto_original) "
+        "VALUES ('o2', 3, '2025-01-07', 'c');",
+    )
+    assert archivar() == (1, 0)
+
+    with gzip.open(tmp_path / "facturas-archivo" / "facturas_2025_01.jsonl.gz", "rt") as fh:
+        assert [json.loads(linea)["texto_original"] for linea in fh] == ["a", "b", "c"]
+
+
+def test_crear_particion_mueve_las_filas_de_default(meses_pasados):
+    _ejecutar(
+        "INSERT INTO moltbot.facturas_gastos (proveedor, importe, fecha_registro) "
+        "VALUES ('o2', 5, '2021-05-03'), ('o2', 6, '2021-05-31 23:59'), ('o2', 7, '2021-06-01');",
+    )
+
+    assert partitions.ensure_month_partitions([date(2021, 5, 1)]) == 1
+
+    por_tabla = dict(_ejecutar(
+        "SELECT tableoid::regclass::text, COUNT(*) FROM moltbot.facturas_gastos GROUP BY 1;",
+    ))
+    assert por_tabla == {
+        "moltbot.facturas_gastos_2021_05": 2,
+        "moltbot.facturas_gastos_default": 1,
+    }
+
+
+def test_migrar_legacy_conserva_ids_y_borra_la_tabla(meses_pasados):
+    _ejecutar(
+        """
+        CREATE TABLE moltbot.facturas_gastos_legacy (
+            id INTEGER PRIMARY KEY, proveedor VARCHAR(50), importe DECIMAL(10, 2),
+            fecha_registro TIMESTAMP, texto_original TEXT, hash_contenido CHAR(64)
+        );
+        """,
+    )
+    _ejecutar(
+        "INSERT INTO moltbot.facturas_gastos_legacy VALUES "
+        "(901, 'o2', 1, '2024-03-05', 'a', NULL), (902, 'o2', 2, '2024-04-01', 'b', NULL), "
+        "(903, 'o2', 3, '2024-03-31', 'c', NULL);",
+    )
+    assert partitions.legacy_con_filas() is True
+
+    assert partitions.migrar_legacy(batch_size=2) == 3
+
+    assert partitions.legacy_con_filas() is False
+    filas = _ejecutar(
+        "SELECT id, tableoid::regclass::text, fecha_registro FROM moltbot.facturas_gastos "
+        "WHERE id > 900 ORDER BY id;",
+    )
+    assert filas == [
+        (901, "moltbot.facturas_gastos_2024_03", datetime(2024, 3, 5)),
+        (902, "moltbot.facturas_gastos_2024_04", datetime(2024, 4, 1)),
+        (903, "moltbot.facturas_gastos_2024_03", datetime(2024, 3, 31)),
+    ]
@@ -0,0 +1,250 @@
+"""Tests del pool de conexiones con un ``psycopg2.connect`` falso."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Optional
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+from moltbot.db import pool as pool_mod
+from moltbot.db.pool import ConnectionPool, PoolTimeout
+
+
+class _Cursor:
+    def __init__(self, conn: "_Conexion") -> None:
+        self._conn = conn
+
+    def __enter__(self) -> "_Cursor":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        pass
+
+    def execute(self, sql: str, params: Optional[tuple] = None) -> None:
+        if self._conn.rota:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self._conn.consultas.append(sql)
+
+
+class _Conexion:
+    """Lo mínimo de ``psycopg2.extensions.connection`` que usa el pool."""
+
+    def __init__(self) -> None:
+        self.closed = 0
+        self.autocommit = False
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+        self.rota = False
+        self.consultas: list[str] = []
+        self.rollbacks = 0
+
+    def cursor(self) -> _Cursor:
+        return _Cursor(self)
+
+    def rollback(self) -> None:
+        if self.rota:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+class _Servidor:
+    """Sustituto de ``psycopg2.connect``: registra las conexiones abiertas."""
+
+    def __init__(self) -> None:
+        self.conexiones: list[_Conexion] = []
+        self.fallos = 0
+
+    def connect(self, **kwargs: object) -> _Conexion:
+        if self.fallos:
+            self.fallos -= 1
+            raise psycopg2.OperationalError("could not connect to server")
+        conn = _Conexion()
+        self.conexiones.append(conn)
+        return conn
+
+
+@pytest.fixture()
+def servidor(monkeypatch) -> _Servidor:
+    servidor = _Servidor()
+    monkeypatch.setattr(pool_mod.psycopg2, "connect", servidor.connect)
+    monkeypatch.setattr(pool_mod, "_deadline_provider", None)
+    return servidor
+
+
+@pytest.fixture()
+def reloj(monkeypatch) -> SimpleNamespace:
+    """Reloj manual para ``time.monotonic`` del pool."""
+    reloj = SimpleNamespace(t=1_000.0)
+    monkeypatch.setattr(pool_mod, "time", SimpleNamespace(monotonic=lambda: reloj.t))
+    return reloj
+
+
+def _pool(**kwargs: float) -> ConnectionPool:
+    opciones = {"min_size": 0, "max_size": 1, "timeout": 1.0, "max_lifetime": 100.0}
+    opciones.update(kwargs)
+    return ConnectionPool({"host": "db"}, **opciones)
+
+
+def _usar(pool: ConnectionPool) -> _Conexion:
+    with pool.connection() as conn:
+        return conn
+
+
+# ---------------------------------------------------------------------------
+# Checkout
+# ---------------------------------------------------------------------------
+
+def test_checkout_agota_la_espera(servidor):
+    pool = _pool(timeout=0.05)
+
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+
+    stats = pool.stats()
+    assert (stats.waits, stats.timeouts, stats.checkouts) == (1, 1, 1)
+    # El hueco ocupado vuelve a estar libre.
+    assert _usar(pool) is servidor.conexiones[0]
+
+
+def test_fallo_al_conectar_libera_el_hueco(servidor):
+    pool = _pool()
+    servidor.fallos = 1
+
+    with pytest.raises(psycopg2.OperationalError):
+        _usar(pool)
+
+    assert (pool.stats().size, pool.stats().connect_errors) == (0, 1)
+    # Con max_size=1 no habría hueco si no se hubiera devuelto.
+    _usar(pool)
+    assert (pool.stats().size, pool.stats().created) == (1, 1)
+
+
+def test_open_tolera_fallos_al_preabrir(servidor):
+    pool = _pool(min_size=1)
+    servidor.fallos = 1
+
+    pool.open()
+
+    assert (pool.stats().size, pool.stats().idle) == (0, 0)
+    pool.open()
+    assert (pool.stats().size, pool.stats().idle) == (1, 1)
+
+
+# ---------------------------------------------------------------------------
+# Reciclado y health checks
+# ---------------------------------------------------------------------------
+
+def test_recicla_conexiones_por_edad(servidor, reloj):
+    pool = _pool(health_check_idle=1_000.0)
+    vieja = _usar(pool)
+
+    reloj.t += 99
+    assert _usar(pool) is vieja
+
+    reloj.t += 1
+    nueva = _usar(pool)
+
+    assert nueva is not vieja and vieja.closed
+    stats = pool.stats()
+    assert (stats.recycled, stats.discarded, stats.created, stats.size) == (1, 0, 2, 1)
+
+
+def test_recicla_al_devolver_si_caduco_mientras_se_usaba(servidor, reloj):
+    pool = _pool()
+
+    with pool.connection() as conn:
+        reloj.t += 100
+
+    assert conn.closed
+    assert (pool.stats().recycled, pool.stats().size, pool.stats().idle) == (1, 0, 0)
+
+
+def test_health_check_solo_tras_estar_ociosa(servidor, reloj):
+    pool = _pool(health_check_idle=30.0, max_lifetime=0)
+    conn = _usar(pool)
+
+    reloj.t += 29
+    _usar(pool)
+    assert conn.consultas == []
+
+    reloj.t += 31
+    assert _usar(pool) is conn
+    assert conn.consultas == ["SELECT 1;"]
+
+
+def test_health_check_descarta_conexiones_rotas(servidor, reloj):
+    pool = _pool(health_check_idle=30.0)
+    rota = _usar(pool)
+    rota.rota = True
+
+    reloj.t += 30
+    nueva = _usar(pool)
+
+    assert nueva is not rota and rota.closed
+    assert (pool.stats().discarded, pool.stats().size) == (1, 1)
+
+
+def test_descarta_conexiones_cerradas_sin_consultar(servidor):
+    pool = _pool()
+    cerrada = _usar(pool)
+    cerrada.closed = 2
+
+    assert _usar(pool) is not cerrada
+    assert cerrada.consultas == [] and pool.stats().discarded == 1
+
+
+# ---------------------------------------------------------------------------
+# Checkin
+# ---------------------------------------------------------------------------
+
+def test_rollback_al_devolver(servidor):
+    pool = _pool()
+
+    conn = _usar(pool)
+    assert conn.rollbacks == 0
+
+    # Transacción sin cerrar.
+    with pool.connection() as conn:
+        conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    assert conn.rollbacks == 1
+
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("fallo en el bloque")
+    assert conn.rollbacks == 2
+
+    stats = pool.stats()
+    assert (stats.errors, stats.idle, stats.in_use, stats.discarded) == (1, 1, 0, 0)
+
+
+def test_rollback_fallido_descarta_la_conexion(servidor):
+    pool = _pool()
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.rota = True
+            raise ValueError("fallo en el bloque")
+
+    assert conn.closed
+    assert (pool.stats().discarded, pool.stats().size, pool.stats().idle) == (1, 0, 0)
+
+
+def test_close_cierra_las_ociosas_y_las_que_vuelven(servidor):
+    pool = _pool(max_size=2)
+
+    with pool.connection() as prestada:
+        ociosa = _usar(pool)
+        pool.close()
+        assert ociosa.closed and not prestada.closed
+    assert prestada.closed
+    with pytest.raises(PoolTimeout):
+        _usar(pool)
+    assert pool.stats().size == 0
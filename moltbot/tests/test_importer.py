@@ -0,0 +1,64 @@
+"""Tests de la importación masiva de facturas."""
+
+from __future__ import annotations
+
+import io
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+from moltbot.importer import Importer, _fecha
+
+
+@pytest.fixture()
+def madrid(monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Madrid")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_fecha_con_zona_pasa_a_hora_local(madrid):
+    assert _fecha("2026-01-15T23:30:00+00:00") == datetime(2026, 1, 16, 0, 30)
+    assert _fecha("2026-07-15T10:00:00-04:00") == datetime(2026, 7, 15, 16, 0)
+
+
+def test_fecha_sin_zona_se_queda_igual(madrid):
+    assert _fecha("2026-01-15T23:30:00") == datetime(2026, 1, 15, 23, 30)
+    assert _fecha("") is None
+
+
+def _importar(tmp_path, cargar, monkeypatch) -> object:
+    monkeypatch.setattr(Importer, "_cargar", cargar)
+    importer = Importer(
+        tmp_path / "facturas.jsonl", workers=1, batch_size=2, chunksize=1,
+        state_path=tmp_path / "estado.json", progress=io.StringIO(),
+    )
+    return importer.run()
+
+
+def test_reanudar_no_repite_lineas_del_informe(tmp_path, monkeypatch):
+    buena = {"text": "O2 Fibra y Móvil\nTotal factura 12,34 €", "proveedor": "o2"}
+    # Buenas en las líneas impares y vacías en las pares: lotes de 2 tras las líneas 3 y 5.
+    lineas = [buena, {"text": ""}] * 3
+    (tmp_path / "facturas.jsonl").write_text(
+        "".join(json.dumps(linea) + "\n" for linea in lineas), encoding="utf-8",
+    )
+    cargas: list[int] = []
+
+    def falla_el_segundo(self, lote, stats):
+        cargas.append(len(lote))
+        return len(cargas) < 2
+
+    assert _importar(tmp_path, falla_el_segundo, monkeypatch) is None
+    informe = tmp_path / "estado.errores.jsonl"
+    assert informe.read_text(encoding="utf-8").count("\n") == 3
+
+    stats = _importar(tmp_path, lambda self, lote, stats: True, monkeypatch)
+
+    assert stats is not None and stats.errores == 3
+    claves = [json.loads(linea)["clave"] for linea in informe.read_text().splitlines()]
+    assert claves == ["linea:2", "linea:4", "linea:6"]
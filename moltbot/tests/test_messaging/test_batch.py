@@ -0,0 +1,155 @@
+"""Tests del consumo de facturas por micro-lotes."""
+
+from __future__ import annotations
+
+import pytest
+from pika.exceptions import AMQPError
+
+from benchmarks.standins import FakeChannel, FakeProperties, RecordingDB
+from moltbot.messaging import batch, dedup
+from moltbot.messaging.batch import FacturaBatcher
+from moltbot.messaging.facturas import Factura
+
+
+def _extraer(properties, body: bytes) -> Factura | None:
+    if body == b"ilegible":
+        return None
+    proveedor, importe = body.decode().split(":")
+    return Factura(proveedor, float(importe), body.decode(), body.hex().ljust(64, "0"))
+
+
+@pytest.fixture(autouse=True)
+def notificadas(monkeypatch) -> list[tuple]:
+    """Caché de deduplicación vacía; devuelve las notificaciones enviadas."""
+    enviadas: list[tuple] = []
+    monkeypatch.setattr(dedup, "_cache", dedup.DedupCache(100))
+    monkeypatch.setattr(batch, "notificar_factura", lambda *a: enviadas.append(a))
+    return enviadas
+
+
+@pytest.fixture()
+def db(monkeypatch) -> RecordingDB:
+    recording = RecordingDB()
+    monkeypatch.setattr(batch, "insert_facturas", recording.insert_facturas)
+    return recording
+
+
+def _entregar(batcher: FacturaBatcher, canal: FakeChannel, *cuerpos: bytes) -> None:
+    for cuerpo in cuerpos:
+        batcher.on_message(canal, canal.deliver("tareas_facturas"), FakeProperties(), cuerpo)
+
+
+def test_factura_fallida_se_aparca_antes_de_rechazarla(monkeypatch):
+    # El lote falla entero; fila a fila solo falla "mal".
+    monkeypatch.setattr(
+        batch, "insert_facturas",
+        lambda facturas: None if len(facturas) > 1 or facturas[0].proveedor == "mal" else [7],
+    )
+    canal = FakeChannel()
+    batcher = FacturaBatcher(canal, _extraer, batch_size=2, cola_fallidas="fallidas")
+
+    _entregar(batcher, canal, b"o2:10", b"mal:5")
+
+    assert canal.publicadas == [("fallidas", b"mal:5")]
+    assert (canal.acks, canal.rechazos, canal.nacks) == (1, 1, 0)
+
+
+def test_lote_completo_se_confirma_al_guardarlo(db, notificadas):
+    canal = FakeChannel()
+    batcher = FacturaBatcher(canal, _extraer, batch_size=3)
+
+    _entregar(batcher, canal, b"o2:10", b"iberdrola:20")
+    assert (canal.acks, db.llamadas) == (0, 0)
+
+    _entregar(batcher, canal, b"o2:30")
+
+    assert (canal.sin_confirmar, canal.nacks, db.llamadas, db.insertadas) == ([], 0, 1, 3)
+    assert notificadas == [("o2", 10.0), ("iberdrola", 20.0), ("o2", 30.0)]
+
+
+def test_flush_confirma_el_lote_incompleto(db, notificadas):
+    canal = FakeChannel()
+    batcher = FacturaBatcher(canal, _extraer, batch_size=10)
+    _entregar(batcher, canal, b"o2:10")
+
+    batcher.flush()
+    batcher.flush()
+
+    assert (canal.acks, db.llamadas) == (1, 1)
+
+
+def test_descartadas_y_repetidas_se_confirman_sin_lote(db, notificadas):
+    canal = FakeChannel()
+    batcher = FacturaBatcher(canal, _extraer, batch_size=10)
+    _entregar(batcher, canal, b"o2:10")
+    batcher.flush()
+
+    _entregar(batcher, canal, b"ilegible", b"o2:10")
+    batcher.flush()
+
+    assert (canal.acks, db.llamadas) == (3, 1)
+    assert notificadas == [("o2", 10.0)]
+
+
+def test_duplicadas_en_db_se_confirman_sin_notificar(db, notificadas, monkeypatch):
+    canal = FakeChannel()
+    FacturaBatcher(canal, _extraer, batch_size=1).on_message(
+        canal, canal.deliver("tareas_facturas"), FakeProperties(), b"o2:10",
+    )
+    notificadas.clear()
+    # Como si la repitiera otro worker, con su caché vacía.
+    monkeypatch.setattr(dedup, "_cache", dedup.DedupCache(100))
+
+    _entregar(FacturaBatcher(canal, _extraer, batch_size=1), canal, b"o2:10")
+
+    assert (canal.acks, db.duplicadas) == (2, 1)
+    assert notificadas == []
+
+
+def test_lote_sin_db_se_reencola_entero(monkeypatch, notificadas):
+    monkeypatch.setattr(batch, "insert_facturas", lambda facturas: None)
+    canal = FakeChannel()
+    batcher = FacturaBatcher(canal, _extraer, batch_size=2)
+
+    _entregar(batcher, canal, b"o2:10", b"o2:20")
+
+    assert (canal.acks, canal.rechazos, canal.reencoladas) == (0, 0, [1, 2])
+    assert canal.publicadas == [] and notificadas == []
+
+
+@pytest.mark.parametrize("db_caida", [False, True])
+def test_lote_no_toca_los_comandos_en_curso_del_canal(monkeypatch, db_caida):
+    if db_caida:
+        monkeypatch.setattr(batch, "insert_facturas", lambda facturas: None)
+    else:
+        monkeypatch.setattr(batch, "insert_facturas", RecordingDB().insert_facturas)
+    canal = FakeChannel()
+    batcher = FacturaBatcher(canal, _extraer, batch_size=2)
+
+    _entregar(batcher, canal, b"o2:10")
+    comando = canal.deliver("comandos_bot")  # en el pool de ConcurrentConsumer
+    _entregar(batcher, canal, b"o2:20")
+
+    assert canal.sin_confirmar == [comando.delivery_tag]
+    assert canal.reencoladas == ([1, 3] if db_caida else [])
+    # El comando termina después y se confirma sin cerrar el canal.
+    canal.basic_ack(delivery_tag=comando.delivery_tag)
+    assert canal.is_open and canal.sin_confirmar == []
+
+
+def test_factura_que_no_se_puede_aparcar_se_reencola(monkeypatch):
+    monkeypatch.setattr(
+        batch, "insert_facturas",
+        lambda facturas: None if len(facturas) > 1 or facturas[0].proveedor == "mal" else [7],
+    )
+    canal = FakeChannel()
+
+    def sin_broker(*args, **kwargs) -> None:
+        raise AMQPError("canal cerrado")
+
+    canal.basic_publish = sin_broker
+    batcher = FacturaBatcher(canal, _extraer, batch_size=2, cola_fallidas="fallidas")
+
+    _entregar(batcher, canal, b"o2:10", b"mal:5")
+
+    assert (canal.acks, canal.rechazos, canal.nacks) == (1, 0, 1)
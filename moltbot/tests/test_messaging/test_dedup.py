@@ -0,0 +1,96 @@
+"""Tests de la deduplicación de facturas (caché LRU y claves de contenido)."""
+
+from __future__ import annotations
+
+import json
+import random
+
+from benchmarks.corpus import TEMPLATES
+from moltbot.db import hash_factura
+from moltbot.messaging import facturas
+from moltbot.messaging.dedup import DedupCache, clave_factura, clave_mensaje
+from moltbot.messaging.facturas import TEXTO_MAX, extraer_factura
+from moltbot.processors.payload import find_string_value
+
+# ---------------------------------------------------------------------------
+# DedupCache
+# ---------------------------------------------------------------------------
+
+def test_cache_cuenta_mensajes_y_facturas_por_separado():
+    cache = DedupCache(10)
+    assert not cache.mensaje_visto("m:1")
+    cache.add("m:1", "f:1")
+    assert cache.mensaje_visto("m:1")
+    assert cache.factura_vista("f:1")
+    assert not cache.factura_vista("f:2")
+    cache.contar_duplicada()
+
+    stats = cache.stats()
+    assert (stats.mensajes_duplicados, stats.facturas_duplicadas) == (1, 2)
+    assert (stats.size, stats.max_size) == (2, 10)
+
+
+def test_cache_expulsa_la_clave_menos_reciente():
+    cache = DedupCache(2)
+    cache.add("a", "b")
+    assert cache.mensaje_visto("a")  # "a" pasa a ser la más reciente
+    cache.add("c")
+    assert cache.mensaje_visto("a")
+    assert not cache.mensaje_visto("b")
+    assert cache.stats().size == 2
+
+
+def test_cache_de_tamano_cero_no_memoriza():
+    cache = DedupCache(0)
+    cache.add("a")
+    assert not cache.mensaje_visto("a")
+    assert cache.stats().size == 0
+
+
+def test_clave_mensaje_depende_del_proveedor_y_del_cuerpo():
+    body = b'{"text": "x"}'
+    assert clave_mensaje({"proveedor": "o2"}, body) == clave_mensaje({"proveedor": "o2"}, body)
+    assert clave_mensaje({"proveedor": "o2"}, body) != clave_mensaje(None, body)
+    assert clave_mensaje(None, body) != clave_mensaje(None, body + b" ")
+
+
+# ---------------------------------------------------------------------------
+# Hash de contenido
+# ---------------------------------------------------------------------------
+
+def _mensaje(texto: str) -> bytes:
+    return json.dumps({"text": texto}).encode()
+
+
+def test_cuotas_fijas_con_texto_largo_distinto_no_se_confunden():
+    cabecera = "IBERDROLA CLIENTES, S.A.U.\n" + "x" * TEXTO_MAX
+    texto = cabecera + "\nPeriodo: enero\nTOTAL IMPORTE FACTURA 42,00 €"
+    otro = cabecera + "\nPeriodo: febrero\nTOTAL IMPORTE FACTURA 42,00 €"
+    headers = {"proveedor": "iberdrola"}
+    a = extraer_factura(headers, _mensaje(texto))
+    b = extraer_factura(headers, _mensaje(otro))
+
+    assert a is not None and b is not None
+    assert a.importe == b.importe and a.texto == b.texto
+    assert clave_factura(a) != clave_factura(b)
+    assert clave_factura(a) == clave_factura(extraer_factura(headers, _mensaje(texto)))
+
+
+def test_texto_corto_mantiene_el_hash_de_siempre():
+    texto = "IBERDROLA CLIENTES, S.A.U.\nTOTAL IMPORTE FACTURA 42,00 €"
+    factura = extraer_factura({"proveedor": "iberdrola"}, _mensaje(texto))
+    assert factura is not None
+    assert factura.hash_contenido == hash_factura("iberdrola", 42.0, texto)
+
+
+def test_factura_grande_tiene_el_mismo_hash_que_decodificada_entera():
+    rng = random.Random(7)
+    texto = TEMPLATES["iberdrola"](rng, 123.45, 300_000) + " \U0001f600 \\ \"fin\""
+    body = _mensaje(texto)
+    span = find_string_value(body, "text")
+
+    grande = facturas._extraer_factura_grande({"proveedor": "iberdrola"}, memoryview(body), span)
+
+    assert grande is not None
+    assert grande.texto == texto[:TEXTO_MAX]
+    assert grande.hash_contenido == hash_factura("iberdrola", grande.importe, texto)
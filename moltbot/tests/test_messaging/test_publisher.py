@@ -0,0 +1,114 @@
+"""Tests de las confirmaciones del publicador de respuestas y del ack de comandos."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pika
+from pika.spec import Basic
+
+from benchmarks.standins import FakeChannel
+from moltbot.messaging.publisher import ReplyPublisher, _Respuesta
+from moltbot.messaging.workers import ConcurrentConsumer
+
+
+def _publicador(max_retries: int = 1) -> ReplyPublisher:
+    # Sin start(): solo se ejercita la lógica de confirmaciones.
+    return ReplyPublisher(pika.ConnectionParameters(), "respuestas_bot", max_retries=max_retries)
+
+
+def _enviada(publicador: ReplyPublisher, tag: int, avisos: list, intentos: int = 1) -> None:
+    publicador._outstanding[tag] = _Respuesta(
+        "respuestas_bot", b"ok", pika.BasicProperties(), intentos=intentos,
+        on_confirm=avisos.append,
+    )
+
+
+def _frame(metodo) -> SimpleNamespace:
+    return SimpleNamespace(method=metodo)
+
+
+def test_ack_avisa_de_cada_respuesta_confirmada():
+    publicador, avisos = _publicador(), []
+    for tag in (1, 2, 3):
+        _enviada(publicador, tag, avisos)
+
+    publicador._on_confirm(_frame(Basic.Ack(delivery_tag=2, multiple=True)))
+
+    assert avisos == [True, True]
+    assert list(publicador._outstanding) == [3]
+    assert publicador.stats().confirmadas == 2
+
+
+def test_nack_reintenta_y_solo_avisa_al_descartar(caplog):
+    publicador, avisos = _publicador(max_retries=1), []
+    _enviada(publicador, 1, avisos, intentos=1)
+    _enviada(publicador, 2, avisos, intentos=2)
+
+    publicador._on_confirm(_frame(Basic.Nack(delivery_tag=2, multiple=True)))
+
+    assert avisos == [False]
+    stats = publicador.stats()
+    assert (stats.rechazadas, stats.descartadas, stats.pendientes) == (2, 1, 1)
+    mensajes = [r.getMessage() for r in caplog.records]
+    assert any("1 respuestas rechazadas por RabbitMQ; se reintentan" in m for m in mensajes)
+    assert any("se descartan" in m for m in mensajes)
+
+
+def test_cola_llena_no_encola_ni_avisa():
+    publicador = ReplyPublisher(pika.ConnectionParameters(), "respuestas_bot", max_pending=1)
+    avisos: list = []
+    assert publicador.publicar(b"a", on_confirm=avisos.append)
+    assert not publicador.publicar(b"b", on_confirm=avisos.append)
+    assert avisos == [] and publicador.stats().descartadas == 1
+
+
+# ---------------------------------------------------------------------------
+# ConcurrentConsumer
+# ---------------------------------------------------------------------------
+
+class _Conexion:
+    """Ejecuta los callbacks "thread-safe" en cuanto se programan."""
+
+    def add_callback_threadsafe(self, callback) -> None:
+        callback()
+
+
+def _consumidor(canal: FakeChannel) -> ConcurrentConsumer:
+    return ConcurrentConsumer(_Conexion(), canal, "comandos_bot", lambda p, b: None, 1)
+
+
+def test_accion_diferida_confirma_al_avisar():
+    canal, pendientes = FakeChannel(), []
+    consumidor = _consumidor(canal)
+    canal.deliver("comandos_bot")
+
+    consumidor._finish(1, lambda ch, confirmar: pendientes.append(confirmar) or True)
+    assert (canal.acks, canal.nacks) == (0, 0)
+
+    pendientes[0](True)
+    assert (canal.acks, canal.nacks, canal.sin_confirmar) == (1, 0, [])
+
+
+def test_accion_diferida_reencola_si_se_descarta():
+    canal = FakeChannel()
+    consumidor = _consumidor(canal)
+    canal.deliver("comandos_bot")
+
+    consumidor._finish(1, lambda ch, confirmar: confirmar(False) or True)
+
+    assert (canal.acks, canal.nacks, canal.reencoladas) == (0, 1, [1])
+
+
+def test_accion_inmediata_y_errores_confirman_al_terminar():
+    canal = FakeChannel()
+    consumidor = _consumidor(canal)
+    for _ in range(3):
+        canal.deliver("comandos_bot")
+
+    consumidor._finish(1, lambda ch, confirmar: False)
+    consumidor._finish(2, None)
+    consumidor._finish(3, lambda ch, confirmar: 1 / 0)
+
+    assert (canal.acks, canal.nacks, canal.sin_confirmar) == (3, 0, [])
+    consumidor.shutdown()
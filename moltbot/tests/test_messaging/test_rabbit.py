@@ -0,0 +1,152 @@
+"""Tests de los callbacks de las colas con los sustitutos de ``benchmarks.standins``."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+
+from benchmarks.standins import FakeChannel, FakeProperties, RecordingDB, install
+from moltbot.messaging import rabbit
+
+TEXTO_O2 = "O2 Fibra y Móvil\nTotal factura 12,34 €"
+
+
+@pytest.fixture()
+def entorno() -> Iterator[SimpleNamespace]:
+    """Canal, DB en memoria y notificaciones recibidas, conectados a ``rabbit``."""
+    canal, db, notificadas = FakeChannel(), RecordingDB(), []
+    notifier = SimpleNamespace(notificar_factura=lambda *args: notificadas.append(args))
+    with install(canal, db, notifier):
+        yield SimpleNamespace(canal=canal, db=db, notificadas=notificadas)
+
+
+@pytest.fixture()
+def confirms(monkeypatch) -> None:
+    monkeypatch.setattr(
+        rabbit, "_rabbit", dataclasses.replace(rabbit._rabbit, publisher_confirms=True),
+    )
+
+
+@pytest.fixture()
+def sin_confirms(monkeypatch) -> None:
+    monkeypatch.setattr(
+        rabbit, "_rabbit", dataclasses.replace(rabbit._rabbit, publisher_confirms=False),
+    )
+
+
+def _factura(entorno: SimpleNamespace, texto: str, proveedor: str = "o2") -> None:
+    cuerpo = json.dumps({"text": texto}).encode()
+    rabbit._on_factura(
+        entorno.canal, entorno.canal.deliver("tareas_facturas", auto_ack=True),
+        FakeProperties(headers={"proveedor": proveedor}), cuerpo,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Facturas
+# ---------------------------------------------------------------------------
+
+def test_factura_se_guarda_y_notifica_una_vez(entorno):
+    _factura(entorno, TEXTO_O2)
+    _factura(entorno, TEXTO_O2)
+
+    assert entorno.notificadas == [("o2", 12.34)]
+    # El repetido se descarta por la caché, sin llegar a la DB.
+    assert (entorno.db.llamadas, entorno.db.insertadas) == (1, 1)
+    assert entorno.db.get_total_gastos_mes() == 12.34
+
+
+def test_factura_duplicada_en_db_no_se_notifica(entorno, monkeypatch):
+    _factura(entorno, TEXTO_O2)
+    entorno.notificadas.clear()
+    # Como si la repitiera otro worker, con su caché vacía.
+    monkeypatch.setattr(rabbit.dedup, "_cache", rabbit.dedup.DedupCache(10))
+
+    _factura(entorno, TEXTO_O2)
+
+    assert entorno.notificadas == []
+    assert (entorno.db.llamadas, entorno.db.duplicadas) == (2, 1)
+
+
+def test_factura_ilegible_no_llega_a_la_db(entorno):
+    _factura(entorno, "O2 Fibra y Móvil\nsin importe")
+    _factura(entorno, TEXTO_O2, proveedor="desconocido")
+
+    assert entorno.db.llamadas == 0 and entorno.notificadas == []
+
+
+def test_error_al_guardar_no_sale_del_callback(entorno, monkeypatch, caplog):
+    def falla(facturas):
+        raise RuntimeError("sin conexión")
+
+    monkeypatch.setattr(rabbit, "insert_facturas", falla)
+
+    _factura(entorno, TEXTO_O2)
+
+    assert entorno.notificadas == []
+    assert "Error procesando factura." in caplog.text
+
+
+# ---------------------------------------------------------------------------
+# Comandos
+# ---------------------------------------------------------------------------
+
+def _comando(entorno: SimpleNamespace, body: bytes, **propiedades) -> tuple[bool, list[bool]]:
+    confirmaciones: list[bool] = []
+    accion = rabbit._tarea_comando(FakeProperties(**propiedades), body)
+    # Nada se publica desde el hilo worker: solo al ejecutar la acción.
+    assert entorno.canal.publicadas == []
+    return accion(entorno.canal, confirmaciones.append), confirmaciones
+
+
+def test_comando_sin_confirms_publica_y_se_confirma_al_volver(entorno, sin_confirms):
+    _factura(entorno, TEXTO_O2)
+
+    diferida, confirmaciones = _comando(
+        entorno, b"!gastos", reply_to="respuestas_n8n", correlation_id="c1",
+    )
+
+    assert diferida is False and confirmaciones == []
+    [(cola, respuesta)] = entorno.canal.publicadas
+    assert cola == "respuestas_n8n"
+    assert "Resumen de gastos" in respuesta and "12.34" in respuesta
+
+
+def test_comando_con_confirms_espera_al_broker(entorno, confirms):
+    diferida, confirmaciones = _comando(entorno, b"!no_existe")
+
+    assert diferida is True and confirmaciones == [True]
+    assert entorno.canal.publicadas == [("respuestas_bot", "⚠️ Comando desconocido: !no_existe")]
+
+
+def _perdidas() -> float:
+    return sum(rabbit.metrics.REPLIES_LOST._values.values())
+
+
+def test_comando_con_cola_de_respuestas_llena_se_confirma(entorno, confirms, monkeypatch):
+    monkeypatch.setattr(rabbit, "publicar_respuesta", lambda *args, **kwargs: False)
+    antes = _perdidas()
+
+    diferida, confirmaciones = _comando(entorno, b"!gastos")
+
+    # Sin acción diferida: el consumidor lo confirma al volver, no lo reencola.
+    assert diferida is False and confirmaciones == []
+    assert _perdidas() == antes + 1
+
+
+def test_comando_con_respuesta_rechazada_se_confirma(entorno, confirms, monkeypatch):
+    def rechazada(*args, on_confirm, **kwargs) -> bool:
+        on_confirm(False)  # el broker la rechazó max_retries + 1 veces
+        return True
+
+    monkeypatch.setattr(rabbit, "publicar_respuesta", rechazada)
+    antes = _perdidas()
+
+    diferida, confirmaciones = _comando(entorno, b"!gastos")
+
+    assert diferida is True and confirmaciones == [True]
+    assert _perdidas() == antes + 1
@@ -0,0 +1,154 @@
+"""Tests del consumidor concurrente: los acks vuelven siempre al hilo de la conexión."""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Optional
+
+import pytest
+
+from benchmarks.standins import FakeChannel, FakeProperties
+from moltbot.messaging.workers import AccionCanal, ConcurrentConsumer, Confirmar
+
+
+class _Canal(FakeChannel):
+    """Canal que además anota desde qué hilo se confirma cada entrega."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.hilos: list[threading.Thread] = []
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        super().basic_ack(delivery_tag, multiple)
+        self.hilos.append(threading.current_thread())
+
+    def basic_nack(
+        self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True,
+    ) -> None:
+        super().basic_nack(delivery_tag, multiple, requeue)
+        self.hilos.append(threading.current_thread())
+
+
+class _Conexion:
+    """``add_callback_threadsafe`` que solo encola: los callbacks corren en ``procesar``."""
+
+    def __init__(self) -> None:
+        self.callbacks: list[Callable[[], None]] = []
+        self.cerrada = False
+        self._lock = threading.Lock()
+
+    def add_callback_threadsafe(self, callback: Callable[[], None]) -> None:
+        if self.cerrada:
+            raise RuntimeError("BlockingConnection.add_callback_threadsafe() called on closed")
+        with self._lock:
+            self.callbacks.append(callback)
+
+    def procesar(self) -> None:
+        """Ejecuta lo programado, como el bucle de la conexión en su hilo."""
+        while self.callbacks:
+            with self._lock:
+                callback = self.callbacks.pop(0)
+            callback()
+
+
+@pytest.fixture()
+def canal() -> _Canal:
+    return _Canal()
+
+
+@pytest.fixture()
+def conexion() -> _Conexion:
+    return _Conexion()
+
+
+def _entregar(
+    conexion: _Conexion, canal: _Canal, tarea: Callable[..., Optional[AccionCanal]],
+) -> ConcurrentConsumer:
+    """Entrega un mensaje y espera a que el worker termine (sin procesar los callbacks)."""
+    consumidor = ConcurrentConsumer(conexion, canal, "comandos_bot", tarea, 2)
+    consumidor._on_message(canal, canal.deliver("comandos_bot"), FakeProperties(), b"!gastos")
+    consumidor.shutdown(wait=True)
+    return consumidor
+
+
+def test_error_en_la_tarea_se_confirma_en_el_hilo_de_la_conexion(conexion, canal, caplog):
+    hilos: list[threading.Thread] = []
+
+    def falla(properties, body: bytes) -> None:
+        hilos.append(threading.current_thread())
+        raise RuntimeError("handler roto")
+
+    _entregar(conexion, canal, falla)
+
+    # El worker no toca el canal: solo programa el ack.
+    assert hilos and hilos[0] is not threading.current_thread()
+    assert (canal.acks, canal.sin_confirmar, len(conexion.callbacks)) == (0, [1], 1)
+    assert "Error procesando mensaje de la cola comandos_bot." in caplog.text
+
+    conexion.procesar()
+
+    assert (canal.acks, canal.nacks, canal.sin_confirmar) == (1, 0, [])
+    assert canal.hilos == [threading.current_thread()]
+
+
+def test_accion_se_ejecuta_en_el_hilo_de_la_conexion(conexion, canal):
+    hilos: list[threading.Thread] = []
+
+    def accion(ch, confirmar: Confirmar) -> bool:
+        hilos.append(threading.current_thread())
+        ch.basic_publish("", "respuestas_bot", b"ok")
+        return False
+
+    _entregar(conexion, canal, lambda properties, body: accion)
+    assert canal.publicadas == []
+
+    conexion.procesar()
+
+    assert hilos == [threading.current_thread()]
+    assert canal.publicadas == [("respuestas_bot", b"ok")]
+    assert (canal.acks, canal.sin_confirmar) == (1, [])
+
+
+@pytest.mark.parametrize(("ok", "acks", "reencoladas"), [(True, 1, []), (False, 0, [1])])
+def test_confirmacion_diferida_desde_otro_hilo(conexion, canal, ok, acks, reencoladas):
+    pendientes: list[Confirmar] = []
+
+    def accion(ch, confirmar: Confirmar) -> bool:
+        pendientes.append(confirmar)
+        return True
+
+    _entregar(conexion, canal, lambda properties, body: accion)
+    conexion.procesar()
+    assert (canal.acks, canal.nacks, canal.sin_confirmar) == (0, 0, [1])
+
+    # El aviso llega desde otro hilo (p. ej. el del publicador de respuestas).
+    hilo = threading.Thread(target=pendientes[0], args=(ok,))
+    hilo.start()
+    hilo.join()
+    assert canal.hilos == []
+
+    conexion.procesar()
+
+    assert (canal.acks, canal.reencoladas, canal.sin_confirmar) == (acks, reencoladas, [])
+    assert canal.hilos == [threading.current_thread()]
+
+
+def test_confirmacion_diferida_tras_cerrar_el_canal_no_hace_nada(conexion, canal):
+    pendientes: list[Confirmar] = []
+    _entregar(conexion, canal, lambda properties, body: lambda ch, c: pendientes.append(c) or True)
+    conexion.procesar()
+
+    canal.is_open = False  # reconexión: el tag ya no vale
+    pendientes[0](True)
+    conexion.procesar()
+
+    assert (canal.acks, canal.nacks) == (0, 0)
+
+
+def test_conexion_cerrada_deja_el_mensaje_sin_confirmar(conexion, canal, caplog):
+    conexion.cerrada = True
+
+    _entregar(conexion, canal, lambda properties, body: None)
+
+    assert (canal.acks, canal.sin_confirmar) == (0, [1])
+    assert "no se pudo confirmar el mensaje 1" in caplog.text
@@ -0,0 +1,146 @@
+"""Tests del backup de workflows (sin PostgreSQL: se sustituye la lectura de n8n)."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from moltbot.config import settings
+from moltbot.processors import backup_manager
+from moltbot.processors.snapshot_store import SnapshotStore
+
+_WORKFLOWS = [
+    (1, "Facturas", [{"id": "n1"}], {}, None),
+    (2, "Backup", [], {}, None),
+]
+
+
+@pytest.fixture()
+def formato(monkeypatch):
+    def _usar(nombre: str) -> None:
+        backup = dataclasses.replace(settings.backup, format=nombre, workers=2)
+        monkeypatch.setattr(backup_manager, "settings", SimpleNamespace(backup=backup))
+
+    monkeypatch.setattr(backup_manager, "iter_workflows", lambda *a, **k: iter(_WORKFLOWS))
+    return _usar
+
+
+@pytest.mark.parametrize(("nombre", "ficheros"), [("snapshot", False), ("both", True)])
+def test_backup_completo_escribe_snapshot(tmp_path, formato, nombre, ficheros):
+    formato(nombre)
+
+    assert backup_manager.backup_n8n_workflows(str(tmp_path)) == 2
+
+    snap = SnapshotStore(tmp_path / settings.backup.snapshot_dir).load("latest")
+    assert {wf_id: e["name"] for wf_id, e in snap.workflows.items()} == {
+        "1": "Facturas", "2": "Backup",
+    }
+    assert (tmp_path / "Facturas.json").exists() is ficheros
+
+
+def test_backup_completo_json_no_crea_almacen(tmp_path, formato):
+    formato("json")
+
+    assert backup_manager.backup_n8n_workflows(str(tmp_path)) == 2
+
+    assert (tmp_path / "Backup.json").exists()
+    assert not (tmp_path / settings.backup.snapshot_dir).exists()
+
+
+# ---------------------------------------------------------------------------
+# Backup incremental
+# ---------------------------------------------------------------------------
+
+class _N8n:
+    """``workflow_entity`` en memoria: id → (nombre, nodos, conexiones, updatedAt)."""
+
+    def __init__(self) -> None:
+        self.filas: dict[int, tuple] = {}
+        self.desde: list = []
+
+    def guardar(self, wf_id: int, nombre: str, nodos: list, dia: int) -> None:
+        self.filas[wf_id] = (nombre, nodos, {}, datetime(2026, 10, dia))
+
+    def iter_workflows(self, since=None, itersize: int = 50):
+        self.desde.append(since)
+        filas = sorted(self.filas.items(), key=lambda fila: fila[1][3])
+        return iter([
+            (wf_id, *datos) for wf_id, datos in filas if since is None or datos[3] >= since
+        ])
+
+    def get_workflow_ids(self) -> set[str]:
+        return {str(wf_id) for wf_id in self.filas}
+
+
+@pytest.fixture()
+def n8n(monkeypatch) -> _N8n:
+    falso = _N8n()
+    monkeypatch.setattr(backup_manager, "iter_workflows", falso.iter_workflows)
+    monkeypatch.setattr(backup_manager, "get_workflow_ids", falso.get_workflow_ids)
+    return falso
+
+
+def _ficheros(carpeta: Path) -> dict[str, dict]:
+    """Ficheros ``.json`` de workflows (sin el manifiesto) → contenido."""
+    return {
+        p.name: json.loads(p.read_text(encoding="utf-8"))
+        for p in carpeta.glob("*.json") if p.name != settings.backup.manifest_name
+    }
+
+
+def _manifiesto(carpeta: Path) -> dict:
+    return json.loads((carpeta / settings.backup.manifest_name).read_text(encoding="utf-8"))
+
+
+def _contadores(result: backup_manager.BackupResult) -> tuple[int, int, int, int]:
+    return result.added, result.changed, result.unchanged, result.deleted
+
+
+@pytest.mark.parametrize("nombre", ["json", "both"])
+def test_incremental_solo_toca_lo_que_cambia(tmp_path, formato, n8n, nombre):
+    formato(nombre)
+    n8n.guardar(1, "Facturas", [{"id": "a"}], dia=1)
+    n8n.guardar(2, "Backup", [], dia=2)
+    n8n.guardar(3, "Facturas!", [{"id": "b"}], dia=3)  # mismo nombre saneado que el 1
+
+    primero = backup_manager.backup_n8n_workflows_incremental(str(tmp_path))
+
+    assert _contadores(primero) == (3, 0, 0, 0)
+    assert (primero.snapshot_id is None) is (nombre == "json")
+    assert sorted(_ficheros(tmp_path)) == ["Backup.json", "Facturas.json", "Facturas_3.json"]
+    assert _manifiesto(tmp_path)["watermark"] == "2026-10-03T00:00:00"
+    mtimes = {nombre: (tmp_path / nombre).stat().st_mtime_ns for nombre in _ficheros(tmp_path)}
+
+    # Sin cambios: solo se leen las filas desde la marca de agua y no se reescribe nada.
+    segundo = backup_manager.backup_n8n_workflows_incremental(str(tmp_path))
+
+    assert _contadores(segundo) == (0, 0, 3, 0)
+    assert n8n.desde == [None, datetime(2026, 10, 3)]
+    assert {nombre: (tmp_path / nombre).stat().st_mtime_ns for nombre in mtimes} == mtimes
+
+    # Renombrado, modificado, borrado y nuevo.
+    n8n.guardar(1, "Informes", [{"id": "a"}], dia=4)
+    del n8n.filas[2]
+    n8n.guardar(3, "Facturas!", [{"id": "c"}], dia=5)
+    n8n.guardar(4, "Facturas", [], dia=6)
+
+    tercero = backup_manager.backup_n8n_workflows_incremental(str(tmp_path))
+
+    assert _contadores(tercero) == (1, 2, 0, 1)
+    assert n8n.desde[-1] == datetime(2026, 10, 3)
+    # El 3 conserva su fichero; el 4 ocupa el que dejó libre el 1.
+    ficheros = _ficheros(tmp_path)
+    assert {fichero: datos["name"] for fichero, datos in ficheros.items()} == {
+        "Informes.json": "Informes", "Facturas_3.json": "Facturas!", "Facturas.json": "Facturas",
+    }
+    assert ficheros["Facturas_3.json"]["nodes"] == [{"id": "c"}]
+    manifiesto = _manifiesto(tmp_path)
+    assert manifiesto["watermark"] == "2026-10-06T00:00:00"
+    assert {k: v["file"] for k, v in manifiesto["workflows"].items()} == {
+        "1": "Informes.json", "3": "Facturas_3.json", "4": "Facturas.json",
+    }
@@ -0,0 +1,136 @@
+"""Tests de la detección de proveedor por firmas (autómata Aho-Corasick)."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+import pytest
+
+from moltbot.messaging import facturas
+from moltbot.processors import bill_parser
+from moltbot.processors.bill_parser import (
+    BillParser,
+    ProviderMatch,
+    _SignatureAutomaton,
+    detect_provider,
+    register_parser,
+)
+
+
+@pytest.fixture()
+def registro() -> Iterator[None]:
+    """Restaura el registry de parsers (y el autómata) tras cada test."""
+    antes = dict(bill_parser._PARSER_REGISTRY)
+    yield
+    bill_parser._PARSER_REGISTRY.clear()
+    bill_parser._PARSER_REGISTRY.update(antes)
+    bill_parser._invalidate_classifier()
+
+
+def _registrar(proveedor: str, *firmas: str) -> None:
+    @register_parser(proveedor)
+    class _Parser(BillParser):
+        signatures = firmas
+
+        def extraer_importe(self, texto: str) -> Optional[float]:
+            return 1.0
+
+
+def _solo(*proveedores: tuple[str, tuple[str, ...]]) -> None:
+    """Deja en el registry únicamente los proveedores indicados."""
+    bill_parser._PARSER_REGISTRY.clear()
+    for proveedor, firmas in proveedores:
+        _registrar(proveedor, *firmas)
+
+
+# ---------------------------------------------------------------------------
+# Autómata
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    ("texto", "esperado"),
+    [
+        ("O2", {"o2": {"o2"}}),
+        ("Cliente de O2, gracias", {"o2": {"o2"}}),
+        ("(o2)", {"o2": {"o2"}}),
+        ("tarifa o20 megas", {}),
+        ("ref. ao2 y o2online", {}),
+        ("co2", {}),
+    ],
+)
+def test_firmas_solo_como_palabras_completas(texto, esperado):
+    assert _SignatureAutomaton({"o2": ["o2"]}).scan(texto) == esperado
+
+
+def test_firmas_solapadas_y_contenidas_en_otras():
+    automata = _SignatureAutomaton({
+        "a": ["total factura", "fibra"],
+        "b": ["factura electronica", "o2 fibra"],
+        "c": ["total factura"],
+    })
+
+    encontradas = automata.scan("TOTAL FACTURA ELECTRONICA de O2 Fibra")
+
+    # "fibra" es sufijo de "o2 fibra": sale por el enlace de fallo.
+    assert encontradas == {
+        "a": {"total factura", "fibra"},
+        "b": {"factura electronica", "o2 fibra"},
+        "c": {"total factura"},
+    }
+
+
+def test_firmas_repetidas_o_vacias_no_cuentan():
+    automata = _SignatureAutomaton({"a": ["Alfa", "alfa ", " ", "beta"]})
+
+    assert automata.totals == {"a": 2}
+    assert automata.scan("alfa") == {"a": {"alfa"}}
+
+
+# ---------------------------------------------------------------------------
+# detect_provider
+# ---------------------------------------------------------------------------
+
+def test_sin_firmas_no_hay_proveedor(registro):
+    _solo(("alfa", ("alfa",)))
+
+    assert detect_provider("factura sin nombre") is None
+
+
+def test_confianza_con_empate_entre_proveedores(registro):
+    _solo(("alfa", ("alfa", "comun")), ("beta", ("beta", "comun")))
+
+    empate = detect_provider("texto comun")
+    ventaja = detect_provider("texto comun de alfa")
+
+    # Misma cobertura (1/2) para los dos: 0.5 · 0.5 / (0.5 + 0.5).
+    assert empate is not None and empate.confidence == 0.25
+    assert empate.matched == ("comun",)
+    assert ventaja == ProviderMatch("alfa", round(1 / 1.5, 3), ("alfa", "comun"))
+
+
+def test_se_reconstruye_tras_register_parser(registro):
+    _solo(("alfa", ("alfa",)))
+    assert detect_provider("zeta") is None
+
+    _registrar("zeta", "zeta")
+
+    assert detect_provider("zeta") == ProviderMatch("zeta", 1.0, ("zeta",))
+
+
+# ---------------------------------------------------------------------------
+# Umbral FACTURA_DETECT_MIN_CONFIDENCE
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(("minimo", "proveedor"), [(0.3, None), (0.25, "alfa")])
+def test_umbral_de_confianza_al_extraer(registro, monkeypatch, minimo, proveedor):
+    # Una de sus cuatro firmas y sin competidores: confianza 0.25.
+    _solo(("alfa", ("alfa", "uno", "dos", "tres")))
+    invoices = dataclasses.replace(facturas.settings.invoices, detect_min_confidence=minimo)
+    monkeypatch.setattr(facturas, "settings", SimpleNamespace(invoices=invoices))
+
+    factura = facturas.extraer_factura({}, json.dumps({"text": "factura alfa"}).encode())
+
+    assert (factura and factura.proveedor) == proveedor
@@ -0,0 +1,163 @@
+"""Tests de la lectura acotada de cadenas JSON sobre el buffer del mensaje."""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+
+import pytest
+
+from moltbot.messaging import facturas
+from moltbot.processors.payload import (
+    Span,
+    _skip_partial_escape,
+    decode_fragment,
+    find_string_value,
+    iter_fragments,
+    read_windows,
+)
+
+# Escapes \uXXXX, pares suplentes, UTF-8 multibyte, comillas y rachas de barras.
+TEXTO = 'O2 Fibra y Móvil\n€ ñandú 😀😀 "cita" \\ \\\\ \\\\\\n \\u20ac \t fin\\'
+
+
+def _cuerpo(texto: str, ascii: bool) -> tuple[bytes, Span]:
+    cuerpo = json.dumps({"id": 1, "text": texto, "otro": "x"}, ensure_ascii=ascii).encode()
+    span = find_string_value(cuerpo, "text")
+    assert span is not None
+    return cuerpo, span
+
+
+def _fragmento(texto: str, desde: int, hasta: int, ascii: bool = True) -> str:
+    """``decode_fragment`` sobre los bytes ``[desde, hasta)`` del contenido de *texto*."""
+    cuerpo, span = _cuerpo(texto, ascii)
+    return decode_fragment(cuerpo, span.start + desde, span.start + hasta)
+
+
+# ---------------------------------------------------------------------------
+# find_string_value
+# ---------------------------------------------------------------------------
+
+def test_localiza_el_valor_y_su_comilla_de_cierre():
+    cuerpo = b'{"a": "\\"text\\": \\"no\\"", "text" : "s\\\\\\"i\\\\", "b": 1}'
+
+    span = find_string_value(memoryview(cuerpo), "text")
+
+    assert span is not None and cuerpo[span.start:span.end] == b's\\\\\\"i\\\\'
+    assert find_string_value(cuerpo, "b") is None
+    assert find_string_value(b'{"text": "sin cerrar', "text") is None
+
+
+# ---------------------------------------------------------------------------
+# _skip_partial_escape
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    ("raw", "start", "esperado"),
+    [
+        (b"ab\\u20accd", 3, 8),  # dentro de €
+        (b"ab\\u20accd", 7, 8),
+        (b"ab\\u20accd", 8, 8),  # justo después: no se mueve
+        (b"ab\\ncd", 3, 4),  # entre la barra y la "n"
+        (b"ab\\\\cd", 3, 4),  # dentro de \\
+        (b"ab\\\\ncd", 4, 4),  # tras \\ la "n" es texto
+        (b"\\\\\\u20ac", 3, 8),  # \\ y luego €
+        (b"\\u20ac", 0, 0),
+    ],
+)
+def test_skip_partial_escape(raw, start, esperado):
+    assert _skip_partial_escape(memoryview(raw), start) == esperado
+
+
+# ---------------------------------------------------------------------------
+# decode_fragment / read_windows
+# ---------------------------------------------------------------------------
+
+def test_corte_dentro_de_un_escape_unicode():
+    # "€" se escapa como \\u20ac: 6 bytes en el JSON.
+    assert _fragmento("€ y", 2, 8) == " y"
+    assert _fragmento("x€ y", 0, 4) == "x"
+    assert _fragmento("x€ y", 0, 7) == "x€"
+
+
+def test_corte_dentro_de_un_par_suplente():
+    # "😀" es \\ud83d\\ude00: se descarta la mitad que queda suelta.
+    assert _fragmento("😀x", 6, 13) == "x"
+    assert _fragmento("x😀", 0, 7) == "x"
+    assert _fragmento("x😀", 0, 13) == "x😀"
+
+
+def test_corte_dentro_de_un_caracter_utf8():
+    # "ñ" y "ú" ocupan 2 bytes cada una sin ensure_ascii.
+    assert _fragmento("ñandú", 1, 7, ascii=False) == "andú"
+    assert _fragmento("ñandú", 0, 6, ascii=False) == "ñand"
+
+
+def test_corte_tras_barras_invertidas():
+    # La barra literal es \\ en el JSON; "\\n" literal es \\\\n.
+    assert _fragmento("a\\", 0, 2) == "a"
+    assert _fragmento("a\\", 0, 3) == "a\\"
+    assert _fragmento("a\\", 2, 3) == ""
+    assert _fragmento("\\n", 2, 3) == "n"
+    assert _fragmento("\\\\", 0, 3) == "\\"
+
+
+@pytest.mark.parametrize("ascii", [True, False])
+def test_cualquier_corte_da_un_trozo_del_texto(ascii):
+    cuerpo, span = _cuerpo(TEXTO, ascii)
+
+    for desde in range(span.start, span.end + 1):
+        for hasta in range(desde, span.end + 1):
+            assert decode_fragment(cuerpo, desde, hasta) in TEXTO
+
+
+def test_read_windows():
+    cuerpo, span = _cuerpo("cabeza " + "x" * 100 + " cola", True)
+
+    assert read_windows(cuerpo, span, 6, 4) == ("cabeza", "cola")
+    assert read_windows(cuerpo, span, 0, 4) == ("", "cola")
+    assert read_windows(cuerpo, span, 6, 0) == ("cabeza", "")
+    # Ventanas solapadas: el texto entero como cabeza.
+    assert read_windows(cuerpo, span, 60, 60) == ("cabeza " + "x" * 100 + " cola", "")
+
+
+# ---------------------------------------------------------------------------
+# iter_fragments
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("ascii", [True, False])
+def test_los_fragmentos_reconstruyen_el_texto(ascii):
+    # El relleno desplaza los cortes (trozos de 16 bytes) por todas las posiciones.
+    for relleno in range(16):
+        texto = "x" * relleno + TEXTO * 3
+        cuerpo, span = _cuerpo(texto, ascii)
+
+        for chunk in (1, 16, 17, 23):
+            assert "".join(iter_fragments(cuerpo, span, chunk)) == json.loads(cuerpo)["text"]
+
+
+# ---------------------------------------------------------------------------
+# Facturas grandes (solo ventanas del texto)
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("headers", [{"proveedor": "o2"}, None])
+def test_factura_grande_igual_que_decodificando_entera(monkeypatch, headers):
+    texto = "O2 Fibra y Móvil\n" + TEXTO * 2_000 + "\nTotal factura 1.170,14 €"
+    cuerpo = json.dumps({"text": texto}).encode()
+    entera = facturas.extraer_factura(headers, cuerpo)
+
+    grandes = []
+    original = facturas._extraer_factura_grande
+
+    def espia(*args):
+        grandes.append(original(*args))
+        return grandes[-1]
+
+    monkeypatch.setattr(facturas, "_extraer_factura_grande", espia)
+    monkeypatch.setattr(
+        facturas, "_invoices", dataclasses.replace(facturas._invoices, large_payload_bytes=1_024),
+    )
+
+    assert facturas.extraer_factura(headers, cuerpo) == entera
+    assert grandes == [entera]
+    assert entera is not None and (entera.proveedor, entera.importe) == ("o2", 1170.14)
@@ -0,0 +1,65 @@
+"""Tests del almacén de snapshots de workflows."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import pytest
+
+from moltbot.processors.snapshot_store import SnapshotNotFound, SnapshotStore
+
+
+@pytest.fixture()
+def store(tmp_path) -> SnapshotStore:
+    store = SnapshotStore(tmp_path)
+    digest = store.put_blob(b"{}")
+    for dia in (1, 2, 3):
+        store.write_snapshot(
+            {"w1": {"name": "uno", "sha256": digest}},
+            now=datetime(2026, 10, dia, tzinfo=timezone.utc),
+        )
+    return store
+
+
+def test_resolve_latest_y_prefijos(store):
+    assert store.resolve("latest") == "20261003T000000Z"
+    assert store.resolve("latest~2") == "20261001T000000Z"
+    assert store.resolve("20261002") == "20261002T000000Z"
+
+
+@pytest.mark.parametrize("ref", ["latest~3", "latest~abc", "latest~-1", "2025", "2026"])
+def test_resolve_referencias_invalidas(store, ref):
+    with pytest.raises(SnapshotNotFound):
+        store.resolve(ref)
+
+
+def test_snapshots_en_el_mismo_segundo(store):
+    digest = store.put_blob(b'{"v": 2}')
+    mismo = datetime(2026, 10, 3, tzinfo=timezone.utc)
+    ids = [
+        store.write_snapshot({"w1": {"name": f"v{n}", "sha256": digest}}, now=mismo)
+        for n in range(1, 12)
+    ]
+
+    assert ids[:2] == ["20261003T000000Z-1", "20261003T000000Z-2"]
+    assert [i.id for i in store.list_snapshots()][-12:] == ["20261003T000000Z", *ids]
+    assert store.resolve("latest") == "20261003T000000Z-11"
+    # Un id completo gana aunque sea prefijo de otros.
+    assert store.load("20261003T000000Z").workflows["w1"]["name"] == "uno"
+    assert store.load("20261003T000000Z-1").workflows["w1"]["name"] == "v1"
+    assert store.prune(keep_days=1, now=datetime(2026, 12, 1, tzinfo=timezone.utc)) == (13, 1)
+    assert [i.id for i in store.list_snapshots()] == ["20261003T000000Z-11"]
+
+
+def test_prune_espera_a_los_backups_en_curso(store):
+    ahora = datetime(2026, 12, 1, tzinfo=timezone.utc)
+    with store.writing():
+        # Blob de un backup que aún no ha escrito su índice.
+        huerfano = store.put_blob(b'{"nuevo": true}')
+        assert store.prune(keep_days=30, now=ahora) == (0, 0)
+        assert store.has_blob(huerfano)
+
+    # Sin backups escribiendo, la poda sigue su curso (se conserva el más reciente).
+    assert store.prune(keep_days=30, now=ahora) == (2, 1)
+    assert not store.has_blob(huerfano)
+    assert [info.id for info in store.list_snapshots()] == ["20261003T000000Z"]
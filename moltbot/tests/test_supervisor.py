@@ -0,0 +1,31 @@
+"""Tests del reparto de workers del supervisor."""
+
+from __future__ import annotations
+
+import pytest
+
+from moltbot.supervisor import parse_worker_plan
+
+
+def test_sin_reparto_todos_consumen_todo():
+    assert parse_worker_plan(3) == [None, None, None]
+    assert parse_worker_plan(0, " ") == [None]
+
+
+def test_reparto_por_cola():
+    assert parse_worker_plan(9, "tareas_facturas=2, comandos_bot=1") == [
+        ("tareas_facturas",), ("tareas_facturas",), ("comandos_bot",),
+    ]
+
+
+@pytest.mark.parametrize(
+    "spec", ["tareas_facturas", "tareas_facturas=x", "=2", "respuestas_bot=1", "facturas=2"],
+)
+def test_reparto_invalido(spec):
+    with pytest.raises(ValueError):
+        parse_worker_plan(1, spec)
+
+
+def test_reparto_sin_workers():
+    with pytest.raises(ValueError, match="ningún worker"):
+        parse_worker_plan(1, "comandos_bot=0")
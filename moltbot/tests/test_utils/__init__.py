@@ -0,0 +1 @@
+"""Tests para las utilidades."""
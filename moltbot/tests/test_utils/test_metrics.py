@@ -0,0 +1,119 @@
+"""Tests del registro de métricas y del endpoint ``/metrics``."""
+
+from __future__ import annotations
+
+import urllib.error
+import urllib.request
+from typing import Iterator
+
+import pytest
+
+from moltbot.utils import metrics
+from moltbot.utils.metrics import Counter, GaugeFunc, Histogram
+
+
+@pytest.fixture(autouse=True)
+def registro() -> Iterator[None]:
+    """Quita del registro global las métricas creadas por cada test."""
+    antes = list(metrics._REGISTRY)
+    yield
+    metrics._REGISTRY[:] = antes
+
+
+# ---------------------------------------------------------------------------
+# Histogramas
+# ---------------------------------------------------------------------------
+
+def test_buckets_acumulados_con_le_inclusivo():
+    histograma = Histogram("t_seconds", "Prueba.", ("stage",), buckets=(1.0, 0.005, 0.25))
+    for valor in (0.001, 0.005, 0.2, 0.25, 3.0):
+        histograma.observe(valor, stage="db")
+
+    assert histograma.render() == [
+        "# HELP t_seconds Prueba.",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{stage="db",le="0.005"} 2',
+        't_seconds_bucket{stage="db",le="0.25"} 4',
+        't_seconds_bucket{stage="db",le="1"} 4',
+        't_seconds_bucket{stage="db",le="+Inf"} 5',
+        't_seconds_sum{stage="db"} 3.456',
+        't_seconds_count{stage="db"} 5',
+    ]
+
+
+def test_una_serie_por_combinacion_de_etiquetas():
+    histograma = Histogram("t_seconds", "Prueba.", ("stage", "provider"), buckets=(1.0,))
+    histograma.observe(0.5, stage="parse", provider="o2")
+    histograma.observe(2, stage="parse", provider='a"b')
+
+    lineas = histograma.render()
+
+    assert 't_seconds_bucket{stage="parse",provider="o2",le="1"} 1' in lineas
+    assert 't_seconds_bucket{stage="parse",provider="a\\"b",le="1"} 0' in lineas
+    assert 't_seconds_sum{stage="parse",provider="a\\"b"} 2' in lineas
+
+
+def test_sin_etiquetas_y_sin_observaciones():
+    histograma = Histogram("t_seconds", "Prueba.", buckets=(1.0,))
+    assert histograma.render() == ["# HELP t_seconds Prueba.", "# TYPE t_seconds histogram"]
+
+    with histograma.time():
+        pass
+
+    bucket, inf, suma, total = histograma.render()[2:]
+    assert (bucket, inf, total) == (
+        't_seconds_bucket{le="1"} 1', 't_seconds_bucket{le="+Inf"} 1', "t_seconds_count 1",
+    )
+    assert suma.startswith("t_seconds_sum ") and float(suma.split()[1]) < 1
+
+
+# ---------------------------------------------------------------------------
+# Exposición
+# ---------------------------------------------------------------------------
+
+def test_render_concatena_el_registro_y_omite_gauges_sin_dato():
+    metrics._REGISTRY.clear()
+    contador = Counter("t_total", "Mensajes.", ("queue",))
+    contador.inc(queue="comandos")
+    contador.inc(2, queue="comandos")
+    GaugeFunc("t_vacio", "Sin dato.", lambda: None)
+    GaugeFunc("t_pendientes", "Pendientes.", lambda: {("facturas",): 1.5}, ("queue",))
+
+    assert metrics.render() == (
+        "# HELP t_total Mensajes.\n"
+        "# TYPE t_total counter\n"
+        't_total{queue="comandos"} 3\n'
+        "# HELP t_pendientes Pendientes.\n"
+        "# TYPE t_pendientes gauge\n"
+        't_pendientes{queue="facturas"} 1.5\n'
+    )
+
+
+@pytest.fixture()
+def servidor() -> Iterator[str]:
+    server = metrics.start_server(0, host="127.0.0.1")
+    assert server is not None
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        metrics.stop_server()
+
+
+def test_endpoint_metrics(servidor):
+    Counter("t_total", "Mensajes.").inc()
+
+    with urllib.request.urlopen(f"{servidor}/metrics?x=1", timeout=5) as respuesta:
+        cuerpo = respuesta.read().decode("utf-8")
+        tipo = respuesta.headers["Content-Type"]
+        longitud = int(respuesta.headers["Content-Length"])
+
+    assert tipo == "text/plain; version=0.0.4; charset=utf-8"
+    assert longitud == len(cuerpo.encode("utf-8"))
+    assert cuerpo.endswith("# TYPE t_total counter\nt_total 1\n")
+
+
+def test_endpoint_otra_ruta_es_404(servidor):
+    with pytest.raises(urllib.error.HTTPError) as info:
+        urllib.request.urlopen(f"{servidor}/", timeout=5)
+    info.value.close()
+    assert info.value.code == 404
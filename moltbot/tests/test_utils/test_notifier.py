@@ -0,0 +1,162 @@
+"""Tests del notificador de Discord con una ``requests.Session`` falsa."""
+
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pytest
+import requests
+
+from moltbot.utils import notifier as notifier_mod
+from moltbot.utils.discord_bot import CONTENT_FACTURA
+from moltbot.utils.notifier import MAX_EMBEDS, DiscordNotifier
+
+
+class _Respuesta:
+    def __init__(
+        self, status_code: int = 204, cuerpo: Any = None, headers: Optional[dict] = None,
+    ) -> None:
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._cuerpo = cuerpo
+
+    def json(self) -> Any:
+        if self._cuerpo is None:
+            raise ValueError("sin cuerpo JSON")
+        return self._cuerpo
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+
+class _Sesion:
+    """Sustituto de ``requests.Session``: responde con la cola ``respuestas``."""
+
+    def __init__(self) -> None:
+        self.respuestas: list[_Respuesta] = []
+        self.enviados: list[dict] = []
+        self.cerrada = False
+
+    def post(self, url: str, json: dict, timeout: float) -> _Respuesta:
+        self.enviados.append(json)
+        return self.respuestas.pop(0) if self.respuestas else _Respuesta()
+
+    def close(self) -> None:
+        self.cerrada = True
+
+
+@pytest.fixture()
+def sesion(monkeypatch) -> _Sesion:
+    sesion = _Sesion()
+    monkeypatch.setattr(notifier_mod.requests, "Session", lambda: sesion)
+    return sesion
+
+
+@pytest.fixture()
+def esperas(monkeypatch) -> list[float]:
+    """Segundos que el notificador habría dormido (sin dormirlos)."""
+    esperas: list[float] = []
+    monkeypatch.setattr(
+        notifier_mod, "time", SimpleNamespace(monotonic=time.monotonic, sleep=esperas.append),
+    )
+    return esperas
+
+
+def _embeds(sesion: _Sesion) -> list[int]:
+    return [len(payload["embeds"]) for payload in sesion.enviados]
+
+
+# ---------------------------------------------------------------------------
+# Rate limit
+# ---------------------------------------------------------------------------
+
+def test_429_espera_retry_after_y_reintenta(sesion, esperas):
+    sesion.respuestas = [
+        _Respuesta(429, {"retry_after": 0.25}),
+        _Respuesta(429, headers={"Retry-After": "2"}),
+        _Respuesta(204, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "1.5"}),
+    ]
+    notifier = DiscordNotifier("http://discord/webhook", max_retries=2)
+
+    notifier._enviar([{"title": "a"}])
+
+    # 429 del cuerpo, 429 de la cabecera y el bucket agotado tras el envío.
+    assert esperas == [0.25, 2.0, 1.5]
+    stats = notifier.stats()
+    assert (stats.enviadas, stats.mensajes, stats.rate_limited, stats.fallidas) == (1, 1, 2, 0)
+
+
+def test_429_agota_los_reintentos(sesion, esperas):
+    sesion.respuestas = [_Respuesta(429, {"retry_after": 1}) for _ in range(3)]
+    notifier = DiscordNotifier("http://discord/webhook", max_retries=1)
+
+    notifier._enviar([{"title": "a"}, {"title": "b"}])
+
+    assert esperas == [1.0, 1.0] and len(sesion.enviados) == 2
+    stats = notifier.stats()
+    assert (stats.enviadas, stats.rate_limited, stats.fallidas) == (0, 2, 2)
+
+
+def test_error_http_no_se_reintenta(sesion, esperas):
+    sesion.respuestas = [_Respuesta(500)]
+    notifier = DiscordNotifier("http://discord/webhook")
+
+    notifier._enviar([{"title": "a"}])
+
+    assert len(sesion.enviados) == 1 and esperas == []
+    assert notifier.stats().fallidas == 1
+
+
+# ---------------------------------------------------------------------------
+# Cola y agrupado
+# ---------------------------------------------------------------------------
+
+def test_cola_llena_descarta_y_cuenta(sesion):
+    notifier = DiscordNotifier("http://discord/webhook", queue_size=2)
+
+    resultados = [notifier.notificar_factura("o2", float(n)) for n in range(4)]
+
+    assert resultados == [True, True, False, False]
+    stats = notifier.stats()
+    assert (stats.encoladas, stats.descartadas, stats.pendientes) == (2, 2, 2)
+
+
+def test_agrupa_como_mucho_diez_embeds_por_mensaje(sesion, esperas):
+    notifier = DiscordNotifier("http://discord/webhook", coalesce_window=0)
+    for n in range(2 * MAX_EMBEDS + 3):
+        notifier.notificar_factura("o2", float(n))
+
+    notifier.start()
+    notifier.stop(timeout=5)
+
+    assert _embeds(sesion) == [MAX_EMBEDS, MAX_EMBEDS, 3]
+    assert sesion.enviados[-1]["content"].startswith("🔔 **3 Nuevas Facturas")
+    assert notifier.stats().enviadas == 2 * MAX_EMBEDS + 3
+
+
+def test_una_sola_factura_usa_el_mensaje_simple(sesion, esperas):
+    notifier = DiscordNotifier("http://discord/webhook", coalesce_window=0)
+    notifier.notificar_factura("o2", 12.34)
+
+    notifier.start()
+    notifier.stop(timeout=5)
+
+    [payload] = sesion.enviados
+    assert payload["content"] == CONTENT_FACTURA and len(payload["embeds"]) == 1
+
+
+def test_stop_envia_lo_pendiente_sin_esperar_la_ventana(sesion, esperas):
+    notifier = DiscordNotifier("http://discord/webhook", coalesce_window=60)
+    notifier.start()
+    for n in range(3):
+        notifier.notificar_factura("o2", float(n))
+
+    inicio = time.monotonic()
+    notifier.stop(timeout=5)
+
+    assert time.monotonic() - inicio < 5
+    assert _embeds(sesion) == [3] and sesion.cerrada
+    assert notifier.stats().pendientes == 0
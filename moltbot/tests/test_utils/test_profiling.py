@@ -0,0 +1,80 @@
+"""Tests del perfilado bajo demanda."""
+
+from __future__ import annotations
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from moltbot.utils import profiling
+from moltbot.utils.profiling import ProfileSession
+
+
+def _ocupado(parar: threading.Event) -> None:
+    while not parar.is_set():
+        sum(range(1000))
+
+
+def _parado(parar: threading.Event) -> None:
+    parar.wait()
+
+
+@pytest.mark.skipif(not hasattr(time, "pthread_getcpuclockid"), reason="sin reloj por hilo")
+def test_solo_muestrea_los_hilos_ocupados(tmp_path):
+    parar = threading.Event()
+    hilos = [
+        threading.Thread(target=_ocupado, args=(parar,), name="ocupado"),
+        threading.Thread(target=_parado, args=(parar,), name="parado"),
+    ]
+    for hilo in hilos:
+        hilo.start()
+    session = ProfileSession(tmp_path, max_messages=0, max_seconds=0.5, interval=0.01)
+    try:
+        session.start()
+        # Termina sola al llegar a max_seconds.
+        session._thread.join(5)
+        report = session.report
+    finally:
+        parar.set()
+        for hilo in hilos:
+            hilo.join()
+
+    assert report is not None
+    raices = {pila[0] for pila in session._stacks}
+    assert "ocupado" in raices
+    assert "parado" not in raices
+
+
+def test_toggle_no_espera_al_informe(tmp_path, monkeypatch):
+    backup = SimpleNamespace(output_folder=str(tmp_path))
+    monkeypatch.setattr(profiling, "settings", SimpleNamespace(backup=backup))
+    assert profiling.start(max_messages=0, max_seconds=60)
+    session = profiling._session
+    # Un _finish lento no debe bloquear al manejador de la señal.
+    monkeypatch.setattr(session, "_finish", lambda: time.sleep(1) or None)
+
+    inicio = time.monotonic()
+    profiling.toggle()
+
+    assert time.monotonic() - inicio < 0.5
+    session._thread.join(5)
+    assert not profiling.is_active()
+
+
+def test_stop_espera_al_informe_como_mucho_timeout(tmp_path, monkeypatch):
+    backup = SimpleNamespace(output_folder=str(tmp_path))
+    monkeypatch.setattr(profiling, "settings", SimpleNamespace(backup=backup))
+    assert profiling.start(max_messages=0, max_seconds=60)
+    session = profiling._session
+    informe = SimpleNamespace(resumen=lambda: "resumen")
+    monkeypatch.setattr(session, "_finish", lambda: time.sleep(0.5) or informe)
+
+    inicio = time.monotonic()
+    assert profiling.stop(timeout=0.05) is None
+    assert time.monotonic() - inicio < 0.4
+
+    session._thread.join(5)
+    # Terminada la sesión, el siguiente stop devuelve su informe.
+    assert profiling.stop(timeout=0.05) is informe